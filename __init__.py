@@ -3,16 +3,29 @@
 QuMail Package Initialization
 """
 
+import importlib
+
 __version__ = "1.0.0"
 __author__ = "ISRO Quantum Communications Team"
 __description__ = "Quantum Secure Email Client with ETSI GS QKD 014 compliance"
 
-# Package imports
-from .main import main
-from .core.app_core import QuMailCore
-from .crypto.kme_simulator import KMESimulator
-from .crypto.cipher_strategies import CipherManager
-from .gui.main_window import QuMailMainWindow
+# Package exports are imported on first access so that importing qumail
+# (or any subpackage) does not pull in PyQt6, Flask or the crypto stack
+_LAZY_EXPORTS = {
+    'main': '.main',
+    'QuMailCore': '.core.app_core',
+    'KMESimulator': '.crypto.kme_simulator',
+    'CipherManager': '.crypto.cipher_strategies',
+    'QuMailMainWindow': '.gui.main_window'
+}
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'main',
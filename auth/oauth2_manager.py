@@ -11,271 +11,9 @@ import base64
 import secrets
 from typing import Dict, Optional, List, Tuple
 from datetime import datetime, timedelta
-from PyQt6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
-    QLineEdit, QComboBox, QProgressBar, QTextEdit, QMessageBox,
-    QCheckBox, QFrame
-)
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread
-from PyQt6.QtGui import QFont, QPixmap
 import webbrowser
 import urllib.parse
 
-class OAuth2LoginDialog(QDialog):
-    """OAuth2 login simulation dialog"""
-    
-    login_completed = pyqtSignal(dict)  # auth_result
-    
-    def __init__(self, provider: str, parent=None):
-        super().__init__(parent)
-        self.provider = provider
-        self.auth_result = None
-        
-        self.setup_ui()
-        
-    def setup_ui(self):
-        """Setup login dialog UI"""
-        self.setWindowTitle(f"QuMail - Login with {self.provider.title()}")
-        self.setModal(True)
-        self.resize(500, 600)
-        
-        layout = QVBoxLayout(self)
-        
-        # Header
-        header_frame = QFrame()
-        header_frame.setStyleSheet("""
-            QFrame {
-                background-color: #4285F4;
-                border-radius: 8px;
-                padding: 16px;
-            }
-        """)
-        header_layout = QVBoxLayout(header_frame)
-        
-        title_label = QLabel("🔐 Secure Authentication")
-        title_label.setFont(QFont("Arial", 18, QFont.Weight.Bold))
-        title_label.setStyleSheet("color: white;")
-        title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        header_layout.addWidget(title_label)
-        
-        subtitle_label = QLabel(f"Connecting QuMail to your {self.provider.title()} account")
-        subtitle_label.setStyleSheet("color: white; font-size: 12px;")
-        subtitle_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        header_layout.addWidget(subtitle_label)
-        
-        layout.addWidget(header_frame)
-        
-        # Provider info
-        info_frame = QFrame()
-        info_layout = QVBoxLayout(info_frame)
-        
-        provider_label = QLabel(f"📧 {self.provider.title()} Authentication")
-        provider_label.setFont(QFont("Arial", 14, QFont.Weight.Bold))
-        info_layout.addWidget(provider_label)
-        
-        info_text = self._get_provider_info()
-        info_display = QLabel(info_text)
-        info_display.setWordWrap(True)
-        info_display.setStyleSheet("color: #666; font-size: 11px; padding: 8px;")
-        info_layout.addWidget(info_display)
-        
-        layout.addWidget(info_frame)
-        
-        # Simulation notice
-        sim_frame = QFrame()
-        sim_frame.setStyleSheet("""
-            QFrame {
-                background-color: #FFF3CD;
-                border: 1px solid #FFEAA7;
-                border-radius: 6px;
-                padding: 12px;
-            }
-        """)
-        sim_layout = QVBoxLayout(sim_frame)
-        
-        sim_title = QLabel("🧪 Simulation Mode")
-        sim_title.setFont(QFont("Arial", 12, QFont.Weight.Bold))
-        sim_title.setStyleSheet("color: #856404;")
-        sim_layout.addWidget(sim_title)
-        
-        sim_text = QLabel(
-            "This is a simulated OAuth2 flow for demonstration purposes. "
-            "In production, this would redirect to the actual provider's "
-            "authentication server."
-        )
-        sim_text.setWordWrap(True)
-        sim_text.setStyleSheet("color: #856404; font-size: 11px;")
-        sim_layout.addWidget(sim_text)
-        
-        layout.addWidget(sim_frame)
-        
-        # Mock login form
-        form_frame = QFrame()
-        form_frame.setStyleSheet("""
-            QFrame {
-                background-color: white;
-                border: 1px solid #E0E0E0;
-                border-radius: 6px;
-                padding: 16px;
-            }
-        """)
-        form_layout = QVBoxLayout(form_frame)
-        
-        form_title = QLabel("Mock Login Credentials")
-        form_title.setFont(QFont("Arial", 12, QFont.Weight.Bold))
-        form_layout.addWidget(form_title)
-        
-        # Email input
-        email_layout = QHBoxLayout()
-        email_layout.addWidget(QLabel("Email:"))
-        self.email_input = QLineEdit()
-        self.email_input.setText(f"user@{self.provider}.com")
-        self.email_input.setStyleSheet("""
-            QLineEdit {
-                padding: 8px;
-                border: 1px solid #E0E0E0;
-                border-radius: 4px;
-                font-size: 12px;
-            }
-        """)
-        email_layout.addWidget(self.email_input)
-        form_layout.addLayout(email_layout)
-        
-        # Name input
-        name_layout = QHBoxLayout()
-        name_layout.addWidget(QLabel("Name:"))
-        self.name_input = QLineEdit()
-        self.name_input.setText("Test User")
-        self.name_input.setStyleSheet("""
-            QLineEdit {
-                padding: 8px;
-                border: 1px solid #E0E0E0;
-                border-radius: 4px;
-                font-size: 12px;
-            }
-        """)
-        name_layout.addWidget(self.name_input)
-        form_layout.addLayout(name_layout)
-        
-        # Permissions
-        perms_label = QLabel("Requested Permissions:")
-        perms_label.setFont(QFont("Arial", 10, QFont.Weight.Bold))
-        form_layout.addWidget(perms_label)
-        
-        permissions = self._get_permissions()
-        for permission in permissions:
-            perm_check = QCheckBox(permission)
-            perm_check.setChecked(True)
-            perm_check.setEnabled(False)  # Required permissions
-            perm_check.setStyleSheet("font-size: 10px; color: #666;")
-            form_layout.addWidget(perm_check)
-            
-        layout.addWidget(form_frame)
-        
-        # Progress bar (hidden initially)
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setVisible(False)
-        self.progress_bar.setStyleSheet("""
-            QProgressBar {
-                border: 1px solid #4285F4;
-                border-radius: 4px;
-                text-align: center;
-            }
-            QProgressBar::chunk {
-                background-color: #4285F4;
-            }
-        """)
-        layout.addWidget(self.progress_bar)
-        
-        # Buttons
-        button_layout = QHBoxLayout()
-        
-        cancel_button = QPushButton("Cancel")
-        cancel_button.setStyleSheet("""
-            QPushButton {
-                background-color: #666;
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 6px;
-                font-weight: bold;
-            }
-        """)
-        cancel_button.clicked.connect(self.reject)
-        button_layout.addWidget(cancel_button)
-        
-        self.login_button = QPushButton(f"Login with {self.provider.title()}")
-        self.login_button.setStyleSheet("""
-            QPushButton {
-                background-color: #4285F4;
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 6px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #3367D6;
-            }
-        """)
-        self.login_button.clicked.connect(self.start_auth)
-        button_layout.addWidget(self.login_button)
-        
-        layout.addLayout(button_layout)
-        
-    def _get_provider_info(self) -> str:
-        """Get provider-specific information"""
-        provider_info = {
-            'gmail': "QuMail will access your Gmail account to send and receive encrypted emails. Your emails will be protected with quantum encryption.",
-            'yahoo': "QuMail will access your Yahoo Mail account for secure email communication with quantum key distribution.",
-            'outlook': "QuMail will connect to your Outlook account to provide quantum-secured email services."
-        }
-        return provider_info.get(self.provider, "QuMail will access your email account for secure communication.")
-        
-    def _get_permissions(self) -> List[str]:
-        """Get required permissions for the provider"""
-        return [
-            "Read and send emails",
-            "Access email folders",
-            "Manage email labels/folders",
-            "Offline access (for token refresh)"
-        ]
-        
-    def start_auth(self):
-        """Start the simulated authentication process"""
-        self.login_button.setEnabled(False)
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Indeterminate
-        
-        # Simulate authentication delay
-        QTimer.singleShot(2000, self.complete_auth)
-        
-    def complete_auth(self):
-        """Complete the authentication process"""
-        self.progress_bar.setVisible(False)
-        self.login_button.setEnabled(True)
-        
-        # Generate mock authentication result
-        user_id = f"user_{int(datetime.utcnow().timestamp())}"
-        
-        self.auth_result = {
-            'user_id': user_id,
-            'email': self.email_input.text(),
-            'name': self.name_input.text(),
-            'access_token': f"mock_access_token_{self.provider}_{secrets.token_hex(16)}",
-            'refresh_token': f"mock_refresh_token_{self.provider}_{secrets.token_hex(16)}",
-            'expires_in': 3600,
-            'token_type': 'Bearer',
-            'scope': ' '.join([
-                'email.read', 'email.write', 'email.modify'
-            ]),
-            'provider': self.provider,
-            'authenticated_at': datetime.utcnow().isoformat()
-        }
-        
-        self.login_completed.emit(self.auth_result)
-        self.accept()
-
 class OAuth2Manager:
     """OAuth2 authentication manager with secure credential storage"""
     
@@ -345,6 +83,8 @@ class OAuth2Manager:
             
     async def _show_login_dialog(self, provider: str, parent_widget=None) -> Optional[Dict]:
         """Show the login dialog and wait for completion"""
+        # The dialog module imports PyQt6; headless service mode never gets here
+        from .oauth2_dialog import OAuth2LoginDialog
         dialog = OAuth2LoginDialog(provider, parent_widget)
         
         # Use a future to handle the async dialog
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Headless Service Throughput Benchmark
+Starts the headless service (python -m <package>.daemon, one process and one
+asyncio loop, i.e. one core) against a KME cluster, then drives it over the
+Unix socket with a growing number of concurrent user sessions. Each session
+has its own connection and sends QuMail-to-QuMail email to the next session,
+then lists and decrypts its inbox. Reports sends/s and receives/s per session
+count, and how busy the service process was
+"""
+
+import os
+import sys
+import time
+import secrets
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).parent
+PACKAGE = PACKAGE_DIR.name  # imported as a package from its parent directory
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+
+import importlib
+KMECluster = importlib.import_module(f'{PACKAGE}.crypto.kme_cluster').KMECluster
+RPCClient = importlib.import_module(f'{PACKAGE}.service.rpc_server').RPCClient
+
+SERVICE_TOKEN = secrets.token_urlsafe(16)  # session.open credential shared with the spawned service
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+def free_port() -> int:
+    """Pick an unused local port"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU time of a process (Linux /proc; 0.0 elsewhere)"""
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+def start_service(socket_path: str, kme_url: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PACKAGE_DIR.parent), env.get('PYTHONPATH')]))
+    env.setdefault('QUMAIL_LOG_LEVEL', 'WARNING')
+    env['QUMAIL_SERVICE_TOKEN'] = SERVICE_TOKEN
+    return subprocess.Popen([sys.executable, '-m', f'{PACKAGE}.daemon', '--socket', socket_path,
+                             '--kme-url', kme_url], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_for_service(socket_path: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(socket_path):
+            try:
+                client = await RPCClient(socket_path).connect()
+                status = await client.call('service.status')
+                await client.close()
+                return status
+            except (ConnectionError, OSError):
+                pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("service did not start")
+
+async def run_round(socket_path: str, sessions: int, messages: int, level: str, pid: int) -> dict:
+    """Open `sessions` sessions and time the send and receive phases"""
+    clients = [await RPCClient(socket_path).connect() for _ in range(sessions)]
+    emails = [f"bench{sessions}_{index}@qumail.com" for index in range(sessions)]
+    opened = await asyncio.gather(*(client.call('session.open', email=email, token=SERVICE_TOKEN)
+                                    for client, email in zip(clients, emails)))
+    session_ids = [session['session_id'] for session in opened]
+    
+    async def send_all(index: int) -> int:
+        results = await asyncio.gather(*(
+            clients[index].call('email.send', session_id=session_ids[index],
+                                to=emails[(index + 1) % sessions], subject=f"bench {n}",
+                                body='x' * 2048, security_level=level)
+            for n in range(messages)))
+        return sum(1 for result in results if result['sent'])
+        
+    async def receive_all(index: int) -> int:
+        inbox = await clients[index].call('email.list', session_id=session_ids[index], limit=messages)
+        results = await asyncio.gather(*(
+            clients[index].call('email.receive', session_id=session_ids[index], email_id=email['email_id'])
+            for email in inbox), return_exceptions=True)
+        return sum(1 for result in results if isinstance(result, dict))
+        
+    cpu_before, started = cpu_seconds(pid), time.perf_counter()
+    sent = sum(await asyncio.gather(*(send_all(index) for index in range(sessions))))
+    send_time = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    received = sum(await asyncio.gather(*(receive_all(index) for index in range(sessions))))
+    receive_time = time.perf_counter() - started
+    cpu = cpu_seconds(pid) - cpu_before
+    
+    await asyncio.gather(*(client.call('session.close', session_id=session_id)
+                           for client, session_id in zip(clients, session_ids)))
+    for client in clients:
+        await client.close()
+    return {
+        'sent': sent, 'received': received,
+        'sends_per_s': sent / send_time, 'receives_per_s': received / receive_time,
+        'service_cpu': cpu / (send_time + receive_time)
+    }
+
+async def benchmark(args, socket_path: str, pid: int):
+    await wait_for_service(socket_path)
+    expected = args.messages
+    print(f"{'sessions':>8} | {'sent':>6} | {'sends/s':>8} | {'recv':>6} | {'receives/s':>10} | service CPU")
+    for sessions in args.sessions:
+        r = await run_round(socket_path, sessions, args.messages, args.level, pid)
+        print(f"{sessions:>8} | {r['sent']:>6} | {r['sends_per_s']:>8,.0f} | {r['received']:>6} | "
+              f"{r['receives_per_s']:>10,.0f} | {r['service_cpu']:.0%}")
+        if r['sent'] != sessions * expected or r['received'] != sessions * expected:
+            print(f"    incomplete round: expected {sessions * expected} sends and receives")
+            
+    client = await RPCClient(socket_path).connect()
+    status = await client.call('service.status')
+    await client.close()
+    print(f"\nKME breaker: {status['kme']['breaker_state']}, crypto pool: "
+          f"{status['crypto_executor']['mode']} x{status['crypto_executor']['max_workers']}, RPC requests: {status['rpc']['requests']}, "
+          f"errors: {status['rpc']['errors']}")
+    scheduler = status['scheduler']
+    print(f"Background scheduler: {scheduler['wakeups']} wakeups, {scheduler['runs']} runs, "
+          f"{scheduler['coalesced']} coalesced")
+    for name, task in sorted(scheduler['tasks'].items()):
+        print(f"    {name:<26} x{task['instances']:<3} every {task['current_interval']:>6.1f}s  runs {task['runs']:>4}  "
+              f"lag p95 {task['lag_p95_ms']:>7.1f}ms  duration p95 {task['duration_p95_ms']:>7.1f}ms")
+
+def main():
+    """Run the session sweep"""
+    parser = argparse.ArgumentParser(description='Headless service throughput benchmark')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--messages', type=int, default=20, help='emails sent per session per round')
+    parser.add_argument('--level', choices=['L1', 'L2', 'L3', 'L4'], default='L2')
+    parser.add_argument('--kme-workers', type=int, default=2)
+    args = parser.parse_args()
+    
+    port = free_port()
+    cluster = KMECluster(port=port, workers=args.kme_workers, slots=65536)
+    cluster.start()
+    cluster.wait_until_ready()
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='qumail-bench-'), 'service.sock')
+    service = start_service(socket_path, f'http://127.0.0.1:{port}')
+    
+    print("=== Headless Service Throughput (one service process) ===")
+    print(f"security {args.level}, {args.messages} emails per session, KME workers: {args.kme_workers}")
+    try:
+        asyncio.run(benchmark(args, socket_path, service.pid))
+    finally:
+        service.terminate()
+        service.wait(timeout=30)
+        cluster.stop()
+
+if __name__ == "__main__":
+    main()
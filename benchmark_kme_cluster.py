@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+KME Cluster Load Test
+Drives the multi-worker KME simulator with many simulated SAEs and reports
+request throughput as the worker count grows
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import http.client
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from crypto.kme_cluster import KMECluster
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+def free_port() -> int:
+    """Pick an unused local port"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def client_loop(port: int, client_index: int, sae_count: int, duration: float, results):
+    """Mint and retrieve keys between pairs of simulated SAEs for `duration` seconds"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    headers = {'Content-Type': 'application/json'}
+    requests = 0
+    errors = 0
+    deadline = time.monotonic() + duration
+    
+    while time.monotonic() < deadline:
+        sender = f"sae_{(client_index + requests) % sae_count}"
+        receiver = f"sae_{(client_index + requests + 1) % sae_count}"
+        try:
+            connection.request('POST', f'/api/v1/keys/{receiver}/enc_keys', headers=headers,
+                               body=json.dumps({'sender_sae_id': sender, 'key_type': 'otp',
+                                                'key_length': 8192}))
+            key_id = json.loads(connection.getresponse().read())['keys'][0]['key_id']
+            
+            connection.request('GET', f'/api/v1/keys/{receiver}/{key_id}/dec_keys')
+            connection.getresponse().read()
+            requests += 2
+        except Exception:
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            
+    results.put((requests, errors))
+
+def run_load(workers: int, clients: int, sae_count: int, duration: float) -> float:
+    """Start a cluster with `workers` processes and return requests per second"""
+    port = free_port()
+    cluster = KMECluster(port=port, workers=workers, slots=65536)
+    cluster.start()
+    cluster.wait_until_ready()
+    
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client_loop,
+                                         args=(port, index, sae_count, duration, results))
+                 for index in range(clients)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    cluster.stop()
+    
+    requests = sum(total[0] for total in totals)
+    errors = sum(total[1] for total in totals)
+    if errors:
+        print(f"  ({errors} request errors with {workers} workers)")
+    return requests / duration
+
+def main():
+    """Run the scaling sweep"""
+    parser = argparse.ArgumentParser(description='KME cluster load test')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--clients', type=int, default=None, help='client processes (default: 2 x max workers)')
+    parser.add_argument('--saes', type=int, default=200, help='simulated SAEs')
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    
+    clients = args.clients or 2 * args.max_workers
+    sweep = sorted({1, *[2 ** n for n in range(1, 8) if 2 ** n <= args.max_workers], args.max_workers})
+    
+    print("=== KME Cluster Scaling ===")
+    print(f"CPUs: {os.cpu_count()}, client processes: {clients}, SAEs: {args.saes}, "
+          f"{args.duration:.0f}s per run")
+    print(f"{'workers':>8} | {'requests/s':>11} | {'speedup':>7} | efficiency")
+    
+    baseline = None
+    for workers in sweep:
+        throughput = run_load(workers, clients, args.saes, args.duration)
+        baseline = baseline or throughput
+        speedup = throughput / baseline
+        print(f"{workers:>8} | {throughput:>11,.0f} | {speedup:>6.2f}x | {speedup / workers:.0%}")
+
+if __name__ == "__main__":
+    main()
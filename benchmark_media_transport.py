@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Quantum-Secured Call Media Benchmark
+Runs N concurrent full-duplex loopback calls (20ms G.711 frames, SRTP over
+127.0.0.1 UDP, adaptive jitter buffer) and reports mouth-to-ear latency,
+loss and CPU per call as the call count grows. SRTP master keys come from a
+per-call key schedule seeded locally (no KME in the loop)
+"""
+
+import sys
+import asyncio
+import logging
+import secrets
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from crypto.srtp import SRTPSession
+from crypto.srtp_keys import CallKeySchedule
+from transport.media_transport import run_loopback_calls
+
+logging.basicConfig(level=logging.WARNING)
+
+async def run(count: int, duration: float, epoch_seconds: float):
+    schedules = {}
+    
+    async def local_seed():
+        return {'key_id': secrets.token_hex(8), 'key_data': secrets.token_bytes(32)}
+        
+    for i in range(count):
+        schedule = CallKeySchedule(f"loopback_{i}", local_seed, epoch_seconds=epoch_seconds)
+        await schedule.start()
+        schedules[f"loopback_{i}"] = schedule
+        
+    result = await run_loopback_calls(count, duration, SRTPSession, lambda call_id: schedules[call_id].current)
+    result['epochs'] = max(schedule.epoch_at() for schedule in schedules.values()) + 1
+    return result
+
+def main():
+    """Scale concurrent call count"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per step')
+    parser.add_argument('--calls', type=int, nargs='+', default=[1, 10, 25, 50, 100])
+    parser.add_argument('--epoch-seconds', type=float, default=1.0, help='SRTP rekey interval')
+    args = parser.parse_args()
+    
+    print("=== Loopback SRTP calls (20ms audio, both directions) ===")
+    print(f"{'calls':>5} | {'m2e p50 ms':>10} | {'m2e p95 ms':>10} | {'loss':>6} | {'late':>6} | "
+          f"{'CPU ms/call/s':>13} | {'overruns':>8} | {'epochs':>6}")
+    for count in args.calls:
+        result = asyncio.run(run(count, args.duration, args.epoch_seconds))
+        latency = result['mouth_to_ear']
+        print(f"{count:>5} | {latency.get('p50_ms', 0):>10.2f} | {latency.get('p95_ms', 0):>10.2f} | "
+              f"{result['loss_rate']:>6.2%} | {result['late_rate']:>6.2%} | "
+              f"{result['cpu_ms_per_call_second']:>13.2f} | {result['tick_overruns']:>8} | {result['epochs']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Message Serialization Benchmark
+Compares the old JSON serialization (attachment bytes base64'd into the
+document) against the framed binary message format: encode/decode throughput
+and payload size before encryption, plus the size after the cipher envelope
+base64s the ciphertext
+"""
+
+import sys
+import json
+import time
+import base64
+import logging
+import secrets
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils.message_codec import decode_message, encode_message
+
+logging.basicConfig(level=logging.WARNING)
+
+def json_encode(message: dict) -> bytes:
+    """Pre-codec path: bytes had to be base64'd to fit in JSON"""
+    document = dict(message)
+    document['attachments'] = [
+        dict(att, data=base64.b64encode(att['data']).decode('ascii')) if 'data' in att else att
+        for att in message['attachments']
+    ]
+    return json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+def json_decode(payload: bytes) -> dict:
+    message = json.loads(payload.decode('utf-8'))
+    for att in message['attachments']:
+        if 'data' in att:
+            att['data'] = base64.b64decode(att['data'])
+    return message
+
+def build_message(attachment_bytes: int) -> dict:
+    attachments = []
+    if attachment_bytes:
+        attachments.append({'name': 'report.bin', 'size': attachment_bytes,
+                            'is_mock': False, 'data': secrets.token_bytes(attachment_bytes)})
+    return {
+        'subject': 'Quarterly quantum link report',
+        'body': 'Please find the figures attached. ' * 40,
+        'attachments': attachments,
+        'total_attachment_size': attachment_bytes,
+        'has_large_files': attachment_bytes > 10 * 1024 * 1024
+    }
+
+def throughput(func, arg, total_bytes: int, min_seconds: float = 0.5) -> float:
+    """Run func(arg) repeatedly and return MB/s"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(arg)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return total_bytes * runs / elapsed / (1024 * 1024)
+
+def main():
+    """Run before/after comparison"""
+    print("=== Message Serialization (JSON + base64 vs framed binary) ===")
+    print(f"{'attachment':>10} | {'format':>6} | {'payload':>10} | {'on wire':>10} | "
+          f"{'encode MB/s':>11} | {'decode MB/s':>11}")
+    for attachment_bytes in [0, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024]:
+        message = build_message(attachment_bytes)
+        for label, encode, decode in [('json', json_encode, json_decode),
+                                      ('binary', encode_message, decode_message)]:
+            payload = encode(message)
+            assert decode(payload)['attachments'] == message['attachments']
+            size = max(len(payload), 1)
+            # The cipher envelope base64s whatever plaintext it is given
+            wire = len(base64.b64encode(payload))
+            print(f"{attachment_bytes // 1024:>8}KB | {label:>6} | {len(payload):>10,} | {wire:>10,} | "
+                  f"{throughput(encode, message, size):>11,.0f} | {throughput(decode, payload, size):>11,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+SRTP Media Encryption Benchmark
+Packets/sec and microseconds per packet for AES_CM_128_HMAC_SHA1_80 protect
+and unprotect: a naive per-packet implementation (new AES-CTR cipher and
+HMAC per packet) against the batched SRTPSession engine, for audio (20ms
+G.711, 160 byte payload) and video (1200 byte payload) packets
+"""
+
+import sys
+import time
+import hmac
+import struct
+import hashlib
+import logging
+import secrets
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from crypto.srtp import AUTH_TAG_BYTES, MKI, SRTPSession, derive_session_keys
+
+logging.basicConfig(level=logging.WARNING)
+
+PACKETS_PER_CALL = 50  # 20ms audio frames
+
+def build_packets(count: int, payload_size: int, ssrc: int = 0x1234ABCD):
+    return [struct.pack('>BBHII', 0x80, 0, seq & 0xFFFF, seq * 160, ssrc) + secrets.token_bytes(payload_size)
+            for seq in range(count)]
+
+def naive_protect(packets, master_key: bytes, master_salt: bytes, epoch: int = 0):
+    """One cipher object and HMAC key schedule per packet (the straightforward port)"""
+    cipher_key, auth_key, salt = derive_session_keys(master_key, master_salt)
+    salt_int = int.from_bytes(salt, 'big') << 16
+    out = []
+    for packet in packets:
+        seq, ssrc = struct.unpack_from('>H', packet, 2)[0], struct.unpack_from('>I', packet, 8)[0]
+        iv = (salt_int ^ (ssrc << 64) ^ (seq << 16)).to_bytes(16, 'big')
+        encrypted = packet[:12] + Cipher(algorithms.AES(cipher_key), modes.CTR(iv)).encryptor().update(packet[12:])
+        tag = hmac.new(auth_key, encrypted + bytes(4), hashlib.sha1).digest()[:AUTH_TAG_BYTES]
+        out.append(encrypted + MKI.pack(epoch) + tag)
+    return out
+
+def timed(func, packets, min_seconds: float = 0.5) -> float:
+    """Seconds per packet over repeated runs"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(packets)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / (runs * len(packets))
+
+def main():
+    """Run before/after comparison"""
+    master_key, master_salt = secrets.token_bytes(16), secrets.token_bytes(14)
+    print("=== SRTP AES_CM_128_HMAC_SHA1_80 (naive per-packet vs batched engine) ===")
+    print(f"{'media':>6} | {'impl':>7} | {'op':>9} | {'us/packet':>9} | {'packets/s':>10} | {'50pps calls/core':>16}")
+    for media, payload_size in [('audio', 160), ('video', 1200)]:
+        packets = build_packets(1024, payload_size)
+        sender, receiver = SRTPSession(), SRTPSession()
+        sender.install_key(0, master_key, master_salt)
+        receiver.install_key(0, master_key, master_salt, send=False)
+        protected = sender.protect_batch(packets)
+        assert protected == naive_protect(packets, master_key, master_salt)
+        assert receiver.unprotect_batch(protected) == packets
+        
+        def engine_unprotect(batch):
+            receiver.recv_streams.clear()  # replaying the same packets on purpose
+            receiver.unprotect_batch(batch)
+            
+        rows = [
+            ('naive', 'protect', timed(lambda batch: naive_protect(batch, master_key, master_salt), packets)),
+            ('batched', 'protect', timed(sender.protect_batch, packets)),
+            ('batched', 'unprotect', timed(engine_unprotect, protected))
+        ]
+        for impl, op, seconds in rows:
+            print(f"{media:>6} | {impl:>7} | {op:>9} | {seconds * 1e6:>9.2f} | {1 / seconds:>10,.0f} | "
+                  f"{1 / seconds / PACKETS_PER_CALL:>16,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Import-time profile (python -X importtime) of the GUI entry module, plus
+time-to-first-window for the real startup path (QApplication, core startup
+phases, main window shown) measured from process launch. Each run is a fresh
+interpreter; the KME URL can point at an unreachable host to show that a slow
+KME no longer delays the window
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).parent
+PACKAGE = PACKAGE_DIR.name  # imported as a package from its parent directory
+
+# Modules the first window must not pull in (loaded on demand instead)
+DEFERRED_MODULES = ['flask', 'flask_cors', 'aiosmtplib', 'aioimaplib', 'httpx',
+                    f'{PACKAGE}.crypto.kme_simulator', f'{PACKAGE}.gui.chat_module',
+                    f'{PACKAGE}.gui.call_module', f'{PACKAGE}.gui.security_dock']
+
+FIRST_WINDOW = f'''
+import asyncio, json, os, sys, time
+started = time.perf_counter()
+from {PACKAGE}.main import QuMailApplication
+imported = time.perf_counter()
+qumail = QuMailApplication()
+qumail.setup_application()
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+loop.run_until_complete(qumail.setup_backend_services())
+core_ready = time.perf_counter()
+qumail.setup_main_window()
+qumail.app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({{
+    'import': imported - started,
+    'core': core_ready - imported,
+    'window': shown - core_ready,
+    'startup': qumail.core.get_startup_timings(),
+    'loaded': [name for name in {DEFERRED_MODULES!r} if name in sys.modules]
+}}))
+sys.stdout.flush()
+os._exit(0)
+'''
+
+def child_env(kme_url: str) -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PACKAGE_DIR.parent), env.get('PYTHONPATH')]))
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    env['QUMAIL_KME_URL'] = kme_url
+    return env
+
+def import_profile(module: str, env: dict):
+    """Return (total seconds, [(cumulative seconds, module)]) from -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    # Top-level imports have no indentation in the module column
+    total = sum(seconds for seconds, name in rows if not name.startswith('  '))
+    return total, rows
+
+def first_window(env: dict, timeout: float) -> dict:
+    """Launch the startup path in a fresh interpreter; wall time includes interpreter start"""
+    launched = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', FIRST_WINDOW], env=env,
+                            capture_output=True, text=True, timeout=timeout)
+    wall = time.perf_counter() - launched
+    if result.returncode != 0 or not result.stdout.strip():
+        raise RuntimeError(f"startup run failed: {result.stderr[-2000:]}")
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement['wall'] = wall
+    return measurement
+
+def main():
+    """Profile imports and time-to-first-window"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='heaviest imports to list')
+    parser.add_argument('--kme-url', default='http://127.0.0.1:8080',
+                        help='e.g. http://10.255.255.1:8080 for a KME that never answers')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+    env = child_env(args.kme_url)
+    
+    print(f"=== Import profile: import {PACKAGE}.main (-X importtime) ===")
+    total, rows = import_profile(f'{PACKAGE}.main', env)
+    print(f"total {total * 1000:.0f}ms, {len(rows)} modules")
+    heaviest = {}
+    for seconds, name in rows:
+        heaviest[name.strip()] = max(seconds, heaviest.get(name.strip(), 0.0))
+    for name, seconds in sorted(heaviest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{seconds * 1000:>9.1f}ms  {name}")
+        
+    print(f"\n=== Time to first window (KME {args.kme_url}) ===")
+    print(f"{'run':>3} | {'wall':>8} | {'import':>8} | {'core':>8} | {'window':>8} | phases")
+    walls = []
+    for run in range(args.runs):
+        m = first_window(env, args.timeout)
+        walls.append(m['wall'])
+        phases = ', '.join(f"{name}={phase['duration'] * 1000:.0f}ms" if phase['duration'] is not None
+                           else f"{name}={phase['status']}"
+                           for name, phase in m['startup'].get('phases', {}).items())
+        print(f"{run + 1:>3} | {m['wall'] * 1000:>6.0f}ms | {m['import'] * 1000:>6.0f}ms | "
+              f"{m['core'] * 1000:>6.0f}ms | {m['window'] * 1000:>6.0f}ms | {phases}")
+        if m['loaded']:
+            print(f"    deferred modules loaded before first window: {', '.join(m['loaded'])}")
+    print(f"median time-to-first-window: {sorted(walls)[len(walls) // 2] * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
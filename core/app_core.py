@@ -10,14 +10,25 @@ Central orchestrator for all QuMail functionality including:
 """
 
 import asyncio
+import base64
 import logging
-from typing import Dict, List, Optional, Any
+import secrets
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import os
 import aiofiles.os 
 from ..crypto.kme_client import KMEClient
 from ..crypto.cipher_strategies import CipherManager
+from ..crypto.crypto_executor import CryptoExecutor
+from ..crypto.session_ratchet import SessionRatchet
+from .outbox import Outbox, SendHandle
+from .inbox_prefetch import InboxPrefetcher, SealedPlaintextCache
+from .security_policy import SecurityPolicyEngine
+from .startup import StartupOrchestrator
+from ..utils.message_codec import decode_message, encode_message
+from ..utils.adaptive_compression import AdaptiveCompressor, decompress_payload
+from ..utils.perf_metrics import MetricsRegistry, StageTrace
 from ..transport.email_handler import EmailHandler
 from ..transport.chat_handler import ChatHandler
 from ..auth.identity_manager import IdentityManager
@@ -38,16 +49,27 @@ class UserProfile:
 class QuMailCore:
     """Core application logic and workflow manager"""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, kme_client: Optional[KMEClient] = None,
+                 crypto_executor: Optional[CryptoExecutor] = None, smtp_pool=None,
+                 imap_pool=None):
         self.config = config
         self.current_user: Optional[UserProfile] = None
         self.current_security_level = "L2"  # Default to Quantum-aided AES
         
+        # SERVICE MODE: The KME client, crypto worker pool and SMTP/IMAP pools may be
+        # shared by many sessions; shared ones are left open on cleanup
+        self.owns_kme_client = kme_client is None
+        self.owns_crypto_executor = crypto_executor is None
+        
         # Initialize components with enhanced error handling
         try:
-            self.kme_client = KMEClient(config.get('kme_url', 'http://127.0.0.1:8080'))
-            self.cipher_manager = CipherManager()
-            self.email_handler = EmailHandler()
+            self.kme_client = kme_client or KMEClient(config.get('kme_url', 'http://127.0.0.1:8080'))
+            self.cipher_manager = crypto_executor.cipher_manager if crypto_executor else CipherManager()
+            self.crypto_executor = crypto_executor or CryptoExecutor.from_config(self.cipher_manager, config)
+            self.compressor = AdaptiveCompressor.from_config(config)
+            self.security_policy = SecurityPolicyEngine.from_config(self.kme_client, config)
+            self.metrics = MetricsRegistry()  # per-stage latency histograms
+            self.email_handler = EmailHandler(smtp_pool=smtp_pool, imap_pool=imap_pool)
             self.chat_handler = ChatHandler()
             self.secure_storage = SecureStorage()
             
@@ -63,8 +85,35 @@ class QuMailCore:
         
         # State tracking
         self.qkd_status = "disconnected"
+        self.startup: Optional[StartupOrchestrator] = None
+        self._kme_connect_task: Optional[asyncio.Task] = None
         self.active_connections = {}
-        self.message_queue = asyncio.Queue()
+        
+        # OUTBOX: Queued sends drained by a worker pool (replaces the unused message_queue)
+        self.outbox = Outbox(
+            self.send_secure_email,
+            workers=config.get('outbox_workers', 4),
+            max_queue=config.get('outbox_max_queue', 100),
+            per_destination_limit=config.get('outbox_per_destination', 2)
+        )
+        self._status_callbacks = {}  # subscriber -> KME status callback wrapper
+        
+        # INBOX PREFETCH: Decrypt the newest listed emails ahead into a sealed plaintext cache
+        self.inbox_prefetcher = InboxPrefetcher(
+            self._fetch_and_decrypt_email,
+            SealedPlaintextCache(
+                max_bytes=config.get('prefetch_cache_bytes', 16 * 1024 * 1024),
+                max_entries=config.get('prefetch_cache_entries', 200)
+            ),
+            depth=config.get('prefetch_depth', 10),
+            concurrency=config.get('prefetch_concurrency', 3),
+            batch_func=self.receive_secure_emails
+        )
+        
+        # SESSION RATCHET: Optional per-peer KME-seeded key chains for L2/L3 chat and email
+        self.session_ratchet = SessionRatchet.from_config(config)
+        self.session_mode = config.get('session_ratchet_enabled', False)
+        self._ratchet_locks: Dict[str, asyncio.Lock] = {}
         
         # PQC FILE FEATURE: Track file encryption statistics
         self.pqc_stats = {
@@ -90,22 +139,20 @@ class QuMailCore:
         }
         
     async def initialize(self):
-        """Initialize all core components with KME robustness"""
+        """Initialize core components; returns once the profile and transports are ready
+        
+        STARTUP: Phases run concurrently in dependency order. The KME connection
+        and key pool watch do not gate startup - they finish in the background
+        and sends that need the KME wait for the in-flight connection.
+        """
+        self.startup = StartupOrchestrator(self.metrics)
+        self.startup.add('storage', self.secure_storage.initialize)
+        self.startup.add('kme', self.initialize_kme_with_robustness)
+        self.startup.add('profile', self.load_user_profile, depends_on=['storage'])
+        self.startup.add('transports', self._initialize_transports, depends_on=['profile'])
+        self.startup.add('key_pool', self._watch_key_pool, depends_on=['profile', 'kme'])
         try:
-            # Initialize secure storage
-            await self.secure_storage.initialize()
-            
-            # KME ROBUSTNESS: Enhanced KME connection with heartbeat
-            await self.initialize_kme_with_robustness()
-            
-            # Load saved user profile if available
-            await self.load_user_profile()
-            
-            # Initialize transport handlers
-            if self.current_user:
-                await self.email_handler.initialize(self.current_user)
-                await self.chat_handler.initialize(self.current_user)
-            
+            await self.startup.run(until=['profile', 'transports'])
             logging.info("QuMail Core initialization complete with KME robustness")
             
         except Exception as e:
@@ -113,7 +160,25 @@ class QuMailCore:
             # Continue operation even if KME fails
             self.qkd_status = "error"
             
+    async def _initialize_transports(self):
+        """Initialize transport handlers for the loaded user (IMAP/SMTP connect on first use)"""
+        if self.current_user:
+            await self.email_handler.initialize(self.current_user)
+            await self.chat_handler.initialize(self.current_user)
+            
+    def get_startup_timings(self) -> Dict:
+        """Per-phase startup timings (seconds) and when the core became ready"""
+        if self.startup is None:
+            return {}
+        return self.startup.get_timings()
+        
     async def initialize_kme_with_robustness(self):
+        """KME ROBUSTNESS: Connect to the KME, sharing one attempt between concurrent callers"""
+        if self._kme_connect_task is None or self._kme_connect_task.done():
+            self._kme_connect_task = asyncio.ensure_future(self._connect_kme())
+        await asyncio.shield(self._kme_connect_task)
+        
+    async def _connect_kme(self):
         """KME ROBUSTNESS: Initialize KME with enhanced error handling and heartbeat"""
         try:
             # Initialize KME client with heartbeat monitoring enabled
@@ -123,6 +188,9 @@ class QuMailCore:
                 self.qkd_status = "connected"
                 logging.info("KME connection established with heartbeat monitoring")
                 
+                # One shared status poll feeds every status display
+                self.kme_client.start_status_polling()
+                
                 # Perform initial health check
                 health_status = await self.kme_client.health_check()
                 logging.info(f"KME health status: {health_status.get('overall_status', 'unknown')}")
@@ -135,6 +203,23 @@ class QuMailCore:
             logging.error(f"KME initialization failed: {e}")
             # Application continues to function without KME
             
+    async def start_headless_session(self, profile: UserProfile):
+        """SERVICE MODE: Sign profile in without secure storage or dialogs and ready its transports"""
+        self.current_user = profile
+        await self._initialize_transports()
+        self.chat_handler.user_id = profile.user_id  # group chats are created and sent as this user
+        if self.owns_kme_client:
+            await self.initialize_kme_with_robustness()
+            await self._watch_key_pool()
+            
+    async def end_headless_session(self):
+        """SERVICE MODE: Drop the session's user state and release its per-session resources"""
+        await self._drain_outbox()  # queued sends still need the user and the KME
+        await self.inbox_prefetcher.cancel()
+        self.session_ratchet.clear()
+        self.current_user = None
+        await self.cleanup()
+        
     async def authenticate_user(self, provider: str = "qumail_native") -> bool:
         """Authenticate user with IdentityManager for persistent login."""
         try:
@@ -178,6 +263,7 @@ class QuMailCore:
                     )
                 
                 await self.chat_handler.initialize(self.current_user)
+                await self._watch_key_pool()
                 
                 logging.info(f"User authenticated: {self.current_user.email}")
                 return True
@@ -186,6 +272,31 @@ class QuMailCore:
             logging.error(f"Authentication failed: {e}")
             return False
             
+    async def _watch_key_pool(self):
+        """Track the current user's key pool counts for status displays"""
+        if not self.current_user:
+            return
+        self.kme_client.watch_key_pool(self.current_user.sae_id)
+        if self.kme_client.is_connected:
+            await self.kme_client.get_aggregated_status()
+            
+    def subscribe_status(self, callback):
+        """Call callback with get_qkd_status() whenever the shared KME poll refreshes"""
+        if callback in self._status_callbacks:
+            return
+        
+        def on_kme_status(_snapshot):
+            callback(self.get_qkd_status())
+            
+        self._status_callbacks[callback] = on_kme_status
+        self.kme_client.subscribe_status(on_kme_status)
+        
+    def unsubscribe_status(self, callback):
+        """Stop delivering status updates to callback"""
+        on_kme_status = self._status_callbacks.pop(callback, None)
+        if on_kme_status:
+            self.kme_client.unsubscribe_status(on_kme_status)
+            
     async def load_user_profile(self):
         """Load saved user profile and restore IdentityManager state"""
         try:
@@ -250,8 +361,23 @@ class QuMailCore:
     async def send_secure_email(self, to_address: str, subject: str, 
                                body: str, attachments: List = None, 
                                security_level: str = None, 
-                               file_context: Dict = None) -> bool:
-        """PQC FEATURE: Send encrypted email with enhanced file attachment support"""
+                               file_context: Dict = None,
+                               progress_callback: Callable[[str, int, int], None] = None,
+                               min_security_level: str = None, session: bool = None) -> bool:
+        """PQC FEATURE: Send encrypted email with enhanced file attachment support
+        
+        Real file attachments are streamed under a per-message file encryption
+        key (FEK) carried inside the encrypted envelope; progress_callback gets
+        (file name, bytes sent, file size) as they go out.
+        
+        The security policy may move the message to a faster level at or above
+        min_security_level (default: the requested level) when the KME is slow
+        or short of key material, or defer it until key material returns.
+        
+        session (default: the session_ratchet_enabled config) keys L2/L3 sends
+        from the peer's ratchet chain instead of a fresh KME key per message.
+        """
+        trace = self.metrics.trace('email.send')
         try:
             if not self.current_user:
                 raise ValueError("User not authenticated")
@@ -260,35 +386,11 @@ class QuMailCore:
             level = security_level or self.current_security_level
             
             # PQC FILE FEATURE: Enhanced file attachment handling
-            total_attachment_size = 0
+            processed_attachments, total_attachment_size = await self._process_attachments(attachments)
+            trace.mark('attachments')
             has_large_files = False
-            processed_attachments = []
-            
-            if attachments and len(attachments) > 0:
-                # Process both real files and mock files
-                for attachment in attachments:
-                    if isinstance(attachment, dict) and attachment.get('is_mock'):
-                        # Handle mock file
-                        total_attachment_size += attachment['size']
-                        processed_attachments.append(attachment)
-                        logging.info(f"Processing mock file: {attachment['name']} ({attachment['size'] / (1024*1024):.1f} MB)")
-                    elif isinstance(attachment, str):
-                        # ASYNC I/O ARCHITECTURE FIX: Use aiofiles.os.path.getsize and aiofiles.os.path.exists
-                        if await aiofiles.os.path.exists(attachment): 
-                            file_size = await aiofiles.os.path.getsize(attachment)
-                            total_attachment_size += file_size
-                            processed_attachments.append({
-                                'name': os.path.basename(attachment),
-                                'path': attachment,
-                                'size': file_size,
-                                'is_mock': False
-                            })
-                            logging.info(f"Processing real file: {attachment} ({file_size / (1024*1024):.1f} MB)")
-                        else:
-                            logging.warning(f"Skipping invalid attachment: {attachment}")
-                    else:
-                        logging.warning(f"Skipping invalid attachment: {attachment}")
-                
+            
+            if processed_attachments:
                 has_large_files = total_attachment_size > 10 * 1024 * 1024  # >10MB
                 
                 if has_large_files:
@@ -315,8 +417,55 @@ class QuMailCore:
                 'has_large_files': has_large_files
             }
             
+            # STREAMING ATTACHMENTS: File bytes bypass the envelope cipher and are
+            # segment-encrypted under a FEK that travels inside the envelope
+            stream_attachments = [att for att in processed_attachments if not att.get('is_mock')]
+            attachment_key = None
+            if stream_attachments:
+                attachment_key = secrets.token_bytes(32)
+                message_data['attachment_stream'] = {
+                    'cipher': 'AES256_GCM_STREAM',
+                    'fek': base64.b64encode(attachment_key).decode('utf-8'),
+                    'files': [att['name'] for att in stream_attachments]
+                }
+            
             # Convert to bytes for encryption
             message_bytes = self._serialize_message(message_data)
+            trace.mark('serialize')
+            receiver_sae_id = f"qumail_{to_address.replace('@', '_').replace('.', '_')}"
+            
+            # An L1 request spends one key bit per compressed bit, so only it is compressed
+            # before the policy sizes the key; every other level is compressed once chosen
+            compression = None
+            if level == 'L1':
+                message_bytes, compression = await self._compress_payload(message_bytes, level)
+                trace.mark('compress')
+                
+            # KEY-AWARE POLICY: Pick the level from breaker state, KME latency and the key
+            # material on the path to the receiver
+            if level in ['L1', 'L2', 'L3'] and not self.kme_client.is_connected:
+                logging.warning("KME not connected - attempting reconnection")
+                await self.initialize_kme_with_robustness()
+                trace.mark('kme_reconnect')
+            trace.skip()
+            decision = await self.security_policy.decide_or_wait(level, len(message_bytes), min_security_level,
+                                                                 receiver_sae_id=receiver_sae_id)
+            trace.mark('policy')
+            if decision.action == 'reject':
+                if decision.blocker == 'size':
+                    raise ValueError(decision.reason)
+                logging.error(f"Security policy rejected send to {to_address}: {decision.reason}")
+                trace.end('kme_unavailable')
+                return False
+            if decision.action == 'defer':
+                logging.error(f"Send to {to_address} deferred past timeout: {decision.reason}")
+                trace.end('deferred')
+                return False
+            level = decision.level
+            
+            if compression is None:
+                message_bytes, compression = await self._compress_payload(message_bytes, level)
+                trace.mark('compress')
             
             # PQC FILE FEATURE: Create enhanced file context
             encryption_file_context = {
@@ -335,17 +484,13 @@ class QuMailCore:
             # Check if we need quantum keys
             if level in ['L1', 'L2', 'L3']:
                 # KME ROBUSTNESS: Check KME status before key request
+                trace.skip()
                 if not self.kme_client.is_connected:
-                    logging.warning("KME not connected - attempting reconnection")
-                    await self.initialize_kme_with_robustness()
-                    
-                    if not self.kme_client.is_connected:
-                        logging.error("KME unavailable - cannot proceed with quantum encryption")
-                        return False
+                    logging.error("KME unavailable - cannot proceed with quantum encryption")
+                    trace.end('kme_unavailable')
+                    return False
                 
                 # Request quantum key from KME
-                receiver_sae_id = f"qumail_{to_address.replace('@', '_').replace('.', '_')}"
-                
                 required_key_length = self.cipher_manager.get_required_key_length(
                     level, len(message_bytes)
                 )
@@ -363,34 +508,47 @@ class QuMailCore:
                         logging.warning(f"Message too large for OTP ({required_key_length // 8} bytes > 50KB limit)")
                         raise ValueError(f"OTP encryption limited to 50KB. Message size: {required_key_length // 8} bytes. Please use L2 (Quantum-aided AES) or L3 (PQC) for larger messages.")
                     
-                # Request key from KME with retry logic
+                use_session = (self.session_mode if session is None else session) and level in ['L2', 'L3']
                 key_data = None
-                for attempt in range(3):
-                    try:
-                        key_data = await self.kme_client.request_key(
-                            sender_sae_id=self.current_user.sae_id,
-                            receiver_sae_id=receiver_sae_id,
-                            key_length=required_key_length,
-                            key_type='otp' if level == 'L1' else 'seed'
-                        )
-                        if key_data:
-                            break
-                    except Exception as e:
-                        logging.warning(f"Key request attempt {attempt + 1} failed: {e}")
-                        if attempt < 2:
-                            await asyncio.sleep(1)
+                if use_session:
+                    # SESSION RATCHET: Derive this message's key from the peer's seeded chain
+                    session_key = await self._session_send_key(receiver_sae_id)
+                    if session_key:
+                        seed_key_id, ratchet_index, message_key = session_key
+                        key_data = {'key_id': seed_key_id, 'key_data': message_key}
+                else:
+                    # Request key from KME with retry logic
+                    for attempt in range(3):
+                        try:
+                            key_data = await self.kme_client.request_key(
+                                sender_sae_id=self.current_user.sae_id,
+                                receiver_sae_id=receiver_sae_id,
+                                key_length=required_key_length,
+                                key_type='otp' if level == 'L1' else 'seed'
+                            )
+                            if key_data:
+                                break
+                        except Exception as e:
+                            logging.warning(f"Key request attempt {attempt + 1} failed: {e}")
+                            if attempt < 2:
+                                await asyncio.sleep(1)
                 
+                trace.mark('key_request')
                 if not key_data:
                     logging.error("Failed to obtain quantum key after retries")
+                    trace.end('key_unavailable')
                     return False
                     
                 # Encrypt message with file context
-                encrypted_data = self.cipher_manager.encrypt_with_level(
+                encrypted_data = await self.crypto_executor.encrypt_with_level(
                     message_bytes, key_data['key_data'], level, encryption_file_context
                 )
+                trace.mark('encrypt')
                 
-                # Add key metadata
+                # Add key metadata (ratcheted sends name the seed key and chain index)
                 encrypted_data['key_id'] = key_data['key_id']
+                if use_session:
+                    encrypted_data['ratchet_index'] = ratchet_index
                 
                 # PQC FEATURE: Add enhanced file encryption metadata
                 if level == 'L3' and has_large_files:
@@ -408,14 +566,22 @@ class QuMailCore:
 
             else:
                 # Level 4 - no additional encryption
-                encrypted_data = self.cipher_manager.encrypt_with_level(
+                encrypted_data = await self.crypto_executor.encrypt_with_level(
                     message_bytes, b'', level, encryption_file_context
                 )
+                trace.mark('encrypt')
                 
+            encrypted_data['compression'] = compression
+            
             # Send via email handler
             result = await self.email_handler.send_encrypted_email(
-                to_address, encrypted_data
+                to_address, encrypted_data,
+                attachments=stream_attachments or None,
+                attachment_key=attachment_key,
+                progress_callback=progress_callback
             )
+            trace.mark('transport')
+            trace.end('ok' if result else 'transport_failed')
             
             if result:
                 logging.info(f"Secure email sent successfully to {to_address} with {level} encryption")
@@ -428,21 +594,230 @@ class QuMailCore:
             # EDGE CASE FIX: Catch specific policy/validation errors (e.g., OTP size, Auth)
             # The UI needs to catch this and display the specific message 'e'.
             logging.error(f"Policy/Validation Error: {e}")
+            trace.end('rejected')
             return False
            
         except Exception as e:
             # CRITICAL FIX: Add full traceback logging to find the source of the silent failure
             logging.critical(f"CRITICAL FAILURE: QuMail Core failed to send secure email. Error: {e}", exc_info=True)
+            trace.end('error')
             return False
             
+    async def _process_attachments(self, attachments: List) -> tuple:
+        """Resolve attachment paths and mock files into (processed_attachments, total_size)"""
+        total_attachment_size = 0
+        processed_attachments = []
+        
+        # Process both real files and mock files
+        for attachment in attachments or []:
+            if isinstance(attachment, dict) and attachment.get('is_mock'):
+                # Handle mock file
+                total_attachment_size += attachment['size']
+                processed_attachments.append(attachment)
+                logging.info(f"Processing mock file: {attachment['name']} ({attachment['size'] / (1024*1024):.1f} MB)")
+            elif isinstance(attachment, str):
+                # ASYNC I/O ARCHITECTURE FIX: Use aiofiles.os.path.getsize and aiofiles.os.path.exists
+                if await aiofiles.os.path.exists(attachment): 
+                    file_size = await aiofiles.os.path.getsize(attachment)
+                    total_attachment_size += file_size
+                    processed_attachments.append({
+                        'name': os.path.basename(attachment),
+                        'path': attachment,
+                        'size': file_size,
+                        'is_mock': False
+                    })
+                    logging.info(f"Processing real file: {attachment} ({file_size / (1024*1024):.1f} MB)")
+                else:
+                    logging.warning(f"Skipping invalid attachment: {attachment}")
+            else:
+                logging.warning(f"Skipping invalid attachment: {attachment}")
+                
+        return processed_attachments, total_attachment_size
+        
+    async def send_secure_email_bulk(self, recipients: List[str], subject: str, body: str,
+                                     attachments: List = None, security_level: str = 'L2',
+                                     max_concurrency: int = 16) -> Dict[str, bool]:
+        """
+        BULK SEND: Encrypt the message once under a random Content Encryption Key
+        (CEK), wrap the CEK per recipient with that recipient's quantum key, and
+        deliver to all recipients concurrently. Per-recipient crypto cost is one
+        32-byte key wrap instead of a full re-encryption.
+        
+        Returns {recipient: sent_ok}.
+        """
+        results = {recipient: False for recipient in recipients}
+        try:
+            if not self.current_user:
+                raise ValueError("User not authenticated")
+            if not recipients:
+                raise ValueError("Recipient list cannot be empty for bulk send")
+                
+            if security_level not in ['L2', 'L3']:
+                logging.warning("Bulk send requires L2 or L3 key wrapping. Defaulting to L2.")
+                security_level = 'L2'
+                
+            if not self.kme_client.is_connected:
+                await self.initialize_kme_with_robustness()
+                if not self.kme_client.is_connected:
+                    logging.error("KME unavailable - cannot proceed with quantum encryption for bulk send")
+                    return results
+                    
+            processed_attachments, total_attachment_size = await self._process_attachments(attachments)
+            message_data = {
+                'subject': subject,
+                'body': body,
+                'attachments': processed_attachments,
+                'total_attachment_size': total_attachment_size,
+                'has_large_files': total_attachment_size > 10 * 1024 * 1024
+            }
+            
+            # Attachments stream per delivery under one FEK carried in the shared content
+            stream_attachments = [att for att in processed_attachments if not att.get('is_mock')]
+            attachment_key = None
+            if stream_attachments:
+                attachment_key = secrets.token_bytes(32)
+                message_data['attachment_stream'] = {
+                    'cipher': 'AES256_GCM_STREAM',
+                    'fek': base64.b64encode(attachment_key).decode('utf-8'),
+                    'files': [att['name'] for att in stream_attachments]
+                }
+                
+            # --- 1. Content Encryption (Single Operation) ---
+            content_bytes, compression = await self._compress_payload(self._serialize_message(message_data), security_level)
+            cek_data = await self.crypto_executor.encrypt_group_content(content_bytes)
+            cek = cek_data['cek']
+            sender_sae_id = self.current_user.sae_id
+            semaphore = asyncio.Semaphore(max_concurrency)
+            
+            async def deliver(to_address: str) -> bool:
+                async with semaphore:
+                    receiver_sae_id = f"qumail_{to_address.replace('@', '_').replace('.', '_')}"
+                    
+                    # --- 2. Per-recipient CEK wrap under a 256-bit quantum key ---
+                    key_response = None
+                    for attempt in range(3):
+                        try:
+                            key_response = await self.kme_client.request_key(
+                                sender_sae_id=sender_sae_id,
+                                receiver_sae_id=receiver_sae_id,
+                                key_length=len(cek) * 8,
+                                key_type='seed'
+                            )
+                            if key_response:
+                                break
+                        except Exception as e:
+                            logging.warning(f"Key request for {to_address} attempt {attempt + 1} failed: {e}")
+                        if attempt < 2:
+                            await asyncio.sleep(1)
+                            
+                    if not key_response:
+                        logging.error(f"Failed to obtain quantum key for bulk recipient {to_address}")
+                        return False
+                        
+                    wrapped = self.cipher_manager.wrap_key_with_level(cek, key_response['key_data'], security_level)
+                    encrypted_data = {
+                        'security_level': security_level,
+                        'key_id': key_response['key_id'],
+                        'wrapped_cek': wrapped['wrapped_key'],
+                        'content_encryption_algorithm': cek_data['algorithm'],
+                        'encrypted_content_payload': cek_data['encrypted_payload'],  # shared by all recipients
+                        'compression': compression,
+                        'bulk_recipients': len(recipients),
+                        'timestamp': str(int(datetime.utcnow().timestamp()))
+                    }
+                    
+                    # --- 3. Delivery ---
+                    return await self.email_handler.send_encrypted_email(
+                        to_address, encrypted_data,
+                        attachments=stream_attachments or None,
+                        attachment_key=attachment_key
+                    )
+                    
+            outcomes = await asyncio.gather(*[deliver(to_address) for to_address in recipients],
+                                            return_exceptions=True)
+            for to_address, outcome in zip(recipients, outcomes):
+                if isinstance(outcome, Exception):
+                    logging.error(f"Bulk delivery to {to_address} failed: {outcome}")
+                results[to_address] = outcome is True
+                
+            self.cipher_manager.secure_zero(cek)
+            
+            logging.info(f"Bulk email sent to {sum(results.values())}/{len(recipients)} recipients "
+                         f"with one content encryption ({security_level} key wrap)")
+            return results
+            
+        except ValueError as e:
+            logging.error(f"Bulk Policy/Validation Error: {e}")
+            return results
+            
+        except Exception as e:
+            logging.critical(f"CRITICAL FAILURE: Bulk secure email send failed. Error: {e}", exc_info=True)
+            return results
+            
+    async def enqueue_send(self, to_address: str, subject: str, body: str,
+                           attachments: List = None, security_level: str = None,
+                           file_context: Dict = None, progress_callback: Callable = None) -> SendHandle:
+        """OUTBOX: Queue a secure email, waiting for room if the outbox is full
+        
+        Returns a SendHandle; await handle.wait() for the send result.
+        """
+        return await self.outbox.enqueue(
+            to_address, to_address=to_address, subject=subject, body=body,
+            attachments=attachments, security_level=security_level,
+            file_context=file_context, progress_callback=progress_callback
+        )
+        
+    def try_enqueue_send(self, to_address: str, subject: str, body: str,
+                         attachments: List = None, security_level: str = None,
+                         file_context: Dict = None, progress_callback: Callable = None) -> Optional[SendHandle]:
+        """OUTBOX: Queue a secure email without waiting; None when the outbox is full"""
+        return self.outbox.try_enqueue(
+            to_address, to_address=to_address, subject=subject, body=body,
+            attachments=attachments, security_level=security_level,
+            file_context=file_context, progress_callback=progress_callback
+        )
+        
+    def get_performance_metrics(self, prefix: str = '') -> Dict:
+        """Per-stage latency histograms (ms) and outcome counters for send/receive paths
+        
+        Names are "<operation>.<stage>", e.g. email.send.key_request or
+        email.receive.total; prefix filters by operation.
+        """
+        return self.metrics.snapshot(prefix)
+        
+    def get_security_decisions(self, limit: int = 20) -> List[Dict]:
+        """Recent security policy decisions (requested vs chosen level, reason, KME signals)"""
+        return self.security_policy.get_recent_decisions(limit)
+        
+    def get_outbox_statistics(self) -> Dict:
+        """Get outbox queue depth, wait time and throughput"""
+        return self.outbox.get_stats()
+        
     async def receive_secure_email(self, email_id: str) -> Optional[Dict]:
-        """Receive and decrypt secure email with PQC file support"""
+        """Receive and decrypt secure email, served from the prefetch cache when possible"""
+        if not self.current_user:
+            logging.error("Failed to decrypt email: User not authenticated")
+            return None
+            
+        trace = self.metrics.trace('email.receive')
+        cache_hits = self.inbox_prefetcher.cache.stats['hits']
+        result = await self.inbox_prefetcher.load(self.current_user.email, email_id)
+        if self.inbox_prefetcher.cache.stats['hits'] > cache_hits:
+            trace.end('cache_hit')
+        else:
+            trace.end('ok' if result else 'failed')
+        return result
+        
+    async def _fetch_and_decrypt_email(self, email_id: str) -> Optional[Dict]:
+        """Fetch, key and decrypt one secure email with PQC file support (uncached)"""
+        trace = self.metrics.trace('email.decrypt')
         try:
             if not self.current_user:
                 raise ValueError("User not authenticated")
                 
             # Fetch encrypted email
             encrypted_email = await self.email_handler.fetch_email(email_id, self.current_user.email)
+            trace.mark('fetch')
             if not encrypted_email:
                 return None
                 
@@ -461,6 +836,7 @@ class QuMailCore:
                 if not self.kme_client.is_connected:
                     logging.warning("KME not connected during email decryption")
                     await self.initialize_kme_with_robustness()
+                    trace.mark('kme_reconnect')
                     
                     if not self.kme_client.is_connected:
                         logging.error("KME unavailable - cannot decrypt quantum-secured email")
@@ -471,117 +847,308 @@ class QuMailCore:
                     logging.error("No key ID in encrypted email")
                     return None
                     
-                # Request key from KME with retry
-                key_response = None
-                for attempt in range(3):
-                    try:
-                        key_response = await self.kme_client.get_key(
-                            sae_id=self.current_user.sae_id,
-                            key_id=key_id
-                        )
-                        if key_response:
-                            break
-                    except Exception as e:
-                        logging.warning(f"Key retrieval attempt {attempt + 1} failed: {e}")
-                        if attempt < 2:
-                            await asyncio.sleep(0.5)
-                
-                if not key_response:
-                    logging.error("Failed to obtain decryption key")
-                    return None
+                if 'ratchet_index' in encrypted_data:
+                    # SESSION RATCHET: Local chain state, the seed is fetched only when needed
+                    key_data = await self._session_receive_key(key_id, encrypted_data['ratchet_index'])
+                    trace.mark('key_fetch')
+                    if key_data is None:
+                        logging.error("Failed to derive ratchet message key")
+                        return None
+                else:
+                    # Request key from KME with retry
+                    key_response = None
+                    for attempt in range(3):
+                        try:
+                            key_response = await self.kme_client.get_key(
+                                sae_id=self.current_user.sae_id,
+                                key_id=key_id
+                            )
+                            if key_response:
+                                break
+                        except Exception as e:
+                            logging.warning(f"Key retrieval attempt {attempt + 1} failed: {e}")
+                            if attempt < 2:
+                                await asyncio.sleep(0.5)
                     
-                key_data = key_response['key_data']
+                    trace.mark('key_fetch')
+                    if not key_response:
+                        logging.error("Failed to obtain decryption key")
+                        return None
+                        
+                    key_data = key_response['key_data']
                 
-            # Decrypt message
-            decrypted_bytes = self.cipher_manager.decrypt_with_level(
-                encrypted_data, key_data
-            )
-            
-            # Deserialize message
-            message_data = self._deserialize_message(decrypted_bytes)
-            
-            # Add metadata with PQC info
-            result_data = {
-                'email_id': email_id,
-                'security_level': security_level,
-                'sender': encrypted_email['sender'],
-                'received_at': encrypted_email['received_at'],
-                'decrypted_at': datetime.utcnow().isoformat()
-            }
+            result = await self._decrypt_fetched_email(email_id, encrypted_email, key_data, trace)
+            trace.end('ok' if result else 'failed')
+            return result
             
-            # Merge message data
-            result_data.update(message_data)
+        except Exception as e:
+            logging.error(f"Failed to decrypt email: {e}")
+            return None
             
-            # PQC FEATURE: Add file encryption details if present
-            if encrypted_data.get('pqc_file_encryption'):
-                result_data['pqc_details'] = encrypted_data['pqc_file_encryption']
-                logging.info(f"PQC encrypted email decrypted with file details: {encrypted_data['pqc_file_encryption']}")
+        finally:
+            trace.end('failed')  # no-op once the trace has ended
             
-            logging.info(f"Email decrypted successfully: {email_id}")
-            return result_data
+    async def receive_secure_emails(self, email_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Receive and decrypt a page of secure emails with a single batched KME key lookup"""
+        results: Dict[str, Optional[Dict]] = {email_id: None for email_id in email_ids}
+        
+        try:
+            if not self.current_user:
+                raise ValueError("User not authenticated")
+                
+            # Fetch the whole page first so key IDs can be gathered up front
+            fetched = {}
+            for email_id in email_ids:
+                encrypted_email = await self.email_handler.fetch_email(email_id, self.current_user.email)
+                if encrypted_email:
+                    fetched[email_id] = encrypted_email
+                    
+            # Collect the unique quantum key IDs referenced by the page
+            key_ids = []
+            for encrypted_email in fetched.values():
+                encrypted_data = encrypted_email['encrypted_payload']
+                key_id = encrypted_data.get('key_id')
+                if encrypted_data.get('security_level') in ['L1', 'L2', 'L3'] and key_id and key_id not in key_ids:
+                    key_ids.append(key_id)
+                    
+            # BATCH KEY RETRIEVAL: Resolve every key for the page in one dec_keys call
+            resolved_keys = {}
+            if key_ids:
+                if not self.kme_client.is_connected:
+                    logging.warning("KME not connected during batch email decryption")
+                    await self.initialize_kme_with_robustness()
+                    
+                if self.kme_client.is_connected:
+                    resolved_keys = await self.kme_client.get_keys(self.current_user.sae_id, key_ids)
+                else:
+                    logging.error("KME unavailable - quantum-secured emails in page cannot be decrypted")
+                    
+            for email_id, encrypted_email in fetched.items():
+                encrypted_data = encrypted_email['encrypted_payload']
+                security_level = encrypted_data.get('security_level')
+                
+                key_data = b''
+                if security_level in ['L1', 'L2', 'L3']:
+                    key_response = resolved_keys.get(encrypted_data.get('key_id'))
+                    if not key_response:
+                        logging.error(f"No decryption key available for email {email_id}")
+                        continue
+                    key_data = key_response['key_data']
+                    
+                try:
+                    if 'ratchet_index' in encrypted_data:
+                        # The batched key is the session seed; derive this message's key from it
+                        key_data = self.session_ratchet.receive_key(
+                            encrypted_data['key_id'], encrypted_data['ratchet_index'], seed=key_data
+                        )
+                    results[email_id] = await self._decrypt_fetched_email(email_id, encrypted_email, key_data)
+                except Exception as e:
+                    logging.error(f"Failed to decrypt email {email_id}: {e}")
+                    
+            logging.info(f"Batch decrypted {sum(1 for r in results.values() if r)}/{len(email_ids)} emails "
+                         f"using {len(resolved_keys)} quantum keys")
+            return results
             
         except Exception as e:
-            logging.error(f"Failed to decrypt email: {e}")
+            logging.error(f"Failed to decrypt email batch: {e}")
+            return results
+            
+    async def _decrypt_fetched_email(self, email_id: str, encrypted_email: Dict, key_data: bytes,
+                                     trace: Optional[StageTrace] = None) -> Optional[Dict]:
+        """Decrypt a fetched email payload with resolved key material and attach metadata"""
+        trace = trace or self.metrics.trace('email.decrypt')
+        trace.skip()
+        encrypted_data = encrypted_email['encrypted_payload']
+        security_level = encrypted_data.get('security_level')
+        
+        if not security_level:
+            logging.warning("No security level in encrypted email")
             return None
             
+        # Decrypt message
+        if 'wrapped_cek' in encrypted_data:
+            # BULK SEND: Unwrap this recipient's CEK, then decrypt the shared content
+            cek = self.cipher_manager.unwrap_key_with_level(
+                encrypted_data['wrapped_cek'], key_data, security_level
+            )
+            decrypted_bytes = await self.crypto_executor.decrypt_group_content(
+                encrypted_data['encrypted_content_payload'], cek
+            )
+        else:
+            decrypted_bytes = await self.crypto_executor.decrypt_with_level(
+                encrypted_data, key_data
+            )
+        trace.mark('decrypt')
+        
+        # Deserialize message
+        decrypted_bytes = decompress_payload(decrypted_bytes, encrypted_data.get('compression'))
+        trace.mark('decompress')
+        message_data = self._deserialize_message(decrypted_bytes)
+        trace.mark('deserialize')
+        
+        # Add metadata with PQC info
+        result_data = {
+            'email_id': email_id,
+            'security_level': security_level,
+            'sender': encrypted_email['sender'],
+            'received_at': encrypted_email['received_at'],
+            'decrypted_at': datetime.utcnow().isoformat()
+        }
+        
+        # Merge message data
+        result_data.update(message_data)
+        
+        # PQC FEATURE: Add file encryption details if present
+        if encrypted_data.get('pqc_file_encryption'):
+            result_data['pqc_details'] = encrypted_data['pqc_file_encryption']
+            logging.info(f"PQC encrypted email decrypted with file details: {encrypted_data['pqc_file_encryption']}")
+        
+        logging.info(f"Email decrypted successfully: {email_id}")
+        return result_data
+            
     async def send_secure_chat_message(self, contact_id: str, message: str, 
-                                      security_level: str = None) -> bool:
-        """Send encrypted chat message"""
+                                      security_level: str = None, session: bool = None) -> bool:
+        """Send encrypted chat message
+        
+        In session mode (L2/L3) the key comes from the contact's ratchet chain,
+        so only every reseed_messages-th message waits on a KME round trip.
+        """
+        trace = self.metrics.trace('chat.send')
         try:
             if not self.current_user:
                 raise ValueError("User not authenticated")
                 
             level = security_level or self.current_security_level
-            message_bytes = message.encode('utf-8')
+            message_bytes, compression = await self._compress_payload(message.encode('utf-8'), level)
+            trace.mark('compress')
             
             # Get quantum key if needed
             key_data = b''
             key_id = None
+            ratchet_index = None
             
             if level in ['L1', 'L2', 'L3']:
                 # KME ROBUSTNESS: Check connection
                 if not self.kme_client.is_connected:
                     await self.initialize_kme_with_robustness()
+                    trace.mark('kme_reconnect')
                     
                 if not self.kme_client.is_connected:
                     logging.error("KME unavailable for chat encryption")
                     return False
                 
-                required_key_length = self.cipher_manager.get_required_key_length(
-                    level, len(message_bytes)
-                )
-                
-                key_response = await self.kme_client.request_key(
-                    sender_sae_id=self.current_user.sae_id,
-                    receiver_sae_id=f"qumail_{contact_id}",
-                    key_length=required_key_length,
-                    key_type='seed' if level != 'L1' else 'otp'
-                )
-                
-                if not key_response:
-                    logging.error("Failed to obtain chat encryption key")
-                    return False
+                if (self.session_mode if session is None else session) and level in ['L2', 'L3']:
+                    # SESSION RATCHET: One KME seed per contact, one chain step per message
+                    trace.skip()
+                    key_response = await self._session_send_key(f"qumail_{contact_id}")
+                    trace.mark('key_request')
+                    if not key_response:
+                        logging.error("Failed to obtain chat session key")
+                        return False
+                    key_id, ratchet_index, key_data = key_response
+                else:
+                    required_key_length = self.cipher_manager.get_required_key_length(
+                        level, len(message_bytes)
+                    )
                     
-                key_data = key_response['key_data']
-                key_id = key_response['key_id']
+                    key_response = await self.kme_client.request_key(
+                        sender_sae_id=self.current_user.sae_id,
+                        receiver_sae_id=f"qumail_{contact_id}",
+                        key_length=required_key_length,
+                        key_type='seed' if level != 'L1' else 'otp'
+                    )
+                    trace.mark('key_request')
+                    
+                    if not key_response:
+                        logging.error("Failed to obtain chat encryption key")
+                        return False
+                        
+                    key_data = key_response['key_data']
+                    key_id = key_response['key_id']
                 
             # Encrypt message
-            encrypted_data = self.cipher_manager.encrypt_with_level(
+            trace.skip()
+            encrypted_data = await self.crypto_executor.encrypt_with_level(
                 message_bytes, key_data, level
             )
+            trace.mark('encrypt')
             
             if key_id:
                 encrypted_data['key_id'] = key_id
-                
+            if ratchet_index is not None:
+                encrypted_data['ratchet_index'] = ratchet_index
+            encrypted_data['compression'] = compression
+            
             # Send via chat handler
-            return await self.chat_handler.send_message(
+            result = await self.chat_handler.send_message(
                 contact_id, encrypted_data
             )
+            trace.mark('transport')
+            trace.end('ok' if result else 'transport_failed')
+            return result
             
         except Exception as e:
             logging.error(f"Failed to send chat message: {e}")
             return False
             
+        finally:
+            trace.end('failed')  # no-op once the trace has ended
+            
+    async def decrypt_secure_chat_message(self, encrypted_data: Dict) -> Optional[str]:
+        """Decrypt a received chat payload (per-message KME key or session ratchet)"""
+        try:
+            if not self.current_user:
+                raise ValueError("User not authenticated")
+                
+            key_data = b''
+            if encrypted_data.get('security_level') in ['L1', 'L2', 'L3']:
+                key_id = encrypted_data.get('key_id')
+                if 'ratchet_index' in encrypted_data:
+                    key_data = await self._session_receive_key(key_id, encrypted_data['ratchet_index'])
+                else:
+                    key_response = await self.kme_client.get_key(sae_id=self.current_user.sae_id, key_id=key_id)
+                    key_data = key_response['key_data'] if key_response else None
+                if key_data is None:
+                    logging.error(f"No chat decryption key for {key_id}")
+                    return None
+                    
+            decrypted_bytes = await self.crypto_executor.decrypt_with_level(encrypted_data, key_data)
+            return decompress_payload(decrypted_bytes, encrypted_data.get('compression')).decode('utf-8')
+            
+        except Exception as e:
+            logging.error(f"Failed to decrypt chat message: {e}")
+            return None
+            
+    async def _session_send_key(self, peer_sae_id: str) -> Optional[Tuple[str, int, bytes]]:
+        """SESSION RATCHET: (seed key_id, chain index, message key) for peer, re-seeding from the KME when due"""
+        lock = self._ratchet_locks.setdefault(peer_sae_id, asyncio.Lock())
+        async with lock:
+            if self.session_ratchet.needs_seed(peer_sae_id):
+                seed = await self.kme_client.request_key(
+                    sender_sae_id=self.current_user.sae_id,
+                    receiver_sae_id=peer_sae_id,
+                    key_length=256,
+                    key_type='seed'
+                )
+                if not seed:
+                    return None
+                self.session_ratchet.seed_sending_chain(peer_sae_id, seed['key_id'], seed['key_data'])
+            return self.session_ratchet.next_sending_key(peer_sae_id)
+            
+    async def _session_receive_key(self, key_id: str, index: int) -> Optional[bytes]:
+        """SESSION RATCHET: Message key from local chain state, fetching the seed only when needed"""
+        try:
+            message_key = self.session_ratchet.receive_key(key_id, index)
+            if message_key is None:
+                key_response = await self.kme_client.get_key(sae_id=self.current_user.sae_id, key_id=key_id)
+                if not key_response:
+                    return None
+                message_key = self.session_ratchet.receive_key(key_id, index, seed=key_response['key_data'])
+            return message_key
+        except ValueError as e:
+            logging.error(f"Ratchet key {key_id}#{index} rejected: {e}")
+            return None
+            
     # ========== GROUP CHAT Multi-SAE Keying Implementation ==========
     
     async def create_group_chat(self, group_name: str, participant_emails: List[str]) -> Optional[str]:
@@ -615,6 +1182,7 @@ class QuMailCore:
         The message content is encrypted once, and the content key is wrapped (encrypted)
         for each recipient using a unique quantum key from the KME (Multi-SAE envelope).
         """
+        trace = self.metrics.trace('group.send')
         try:
             if not self.current_user:
                 raise ValueError("User not authenticated")
@@ -627,9 +1195,12 @@ class QuMailCore:
 
             # --- 1. Content Encryption (Single Operation) ---
             # Encrypt the message content once using a randomly generated Content Encryption Key (CEK).
-            cek_data = self.cipher_manager.encrypt_group_content(content.encode('utf-8'))
+            content_bytes, compression = await self._compress_payload(content.encode('utf-8'), security_level)
+            trace.mark('compress')
+            cek_data = await self.crypto_executor.encrypt_group_content(content_bytes)
             cek = cek_data['cek']
             encrypted_content_payload = cek_data['encrypted_payload']
+            trace.mark('encrypt')
 
             # --- 2. Multi-SAE Key Envelope Generation ---
             group_key_envelope = {}
@@ -641,6 +1212,7 @@ class QuMailCore:
             
             if not self.kme_client.is_connected:
                 await self.initialize_kme_with_robustness()
+                trace.mark('kme_reconnect')
                 if not self.kme_client.is_connected:
                     logging.error("KME unavailable - cannot proceed with quantum encryption for group chat")
                     return False
@@ -685,7 +1257,8 @@ class QuMailCore:
                     })
                 else:
                     logging.error(f"Failed to obtain quantum key for recipient {contact_id}")
-
+                    
+            trace.mark('key_wrap')
             if not group_key_envelope:
                 logging.error("Failed to generate key envelope for any recipient.")
                 return False
@@ -697,7 +1270,8 @@ class QuMailCore:
                 'sender_sae_id': sender_sae_id,
                 'security_level': security_level,
                 'content_encryption_algorithm': cek_data['algorithm'],
-                'key_wrap_algorithm': security_level  # L2_QAES or L3_PQC
+                'key_wrap_algorithm': security_level,  # L2_QAES or L3_PQC
+                'compression': compression
             }
 
             result = await self.chat_handler.send_group_message(
@@ -706,6 +1280,8 @@ class QuMailCore:
                 recipient_ids=recipient_ids,
                 sae_key_metadata=sae_key_metadata
             )
+            trace.mark('transport')
+            trace.end('ok' if result else 'transport_failed')
             
             # Secure cleanup of the CEK in core
             self.cipher_manager.secure_zero(cek)
@@ -723,6 +1299,9 @@ class QuMailCore:
             logging.error(f"System/Transport Failure: {e}")
             return False
             
+        finally:
+            trace.end('failed')  # no-op once the trace has ended
+            
     async def get_group_chat_list(self) -> List[Dict]:
         """Get list of group chats with Multi-SAE info"""
         try:
@@ -739,24 +1318,45 @@ class QuMailCore:
             logging.error(f"Failed to get group chat history: {e}")
             return []
             
+    async def _compress_payload(self, data: bytes, security_level: str) -> tuple:
+        """Adaptively compress a plaintext payload; returns (payload, compression record)"""
+        # OTP key material is the scarce resource at L1, so spend more CPU on the ratio
+        budget_scale = 10.0 if security_level == 'L1' else 1.0
+        if len(data) < self.crypto_executor.size_threshold:
+            return self.compressor.compress(data, budget_scale)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.compressor.compress, data, budget_scale)
+        
     def _serialize_message(self, message_data: Dict) -> bytes:
-        """Serialize message data to bytes"""
-        import json
-        return json.dumps(message_data, ensure_ascii=False).encode('utf-8')
+        """Serialize message data to the framed binary message format"""
+        return encode_message(message_data)
         
     def _deserialize_message(self, message_bytes: bytes) -> Dict:
-        """Deserialize message data from bytes"""
-        import json
-        return json.loads(message_bytes.decode('utf-8'))
+        """Deserialize message data from bytes (binary frames or legacy JSON)"""
+        return decode_message(message_bytes)
         
     async def get_email_list(self, folder: str = "INBOX", limit: int = 50) -> List[Dict]:
         """Get list of emails from specified folder"""
         try:
-            return await self.email_handler.get_email_list(folder, limit)
+            emails = await self.email_handler.get_email_list(folder, limit)
         except Exception as e:
             logging.error(f"Failed to get email list: {e}")
             return []
             
+        # INBOX PREFETCH: Start decrypting the newest secure emails in the background.
+        # L1 one-time pads are consumed when fetched, so those wait for the user to open them.
+        if self.current_user and emails:
+            secure_ids = [
+                email['email_id'] for email in emails
+                if email.get('email_id') and email.get('encrypted_payload', {}).get('key_type') != 'otp' and
+                (email.get('security_level') or email.get('encrypted_payload', {}).get('security_level')) in ['L2', 'L3']
+            ]
+            try:
+                self.inbox_prefetcher.schedule(self.current_user.email, secure_ids)
+            except RuntimeError as e:
+                logging.debug(f"Inbox prefetch not started (no running event loop): {e}")
+        return emails
+            
     async def get_chat_history(self, contact_id: str, limit: int = 100) -> List[Dict]:
         """Get chat history with contact"""
         try:
@@ -768,8 +1368,9 @@ class QuMailCore:
     def get_qkd_status(self) -> Dict:
         """Get current QKD status with KME robustness info"""
         kme_stats = self.kme_client.get_connection_statistics()
+        key_pool = self.kme_client.key_pool_counts
         
-        return {
+        status = {
             'status': self.qkd_status,
             'security_level': self.current_security_level,
             'kme_connected': self.kme_client.is_connected,
@@ -778,9 +1379,36 @@ class QuMailCore:
             'connection_failures': self.kme_client.connection_failures,
             'success_rate': kme_stats.get('success_rate', 0),
             'uptime_seconds': kme_stats.get('uptime_seconds', 0),
-            'pqc_stats': self.pqc_stats
+            'pqc_stats': self.pqc_stats,
+            'crypto_executor': self.crypto_executor.get_stats(),
+            'inbox_prefetch': self.inbox_prefetcher.get_stats(),
+            'compression': self.compressor.get_stats(),
+            'security_policy': self.security_policy.get_stats(),
+            'session_ratchet': self.session_ratchet.get_stats(),
+            'startup': self.get_startup_timings(),
+            'scheduler': self._scheduler_stats()
         }
         
+        # Key pool counts come from the shared aggregated KME poll (no I/O here)
+        if key_pool:
+            status.update({
+                'available_keys': key_pool['available_keys'],
+                'used_keys': key_pool['used_keys'],
+                'total_keys': key_pool['total_keys']
+            })
+            
+        snapshot = self.kme_client.get_cached_status()
+        if snapshot:
+            status['qkd_rate'] = snapshot['global'].get('qkd_rate', 0)
+            status['kme_links'] = snapshot.get('links', [])
+            
+        return status
+        
+    def _scheduler_stats(self) -> Dict:
+        """Background scheduler task latencies (the one the KME client registered with)"""
+        scheduler = getattr(self.kme_client, 'scheduler', None)
+        return scheduler.get_stats() if scheduler is not None else {}
+        
     def get_pqc_statistics(self) -> Dict:
         """Get PQC file encryption statistics"""
         return {
@@ -802,6 +1430,9 @@ class QuMailCore:
         user_email = self.current_user.email
         logging.info(f"User {user_email} logging out. Stopping KME heartbeat and cleaning up.")
         
+        # Let queued sends finish while the user and the KME client are still there
+        await self._drain_outbox()
+        
         # KME ROBUSTNESS: Stop heartbeat monitoring
         try:
             await self.kme_client.stop_heartbeat()
@@ -815,8 +1446,11 @@ class QuMailCore:
             except Exception as e:
                 logging.warning(f"Error logging out from IdentityManager: {e}")
         
-        # Clear user state
+        # Clear user state (cancelling any prefetch drops and rekeys the plaintext cache)
+        await self.inbox_prefetcher.cancel()
+        self.session_ratchet.clear()
         self.current_user = None
+        self.kme_client.watch_key_pool(None)
         
         # Run all cleanup tasks
         await self.cleanup() 
@@ -824,17 +1458,37 @@ class QuMailCore:
         logging.info(f"QuMail session reset and core modules cleaned up for {user_email}.")
         return True
     
+    async def _drain_outbox(self, timeout: float = 30.0):
+        """OUTBOX: Stop the workers after queued sends finish (cancelling them after timeout)"""
+        try:
+            await asyncio.wait_for(self.outbox.stop(drain=True), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Outbox did not drain in time - cancelling queued sends")
+            await self.outbox.stop(drain=False)
+            
     async def cleanup(self):
         """Cleanup resources including KME client"""
         logging.info("Cleaning up QuMail Core")
         
-        # KME ROBUSTNESS: Cleanup KME client
+        # STARTUP: Stop background phases (e.g. a KME connect) still in flight
+        if self.startup is not None:
+            await self.startup.cancel()
+        if self._kme_connect_task is not None and not self._kme_connect_task.done():
+            self._kme_connect_task.cancel()
+            
+        # Let queued sends finish before the KME client and transports go away
+        await self._drain_outbox()
+        
+        # KME ROBUSTNESS: Cleanup KME client (unless shared with other sessions)
         try:
-            if self.kme_client:
+            if self.kme_client and self.owns_kme_client:
                 await self.kme_client.close()
         except Exception as e:
             logging.warning(f"Error cleaning up KME client: {e}")
         
+        if self.owns_crypto_executor:
+            self.crypto_executor.shutdown()
+        
         # Cleanup handlers
         if self.email_handler:
             await self.email_handler.cleanup()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Inbox Prefetch - Background decrypt-ahead for QuMailCore
+
+After an inbox listing, the newest messages are fetched, keyed from the KME
+and decrypted in the background, so opening one of them is a cache lookup
+instead of the full fetch -> get_key -> decrypt -> parse chain. With a batch
+function the whole page is keyed from one dec_keys round trip; otherwise
+messages are decrypted one by one with bounded concurrency.
+
+Decrypted messages never sit in memory as plaintext: each cache entry is
+sealed with AES-256-GCM under a random session key that lives only in this
+process and is rotated whenever the cache is cleared (logout, user switch).
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from ..utils.message_codec import decode_message, encode_message
+
+_CANCELLED = object()  # in-flight result when a prefetch was cancelled mid-decrypt
+
+class SealedPlaintextCache:
+    """Size-bounded LRU of decrypted messages, sealed under an in-memory session key"""
+    
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, max_entries: int = 200):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, Tuple[bytes, bytes]]' = OrderedDict()  # key -> (nonce, sealed)
+        self.size = 0
+        self._aead = AESGCM(secrets.token_bytes(32))
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0
+        }
+        
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the unsealed message for key (and mark it recently used), or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+            
+        nonce, sealed = entry
+        try:
+            message = decode_message(self._aead.decrypt(nonce, sealed, key.encode('utf-8')))
+        except Exception as e:
+            logging.error(f"Sealed cache entry {key} failed to open: {e}")
+            self.discard(key)
+            self.stats['misses'] += 1
+            return None
+            
+        self.entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return message
+        
+    def put(self, key: str, message: Dict[str, Any]):
+        """Seal message and store it, evicting least recently used entries over the bounds"""
+        plaintext = encode_message(message)
+        nonce = secrets.token_bytes(12)
+        # The cache key is bound as associated data so entries cannot be swapped
+        sealed = self._aead.encrypt(nonce, plaintext, key.encode('utf-8'))
+        
+        if len(sealed) > self.max_bytes:
+            logging.debug(f"Message {key} too large to cache ({len(sealed)} bytes)")
+            return
+            
+        self.discard(key)
+        self.entries[key] = (nonce, sealed)
+        self.size += len(sealed)
+        self.stats['stores'] += 1
+        
+        while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.stats['evictions'] += 1
+            
+    def discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+            
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+        
+    def clear(self):
+        """Drop every entry and rotate the session key"""
+        self.entries.clear()
+        self.size = 0
+        self._aead = AESGCM(secrets.token_bytes(32))
+        
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hit_rate': round(self.hit_rate, 3)
+        })
+        return stats
+
+class InboxPrefetcher:
+    """Decrypts the newest messages of a listing ahead of time into a SealedPlaintextCache"""
+    
+    def __init__(self, decrypt_func: Callable[[str], Awaitable[Optional[Dict]]],
+                 cache: SealedPlaintextCache, depth: int = 10, concurrency: int = 3,
+                 batch_func: Optional[Callable[[List[str]], Awaitable[Dict[str, Optional[Dict]]]]] = None):
+        self.decrypt_func = decrypt_func
+        self.batch_func = batch_func  # decrypts a whole page with one batched key lookup
+        self.cache = cache
+        self.depth = depth
+        self.concurrency = concurrency
+        
+        self.task: Optional[asyncio.Task] = None
+        self.in_flight: Dict[str, asyncio.Future] = {}  # cache key -> pending decryption
+        self.stats = {
+            'scheduled': 0,
+            'prefetched': 0,
+            'failed': 0,
+            'joined': 0  # opens that waited on an in-flight prefetch instead of decrypting again
+        }
+        
+    def schedule(self, namespace: str, email_ids: List[str]) -> Optional[asyncio.Task]:
+        """Start decrypting the first `depth` email_ids (newest first), replacing any earlier run"""
+        if self.depth <= 0:
+            return None
+        wanted = [email_id for email_id in email_ids[:self.depth]
+                  if self.cache_key(namespace, email_id) not in self.cache]
+        if not wanted:
+            return None
+            
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.stats['scheduled'] += len(wanted)
+        self.task = asyncio.ensure_future(self._run(namespace, wanted))
+        return self.task
+        
+    @staticmethod
+    def cache_key(namespace: str, email_id: str) -> str:
+        return f"{namespace}:{email_id}"
+        
+    async def _run(self, namespace: str, email_ids: List[str]):
+        start = time.perf_counter()
+        if self.batch_func is not None:
+            await self._load_batch(namespace, email_ids)
+            logging.info(f"Inbox prefetch: {len(email_ids)} messages decrypted ahead in one batch "
+                         f"in {time.perf_counter() - start:.2f}s")
+            return
+            
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def prefetch(email_id: str):
+            async with semaphore:
+                await self.load(namespace, email_id, prefetch=True)
+                
+        await asyncio.gather(*(prefetch(email_id) for email_id in email_ids), return_exceptions=True)
+        logging.info(f"Inbox prefetch: {len(email_ids)} messages decrypted ahead "
+                     f"in {time.perf_counter() - start:.2f}s")
+    
+    async def _load_batch(self, namespace: str, email_ids: List[str]):
+        """Decrypt email_ids through batch_func; opens meanwhile join the batch's in-flight futures"""
+        futures: Dict[str, asyncio.Future] = {}
+        for email_id in email_ids:
+            key = self.cache_key(namespace, email_id)
+            if key in self.cache or key in self.in_flight:
+                continue
+            futures[email_id] = self.in_flight[key] = asyncio.get_event_loop().create_future()
+        if not futures:
+            return
+            
+        try:
+            results = await self.batch_func(list(futures))
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.set_result(_CANCELLED)
+            raise
+        except Exception as e:
+            logging.warning(f"Batch prefetch of {len(futures)} emails failed: {e}")
+            results = {}
+        finally:
+            for email_id in futures:
+                self.in_flight.pop(self.cache_key(namespace, email_id), None)
+                
+        for email_id, future in futures.items():
+            result = results.get(email_id)
+            if result is not None:
+                self.cache.put(self.cache_key(namespace, email_id), result)
+                self.stats['prefetched'] += 1
+            else:
+                self.stats['failed'] += 1
+            future.set_result(result)
+            
+    async def load(self, namespace: str, email_id: str, prefetch: bool = False) -> Optional[Dict]:
+        """Return the decrypted message from cache, an in-flight prefetch, or a fresh decryption"""
+        key = self.cache_key(namespace, email_id)
+        if prefetch and key in self.cache:
+            return None
+            
+        if not prefetch:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+                
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            if prefetch:
+                return None
+            self.stats['joined'] += 1
+            result = await asyncio.shield(pending)
+            if result is not _CANCELLED:
+                return result
+            # The prefetch was cancelled underneath us: decrypt directly
+            
+        future = asyncio.get_event_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await self.decrypt_func(email_id)
+        except asyncio.CancelledError:
+            future.set_result(_CANCELLED)
+            raise
+        except Exception as e:
+            future.set_result(None)
+            if not prefetch:
+                raise
+            self.stats['failed'] += 1
+            logging.warning(f"Prefetch of email {email_id} failed: {e}")
+            return None
+        finally:
+            self.in_flight.pop(key, None)
+            
+        if result is not None:
+            self.cache.put(key, result)
+            if prefetch:
+                self.stats['prefetched'] += 1
+        elif prefetch:
+            self.stats['failed'] += 1
+        future.set_result(result)
+        return result
+        
+    async def cancel(self):
+        """Stop any running prefetch and drop the cache"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        self.cache.clear()
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'depth': self.depth,
+            'concurrency': self.concurrency,
+            'in_flight': len(self.in_flight),
+            'cache': self.cache.get_stats()
+        })
+        return stats
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Outbox - Queued outbound sends for QuMailCore
+
+Sends are queued and processed by a pool of async workers, so bursts of
+messages fetch keys, encrypt and hit SMTP in parallel instead of strictly
+one after another. Each destination has its own concurrency limit, and the
+queue is bounded: once full, enqueue waits (or try_enqueue refuses), which
+pushes back on the UI instead of buffering without limit.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+@dataclass
+class SendHandle:
+    """Handle for a queued send; await wait() for the send result"""
+    send_id: str
+    destination: str
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status: str = 'queued'  # queued | sending | sent | failed | cancelled
+    
+    def done(self) -> bool:
+        return self.future.done()
+        
+    async def wait(self) -> bool:
+        return await asyncio.shield(self.future)
+        
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds spent queued before a worker picked the send up"""
+        return self.started_at - self.enqueued_at if self.started_at else None
+
+class Outbox:
+    """Bounded send queue drained by N workers with per-destination limits"""
+    
+    def __init__(self, send_func: Callable[..., Awaitable[bool]], workers: int = 4,
+                 max_queue: int = 100, per_destination_limit: int = 2):
+        self.send_func = send_func
+        self.worker_count = workers
+        self.max_queue = max_queue
+        self.per_destination_limit = per_destination_limit
+        
+        self.queue: Optional[asyncio.Queue] = None
+        self.changed: Optional[asyncio.Condition] = None  # signalled when a send starts or ends
+        self.pending = 0  # queued + parked, bounded by max_queue
+        self.workers = []
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.parked: Dict[str, Deque[SendHandle]] = defaultdict(deque)  # waiting on a busy destination
+        self._ids = itertools.count(1)
+        
+        self.wait_times = deque(maxlen=1000)
+        self.completions = deque(maxlen=1000)  # monotonic completion timestamps
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'rejected': 0,  # try_enqueue refused because the outbox was full
+            'max_depth': 0
+        }
+        
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+        
+    def start(self):
+        """Start the worker pool (idempotent)"""
+        if self.workers:
+            return
+        self.queue = asyncio.Queue()
+        self.changed = asyncio.Condition()
+        self.workers = [asyncio.ensure_future(self._worker(index)) for index in range(self.worker_count)]
+        logging.info(f"Outbox started: {self.worker_count} workers, depth {self.max_queue}, "
+                     f"{self.per_destination_limit} per destination")
+    
+    async def stop(self, drain: bool = True):
+        """Stop the workers, optionally letting queued sends finish first"""
+        if not self.workers:
+            return
+        if drain:
+            async with self.changed:
+                await self.changed.wait_for(lambda: not self.pending and not self.in_flight)
+                
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        
+        # Anything still queued will never be sent
+        pending = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for parked in self.parked.values():
+            pending.extend(parked)
+        self.parked.clear()
+        for handle in pending:
+            handle.status = 'cancelled'
+            if not handle.future.done():
+                handle.future.cancel()
+        logging.info("Outbox stopped")
+        
+    async def enqueue(self, destination: str, **kwargs) -> SendHandle:
+        """Queue send_func(**kwargs), waiting for room when the outbox is full (backpressure)"""
+        self.start()
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.pending < self.max_queue)
+            return self._put(destination, kwargs)
+            
+    def try_enqueue(self, destination: str, **kwargs) -> Optional[SendHandle]:
+        """Queue a send without waiting; None when the outbox is full"""
+        self.start()
+        if self.pending >= self.max_queue:
+            self.stats['rejected'] += 1
+            logging.warning(f"Outbox full ({self.max_queue} queued) - send to {destination} refused")
+            return None
+        return self._put(destination, kwargs)
+        
+    def _put(self, destination: str, kwargs: Dict[str, Any]) -> SendHandle:
+        handle = SendHandle(
+            send_id=f"send_{next(self._ids)}",
+            destination=destination.lower(),
+            kwargs=kwargs,
+            future=asyncio.get_event_loop().create_future()
+        )
+        self.queue.put_nowait(handle)
+        self.pending += 1
+        self.stats['enqueued'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.depth)
+        return handle
+        
+    @property
+    def depth(self) -> int:
+        """Sends queued but not yet started"""
+        return self.pending
+        
+    async def _worker(self, index: int):
+        while True:
+            handle = await self.queue.get()
+            destination = handle.destination
+            try:
+                if self.in_flight[destination] >= self.per_destination_limit:
+                    # Park it; the send that frees a slot picks it up
+                    self.parked[destination].append(handle)
+                    continue
+                    
+                # Claim the slot before the first await so workers cannot overshoot
+                self.in_flight[destination] += 1
+                try:
+                    while handle:
+                        await self._process(handle)
+                        parked = self.parked.get(destination)
+                        handle = parked.popleft() if parked else None
+                finally:
+                    self.in_flight[destination] -= 1
+                    if not self.in_flight[destination]:
+                        del self.in_flight[destination]
+                    if destination in self.parked and not self.parked[destination]:
+                        del self.parked[destination]
+                    async with self.changed:
+                        self.changed.notify_all()
+                        
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Outbox worker {index} error: {e}")
+            finally:
+                self.queue.task_done()
+                
+    async def _process(self, handle: SendHandle):
+        self.pending -= 1
+        async with self.changed:
+            self.changed.notify_all()
+            
+        handle.status = 'sending'
+        handle.started_at = time.monotonic()
+        self.wait_times.append(handle.wait_time)
+        
+        try:
+            result = await self.send_func(**handle.kwargs)
+        except asyncio.CancelledError:
+            handle.status = 'cancelled'
+            handle.future.cancel()
+            raise
+        except Exception as e:
+            logging.error(f"Outbox send {handle.send_id} to {handle.destination} failed: {e}")
+            result = False
+            
+        handle.finished_at = time.monotonic()
+        handle.status = 'sent' if result else 'failed'
+        self.stats['sent' if result else 'failed'] += 1
+        self.completions.append(handle.finished_at)
+        if not handle.future.done():
+            handle.future.set_result(bool(result))
+            
+    def get_stats(self, window: float = 60.0) -> Dict[str, Any]:
+        """Queue depth, wait time and throughput (sends/sec over the last window)"""
+        now = time.monotonic()
+        recent = [t for t in self.completions if now - t <= window]
+        span = now - recent[0] if len(recent) > 1 else window
+        waits = sorted(self.wait_times)
+        
+        stats = dict(self.stats)
+        stats.update({
+            'depth': self.depth,
+            'in_flight': sum(self.in_flight.values()),
+            'workers': len(self.workers),
+            'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+            'wait_p95_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+            'throughput_per_sec': round(len(recent) / span, 3) if recent and span > 0 else 0.0
+        })
+        return stats
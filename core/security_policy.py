@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Security Policy Engine - Key-availability-aware security level selection
+
+Chooses the security level for each send from live KME signals instead of
+the requested level alone:
+
+- breaker state (derived from heartbeat failures) - no quantum level while open
+- KME request latency EWMA - projected key fetch time per level
+- key material (link bits from the aggregated status, SAE key pool counts);
+  in a trusted-node network only the links on the sender -> receiver relay
+  path count, falling back to every link while the path is unknown
+
+Each message carries a security floor (by default the requested level, so
+nothing is silently downgraded). The requested level is used when it is
+viable and within the latency budget; otherwise the fastest viable level at
+or above the floor is chosen. When only levels short of key material satisfy
+the floor (typically L1 with OTP link bits exhausted), the send is deferred
+until key material returns, up to a timeout. With the breaker open, or a
+payload too large for any allowed level, the send is rejected outright.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Relative strength: OTP > PQC hybrid > quantum-aided AES > TLS only
+LEVEL_STRENGTH = {'L4': 0, 'L2': 1, 'L3': 2, 'L1': 3}
+# Fastest first: L4 needs no key, L2/L3 a short seed, L1 one key bit per plaintext bit
+LEVEL_SPEED_ORDER = ['L4', 'L2', 'L3', 'L1']
+SEED_KEY_BITS = {'L2': 256, 'L3': 512}
+
+@dataclass
+class PolicyDecision:
+    """Outcome of one policy evaluation"""
+    requested_level: str
+    floor: str
+    level: Optional[str]  # chosen level; None unless action is 'send'
+    action: str  # send | defer | reject
+    reason: str
+    signals: Dict[str, Any] = field(default_factory=dict)
+    blocker: Optional[str] = None  # what stopped a defer/reject: key_material | breaker_open | size
+    timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    
+    @property
+    def changed(self) -> bool:
+        return self.action == 'send' and self.level != self.requested_level
+
+class SecurityPolicyEngine:
+    """Picks the fastest viable security level that satisfies a per-message floor"""
+    
+    def __init__(self, kme_client, latency_budget: float = 2.0, otp_size_limit: int = 50 * 1024,
+                 otp_reserve_bits: int = 0, defer_timeout: float = 30.0, poll_interval: float = 1.0,
+                 history: int = 100, route_ttl: float = 30.0):
+        self.kme_client = kme_client
+        self.latency_budget = latency_budget  # seconds a key fetch may take before levels are reconsidered
+        self.otp_size_limit = otp_size_limit
+        self.otp_reserve_bits = otp_reserve_bits  # link bits kept back from OTP sends
+        self.defer_timeout = defer_timeout
+        self.poll_interval = poll_interval
+        self.route_ttl = route_ttl
+        self.routes: Dict[str, Tuple[float, Optional[List[str]]]] = {}  # receiver SAE -> (fetched at, node path)
+        
+        self.decisions = deque(maxlen=history)
+        self.outcomes = Counter()
+        self.chosen_levels = Counter()
+        self.stats = {
+            'decisions': 0,
+            'changed': 0,
+            'deferred': 0,
+            'deferral_seconds': 0.0,
+            'deferral_timeouts': 0
+        }
+        
+    @classmethod
+    def from_config(cls, kme_client, config: Dict) -> 'SecurityPolicyEngine':
+        return cls(
+            kme_client,
+            latency_budget=config.get('policy_latency_budget', 2.0),
+            otp_size_limit=config.get('otp_size_limit', 50 * 1024),
+            otp_reserve_bits=config.get('policy_otp_reserve_bits', 0),
+            defer_timeout=config.get('policy_defer_timeout', 30.0)
+        )
+        
+    def signals(self, route: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Current KME breaker, latency and key material readings (key material along route, if known)"""
+        status = self.kme_client.get_cached_status() or {}
+        links = [link for link in status.get('links', []) if 'available_bits' in link]
+        if route is not None:
+            hops = {frozenset(hop) for hop in zip(route, route[1:])}
+            links = [link for link in links if frozenset(link.get('nodes', [])) in hops]
+        link_bits = [link['available_bits'] for link in links]
+        pool = self.kme_client.key_pool_counts or {}
+        return {
+            'breaker': self.kme_client.breaker_state,
+            'latency_ewma': self.kme_client.latency_ewma,
+            'key_material_bits': min(link_bits) if link_bits else None,  # None: not limited
+            'available_keys': pool.get('available_keys'),
+            'route': route
+        }
+        
+    async def resolve_route(self, receiver_sae_id: str, key_bits: int) -> Optional[List[str]]:
+        """Node path keys for receiver_sae_id are relayed over (None: not networked or unknown)"""
+        status = self.kme_client.get_cached_status() or {}
+        if not any(len(link.get('nodes', [])) == 2 for link in status.get('links', [])):
+            return None  # a single KME: no relay path to scope the links to
+            
+        cached = self.routes.get(receiver_sae_id)
+        if cached is not None and time.monotonic() - cached[0] < self.route_ttl:
+            return cached[1]
+            
+        path = None
+        try:
+            route = await self.kme_client.get_relay_route(receiver_sae_id, max(key_bits, 1))
+            if route and isinstance(route.get('path'), list):
+                path = route['path']
+        except Exception as e:
+            logging.debug(f"Relay route lookup for {receiver_sae_id} failed: {e}")
+        self.routes[receiver_sae_id] = (time.monotonic(), path)
+        return path
+        
+    def _required_bits(self, level: str, payload_size: int) -> int:
+        if level == 'L1':
+            return payload_size * 8
+        return SEED_KEY_BITS.get(level, 0)
+        
+    def _blocker(self, level: str, payload_size: int, signals: Dict[str, Any]) -> Optional[str]:
+        """Why level cannot be used right now (None when viable); 'size' blockers never clear"""
+        if level == 'L4':
+            return None
+        if level == 'L1' and payload_size > self.otp_size_limit:
+            return 'size'
+        if signals['breaker'] == 'open':
+            return 'breaker_open'
+        material = signals['key_material_bits']
+        if material is not None:
+            reserve = self.otp_reserve_bits if level == 'L1' else 0
+            if self._required_bits(level, payload_size) > material - reserve:
+                return 'key_material'
+        return None
+        
+    def _projected_latency(self, level: str, payload_size: int, signals: Dict[str, Any]) -> float:
+        ewma = signals['latency_ewma']
+        if level == 'L4' or ewma is None:
+            return 0.0
+        if level == 'L1':
+            # OTP keys grow with the message; scale by 64KB key chunks
+            return ewma * (1 + payload_size / (64 * 1024))
+        return ewma
+        
+    def decide(self, requested_level: str, payload_size: int, floor: Optional[str] = None,
+               route: Optional[List[str]] = None) -> PolicyDecision:
+        """Choose a level for a payload of payload_size bytes relayed over route (node IDs)"""
+        floor = floor or requested_level
+        if LEVEL_STRENGTH.get(floor, 0) > LEVEL_STRENGTH.get(requested_level, 0):
+            requested_level = floor  # the floor always wins over a weaker request
+            
+        signals = self.signals(route)
+        blockers = {level: self._blocker(level, payload_size, signals) for level in LEVEL_SPEED_ORDER}
+        allowed = [level for level in LEVEL_SPEED_ORDER if LEVEL_STRENGTH[level] >= LEVEL_STRENGTH[floor]]
+        viable = [level for level in allowed if blockers[level] is None]
+        requested_latency = self._projected_latency(requested_level, payload_size, signals)
+        
+        if requested_level in viable and requested_latency <= self.latency_budget:
+            decision = PolicyDecision(requested_level, floor, requested_level, 'send', 'requested level available', signals)
+        elif viable:
+            level = viable[0]
+            if blockers[requested_level]:
+                reason = f"{requested_level} blocked ({blockers[requested_level]})"
+            else:
+                reason = f"{requested_level} key fetch projected at {requested_latency:.2f}s"
+            decision = PolicyDecision(requested_level, floor, level, 'send', f"{reason} - using {level}", signals)
+        elif any(blockers[level] == 'key_material' for level in allowed):
+            decision = PolicyDecision(requested_level, floor, None, 'defer',
+                                      f"waiting for quantum key material ({self._required_bits(requested_level, payload_size)} bits)",
+                                      signals, blocker='key_material')
+        elif any(blockers[level] == 'breaker_open' for level in allowed):
+            decision = PolicyDecision(requested_level, floor, None, 'reject',
+                                      "KME unavailable (breaker open)", signals, blocker='breaker_open')
+        else:
+            decision = PolicyDecision(requested_level, floor, None, 'reject',
+                                      f"OTP encryption limited to {self.otp_size_limit // 1024}KB. "
+                                      f"Message size: {payload_size} bytes. Please use L2 (Quantum-aided AES) "
+                                      f"or L3 (PQC) for larger messages.", signals, blocker='size')
+        
+        self._record(decision)
+        return decision
+        
+    async def decide_or_wait(self, requested_level: str, payload_size: int,
+                             floor: Optional[str] = None, timeout: Optional[float] = None,
+                             receiver_sae_id: Optional[str] = None) -> PolicyDecision:
+        """decide(), deferring while key material or the KME is unavailable
+        
+        With receiver_sae_id, key material is judged on the links of the relay
+        path to that SAE. Returns the first 'send' decision, or the last 'defer'
+        once the timeout passes (callers treat that as a failed send).
+        """
+        route = None
+        if receiver_sae_id:
+            route = await self.resolve_route(receiver_sae_id, self._required_bits(requested_level, payload_size))
+        decision = self.decide(requested_level, payload_size, floor, route)
+        if decision.action != 'defer':
+            return decision
+            
+        timeout = self.defer_timeout if timeout is None else timeout
+        started = time.monotonic()
+        self.stats['deferred'] += 1
+        logging.info(f"Security policy deferring {decision.requested_level} send: {decision.reason}")
+        
+        while decision.action == 'defer' and time.monotonic() - started < timeout:
+            await asyncio.sleep(min(self.poll_interval, max(0.0, timeout - (time.monotonic() - started))))
+            try:
+                # Refresh link/pool readings instead of waiting for the next poll
+                await self.kme_client.get_aggregated_status(max_age=self.poll_interval)
+            except Exception as e:
+                logging.debug(f"Policy status refresh failed: {e}")
+            decision = self.decide(requested_level, payload_size, floor, route)
+            
+        self.stats['deferral_seconds'] += time.monotonic() - started
+        if decision.action == 'defer':
+            self.stats['deferral_timeouts'] += 1
+            logging.warning(f"Security policy gave up after {timeout:.1f}s: {decision.reason}")
+        return decision
+        
+    def _record(self, decision: PolicyDecision):
+        self.decisions.append(decision)
+        self.stats['decisions'] += 1
+        self.outcomes[decision.action] += 1
+        if decision.action == 'send':
+            self.chosen_levels[decision.level] += 1
+        if decision.changed:
+            self.stats['changed'] += 1
+            logging.info(f"Security policy: {decision.reason}")
+            
+    def get_recent_decisions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return [asdict(decision) for decision in list(self.decisions)[-limit:]]
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'outcomes': dict(self.outcomes),
+            'chosen_levels': dict(self.chosen_levels),
+            'latency_budget': self.latency_budget,
+            'signals': self.signals(),
+            'last_decision': asdict(self.decisions[-1]) if self.decisions else None
+        })
+        return stats
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Startup Orchestrator - Dependency-ordered concurrent subsystem startup
+
+Each startup phase declares the phases it depends on. All phases are started
+at once and each waits only for its own dependencies, so independent
+subsystems (secure storage and the KME connection, for instance) initialize
+concurrently. `run()` returns as soon as the phases the caller needs are done
+(e.g. the profile is loaded); the remaining phases finish in the background
+and can be awaited later with `wait()`.
+
+Every phase records when it started (relative to startup), how long it ran
+and how it ended (ok, failed, skipped because a dependency failed), and the
+durations are fed to the metrics registry as `startup.<phase>`.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+@dataclass
+class StartupPhase:
+    """One named startup step and the phases it must wait for"""
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    depends_on: List[str] = field(default_factory=list)
+    status: str = 'pending'  # pending | running | ok | failed | skipped
+    started_at: Optional[float] = None  # seconds after startup began
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+class StartupOrchestrator:
+    """Runs startup phases concurrently in dependency order and records their timings"""
+    
+    def __init__(self, metrics=None):
+        self.metrics = metrics  # optional MetricsRegistry
+        self.phases: Dict[str, StartupPhase] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started: Optional[float] = None
+        self.ready_after: Optional[float] = None  # seconds until run() returned
+        
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], depends_on: Iterable[str] = ()):
+        """Register a phase; dependencies must be registered before run()"""
+        if name in self.phases:
+            raise ValueError(f"Startup phase {name} already registered")
+        self.phases[name] = StartupPhase(name, func, list(depends_on))
+        
+    def _check_dependencies(self):
+        for phase in self.phases.values():
+            for dependency in phase.depends_on:
+                if dependency not in self.phases:
+                    raise ValueError(f"Startup phase {phase.name} depends on unknown phase {dependency}")
+                    
+        # Depth-first cycle check
+        visiting, done = set(), set()
+        
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Startup dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self.phases[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            
+        for name in self.phases:
+            visit(name)
+            
+    async def run(self, until: Optional[Iterable[str]] = None) -> bool:
+        """Start every phase; return once the `until` phases (default: all) have finished
+        
+        Returns True when those phases all succeeded. Phases outside `until`
+        keep running in the background.
+        """
+        self._check_dependencies()
+        self._started = time.monotonic()
+        for name in self.phases:
+            self._tasks[name] = asyncio.ensure_future(self._run_phase(self.phases[name]))
+            
+        names = list(until) if until is not None else list(self.phases)
+        await self.wait(*names)
+        self.ready_after = time.monotonic() - self._started
+        logging.info(f"Startup ready after {self.ready_after * 1000:.0f}ms "
+                     f"({', '.join(f'{n}={self.phases[n].status}' for n in names)})")
+        return all(self.phases[name].status == 'ok' for name in names)
+        
+    async def _run_phase(self, phase: StartupPhase):
+        if phase.depends_on:
+            await asyncio.gather(*(self._tasks[d] for d in phase.depends_on))
+            failed = [d for d in phase.depends_on if self.phases[d].status != 'ok']
+            if failed:
+                phase.status = 'skipped'
+                phase.error = f"dependency failed: {', '.join(failed)}"
+                logging.warning(f"Startup phase {phase.name} skipped ({phase.error})")
+                return
+                
+        phase.status = 'running'
+        started = time.monotonic()
+        phase.started_at = started - self._started
+        try:
+            await phase.func()
+            phase.status = 'ok'
+        except Exception as e:
+            phase.status = 'failed'
+            phase.error = str(e)
+            logging.error(f"Startup phase {phase.name} failed: {e}")
+        phase.duration = time.monotonic() - started
+        if self.metrics is not None:
+            self.metrics.record(f'startup.{phase.name}', phase.duration)
+        logging.debug(f"Startup phase {phase.name} {phase.status} in {phase.duration * 1000:.1f}ms")
+        
+    async def wait(self, *names: str):
+        """Wait for the named phases (default: all started phases) to finish"""
+        tasks = [self._tasks[name] for name in (names or self._tasks) if name in self._tasks]
+        if tasks:
+            # Shielded so a cancelled waiter never cancels a shared phase
+            await asyncio.gather(*(asyncio.shield(task) for task in tasks))
+            
+    def is_done(self, name: str) -> bool:
+        task = self._tasks.get(name)
+        return task is not None and task.done()
+        
+    async def cancel(self):
+        """Cancel phases still running in the background (shutdown before startup finished)"""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            
+    def get_timings(self) -> Dict[str, Any]:
+        return {
+            'ready_after': self.ready_after,
+            'total': max((p.started_at + p.duration for p in self.phases.values()
+                          if p.started_at is not None and p.duration is not None), default=None),
+            'phases': {
+                name: {
+                    'status': phase.status,
+                    'depends_on': phase.depends_on,
+                    'started_at': phase.started_at,
+                    'duration': phase.duration,
+                    'error': phase.error
+                }
+                for name, phase in self.phases.items()
+            }
+        }
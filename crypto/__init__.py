@@ -3,9 +3,23 @@
 Crypto Module for QuMail
 """
 
-from .kme_simulator import KMESimulator
-from .kme_client import KMEClient
-from .cipher_strategies import CipherManager
+import importlib
+
+# Imported on first access: the simulator pulls in Flask, which clients of an
+# external KME never need
+_LAZY_EXPORTS = {
+    'KMESimulator': '.kme_simulator',
+    'KMEClient': '.kme_client',
+    'CipherManager': '.cipher_strategies'
+}
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'KMESimulator',
@@ -15,13 +15,55 @@ import os
 import hmac
 import hashlib
 from abc import ABC, abstractmethod
-from typing import Dict, Tuple, Optional, Any, List
+from typing import Dict, Tuple, Optional, Any, List, AsyncIterator
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.backends import default_backend
 import base64
 
+# Payloads above this size are processed in slices, so a crypto executor thread
+# hands the GIL back to the event loop between C calls instead of holding it
+# for the whole payload, and output buffers grow in place instead of being
+# allocated (and page-faulted) in one go.
+CIPHER_SLICE_SIZE = 1024 * 1024
+
+def _cipher_run(context, data) -> bytes:
+    """update() + finalize() on a cipher context, sliced for large payloads"""
+    if len(data) <= CIPHER_SLICE_SIZE:
+        return context.update(data) + context.finalize()
+        
+    view = memoryview(data)
+    output = bytearray()
+    for offset in range(0, len(data), CIPHER_SLICE_SIZE):
+        output += context.update(view[offset:offset + CIPHER_SLICE_SIZE])
+    output += context.finalize()
+    return output
+
+def _b64encode(data) -> str:
+    """Base64-encode to str, sliced for large payloads"""
+    if len(data) <= CIPHER_SLICE_SIZE:
+        return base64.b64encode(data).decode('utf-8')
+        
+    step = CIPHER_SLICE_SIZE // 3 * 3
+    view = memoryview(data)
+    encoded = ''
+    for offset in range(0, len(data), step):
+        # In-place str append keeps this linear
+        encoded += base64.b64encode(view[offset:offset + step]).decode('ascii')
+    return encoded
+
+def _b64decode(encoded) -> bytes:
+    """Base64-decode, sliced for large payloads"""
+    if len(encoded) <= CIPHER_SLICE_SIZE:
+        return base64.b64decode(encoded)
+        
+    step = CIPHER_SLICE_SIZE // 4 * 4
+    decoded = bytearray()
+    for offset in range(0, len(encoded), step):
+        decoded += base64.b64decode(encoded[offset:offset + step])
+    return decoded
+
 class CipherStrategy(ABC):
     """Abstract base class for all cipher strategies"""
     
@@ -63,13 +105,11 @@ class QuantumOTPStrategy(CipherStrategy):
             raise ValueError(f"OTP requires key length >= data length. Need {len(data)}, got {len(key_material)} bytes")
             
         # XOR encryption (OTP)
-        ciphertext = bytearray(len(data))
-        for i in range(len(data)):
-            ciphertext[i] = data[i] ^ key_material[i]
-            
+        ciphertext = self._xor_bytes(data, key_material)
+        
         result = {
             'algorithm': 'QUANTUM_OTP',
-            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+            'ciphertext': _b64encode(ciphertext),
             'key_length': len(key_material) * 8,
             'data_length': len(data),
             'perfect_secrecy': True
@@ -80,18 +120,52 @@ class QuantumOTPStrategy(CipherStrategy):
         
     def decrypt(self, encrypted_data: Dict[str, Any], key_material: bytes) -> bytes:
         """Decrypt using XOR with the same quantum key material"""
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
+        ciphertext = _b64decode(encrypted_data['ciphertext'])
         
         if len(key_material) < len(ciphertext):
             raise ValueError("OTP decryption requires original key length")
             
         # XOR decryption (same as encryption for OTP)
-        plaintext = bytearray(len(ciphertext))
-        for i in range(len(ciphertext)):
-            plaintext[i] = ciphertext[i] ^ key_material[i]
-            
+        plaintext = self._xor_bytes(ciphertext, key_material)
+        
         logging.info(f"Quantum OTP decryption completed: {len(plaintext)} bytes")
-        return bytes(plaintext)
+        return plaintext
+        
+    async def xor_stream(self, chunks: AsyncIterator[bytes],
+                         key_stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """STREAMING OTP: XOR data chunks against key chunks as both arrive
+        
+        Encryption and decryption are the same operation. Only the current data
+        chunk and the unused tail of the current key chunk are held in memory,
+        so memory stays constant regardless of message size.
+        """
+        key_buffer = bytearray()
+        key_iterator = key_stream.__aiter__()
+        total = 0
+        
+        async for chunk in chunks:
+            while len(key_buffer) < len(chunk):
+                try:
+                    key_buffer += await key_iterator.__anext__()
+                except StopAsyncIteration:
+                    raise ValueError(f"OTP key stream exhausted after {total + len(key_buffer)} bytes")
+                    
+            yield self._xor_bytes(chunk, key_buffer)
+            
+            # Used key material is discarded, never reused
+            del key_buffer[:len(chunk)]
+            total += len(chunk)
+            
+        logging.info(f"Quantum OTP stream completed: {total} bytes")
+        
+    @staticmethod
+    def _xor_bytes(data: bytes, key_material: bytes) -> bytes:
+        """XOR data with the leading bytes of key_material"""
+        length = len(data)
+        if not length:
+            return b''
+        result = int.from_bytes(data, 'big') ^ int.from_bytes(key_material[:length], 'big')
+        return result.to_bytes(length, 'big')
         
     def get_required_key_length(self, data_length: int) -> int:
         """OTP requires key length equal to data length"""
@@ -130,12 +204,12 @@ class QuantumAESStrategy(CipherStrategy):
         )
         encryptor = cipher.encryptor()
         
-        ciphertext = encryptor.update(data) + encryptor.finalize()
+        ciphertext = _cipher_run(encryptor, data)
         auth_tag = encryptor.tag
         
         result = {
             'algorithm': 'AES256_GCM_QUANTUM',
-            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+            'ciphertext': _b64encode(ciphertext),
             'iv': base64.b64encode(iv).decode('utf-8'),
             'auth_tag': base64.b64encode(auth_tag).decode('utf-8'),
             'key_length': len(key_material) * 8,
@@ -161,7 +235,7 @@ class QuantumAESStrategy(CipherStrategy):
         aes_key = hkdf.derive(key_material)
         
         # Extract encrypted data components
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
+        ciphertext = _b64decode(encrypted_data['ciphertext'])
         iv = base64.b64decode(encrypted_data['iv'])
         auth_tag = base64.b64decode(encrypted_data['auth_tag'])
         
@@ -174,7 +248,7 @@ class QuantumAESStrategy(CipherStrategy):
         decryptor = cipher.decryptor()
         
         try:
-            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+            plaintext = _cipher_run(decryptor, ciphertext)
         except Exception as e:
             # Secure cleanup on error
             self.secure_zero(bytearray(aes_key))
@@ -214,7 +288,7 @@ class PostQuantumStrategy(CipherStrategy):
             iv = secrets.token_bytes(12)
             cipher = Cipher(algorithms.AES(fek), modes.GCM(iv), backend=default_backend())
             encryptor = cipher.encryptor()
-            file_ciphertext = encryptor.update(data) + encryptor.finalize()
+            file_ciphertext = _cipher_run(encryptor, data)
             file_auth_tag = encryptor.tag
             
             # Step 3: Encapsulate FEK using PQC (simulated CRYSTALS-Kyber)
@@ -224,7 +298,7 @@ class PostQuantumStrategy(CipherStrategy):
                 'algorithm': 'PQC_KYBER_FEK_AES256',
                 'encryption_mode': 'LARGE_FILE_PQC',
                 'file_size_mb': data_size_mb,
-                'ciphertext': base64.b64encode(file_ciphertext).decode('utf-8'),
+                'ciphertext': _b64encode(file_ciphertext),
                 'iv': base64.b64encode(iv).decode('utf-8'),
                 'auth_tag': base64.b64encode(file_auth_tag).decode('utf-8'),
                 'encapsulated_fek': encapsulated_fek,
@@ -411,13 +485,13 @@ class PostQuantumStrategy(CipherStrategy):
         )
         encryptor = cipher.encryptor()
         
-        ciphertext = encryptor.update(data) + encryptor.finalize()
+        ciphertext = _cipher_run(encryptor, data)
         auth_tag = encryptor.tag
         
         result = {
             'algorithm': 'PQC_DILITHIUM_AES256',
             'encryption_mode': 'STANDARD_PQC',
-            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+            'ciphertext': _b64encode(ciphertext),
             'iv': base64.b64encode(iv).decode('utf-8'),
             'auth_tag': base64.b64encode(auth_tag).decode('utf-8'),
             'key_length': len(key_material) * 8,
@@ -446,7 +520,7 @@ class PostQuantumStrategy(CipherStrategy):
         fek = self._kyber_decapsulate_fek(encapsulated_fek, key_material)
         
         # Step 2: Decrypt file data using FEK
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
+        ciphertext = _b64decode(encrypted_data['ciphertext'])
         iv = base64.b64decode(encrypted_data['iv'])
         auth_tag = base64.b64decode(encrypted_data['auth_tag'])
         
@@ -458,7 +532,7 @@ class PostQuantumStrategy(CipherStrategy):
         decryptor = cipher.decryptor()
         
         try:
-            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+            plaintext = _cipher_run(decryptor, ciphertext)
             logging.info(f"PQC FEK decryption completed: {len(plaintext)} bytes")
         except Exception as e:
             raise ValueError(f"PQC FEK decryption failed - possible tampering: {e}")
@@ -596,7 +670,7 @@ class PostQuantumStrategy(CipherStrategy):
         aes_key = hkdf.derive(key_material)
         
         # Extract encrypted data components
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
+        ciphertext = _b64decode(encrypted_data['ciphertext'])
         iv = base64.b64decode(encrypted_data['iv'])
         auth_tag = base64.b64decode(encrypted_data['auth_tag'])
         
@@ -609,7 +683,7 @@ class PostQuantumStrategy(CipherStrategy):
         decryptor = cipher.decryptor()
         
         try:
-            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+            plaintext = _cipher_run(decryptor, ciphertext)
         except Exception as e:
             # Secure cleanup on error
             self.secure_zero(bytearray(aes_key))
@@ -638,7 +712,7 @@ class StandardTLSStrategy(CipherStrategy):
         """Pass-through encryption - relies on TLS transport security"""
         result = {
             'algorithm': 'STANDARD_TLS_ONLY',
-            'ciphertext': base64.b64encode(data).decode('utf-8'),
+            'ciphertext': _b64encode(data),
             'key_length': 0,
             'data_length': len(data),
             'transport_security': 'TLS_1.3'
@@ -649,7 +723,7 @@ class StandardTLSStrategy(CipherStrategy):
         
     def decrypt(self, encrypted_data: Dict[str, Any], key_material: bytes) -> bytes:
         """Pass-through decryption"""
-        plaintext = base64.b64decode(encrypted_data['ciphertext'])
+        plaintext = _b64decode(encrypted_data['ciphertext'])
         logging.info(f"Standard TLS decryption: {len(plaintext)} bytes")
         return plaintext
         
@@ -737,14 +811,14 @@ class CipherManager:
         cipher = Cipher(algorithms.AES(cek), modes.GCM(iv), backend=default_backend())
         encryptor = cipher.encryptor()
         
-        ciphertext = encryptor.update(data) + encryptor.finalize()
+        ciphertext = _cipher_run(encryptor, data)
         auth_tag = encryptor.tag
         
         return {
             'cek': cek,  # The raw key to be wrapped
             'algorithm': 'AES256_GCM_CEK',
             'encrypted_payload': {
-                'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+                'ciphertext': _b64encode(ciphertext),
                 'iv': base64.b64encode(iv).decode('utf-8'),
                 'auth_tag': base64.b64encode(auth_tag).decode('utf-8'),
                 'key_length': len(cek) * 8
@@ -769,6 +843,27 @@ class CipherManager:
             'wrap_algorithm': security_level
         }
         
+    def unwrap_key_with_level(self, wrapped_key: Dict[str, Any], key_material: bytes, security_level: str) -> bytes:
+        """Unwrap a CEK produced by wrap_key_with_level using the recipient's quantum key"""
+        if security_level in ['L1', 'L4']:
+            raise ValueError(f"Key wrapping not supported/needed for {security_level}. Use L2/L3.")
+            
+        return bytes(self.strategies[security_level].decrypt(wrapped_key, key_material))
+        
+    def decrypt_group_content(self, encrypted_payload: Dict[str, Any], cek: bytes) -> bytes:
+        """Decrypt content produced by encrypt_group_content with the unwrapped CEK"""
+        ciphertext = _b64decode(encrypted_payload['ciphertext'])
+        iv = base64.b64decode(encrypted_payload['iv'])
+        auth_tag = base64.b64decode(encrypted_payload['auth_tag'])
+        
+        cipher = Cipher(algorithms.AES(cek), modes.GCM(iv, auth_tag), backend=default_backend())
+        decryptor = cipher.decryptor()
+        
+        try:
+            return _cipher_run(decryptor, ciphertext)
+        except Exception as e:
+            raise ValueError(f"Group content decryption failed - possible tampering: {e}")
+        
     def secure_zero(self, data: bytes) -> None:
         """Securely zero out sensitive data from memory in the manager layer"""
         if isinstance(data, bytes):
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Crypto Executor - CPU-bound cipher work off the asyncio event loop
+
+Payloads above a size threshold are encrypted/decrypted in a thread pool
+(default; AES-GCM and hashing release the GIL) or a process pool (for the
+pure-Python paths such as large OTP XORs). Small payloads stay inline, where
+a hop to the pool would cost more than the cipher itself.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from .cipher_strategies import CipherManager
+
+_worker_cipher_manager: Optional[CipherManager] = None
+
+def _timed_call(func, args: tuple):
+    """Run func in the pool and report when it actually started and finished"""
+    started_at = time.monotonic()
+    result = func(*args)
+    return result, started_at, time.monotonic()
+
+def _process_call(method: str, args: tuple):
+    """Process pool entry point: strategies are stateless, so each worker owns one manager"""
+    global _worker_cipher_manager
+    if _worker_cipher_manager is None:
+        _worker_cipher_manager = CipherManager()
+    return _timed_call(getattr(_worker_cipher_manager, method), args)
+
+class CryptoExecutor:
+    """Runs CipherManager operations inline or in a worker pool depending on size"""
+    
+    def __init__(self, cipher_manager: CipherManager, mode: str = 'thread',
+                 max_workers: Optional[int] = None, size_threshold: int = 256 * 1024):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unsupported crypto executor mode: {mode}")
+            
+        self.cipher_manager = cipher_manager
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.size_threshold = size_threshold
+        self.executor = None
+        
+        self.queue_delays = deque(maxlen=1000)  # seconds between submit and start
+        self.execution_times = deque(maxlen=1000)  # seconds spent in the cipher
+        self.stats = {
+            'inline_operations': 0,
+            'offloaded_operations': 0,
+            'offloaded_bytes': 0,
+            'failed_operations': 0
+        }
+        
+    @classmethod
+    def from_config(cls, cipher_manager: CipherManager, config: Dict) -> 'CryptoExecutor':
+        return cls(
+            cipher_manager,
+            mode=config.get('crypto_executor', 'thread'),
+            max_workers=config.get('crypto_workers') or None,
+            size_threshold=config.get('crypto_offload_threshold', 256 * 1024)
+        )
+        
+    def _get_executor(self):
+        if self.executor is None:
+            if self.mode == 'process':
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                   thread_name_prefix='qumail-crypto')
+            logging.info(f"Crypto executor started: {self.mode} pool, {self.max_workers} workers")
+        return self.executor
+        
+    async def run(self, method: str, size: int, *args) -> Any:
+        """Call cipher_manager.<method>(*args), offloading when size >= size_threshold"""
+        if size < self.size_threshold:
+            self.stats['inline_operations'] += 1
+            return getattr(self.cipher_manager, method)(*args)
+            
+        submitted_at = time.monotonic()
+        if self.mode == 'process':
+            call = functools.partial(_process_call, method, args)
+        else:
+            call = functools.partial(_timed_call, getattr(self.cipher_manager, method), args)
+            
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(self._get_executor(), call)
+        except Exception:
+            self.stats['failed_operations'] += 1
+            raise
+            
+        self.queue_delays.append(max(0.0, started_at - submitted_at))
+        self.execution_times.append(finished_at - started_at)
+        self.stats['offloaded_operations'] += 1
+        self.stats['offloaded_bytes'] += size
+        return result
+        
+    async def encrypt_with_level(self, data: bytes, key_material: bytes, security_level: str,
+                                 file_context: Dict = None) -> Dict[str, Any]:
+        return await self.run('encrypt_with_level', len(data), data, key_material, security_level, file_context)
+        
+    async def decrypt_with_level(self, encrypted_data: Dict[str, Any], key_material: bytes) -> bytes:
+        # Base64 ciphertext length is a close enough size estimate
+        size = len(encrypted_data.get('ciphertext', ''))
+        return await self.run('decrypt_with_level', size, encrypted_data, key_material)
+        
+    async def encrypt_group_content(self, data: bytes) -> Dict[str, Any]:
+        return await self.run('encrypt_group_content', len(data), data)
+        
+    async def decrypt_group_content(self, encrypted_payload: Dict[str, Any], cek: bytes) -> bytes:
+        size = len(encrypted_payload.get('ciphertext', ''))
+        return await self.run('decrypt_group_content', size, encrypted_payload, cek)
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """Get operation counts plus queueing delay and execution time (ms)"""
+        def summarize(samples) -> Dict[str, float]:
+            if not samples:
+                return {}
+            ordered = sorted(samples)
+            return {
+                'avg_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                'max_ms': round(ordered[-1] * 1000, 3)
+            }
+            
+        stats = dict(self.stats)
+        stats.update({
+            'mode': self.mode,
+            'max_workers': self.max_workers,
+            'size_threshold': self.size_threshold,
+            'queue_delay': summarize(self.queue_delays),
+            'execution_time': summarize(self.execution_times)
+        })
+        return stats
+        
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -9,11 +9,14 @@ import logging
 import json
 import base64
 import ssl
-from typing import Dict, Optional, List, Any
+import time
+from typing import Dict, Optional, List, Any, AsyncIterator, Callable
 from datetime import datetime, timedelta
 import aiohttp
 import certifi
 
+from ..utils.scheduler import IDLE, get_scheduler
+
 class KMEClient:
     """Production-Ready ETSI GS QKD 014 Compliant KME Client with Heartbeat Monitoring"""
     
@@ -23,6 +26,21 @@ class KMEClient:
         self.ssl_context = None
         self.connection_timeout = 30
         self.request_timeout = 15
+        self.max_batch_keys = 128  # key IDs per batched dec_keys / consume request
+        self.stream_chunk_size = 64 * 1024  # bytes per streamed key chunk
+        self.available_page_size = 100  # keys per available-keys listing page
+        
+        # Key pool counts for the watched SAE (refreshed by the status poll)
+        self.key_pool_sae_id = None
+        self.key_pool_counts: Dict[str, Any] = {}
+        
+        # AGGREGATED STATUS: One cached poll shared by every status consumer
+        self.status_max_age = 5.0  # seconds a cached aggregate stays fresh
+        self.status_snapshot: Optional[Dict] = None
+        self.status_fetched_at = None
+        self.status_poll_task = None  # SCHEDULER: ScheduledTask handle
+        self._status_refresh = None
+        self._status_subscribers: List[Callable[[Dict], None]] = []
         
         # Authentication settings
         self.client_cert = None
@@ -39,10 +57,15 @@ class KMEClient:
         # Heartbeat and monitoring
         self.heartbeat_enabled = False
         self.heartbeat_interval = 60  # seconds
-        self.heartbeat_task = None
+        self.heartbeat_task = None  # SCHEDULER: ScheduledTask handle
+        self.scheduler = None  # background scheduler of the loop the client runs on
         self.last_successful_request = None
         self.connection_recovery_backoff = [1, 2, 5]  # REDUCED backoff
         
+        # KME latency tracking (EWMA of successful request round trips, seconds)
+        self.latency_ewma: Optional[float] = None
+        self.latency_alpha = 0.2
+        
         # RECURSION FIX: Track initialization state
         self._initializing = False
         self._reconnecting = False
@@ -54,7 +77,9 @@ class KMEClient:
             'failed_requests': 0,
             'reconnection_attempts': 0,
             'last_reconnection': None,
-            'uptime_start': datetime.utcnow()
+            'uptime_start': datetime.utcnow(),
+            'status_polls': 0,
+            'status_cache_hits': 0
         }
         
         logging.info(f"Production KME Client initialized for {self.kme_url}")
@@ -134,46 +159,44 @@ class KMEClient:
             logging.error(f"KME direct connection test failed: {e}")
             
     async def _start_heartbeat(self):
-        """Start heartbeat monitoring task"""
-        if self.heartbeat_task and not self.heartbeat_task.done():
+        """Register the heartbeat with the background scheduler"""
+        if self.heartbeat_task and not self.heartbeat_task.cancelled:
             return  # Already running
             
         self.heartbeat_enabled = True
-        self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        self.scheduler = get_scheduler()
+        # SCHEDULER: Skipped while the status poll (same KME) has just succeeded
+        self.heartbeat_task = self.scheduler.add('kme.heartbeat', self._heartbeat_once, self.heartbeat_interval,
+                                                 resource=f"kme:{self.kme_url}")
         logging.info(f"KME heartbeat monitoring started (interval: {self.heartbeat_interval}s)")
     
-    async def _heartbeat_loop(self):
-        """Main heartbeat monitoring loop"""
-        while self.heartbeat_enabled:
-            try:
-                # Perform heartbeat check
-                heartbeat_result = await self._perform_heartbeat()
-                
-                if not heartbeat_result:
-                    logging.warning("KME heartbeat failed - connection may be unstable")
-                    self.connection_failures += 1
-                    
-                    # Only attempt reconnection if failures exceed threshold
-                    if self.connection_failures >= self.max_connection_failures:
-                        logging.warning("KME heartbeat failures exceeded threshold")
-                        self.is_connected = False
-                else:
-                    # Reset failure counter on successful heartbeat
-                    self.connection_failures = 0
-                    self.last_successful_request = datetime.utcnow()
-                    if not self.is_connected:
-                        self.is_connected = True
-                        logging.info("KME connection restored via heartbeat")
-                
-                # Wait for next heartbeat
-                await asyncio.sleep(self.heartbeat_interval)
-                
-            except asyncio.CancelledError:
-                logging.info("KME heartbeat monitoring cancelled")
-                break
-            except Exception as e:
-                logging.error(f"KME heartbeat loop error: {e}")
-                await asyncio.sleep(self.heartbeat_interval)
+    async def _heartbeat_once(self) -> bool:
+        """One heartbeat check (scheduled every heartbeat_interval)"""
+        heartbeat_result = await self._perform_heartbeat()
+        self._record_heartbeat(heartbeat_result)
+        
+        # Refresh the shared status cache (no-op while it is fresh)
+        if heartbeat_result and self.key_pool_sae_id:
+            await self.get_aggregated_status()
+        return heartbeat_result
+        
+    def _record_heartbeat(self, ok: bool):
+        """Update failure count and connection state from a liveness probe"""
+        if not ok:
+            logging.warning("KME heartbeat failed - connection may be unstable")
+            self.connection_failures += 1
+            
+            # Only attempt reconnection if failures exceed threshold
+            if self.connection_failures >= self.max_connection_failures:
+                logging.warning("KME heartbeat failures exceeded threshold")
+                self.is_connected = False
+        else:
+            # Reset failure counter on successful heartbeat
+            self.connection_failures = 0
+            self.last_successful_request = datetime.utcnow()
+            if not self.is_connected:
+                self.is_connected = True
+                logging.info("KME connection restored via heartbeat")
     
     async def _perform_heartbeat(self) -> bool:
         """Perform a lightweight heartbeat check"""
@@ -195,12 +218,9 @@ class KMEClient:
     async def stop_heartbeat(self):
         """Stop heartbeat monitoring"""
         self.heartbeat_enabled = False
-        if self.heartbeat_task and not self.heartbeat_task.done():
+        if self.heartbeat_task:
             self.heartbeat_task.cancel()
-            try:
-                await self.heartbeat_task
-            except asyncio.CancelledError:
-                pass
+            self.heartbeat_task = None
         logging.info("KME heartbeat monitoring stopped")
             
     async def _make_request(self, method: str, endpoint: str, 
@@ -236,6 +256,7 @@ class KMEClient:
                     
                 logging.debug(f"KME Request (attempt {attempt + 1}): {method} {url}")
                 
+                request_started = time.monotonic()
                 async with self.session.request(
                     method=method,
                     url=url,
@@ -265,6 +286,7 @@ class KMEClient:
                         self.is_connected = True
                         self.last_successful_request = datetime.utcnow()
                         self.stats['successful_requests'] += 1
+                        self.record_latency(time.monotonic() - request_started)
                         return response_data
                     elif response.status in [401, 403, 404]:
                         logging.error(f"KME authentication/authorization error: {response.status}")
@@ -348,6 +370,99 @@ class KMEClient:
             self.is_connected = False
             return None
             
+    async def get_aggregated_status(self, max_age: Optional[float] = None) -> Optional[Dict]:
+        """AGGREGATED STATUS: Global, per-SAE and link status from one shared poll
+        
+        Served from cache while younger than max_age (default status_max_age).
+        Concurrent callers share a single in-flight request, and subscribers are
+        notified whenever a fresh snapshot arrives.
+        """
+        max_age = self.status_max_age if max_age is None else max_age
+        if (self.status_snapshot is not None and self.status_fetched_at is not None and
+                time.monotonic() - self.status_fetched_at <= max_age):
+            self.stats['status_cache_hits'] += 1
+            return self.status_snapshot
+            
+        if self._status_refresh is None or self._status_refresh.done():
+            self._status_refresh = asyncio.ensure_future(self._refresh_aggregated_status())
+        return await asyncio.shield(self._status_refresh)
+        
+    async def _refresh_aggregated_status(self) -> Optional[Dict]:
+        """Fetch the aggregated status and fan it out to subscribers"""
+        try:
+            params = {'sae_id': self.key_pool_sae_id} if self.key_pool_sae_id else None
+            response = await self._make_request('GET', '/api/v1/status/aggregate', params=params)
+            self.stats['status_polls'] += 1
+            
+            if not response or 'global' not in response:
+                return None
+                
+            self.status_snapshot = response
+            self.status_fetched_at = time.monotonic()
+            
+            sae_status = response.get('saes', {}).get(self.key_pool_sae_id)
+            if sae_status:
+                self.key_pool_counts = {
+                    'sae_id': self.key_pool_sae_id,
+                    'available_keys': sae_status['available_keys'],
+                    'total_keys': sae_status['total_keys'],
+                    'used_keys': sae_status['consumed_keys'],
+                    'updated_at': response['global'].get('timestamp')
+                }
+                
+            for callback in list(self._status_subscribers):
+                try:
+                    callback(response)
+                except Exception as e:
+                    logging.error(f"KME status subscriber failed: {e}")
+                    
+            return response
+            
+        except Exception as e:
+            logging.error(f"Failed to get aggregated KME status: {e}")
+            return None
+            
+    def get_cached_status(self) -> Optional[Dict]:
+        """Get the last aggregated status snapshot without any I/O"""
+        return self.status_snapshot
+        
+    def subscribe_status(self, callback: Callable[[Dict], None]):
+        """Call callback with every fresh aggregated status snapshot"""
+        if callback not in self._status_subscribers:
+            self._status_subscribers.append(callback)
+            if self.status_poll_task:
+                self.status_poll_task.scheduler.wake(self.status_poll_task)  # end any idle backoff
+            
+    def unsubscribe_status(self, callback: Callable[[Dict], None]):
+        """Stop delivering status snapshots to callback"""
+        if callback in self._status_subscribers:
+            self._status_subscribers.remove(callback)
+            
+    def start_status_polling(self):
+        """Start the shared status poll (every status_max_age while subscribed, backing off while not)"""
+        if self.status_poll_task and not self.status_poll_task.cancelled:
+            return
+        self.scheduler = get_scheduler()
+        self.status_poll_task = self.scheduler.add('kme.status', self._status_poll_once, self.status_max_age,
+                                                   resource=f"kme:{self.kme_url}", coalesce=False,
+                                                   idle_backoff=12, delay=0)
+        
+    async def stop_status_polling(self):
+        """Stop the shared status poll"""
+        if self.status_poll_task:
+            self.status_poll_task.cancel()
+        self.status_poll_task = None
+        
+    async def _status_poll_once(self):
+        """Refresh the status cache for subscribers (IDLE when nobody is subscribed)"""
+        if not self._status_subscribers:
+            return IDLE
+        snapshot = await self.get_aggregated_status()
+        if snapshot is not None:
+            # A fresh aggregate proves the KME is alive as well as a heartbeat would
+            self._record_heartbeat(True)
+        return snapshot is not None
+                
     async def get_sae_status(self, sae_id: str) -> Optional[Dict]:
         """Get status for specific SAE"""
         try:
@@ -389,7 +504,10 @@ class KMEClient:
                         'key_type': key_info['key_type'],
                         'expires_at': key_info['expires_at'],
                         'sender_sae_id': sender_sae_id,
-                        'receiver_sae_id': receiver_sae_id
+                        'receiver_sae_id': receiver_sae_id,
+                        # MULTI-HOP RELAY: Present when the receiver is attached to a remote node
+                        'relay': key_info.get('relay'),
+                        'receiver_node': response.get('receiver_node')
                     }
                     
             return None
@@ -398,6 +516,34 @@ class KMEClient:
             logging.error(f"Failed to request key: {e}")
             return None
             
+    async def get_relay_route(self, receiver_sae_id: str, key_length: int = 256) -> Optional[Dict]:
+        """Preview the trusted-node path a key for a (possibly remote) SAE would take"""
+        try:
+            endpoint = f"/api/v1/network/route/{receiver_sae_id}"
+            return await self._make_request('GET', endpoint, params={'key_length': key_length})
+            
+        except Exception as e:
+            logging.error(f"Failed to get relay route to {receiver_sae_id}: {e}")
+            return None
+            
+    async def get_network_topology(self) -> Optional[Dict]:
+        """Get KME network nodes, links and SAE attachments"""
+        try:
+            return await self._make_request('GET', "/api/v1/network/topology")
+            
+        except Exception as e:
+            logging.error(f"Failed to get KME network topology: {e}")
+            return None
+            
+    async def get_network_stats(self) -> Optional[Dict]:
+        """Get end-to-end relay latency and per-link key consumption"""
+        try:
+            return await self._make_request('GET', "/api/v1/network/stats")
+            
+        except Exception as e:
+            logging.error(f"Failed to get KME network statistics: {e}")
+            return None
+            
     async def get_key(self, sae_id: str, key_id: str) -> Optional[Dict]:
         """Get decryption key by ID"""
         try:
@@ -419,6 +565,46 @@ class KMEClient:
             logging.error(f"Failed to get key {key_id}: {e}")
             return None
             
+    async def get_keys(self, sae_id: str, key_ids: List[str]) -> Dict[str, Dict]:
+        """Get several decryption keys via batched POST dec_keys
+        
+        Returns a mapping of key_id -> key info for every key the KME released.
+        Duplicate IDs are collapsed and large lists are split into batches of
+        max_batch_keys, so a page of N messages costs ceil(N / batch) round trips.
+        """
+        resolved: Dict[str, Dict] = {}
+        unique_ids = list(dict.fromkeys(key_id for key_id in key_ids if key_id))
+        
+        for start in range(0, len(unique_ids), self.max_batch_keys):
+            batch = unique_ids[start:start + self.max_batch_keys]
+            try:
+                endpoint = f"/api/v1/keys/{sae_id}/dec_keys"
+                response = await self._make_request(
+                    'POST', endpoint,
+                    data={'key_IDs': [{'key_ID': key_id} for key_id in batch]}
+                )
+                
+                if not response:
+                    continue
+                    
+                for key_info in response.get('keys', []):
+                    resolved[key_info['key_id']] = {
+                        'key_id': key_info['key_id'],
+                        'key_data': base64.b64decode(key_info['key_data']),
+                        'length': key_info['length'],
+                        'key_type': key_info['key_type'],
+                        'expires_at': key_info.get('expires_at')
+                    }
+                    
+                for error in response.get('errors', []):
+                    logging.warning(f"KME could not release key {error.get('key_id')}: {error.get('error')}")
+                    
+            except Exception as e:
+                logging.error(f"Failed to get key batch for {sae_id}: {e}")
+                
+        logging.debug(f"Batch key retrieval: {len(resolved)}/{len(unique_ids)} keys resolved")
+        return resolved
+        
     async def consume_key(self, sae_id: str, key_id: str) -> bool:
         """Mark key as consumed (for OTP keys)"""
         try:
@@ -431,46 +617,173 @@ class KMEClient:
             logging.error(f"Failed to consume key {key_id}: {e}")
             return False
             
+    async def consume_keys(self, sae_id: str, key_ids: List[str]) -> List[str]:
+        """Mark several keys as consumed, returning the IDs the KME accepted"""
+        consumed: List[str] = []
+        unique_ids = list(dict.fromkeys(key_id for key_id in key_ids if key_id))
+        
+        for start in range(0, len(unique_ids), self.max_batch_keys):
+            batch = unique_ids[start:start + self.max_batch_keys]
+            try:
+                endpoint = f"/api/v1/keys/{sae_id}/consume"
+                response = await self._make_request(
+                    'POST', endpoint,
+                    data={'key_IDs': [{'key_ID': key_id} for key_id in batch]}
+                )
+                
+                if response:
+                    consumed.extend(response.get('consumed', []))
+                    
+            except Exception as e:
+                logging.error(f"Failed to consume key batch for {sae_id}: {e}")
+                
+        return consumed
+        
+    async def stream_key(self, sae_id: str, key_id: str,
+                         chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """STREAMING OTP: Yield key material in fixed-size chunks
+        
+        Every chunk is exactly chunk_size bytes except the last. Iteration ends
+        early (with an error logged) if the KME rejects or drops the stream, so
+        consumers must check they received enough key material.
+        """
+        chunk_size = chunk_size or self.stream_chunk_size
+        self.stats['total_requests'] += 1
+        
+        if not self.session or self.session.closed:
+            logging.warning("KME session unavailable - key stream will fail")
+            self.stats['failed_requests'] += 1
+            return
+            
+        url = f"{self.kme_url}/api/v1/keys/{sae_id}/{key_id}/stream"
+        headers = {'Accept': 'application/octet-stream'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+            
+        try:
+            async with self.session.get(
+                url, params={'chunk_size': chunk_size}, headers=headers, ssl=self.ssl_context
+            ) as response:
+                if response.status != 200:
+                    logging.error(f"KME key stream for {key_id} rejected: {response.status}")
+                    self.stats['failed_requests'] += 1
+                    return
+                    
+                # Network reads arrive in arbitrary sizes; re-chunk to fixed size
+                buffer = bytearray()
+                streamed = 0
+                async for data in response.content.iter_chunked(chunk_size):
+                    buffer += data
+                    while len(buffer) >= chunk_size:
+                        chunk = bytes(buffer[:chunk_size])
+                        del buffer[:chunk_size]
+                        streamed += chunk_size
+                        yield chunk
+                        
+                if buffer:
+                    streamed += len(buffer)
+                    yield bytes(buffer)
+                    
+                self.is_connected = True
+                self.last_successful_request = datetime.utcnow()
+                self.stats['successful_requests'] += 1
+                logging.info(f"Streamed {streamed} bytes of key {key_id}")
+                
+        except aiohttp.ClientError as e:
+            logging.error(f"KME key stream for {key_id} failed: {e}")
+            self.stats['failed_requests'] += 1
+            
+    async def iter_available_keys(self, sae_id: str,
+                                  page_size: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Lazily iterate available keys for SAE, fetching one page at a time"""
+        endpoint = f"/api/v1/keys/{sae_id}/available"
+        params = {'limit': page_size or self.available_page_size}
+        
+        while True:
+            response = await self._make_request('GET', endpoint, params=params)
+            if not response:
+                return
+                
+            for key_info in response.get('available_keys', []):
+                yield key_info
+                
+            next_cursor = response.get('next_cursor')
+            if not next_cursor:
+                return
+            params['cursor'] = next_cursor
+            
     async def get_available_keys(self, sae_id: str) -> Optional[List[Dict]]:
         """Get list of available keys for SAE"""
         try:
-            endpoint = f"/api/v1/keys/{sae_id}/available"
-            response = await self._make_request('GET', endpoint)
-            
-            if response:
-                return response.get('available_keys', [])
-                
-            return []
+            return [key_info async for key_info in self.iter_available_keys(sae_id)]
             
         except Exception as e:
             logging.error(f"Failed to get available keys for {sae_id}: {e}")
             return []
             
+    async def get_available_key_count(self, sae_id: str) -> Optional[Dict]:
+        """Get available/total/consumed key counts for SAE without listing keys"""
+        try:
+            endpoint = f"/api/v1/keys/{sae_id}/available"
+            response = await self._make_request('GET', endpoint, params={'count_only': 'true'})
+            
+            if response and 'count' in response:
+                counts = {
+                    'sae_id': sae_id,
+                    'available_keys': response['count'],
+                    'total_keys': response.get('total_keys', 0),
+                    'used_keys': response.get('consumed_keys', 0),
+                    'updated_at': datetime.utcnow().isoformat()
+                }
+                
+                if sae_id == self.key_pool_sae_id:
+                    self.key_pool_counts = counts
+                return counts
+                
+            return None
+            
+        except Exception as e:
+            logging.error(f"Failed to get available key count for {sae_id}: {e}")
+            return None
+            
+    def watch_key_pool(self, sae_id: Optional[str]):
+        """Include SAE's key pool counts in the shared status poll"""
+        self.key_pool_sae_id = sae_id
+        self.key_pool_counts = {}
+        self.status_snapshot = None
+        
     async def get_key_statistics(self, sae_id: str = None) -> Optional[Dict]:
         """Get key usage statistics"""
         try:
+            if sae_id and sae_id != self.key_pool_sae_id:
+                # One-off aggregate for an SAE outside the shared poll
+                status = await self._make_request('GET', '/api/v1/status/aggregate',
+                                                  params={'sae_id': sae_id})
+            else:
+                status = await self.get_aggregated_status()
+                
+            if not status:
+                return None
+                
             if sae_id:
                 # Get statistics for specific SAE
-                available_keys = await self.get_available_keys(sae_id)
-                sae_status = await self.get_sae_status(sae_id)
-                
-                if available_keys is not None and sae_status:
+                sae_status = status.get('saes', {}).get(sae_id)
+                if sae_status:
                     return {
                         'sae_id': sae_id,
-                        'available_keys': len(available_keys),
-                        'total_keys': sae_status.get('total_keys', 0),
+                        'available_keys': sae_status['available_keys'],
+                        'total_keys': sae_status['total_keys'],
                         'qkd_link_status': sae_status.get('qkd_link_status', 'unknown')
                     }
             else:
                 # Get global KME statistics
-                status = await self.get_status()
-                if status:
-                    return {
-                        'global_status': status.get('status'),
-                        'qkd_rate': status.get('qkd_rate', 0),
-                        'active_keys': status.get('active_keys', 0),
-                        'timestamp': status.get('timestamp')
-                    }
+                global_status = status['global']
+                return {
+                    'global_status': global_status.get('status'),
+                    'qkd_rate': global_status.get('qkd_rate', 0),
+                    'active_keys': global_status.get('active_keys', 0),
+                    'timestamp': global_status.get('timestamp')
+                }
                     
             return None
             
@@ -589,6 +902,22 @@ class KMEClient:
         else:
             logging.error(f"Unsupported authentication method: {method}")
             
+    def record_latency(self, seconds: float):
+        """Fold one request round trip into the latency EWMA"""
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += self.latency_alpha * (seconds - self.latency_ewma)
+            
+    @property
+    def breaker_state(self) -> str:
+        """Circuit state derived from heartbeat failures: closed, half_open or open"""
+        if not self.is_connected or self.connection_failures >= self.max_connection_failures:
+            return 'open'
+        if self.connection_failures:
+            return 'half_open'
+        return 'closed'
+        
     def get_connection_statistics(self) -> Dict[str, Any]:
         """Get comprehensive KME connection statistics"""
         uptime = datetime.utcnow() - self.stats['uptime_start']
@@ -614,14 +943,20 @@ class KMEClient:
                 if self.stats['last_reconnection'] else None
             ),
             'heartbeat_enabled': self.heartbeat_enabled,
-            'heartbeat_interval': self.heartbeat_interval
+            'heartbeat_interval': self.heartbeat_interval,
+            'status_polls': self.stats['status_polls'],
+            'status_cache_hits': self.stats['status_cache_hits'],
+            'status_subscribers': len(self._status_subscribers),
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 3) if self.latency_ewma is not None else None,
+            'breaker_state': self.breaker_state
         }
     
     async def close(self):
         """PRODUCTION: Close KME client session with comprehensive resource cleanup"""
         try:
-            # Stop heartbeat monitoring
+            # Stop heartbeat monitoring and the shared status poll
             await self.stop_heartbeat()
+            await self.stop_status_polling()
             
             # CRITICAL RESOURCE LEAK FIX: Close aiohttp session properly
             if self.session and not self.session.closed:
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+KME Cluster
+
+Multi-process KME simulator: N forked workers serve the ETSI GS QKD 014 routes
+from one shared-memory key table behind a single SO_REUSEPORT front port
+"""
+
+import logging
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from werkzeug.serving import make_server
+
+from .kme_simulator import KMESimulator, QuantumKey
+
+# Slot states
+SLOT_FREE = 0
+SLOT_HEAD = 1   # first slot of a key, holds its metadata
+SLOT_TAIL = 2   # continuation slot of a key spanning several slots
+
+EPOCH = datetime(1970, 1, 1)
+
+class SharedKeyTable:
+    """Fixed-slot quantum key table in anonymous shared memory
+    
+    The table is created before the workers fork and is inherited by all of
+    them. Slots are partitioned per worker so allocation needs no cross-process
+    coordination, only a per-partition thread lock (each worker serves requests
+    on several threads); lookups, consumption and frees from any worker take a
+    striped lock. The
+    slot index is encoded in the key ID, so lookups are O(1) without a shared
+    hash index. Keys larger than slot_bytes span consecutive slots.
+    """
+    
+    # state, consumed, run_slots, length_bits, created_at, expires_at,
+    # key_type, key_id, sender_sae_id, receiver_sae_id
+    HEADER = struct.Struct('<BBxxIIdd16s35s64s64s')
+    
+    def __init__(self, slots: int = 16384, slot_bytes: int = 1024,
+                 partitions: int = 1, lock_stripes: int = 64):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.partitions = partitions
+        
+        self._headers = mmap.mmap(-1, slots * self.HEADER.size)
+        self._data = mmap.mmap(-1, slots * slot_bytes)
+        
+        context = multiprocessing.get_context('fork')
+        self._locks = [context.Lock() for _ in range(lock_stripes)]
+        
+        self.partition = 0
+        self._cursor = 0
+        self._allocating = threading.Lock()  # claims slots in this process's partition
+        
+    def set_partition(self, partition: int):
+        """Select the slot partition this process allocates from"""
+        self.partition = partition
+        self._cursor = self._partition_range()[0]
+        self._allocating = threading.Lock()  # fresh after fork
+        
+    def _partition_range(self, partition: Optional[int] = None) -> Tuple[int, int]:
+        partition = self.partition if partition is None else partition
+        start = partition * self.slots // self.partitions
+        end = (partition + 1) * self.slots // self.partitions
+        return start, end
+        
+    def _lock(self, slot: int):
+        return self._locks[slot % len(self._locks)]
+        
+    def _slot_for(self, key_id: str) -> Optional[int]:
+        """Decode the slot index embedded in a key ID"""
+        if not isinstance(key_id, str) or len(key_id) != 35 or not key_id.startswith('QK_'):
+            return None
+        try:
+            slot = int(key_id[3:11], 16)
+        except ValueError:
+            return None
+        return slot if slot < self.slots else None
+        
+    def _allocate(self, run: int) -> Optional[int]:
+        """Find `run` consecutive free slots in this process's partition (caller holds _allocating)"""
+        start, end = self._partition_range()
+        if run > end - start:
+            return None
+            
+        size = self.HEADER.size
+        slot = self._cursor
+        scanned = 0
+        while scanned < end - start:
+            if slot + run > end:
+                scanned += end - slot
+                slot = start
+                continue
+                
+            # Only the owning worker turns free slots into used ones, and its
+            # threads claim under _allocating, so reading the state byte is enough
+            blocked = next((i for i in range(slot, slot + run)
+                            if self._headers[i * size] != SLOT_FREE), None)
+            if blocked is None:
+                self._cursor = slot + run if slot + run < end else start
+                return slot
+                
+            scanned += blocked + 1 - slot
+            slot = blocked + 1
+            
+        return None
+        
+    def put(self, key: QuantumKey) -> str:
+        """Store a key, rewriting its ID to embed the allocated slot"""
+        for sae_id in (key.sender_sae_id, key.receiver_sae_id):
+            if len(sae_id.encode('utf-8')) > 64:
+                raise ValueError(f"SAE ID too long for shared key table: {sae_id}")
+                
+        data_len = len(key.key_data)
+        run = max(1, (data_len + self.slot_bytes - 1) // self.slot_bytes)
+        size = self.HEADER.size
+        # The run must be marked used before another request thread can scan it
+        with self._allocating:
+            slot = self._allocate(run)
+            if slot is None:
+                raise RuntimeError("Shared key table partition is full")
+                
+            key.key_id = f"QK_{slot:08x}{key.key_id[11:]}"
+            
+            offset = slot * self.slot_bytes
+            with self._lock(slot):
+                self._data[offset:offset + data_len] = key.key_data
+                for tail in range(slot + 1, slot + run):
+                    self._headers[tail * size] = SLOT_TAIL
+                self.HEADER.pack_into(
+                    self._headers, slot * size,
+                    SLOT_HEAD, int(key.consumed), run, key.length,
+                    (key.created_at - EPOCH).total_seconds(),
+                    (key.expires_at - EPOCH).total_seconds(),
+                    key.key_type.encode('utf-8'), key.key_id.encode('utf-8'),
+                    key.sender_sae_id.encode('utf-8'), key.receiver_sae_id.encode('utf-8')
+                )
+                
+        return key.key_id
+        
+    def _decode(self, slot: int, header: tuple, key_data: bytes = b'') -> QuantumKey:
+        """Build a QuantumKey from an unpacked slot header"""
+        (_, consumed, _, length_bits, created_at, expires_at,
+         key_type, key_id, sender, receiver) = header
+        return QuantumKey(
+            key_id=key_id.rstrip(b'\0').decode('utf-8'),
+            key_data=key_data,
+            length=length_bits,
+            created_at=EPOCH + timedelta(seconds=created_at),
+            expires_at=EPOCH + timedelta(seconds=expires_at),
+            sender_sae_id=sender.rstrip(b'\0').decode('utf-8'),
+            receiver_sae_id=receiver.rstrip(b'\0').decode('utf-8'),
+            consumed=bool(consumed),
+            key_type=key_type.rstrip(b'\0').decode('utf-8')
+        )
+        
+    def _header_if_match(self, slot: int, key_id: str) -> Optional[tuple]:
+        """Read a slot header if it holds key_id (caller holds the slot lock)"""
+        header = self.HEADER.unpack_from(self._headers, slot * self.HEADER.size)
+        if header[0] != SLOT_HEAD or header[7].rstrip(b'\0').decode('utf-8') != key_id:
+            return None
+        return header
+        
+    def get(self, key_id: str, default=None) -> Optional[QuantumKey]:
+        """Get a copy of a stored key including its key material"""
+        slot = self._slot_for(key_id)
+        if slot is None:
+            return default
+            
+        with self._lock(slot):
+            header = self._header_if_match(slot, key_id)
+            if not header:
+                return default
+            offset = slot * self.slot_bytes
+            key_data = self._data[offset:offset + (header[3] + 7) // 8]
+            
+        return self._decode(slot, header, key_data)
+        
+    def consume(self, key_id: str) -> bool:
+        """Atomically mark a key consumed, returning False if it already was"""
+        slot = self._slot_for(key_id)
+        if slot is None:
+            return False
+            
+        with self._lock(slot):
+            header = self._header_if_match(slot, key_id)
+            if not header or header[1]:
+                return False
+            self._headers[slot * self.HEADER.size + 1] = 1
+            return True
+            
+    def delete(self, key_id: str) -> bool:
+        """Free the slots held by a key"""
+        slot = self._slot_for(key_id)
+        if slot is None:
+            return False
+            
+        size = self.HEADER.size
+        with self._lock(slot):
+            header = self._header_if_match(slot, key_id)
+            if not header:
+                return False
+            for tail in range(slot + header[2] - 1, slot - 1, -1):
+                self._headers[tail * size] = SLOT_FREE
+            return True
+            
+    def iter_keys(self, partition: Optional[int] = None) -> Iterator[QuantumKey]:
+        """Iterate key metadata from an unlocked snapshot (key material omitted)"""
+        start, end = (0, self.slots) if partition is None else self._partition_range(partition)
+        
+        size = self.HEADER.size
+        snapshot = self._headers[start * size:end * size]
+        for slot, header in enumerate(self.HEADER.iter_unpack(snapshot), start):
+            if header[0] == SLOT_HEAD:
+                yield self._decode(slot, header)
+                
+    def keys_for_sae(self, sae_id: str) -> List[QuantumKey]:
+        """Get metadata of every stored key shared with an SAE"""
+        encoded = sae_id.encode('utf-8').ljust(64, b'\0')
+        snapshot = bytes(self._headers)
+        return [self._decode(slot, header)
+                for slot, header in enumerate(self.HEADER.iter_unpack(snapshot))
+                if header[0] == SLOT_HEAD and (header[8] == encoded or header[9] == encoded)]
+                
+    # Mapping interface used by the KMESimulator routes (self.keys)
+    
+    def __contains__(self, key_id: str) -> bool:
+        slot = self._slot_for(key_id)
+        if slot is None:
+            return False
+        with self._lock(slot):
+            return self._header_if_match(slot, key_id) is not None
+            
+    def __getitem__(self, key_id: str) -> QuantumKey:
+        key = self.get(key_id)
+        if key is None:
+            raise KeyError(key_id)
+        return key
+        
+    def __setitem__(self, key_id: str, key: QuantumKey):
+        key.key_id = key_id
+        self.put(key)
+        
+    def __delitem__(self, key_id: str):
+        if not self.delete(key_id):
+            raise KeyError(key_id)
+            
+    def __len__(self) -> int:
+        size = self.HEADER.size
+        return sum(1 for slot in range(self.slots) if self._headers[slot * size] == SLOT_HEAD)
+        
+    def items(self) -> Iterator[Tuple[str, QuantumKey]]:
+        return ((key.key_id, key) for key in self.iter_keys())
+        
+    def values(self) -> Iterator[QuantumKey]:
+        return self.iter_keys()
+        
+    def get_stats(self) -> Dict:
+        """Get slot usage statistics"""
+        size = self.HEADER.size
+        states = bytes(self._headers[slot * size] for slot in range(self.slots))
+        return {
+            'slots': self.slots,
+            'slot_bytes': self.slot_bytes,
+            'partitions': self.partitions,
+            'keys': states.count(SLOT_HEAD),
+            'slots_used': self.slots - states.count(SLOT_FREE)
+        }
+
+class ClusterKMESimulator(KMESimulator):
+    """KME simulator worker whose key storage lives in a SharedKeyTable"""
+    
+    def __init__(self, table: SharedKeyTable, host='127.0.0.1', port=8080,
+                 worker_index: int = 0, use_entropy_reservoir: bool = True):
+        super().__init__(host, port, use_entropy_reservoir)
+        self.table = table
+        self.worker_index = worker_index
+        self.keys = table
+        
+    def _store_key(self, key: QuantumKey):
+        """Store a key in this worker's partition of the shared table"""
+        self.table.put(key)
+        
+    def _sae_key_list(self, sae_id: str) -> List[QuantumKey]:
+        """Get the keys shared with an SAE from every worker's partition"""
+        return self.table.keys_for_sae(sae_id)
+        
+    def _consume_key(self, key: QuantumKey) -> bool:
+        """Mark a key consumed in shared memory so every worker sees it"""
+        if not self.table.consume(key.key_id):
+            return False
+        key.consumed = True
+        return True
+        
+    def cleanup_expired_keys(self):
+        """Free expired keys allocated by this worker"""
+        current_time = datetime.utcnow()
+        expired_keys = [key.key_id for key in self.table.iter_keys(self.worker_index)
+                        if current_time > key.expires_at]
+                        
+        removed = sum(1 for key_id in expired_keys if self.table.delete(key_id))
+        if removed:
+            logging.info(f"KME worker {self.worker_index} cleaned up {removed} expired keys")
+        return removed
+            
+    def get_stats(self) -> Dict:
+        """Get simulator statistics across the cluster"""
+        stats = super().get_stats()
+        stats['sae_count'] = len({sae_id for key in self.table.iter_keys()
+                                  for sae_id in (key.sender_sae_id, key.receiver_sae_id)})
+        stats['worker_index'] = self.worker_index
+        stats['key_table'] = self.table.get_stats()
+        return stats
+
+class KMECluster:
+    """Pre-forked pool of KME simulator workers sharing one key table
+    
+    Each worker binds its own listening socket to the same front port with
+    SO_REUSEPORT, so the kernel distributes incoming connections across
+    workers. Requires Linux (fork + SO_REUSEPORT).
+    """
+    
+    def __init__(self, host='127.0.0.1', port=8080, workers: Optional[int] = None,
+                 slots: int = 16384, slot_bytes: int = 1024,
+                 use_entropy_reservoir: bool = True):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.use_entropy_reservoir = use_entropy_reservoir
+        self.cleanup_interval = 300  # seconds
+        
+        self.table: Optional[SharedKeyTable] = None
+        self.processes: List[multiprocessing.Process] = []
+        self.running = False
+        
+    def start(self):
+        """Fork the worker processes"""
+        if self.running:
+            return
+            
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError("KME cluster mode requires SO_REUSEPORT support")
+            
+        self.table = SharedKeyTable(self.slots, self.slot_bytes, partitions=self.workers)
+        
+        context = multiprocessing.get_context('fork')
+        for index in range(self.workers):
+            process = context.Process(
+                target=self._serve_worker, args=(index,),
+                name=f"kme-worker-{index}", daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+            
+        self.running = True
+        logging.info(f"KME cluster started with {self.workers} workers on http://{self.host}:{self.port}")
+        
+    def wait_until_ready(self, timeout: float = 10.0) -> bool:
+        """Wait until the front port accepts connections"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.5):
+                    return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+        
+    def stop(self):
+        """Terminate the worker processes"""
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=5)
+            
+        self.processes = []
+        self.running = False
+        logging.info("KME cluster stopped")
+        
+    def _serve_worker(self, index: int):
+        """Worker process entry point"""
+        try:
+            self.table.set_partition(index)
+            kme = ClusterKMESimulator(
+                self.table, self.host, self.port, worker_index=index,
+                use_entropy_reservoir=self.use_entropy_reservoir
+            )
+            
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listener.bind((self.host, self.port))
+            listener.listen(1024)
+            
+            server = make_server(self.host, self.port, kme.app, threaded=True,
+                                 fd=listener.fileno())
+                                 
+            cleanup_thread = threading.Thread(
+                target=self._cleanup_loop, args=(kme,), daemon=True
+            )
+            cleanup_thread.start()
+            
+            logging.info(f"KME worker {index} (pid {os.getpid()}) serving")
+            server.serve_forever()
+            
+        except Exception as e:
+            logging.error(f"KME worker {index} failed: {e}")
+            
+    def _cleanup_loop(self, kme: ClusterKMESimulator):
+        """Periodically free expired keys from this worker's view of the table"""
+        while True:
+            time.sleep(self.cleanup_interval)
+            kme.cleanup_expired_keys()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+KME Network - Multi-hop Trusted-Node Key Relay
+
+Simulates a QKD network of KME nodes joined by links with their own key rates.
+Keys for SAEs attached to remote nodes are relayed hop by hop along the
+cheapest path. Each trusted node would one-time-pad the key with link key it
+shares with the next hop; the simulation models that as link key accounting,
+spending the key's bits from every link pool on the path before the key is
+stored at the destination node.
+"""
+
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .kme_simulator import KMESimulator, QuantumKey
+
+@dataclass
+class QKDLink:
+    """Point-to-point QKD link between two trusted nodes"""
+    node_a: str
+    node_b: str
+    key_rate: int  # bits per second of link key generated
+    latency_ms: float = 1.0
+    buffer_seconds: float = 60.0  # link key pool capacity in seconds of generation
+    available_bits: float = field(init=False)
+    last_refill: float = field(init=False)
+    bits_consumed: int = 0
+    relays: int = 0
+    shortages: int = 0
+    
+    def __post_init__(self):
+        self.available_bits = self.capacity_bits
+        self.last_refill = time.monotonic()
+        
+    @property
+    def capacity_bits(self) -> float:
+        return self.key_rate * self.buffer_seconds
+        
+    def refill(self):
+        """Add the link key generated since the last refill"""
+        now = time.monotonic()
+        self.available_bits = min(self.capacity_bits,
+                                  self.available_bits + (now - self.last_refill) * self.key_rate)
+        self.last_refill = now
+        
+    def cost(self, key_bits: int) -> float:
+        """Expected hop delay in ms: propagation plus waiting for missing link key"""
+        shortage = max(0.0, key_bits - self.available_bits)
+        return self.latency_ms + shortage / self.key_rate * 1000
+        
+    def other(self, node_id: str) -> str:
+        return self.node_b if node_id == self.node_a else self.node_a
+        
+    def to_dict(self) -> Dict:
+        return {
+            'nodes': [self.node_a, self.node_b],
+            'key_rate': self.key_rate,
+            'latency_ms': self.latency_ms,
+            'available_bits': int(self.available_bits),
+            'capacity_bits': int(self.capacity_bits),
+            'bits_consumed': self.bits_consumed,
+            'relays': self.relays,
+            'shortages': self.shortages
+        }
+
+class KMENetwork:
+    """Topology of KME simulator nodes with a trusted-node relay service"""
+    
+    def __init__(self):
+        self.nodes: Dict[str, KMESimulator] = {}
+        self.links: Dict[Tuple[str, str], QKDLink] = {}
+        self.sae_homes: Dict[str, str] = {}  # SAE ID -> node ID
+        self._adjacency: Dict[str, List[QKDLink]] = {}
+        self._lock = threading.Lock()
+        
+        self.relay_latencies = deque(maxlen=1000)  # end-to-end relay latency (ms)
+        self.stats = {
+            'relays': 0,
+            'relayed_bits': 0,
+            'failed_relays': 0,
+            'hops': 0
+        }
+        
+    @classmethod
+    def from_config(cls, config: Dict, host: str = '127.0.0.1', base_port: int = 8080) -> 'KMENetwork':
+        """Build a network from {'nodes': [...], 'links': [...], 'saes': {...}}"""
+        network = cls()
+        for index, node_id in enumerate(config.get('nodes', [])):
+            network.add_node(node_id, KMESimulator(host, base_port + index))
+            
+        for link in config.get('links', []):
+            network.add_link(link['a'], link['b'], link['key_rate'],
+                             latency_ms=link.get('latency_ms', 1.0),
+                             buffer_seconds=link.get('buffer_seconds', 60.0))
+        
+        for sae_id, node_id in config.get('saes', {}).items():
+            network.attach_sae(sae_id, node_id)
+            
+        return network
+        
+    @classmethod
+    def load(cls, path: str, host: str = '127.0.0.1', base_port: int = 8080) -> 'KMENetwork':
+        """Load a network topology from a JSON file"""
+        with open(path, 'r') as f:
+            return cls.from_config(json.load(f), host, base_port)
+            
+    def add_node(self, node_id: str, simulator: KMESimulator):
+        """Add a KME node and attach the simulator to this network"""
+        self.nodes[node_id] = simulator
+        self._adjacency.setdefault(node_id, [])
+        simulator.network = self
+        simulator.node_id = node_id
+        
+    def add_link(self, node_a: str, node_b: str, key_rate: int, **kwargs) -> QKDLink:
+        """Connect two nodes with a QKD link"""
+        if node_a not in self.nodes or node_b not in self.nodes:
+            raise ValueError(f"Unknown node in link {node_a} <-> {node_b}")
+            
+        link = QKDLink(node_a, node_b, key_rate, **kwargs)
+        self.links[tuple(sorted((node_a, node_b)))] = link
+        self._adjacency[node_a].append(link)
+        self._adjacency[node_b].append(link)
+        return link
+        
+    def attach_sae(self, sae_id: str, node_id: str):
+        """Register the node an SAE is attached to"""
+        if node_id not in self.nodes:
+            raise ValueError(f"Unknown node {node_id}")
+        self.sae_homes[sae_id] = node_id
+        
+    def home_of(self, sae_id: str) -> Optional[str]:
+        return self.sae_homes.get(sae_id)
+        
+    def find_path(self, source: str, destination: str, key_bits: int) -> Optional[List[QKDLink]]:
+        """Cheapest path (Dijkstra on expected hop delay) from source to destination"""
+        with self._lock:
+            for link in self.links.values():
+                link.refill()
+                
+            best = {source: 0.0}
+            previous: Dict[str, QKDLink] = {}
+            queue = [(0.0, source)]
+            
+            while queue:
+                cost, node_id = heapq.heappop(queue)
+                if node_id == destination:
+                    break
+                if cost > best.get(node_id, float('inf')):
+                    continue
+                for link in self._adjacency.get(node_id, []):
+                    neighbour = link.other(node_id)
+                    candidate = cost + link.cost(key_bits)
+                    if candidate < best.get(neighbour, float('inf')):
+                        best[neighbour] = candidate
+                        previous[neighbour] = link
+                        heapq.heappush(queue, (candidate, neighbour))
+                        
+        if destination not in best:
+            return None
+            
+        path = []
+        node_id = destination
+        while node_id != source:
+            link = previous[node_id]
+            path.append(link)
+            node_id = link.other(node_id)
+        return list(reversed(path))
+        
+    def relay_key(self, key: QuantumKey, source: str, destination: str) -> Dict:
+        """Relay a key hop by hop to the destination node and store it there
+        
+        Raises RuntimeError when no path exists or a link on the cheapest path
+        lacks the key material for this key.
+        """
+        return self.relay_keys([key], source, destination)[key.key_id]
+        
+    def relay_keys(self, keys: List[QuantumKey], source: str, destination: str) -> Dict[str, Dict]:
+        """Relay several keys over one path, all or nothing
+        
+        Link key for every key is reserved on every hop up front, so a request
+        either relays all of its keys or spends no link key and stores nothing
+        at the destination. Returns key_id -> relay info.
+        """
+        start = time.perf_counter()
+        key_bits = sum(len(key.key_data) * 8 for key in keys)
+        
+        path = self.find_path(source, destination, key_bits)
+        if path is None:
+            self.stats['failed_relays'] += 1
+            raise RuntimeError(f"No QKD path from {source} to {destination}")
+            
+        # Reserve link key for the whole request on every hop before forwarding anything
+        with self._lock:
+            short = [link for link in path if link.available_bits < key_bits]
+            if short:
+                for link in short:
+                    link.shortages += 1
+                self.stats['failed_relays'] += 1
+                raise RuntimeError(
+                    f"Insufficient link key on {short[0].node_a} <-> {short[0].node_b} "
+                    f"({int(short[0].available_bits)} of {key_bits} bits)"
+                )
+            for link in path:
+                link.available_bits -= key_bits
+                
+        node = self.nodes[destination]
+        stored = []
+        try:
+            for key in keys:
+                node._store_key(QuantumKey(
+                    key_id=key.key_id,
+                    key_data=bytes(key.key_data),
+                    length=key.length,
+                    created_at=key.created_at,
+                    expires_at=key.expires_at,
+                    sender_sae_id=key.sender_sae_id,
+                    receiver_sae_id=key.receiver_sae_id,
+                    key_type=key.key_type
+                ))
+                stored.append(key.key_id)
+        except Exception:
+            # Roll back: drop the keys already stored and return the reserved link key
+            for key_id in stored:
+                node.keys.pop(key_id, None)
+            with self._lock:
+                for link in path:
+                    link.available_bits = min(link.capacity_bits, link.available_bits + key_bits)
+                self.stats['failed_relays'] += 1
+            raise
+            
+        hops = []
+        node_id = source
+        for link in path:
+            node_id = link.other(node_id)
+            hops.append(node_id)
+            
+        # End-to-end latency: relay processing plus simulated link propagation
+        propagation_ms = sum(link.latency_ms for link in path)
+        latency_ms = (time.perf_counter() - start) * 1000 + propagation_ms
+        with self._lock:
+            for link in path:
+                link.bits_consumed += key_bits
+                link.relays += len(keys)
+            self.relay_latencies.append(latency_ms)
+            self.stats['relays'] += len(keys)
+            self.stats['relayed_bits'] += key_bits
+            self.stats['hops'] += len(path) * len(keys)
+            
+        logging.info(f"Relayed {len(keys)} keys {source} -> {' -> '.join(hops)} in {latency_ms:.2f} ms")
+        info = {
+            'path': [source] + hops,
+            'hops': len(path),
+            'latency_ms': round(latency_ms, 3)
+        }
+        return {key.key_id: dict(info) for key in keys}
+        
+    def get_topology(self) -> Dict:
+        """Get nodes, links and SAE attachments"""
+        with self._lock:
+            for link in self.links.values():
+                link.refill()
+            return {
+                'nodes': {node_id: f"http://{kme.host}:{kme.port}" for node_id, kme in self.nodes.items()},
+                'links': [link.to_dict() for link in self.links.values()],
+                'saes': dict(self.sae_homes)
+            }
+            
+    def get_stats(self) -> Dict:
+        """Get relay latency and per-link key consumption statistics"""
+        with self._lock:
+            latencies = sorted(self.relay_latencies)
+            stats = dict(self.stats)
+            links = [link.to_dict() for link in self.links.values()]
+            
+        latency = {}
+        if latencies:
+            latency = {
+                'avg_ms': round(sum(latencies) / len(latencies), 3),
+                'p50_ms': round(latencies[len(latencies) // 2], 3),
+                'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max_ms': round(latencies[-1], 3)
+            }
+            
+        stats['average_hops'] = stats['hops'] / stats['relays'] if stats['relays'] else 0.0
+        stats['relay_latency'] = latency
+        stats['links'] = links
+        stats['timestamp'] = datetime.utcnow().isoformat()
+        return stats
+        
+    async def start(self):
+        """Start every node's REST API"""
+        for kme in self.nodes.values():
+            await kme.start()
+            
+    async def stop(self):
+        """Stop every node"""
+        for kme in self.nodes.values():
+            await kme.stop()
@@ -5,23 +5,27 @@ KME (Key Management Entity) Simulator
 Implements ETSI GS QKD 014 compliant REST API for quantum key distribution simulation
 """
 
-import asyncio
+import bisect
 import logging
 import json
+import os
 import secrets
 import threading
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from flask import Flask, request, jsonify
+from typing import Dict, List, Optional, Tuple, Union
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dataclasses import dataclass, asdict
 import base64
 
+from ..utils.scheduler import IDLE, get_scheduler
+
 @dataclass
 class QuantumKey:
     """Quantum key data structure"""
     key_id: str
-    key_data: bytes
+    key_data: Union[bytes, memoryview]
     length: int
     created_at: datetime
     expires_at: datetime
@@ -44,10 +48,120 @@ class QuantumKey:
             'key_type': self.key_type
         }
 
+class EntropyReservoir:
+    """Background-filled pool of random bytes for key minting
+    
+    Reads os.urandom in large blocks on a worker thread and hands out
+    zero-copy memoryview slices, so minting a key costs a slice instead of
+    a getrandom syscall. Blocks are immutable bytes; a slice keeps its
+    block alive until the key referencing it is dropped.
+    """
+    
+    def __init__(self, block_size: int = 2 * 1024 * 1024, max_blocks: int = 4,
+                 low_watermark: int = 2):
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.low_watermark = low_watermark
+        
+        self._blocks = deque()
+        self._current = memoryview(b'')
+        self._offset = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._worker = None
+        self._running = False
+        
+        self.stats = {
+            'hits': 0,            # takes served from buffered entropy
+            'stalls': 0,          # takes that had to read a block synchronously
+            'direct_reads': 0,    # takes larger than a block
+            'refills': 0,         # blocks filled by the worker thread
+            'bytes_served': 0
+        }
+        
+    def start(self):
+        """Start the refill worker thread"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            
+        self._worker = threading.Thread(
+            target=self._refill_loop, name="kme-entropy-refill", daemon=True
+        )
+        self._worker.start()
+        
+    def stop(self):
+        """Stop the refill worker thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+            
+        if self._worker:
+            self._worker.join(timeout=1.0)
+            self._worker = None
+            
+    def take(self, length: int) -> memoryview:
+        """Return `length` random bytes as a read-only view into the pool"""
+        if length > self.block_size:
+            with self._condition:
+                self.stats['direct_reads'] += 1
+                self.stats['bytes_served'] += length
+            return memoryview(os.urandom(length))
+            
+        if not self._running:
+            self.start()
+            
+        with self._condition:
+            offset = self._offset
+            if len(self._current) - offset < length:
+                if self._blocks:
+                    self._current = memoryview(self._blocks.popleft())
+                    self.stats['hits'] += 1
+                else:
+                    # Worker fell behind - read inline rather than wait
+                    self._current = memoryview(os.urandom(self.block_size))
+                    self.stats['stalls'] += 1
+                offset = 0
+                
+                if len(self._blocks) < self.low_watermark:
+                    self._condition.notify()
+            else:
+                self.stats['hits'] += 1
+                
+            self._offset = offset + length
+            self.stats['bytes_served'] += length
+            return self._current[offset:offset + length]
+            
+    def _refill_loop(self):
+        """Keep up to max_blocks blocks of entropy buffered"""
+        while True:
+            with self._condition:
+                while self._running and len(self._blocks) >= self.max_blocks:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                    
+            block = os.urandom(self.block_size)
+            
+            with self._condition:
+                self._blocks.append(block)
+                self.stats['refills'] += 1
+                
+    def get_stats(self) -> Dict:
+        """Get reservoir statistics"""
+        with self._condition:
+            stats = dict(self.stats)
+            buffered = len(self._blocks) * self.block_size + len(self._current) - self._offset
+            
+        takes = stats['hits'] + stats['stalls'] + stats['direct_reads']
+        stats['hit_rate'] = stats['hits'] / takes if takes else 0.0
+        stats['buffered_bytes'] = buffered
+        return stats
+        
 class KMESimulator:
     """Simulated Key Management Entity following ETSI GS QKD 014"""
     
-    def __init__(self, host='127.0.0.1', port=8080):
+    def __init__(self, host='127.0.0.1', port=8080, use_entropy_reservoir: bool = True):
         self.host = host
         self.port = port
         self.app = Flask(__name__)
@@ -61,6 +175,16 @@ class KMESimulator:
         self.max_key_lifetime = timedelta(hours=24)
         self.qkd_rate = 10000  # bits per second (simulated)
         self.max_key_size = 1024 * 1024  # 1MB max key size
+        self.max_keys_per_request = 512  # Batch dec_keys / consume limit
+        self.default_stream_chunk = 64 * 1024  # Streaming key delivery chunk size
+        self.default_page_size = 100  # Available-keys listing page size
+        
+        # Trusted-node relay network this node belongs to (see kme_network)
+        self.network = None
+        self.node_id = None
+        
+        # Pre-generated entropy for key minting (None = per-key secrets calls)
+        self.entropy_reservoir = EntropyReservoir() if use_entropy_reservoir else None
         
         # Setup Flask routes
         self.setup_routes()
@@ -68,6 +192,7 @@ class KMESimulator:
         # Thread for Flask app
         self.flask_thread = None
         self.running = False
+        self.cleanup_task = None  # SCHEDULER: expired key cleanup handle
         
         logging.info(f"KME Simulator initialized on {host}:{port}")
         
@@ -84,12 +209,96 @@ class KMESimulator:
                 'timestamp': datetime.utcnow().isoformat()
             })
             
+        @self.app.route('/api/v1/status/aggregate', methods=['GET'])
+        def get_aggregated_status():
+            """Get global, per-SAE and link status in one payload"""
+            try:
+                current_time = datetime.utcnow()
+                
+                saes = {}
+                for sae_id in request.args.getlist('sae_id')[:self.max_keys_per_request]:
+                    sae_keys = self._sae_key_list(sae_id)
+                    saes[sae_id] = {
+                        'available_keys': sum(1 for key in sae_keys
+                                              if not key.consumed and current_time <= key.expires_at),
+                        'total_keys': len(sae_keys),
+                        'consumed_keys': sum(1 for key in sae_keys if key.consumed),
+                        'qkd_link_status': 'connected',
+                        'node_id': (self.network.home_of(sae_id) if self.network else None) or self.node_id
+                    }
+                    
+                if self.network:
+                    links = self.network.get_topology()['links']
+                    for link in links:
+                        link['status'] = 'connected' if link['available_bits'] > 0 else 'depleted'
+                else:
+                    links = [{
+                        'nodes': [self.node_id or 'local'],
+                        'key_rate': self.qkd_rate,
+                        'status': 'connected'
+                    }]
+                    
+                return jsonify({
+                    'global': {
+                        'status': 'active',
+                        'node_id': self.node_id,
+                        'qkd_rate': self.qkd_rate,
+                        'active_keys': len(self.keys),
+                        'timestamp': current_time.isoformat()
+                    },
+                    'saes': saes,
+                    'links': links
+                })
+                
+            except Exception as e:
+                logging.error(f"Error building aggregated status: {e}")
+                return jsonify({'error': str(e)}), 500
+                
+        @self.app.route('/api/v1/network/topology', methods=['GET'])
+        def get_network_topology():
+            """Get the trusted-node network this KME belongs to"""
+            if not self.network:
+                return jsonify({'error': 'KME is not part of a network'}), 404
+            topology = self.network.get_topology()
+            topology['node_id'] = self.node_id
+            return jsonify(topology)
+            
+        @self.app.route('/api/v1/network/stats', methods=['GET'])
+        def get_network_stats():
+            """Get relay latency and per-link key consumption"""
+            if not self.network:
+                return jsonify({'error': 'KME is not part of a network'}), 404
+            return jsonify(self.network.get_stats())
+            
+        @self.app.route('/api/v1/network/route/<receiver_sae_id>', methods=['GET'])
+        def get_network_route(receiver_sae_id):
+            """Preview the relay path a key for receiver_sae_id would take"""
+            if not self.network:
+                return jsonify({'error': 'KME is not part of a network'}), 404
+                
+            receiver_node = self.network.home_of(receiver_sae_id) or self.node_id
+            key_length = request.args.get('key_length', 256, type=int)
+            path = self.network.find_path(self.node_id, receiver_node, key_length)
+            if path is None:
+                return jsonify({'error': f'No QKD path to {receiver_node}'}), 404
+                
+            nodes = [self.node_id]
+            for link in path:
+                nodes.append(link.other(nodes[-1]))
+                
+            return jsonify({
+                'receiver_sae_id': receiver_sae_id,
+                'receiver_node': receiver_node,
+                'path': nodes,
+                'hops': len(path),
+                'expected_latency_ms': round(sum(link.cost(key_length) for link in path), 3)
+            })
+            
         @self.app.route('/api/v1/keys/<sae_id>/status', methods=['GET'])
         def get_sae_status(sae_id):
             """Get status for specific SAE"""
-            sae_keys = self.sae_keys.get(sae_id, [])
-            available_keys = sum(1 for key_id in sae_keys 
-                               if not self.keys[key_id].consumed)
+            sae_keys = self._sae_key_list(sae_id)
+            available_keys = sum(1 for key in sae_keys if not key.consumed)
             
             return jsonify({
                 'sae_id': sae_id,
@@ -121,32 +330,38 @@ class KMESimulator:
                     )
                     generated_keys.append(key)
                     
+                # MULTI-HOP RELAY: Forward keys to the receiver's home node
+                relays = {}
+                receiver_node = self.network.home_of(receiver_sae_id) if self.network else None
+                if receiver_node and receiver_node != self.node_id:
+                    try:
+                        relays = self.network.relay_keys(generated_keys, self.node_id, receiver_node)
+                    except RuntimeError as e:
+                        logging.warning(f"Key relay to {receiver_node} failed: {e}")
+                        return jsonify({'error': str(e)}), 503
+                        
                 # Store keys
                 for key in generated_keys:
-                    self.keys[key.key_id] = key
-                    
-                    # Add to sender's key list
-                    if sender_sae_id not in self.sae_keys:
-                        self.sae_keys[sender_sae_id] = []
-                    self.sae_keys[sender_sae_id].append(key.key_id)
+                    self._store_key(key)
                     
-                    # Add to receiver's key list
-                    if receiver_sae_id not in self.sae_keys:
-                        self.sae_keys[receiver_sae_id] = []
-                    self.sae_keys[receiver_sae_id].append(key.key_id)
-                    
-                # Return key metadata (not actual keys)
+                # Return the key container (ETSI GS QKD 014: key_ID plus key material)
                 response = {
                     'status': 'success',
                     'key_count': len(generated_keys),
                     'keys': [{
                         'key_id': key.key_id,
+                        'key_data': base64.b64encode(key.key_data).decode('utf-8'),
                         'length': key.length,
                         'key_type': key.key_type,
                         'expires_at': key.expires_at.isoformat()
                     } for key in generated_keys]
                 }
                 
+                if relays:
+                    for entry in response['keys']:
+                        entry['relay'] = relays[entry['key_id']]
+                    response['receiver_node'] = receiver_node
+                
                 logging.info(f"Generated {key_count} {key_type} keys for {sender_sae_id} -> {receiver_sae_id}")
                 return jsonify(response)
                 
@@ -158,42 +373,100 @@ class KMESimulator:
         def get_decryption_key(sae_id, key_id):
             """Get decryption key (Slave SAE request)"""
             try:
-                # Check if key exists
-                if key_id not in self.keys:
-                    return jsonify({'error': 'Key not found'}), 404
+                key, error, status_code = self._resolve_decryption_key(sae_id, key_id)
+                if error:
+                    return jsonify({'error': error}), status_code
                     
-                key = self.keys[key_id]
+                logging.info(f"Key {key_id} retrieved by {sae_id}")
+                return jsonify(self._decryption_key_response(key))
                 
-                # Validate SAE access
-                if key.receiver_sae_id != sae_id and key.sender_sae_id != sae_id:
-                    return jsonify({'error': 'Access denied'}), 403
+            except Exception as e:
+                logging.error(f"Error retrieving key: {e}")
+                return jsonify({'error': str(e)}), 500
+                
+        @self.app.route('/api/v1/keys/<sae_id>/<key_id>/stream', methods=['GET'])
+        def stream_key(sae_id, key_id):
+            """Stream key material as raw bytes in fixed-size chunks"""
+            try:
+                chunk_size = request.args.get('chunk_size', self.default_stream_chunk, type=int)
+                if not 0 < chunk_size <= self.max_key_size:
+                    return jsonify({'error': 'Invalid chunk size'}), 400
                     
-                # Check if key is expired
-                if datetime.utcnow() > key.expires_at:
-                    return jsonify({'error': 'Key expired'}), 410
+                key, error, status_code = self._resolve_stream_key(sae_id, key_id)
+                if error:
+                    return jsonify({'error': error}), status_code
                     
-                # Check if key is already consumed (for OTP)
-                if key.consumed and key.key_type == 'otp':
-                    return jsonify({'error': 'Key already consumed'}), 410
+                def generate(key_data=memoryview(key.key_data)):
+                    for offset in range(0, len(key_data), chunk_size):
+                        yield bytes(key_data[offset:offset + chunk_size])
+                        
+                logging.info(f"Streaming key {key_id} to {sae_id} in {chunk_size}-byte chunks")
+                return Response(generate(), mimetype='application/octet-stream', headers={
+                    'X-Key-ID': key.key_id,
+                    'X-Key-Length': str(key.length),
+                    'X-Key-Type': key.key_type
+                })
+                
+            except Exception as e:
+                logging.error(f"Error streaming key: {e}")
+                return jsonify({'error': str(e)}), 500
+                
+        @self.app.route('/api/v1/keys/<sae_id>/dec_keys', methods=['POST'])
+        def get_decryption_keys_batch(sae_id):
+            """Get several decryption keys in one request (ETSI GS QKD 014 POST dec_keys)"""
+            try:
+                key_ids, error = self._parse_key_id_list(request.get_json(silent=True))
+                if error:
+                    return jsonify({'error': error}), 400
                     
-                # Return the actual key data
-                response = {
-                    'key_id': key.key_id,
-                    'key_data': base64.b64encode(key.key_data).decode('utf-8'),
-                    'length': key.length,
-                    'key_type': key.key_type,
-                    'expires_at': key.expires_at.isoformat()
-                }
+                keys = []
+                errors = []
+                for key_id in key_ids:
+                    key, key_error, status_code = self._resolve_decryption_key(sae_id, key_id)
+                    if key_error:
+                        errors.append({'key_id': key_id, 'error': key_error, 'status': status_code})
+                    else:
+                        keys.append(self._decryption_key_response(key))
+                        
+                logging.info(f"Batch dec_keys for {sae_id}: {len(keys)} retrieved, {len(errors)} failed")
+                return jsonify({
+                    'sae_id': sae_id,
+                    'keys': keys,
+                    'errors': errors
+                })
+                
+            except Exception as e:
+                logging.error(f"Error retrieving key batch: {e}")
+                return jsonify({'error': str(e)}), 500
                 
-                # Mark OTP keys as consumed
-                if key.key_type == 'otp':
-                    key.consumed = True
+        @self.app.route('/api/v1/keys/<sae_id>/consume', methods=['POST'])
+        def consume_keys_batch(sae_id):
+            """Mark several keys as consumed in one request"""
+            try:
+                key_ids, error = self._parse_key_id_list(request.get_json(silent=True))
+                if error:
+                    return jsonify({'error': error}), 400
                     
-                logging.info(f"Key {key_id} retrieved by {sae_id}")
-                return jsonify(response)
+                consumed = []
+                errors = []
+                for key_id in key_ids:
+                    key = self.keys.get(key_id)
+                    if not key:
+                        errors.append({'key_id': key_id, 'error': 'Key not found', 'status': 404})
+                    elif key.receiver_sae_id != sae_id and key.sender_sae_id != sae_id:
+                        errors.append({'key_id': key_id, 'error': 'Access denied', 'status': 403})
+                    else:
+                        self._consume_key(key)
+                        consumed.append(key_id)
+                        
+                return jsonify({
+                    'status': 'keys consumed',
+                    'consumed': consumed,
+                    'errors': errors
+                })
                 
             except Exception as e:
-                logging.error(f"Error retrieving key: {e}")
+                logging.error(f"Error consuming key batch: {e}")
                 return jsonify({'error': str(e)}), 500
                 
         @self.app.route('/api/v1/keys/<sae_id>/<key_id>', methods=['DELETE'])
@@ -210,7 +483,7 @@ class KMESimulator:
                     return jsonify({'error': 'Access denied'}), 403
                     
                 # Mark as consumed
-                key.consumed = True
+                self._consume_key(key)
                 
                 return jsonify({'status': 'key consumed'})
                 
@@ -220,14 +493,43 @@ class KMESimulator:
         
         @self.app.route('/api/v1/keys/<sae_id>/available', methods=['GET'])
         def get_available_keys(sae_id):
-            """Get list of available keys for SAE"""
+            """Get a page of available keys for SAE (limit + opaque cursor)
+            
+            With count_only=true only the counts are returned, so pollers get
+            pool sizes without downloading every key descriptor.
+            """
             try:
-                sae_keys = self.sae_keys.get(sae_id, [])
-                available_keys = []
+                sae_keys = self._sae_key_list(sae_id)
+                current_time = datetime.utcnow()
                 
-                for key_id in sae_keys:
-                    key = self.keys.get(key_id)
-                    if key and not key.consumed and datetime.utcnow() <= key.expires_at:
+                if request.args.get('count_only', '').lower() in ('1', 'true', 'yes'):
+                    available = sum(1 for key in sae_keys
+                                    if not key.consumed and current_time <= key.expires_at)
+                    return jsonify({
+                        'sae_id': sae_id,
+                        'count': available,
+                        'total_keys': len(sae_keys),
+                        'consumed_keys': sum(1 for key in sae_keys if key.consumed)
+                    })
+                    
+                limit = request.args.get('limit', self.default_page_size, type=int)
+                if not 0 < limit <= self.max_keys_per_request:
+                    return jsonify({'error': f'limit must be between 1 and {self.max_keys_per_request}'}), 400
+                    
+                after = self._decode_cursor(request.args.get('cursor'))
+                if after is None:
+                    return jsonify({'error': 'Invalid cursor'}), 400
+                    
+                # Resume after the last key listed, so keys removed by cleanup or
+                # slot reuse in between do not shift the page boundary
+                sae_keys.sort(key=lambda key: (key.created_at, key.key_id))
+                position = bisect.bisect_right([(key.created_at, key.key_id) for key in sae_keys], after)
+                
+                available_keys = []
+                while position < len(sae_keys) and len(available_keys) < limit:
+                    key = sae_keys[position]
+                    position += 1
+                    if not key.consumed and current_time <= key.expires_at:
                         available_keys.append({
                             'key_id': key.key_id,
                             'length': key.length,
@@ -239,22 +541,135 @@ class KMESimulator:
                 return jsonify({
                     'sae_id': sae_id,
                     'available_keys': available_keys,
-                    'count': len(available_keys)
+                    'count': len(available_keys),
+                    'next_cursor': self._encode_cursor(sae_keys[position - 1]) if position < len(sae_keys) else None
                 })
                 
             except Exception as e:
                 logging.error(f"Error getting available keys: {e}")
                 return jsonify({'error': str(e)}), 500
                 
+    def _resolve_decryption_key(self, sae_id: str, key_id: str):
+        """Validate a decryption key request, returning (key, error, status_code)"""
+        # Check if key exists
+        if key_id not in self.keys:
+            return None, 'Key not found', 404
+            
+        key = self.keys[key_id]
+        
+        # Validate SAE access
+        if key.receiver_sae_id != sae_id and key.sender_sae_id != sae_id:
+            return None, 'Access denied', 403
+            
+        # Check if key is expired
+        if datetime.utcnow() > key.expires_at:
+            return None, 'Key expired', 410
+            
+        # Mark OTP keys as consumed, rejecting keys that already were
+        if key.key_type == 'otp' and not self._consume_key(key):
+            return None, 'Key already consumed', 410
+            
+        return key, None, 200
+        
+    def _resolve_stream_key(self, sae_id: str, key_id: str):
+        """Validate a key stream request, returning (key, error, status_code)
+        
+        The sender SAE may stream an OTP key to encrypt with it; the OTP is only
+        consumed when the receiver streams it for decryption.
+        """
+        key = self.keys.get(key_id)
+        if key and key.key_type == 'otp' and key.sender_sae_id == sae_id and key.receiver_sae_id != sae_id:
+            if datetime.utcnow() > key.expires_at:
+                return None, 'Key expired', 410
+            if key.consumed:
+                return None, 'Key already consumed', 410
+            return key, None, 200
+            
+        return self._resolve_decryption_key(sae_id, key_id)
+        
+    def _encode_cursor(self, key: QuantumKey) -> str:
+        """Encode the (created_at, key_id) of the last listed key as an opaque pagination cursor"""
+        position = {'t': key.created_at.isoformat(), 'k': key.key_id}
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+        
+    def _decode_cursor(self, cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+        """Decode a pagination cursor, returning None if it is malformed"""
+        if not cursor:
+            return (datetime.min, '')
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if not isinstance(position['k'], str):
+                return None
+            return (datetime.fromisoformat(position['t']), position['k'])
+        except (ValueError, KeyError, TypeError):
+            return None
+            
+    def _store_key(self, key: QuantumKey):
+        """Store a generated key and index it under both SAEs"""
+        self.keys[key.key_id] = key
+        
+        for sae_id in (key.sender_sae_id, key.receiver_sae_id):
+            if sae_id not in self.sae_keys:
+                self.sae_keys[sae_id] = []
+            self.sae_keys[sae_id].append(key.key_id)
+            
+    def _sae_key_list(self, sae_id: str) -> List[QuantumKey]:
+        """Get the stored keys shared with an SAE"""
+        return [self.keys[key_id] for key_id in self.sae_keys.get(sae_id, [])
+                if key_id in self.keys]
+        
+    def _consume_key(self, key: QuantumKey) -> bool:
+        """Mark a key consumed, returning False if it already was"""
+        if key.consumed:
+            return False
+        key.consumed = True
+        return True
+        
+    def _decryption_key_response(self, key: QuantumKey) -> Dict:
+        """Build the dec_keys response entry for a key (includes key material)"""
+        return {
+            'key_id': key.key_id,
+            'key_data': base64.b64encode(key.key_data).decode('utf-8'),
+            'length': key.length,
+            'key_type': key.key_type,
+            'expires_at': key.expires_at.isoformat()
+        }
+        
+    def _parse_key_id_list(self, data: Optional[Dict]):
+        """Parse an ETSI style key_IDs list, returning (key_ids, error)"""
+        if not data or not isinstance(data.get('key_IDs'), list):
+            return None, 'Request body must contain a key_IDs list'
+            
+        key_ids = []
+        seen = set()
+        for entry in data['key_IDs']:
+            # Accept ETSI {"key_ID": ...} objects as well as bare key ID strings
+            key_id = (entry.get('key_ID') or entry.get('key_id')) if isinstance(entry, dict) else entry
+            if not isinstance(key_id, str) or not key_id:
+                return None, 'Invalid key_ID entry'
+            if key_id not in seen:
+                seen.add(key_id)
+                key_ids.append(key_id)
+                
+        if len(key_ids) > self.max_keys_per_request:
+            return None, f'Too many key IDs (maximum {self.max_keys_per_request})'
+            
+        return key_ids, None
+        
     def _generate_quantum_key(self, sender_sae_id: str, receiver_sae_id: str, 
                              length_bits: int, key_type: str) -> QuantumKey:
         """Generate a quantum key"""
         # Generate cryptographically secure random key data
         key_length_bytes = (length_bits + 7) // 8  # Convert to bytes, round up
-        key_data = secrets.token_bytes(key_length_bytes)
         
-        # Generate unique key ID
-        key_id = f"QK_{secrets.token_hex(16)}"
+        if self.entropy_reservoir:
+            # One slice covers both the key material and the 128-bit key ID
+            entropy = self.entropy_reservoir.take(key_length_bytes + 16)
+            key_data = entropy[:key_length_bytes]
+            key_id = f"QK_{entropy[key_length_bytes:].hex()}"
+        else:
+            key_data = secrets.token_bytes(key_length_bytes)
+            key_id = f"QK_{secrets.token_hex(16)}"
         
         # Calculate expiration time
         expires_at = datetime.utcnow() + self.max_key_lifetime
@@ -286,6 +701,7 @@ class KMESimulator:
             
         if expired_keys:
             logging.info(f"Cleaned up {len(expired_keys)} expired keys")
+        return len(expired_keys)
             
     async def start(self):
         """Start the KME simulator"""
@@ -306,21 +722,24 @@ class KMESimulator:
         self.flask_thread.daemon = True
         self.flask_thread.start()
         
-        # Start cleanup task
-        asyncio.create_task(self._cleanup_task())
+        # Expired key cleanup every 5 minutes on the background scheduler
+        self.cleanup_task = get_scheduler().add('kme_simulator.cleanup', self._scheduled_cleanup, 300)
         
         logging.info(f"KME Simulator started on http://{self.host}:{self.port}")
         
     async def stop(self):
         """Stop the KME simulator"""
         self.running = False
+        if self.cleanup_task:
+            self.cleanup_task.cancel()
+            self.cleanup_task = None
+        if self.entropy_reservoir:
+            self.entropy_reservoir.stop()
         logging.info("KME Simulator stopped")
         
-    async def _cleanup_task(self):
-        """Background task to cleanup expired keys"""
-        while self.running:
-            await asyncio.sleep(300)  # Run every 5 minutes
-            self.cleanup_expired_keys()
+    def _scheduled_cleanup(self):
+        """Periodic expired key cleanup (IDLE when nothing had expired)"""
+        return self.cleanup_expired_keys() or IDLE
             
     def get_stats(self) -> Dict:
         """Get simulator statistics"""
@@ -333,5 +752,6 @@ class KMESimulator:
             'consumed_keys': sum(1 for key in self.keys.values() if key.consumed),
             'sae_count': len(self.sae_keys),
             'qkd_rate': self.qkd_rate,
-            'uptime': 'simulated'
+            'uptime': 'simulated',
+            'entropy_reservoir': self.entropy_reservoir.get_stats() if self.entropy_reservoir else None
         }
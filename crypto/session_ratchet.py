@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Session Ratchet - KME-seeded symmetric key ratchet for per-peer sessions
+
+Instead of one KME key per message, a peer session draws one quantum seed key
+from the KME and runs it through an HKDF chain: every step derives the next
+chain key plus a one-message key and overwrites the old chain key, so a
+compromised chain cannot recover earlier message keys (forward secrecy).
+Senders re-seed from the KME every `reseed_messages` messages or
+`reseed_seconds` seconds; the envelope carries the seed `key_id` and the
+chain index. Receivers advance their chain to the index, keeping keys for
+skipped indices in a bounded cache so out-of-order messages still decrypt.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+CHAIN_KEY_BYTES = 32
+MESSAGE_KEY_BYTES = 64  # enough seed material for L2 (256 bit) and L3 (512 bit)
+
+def _hkdf(material: bytes, length: int, info: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=None, info=info).derive(material)
+
+def initial_chain_key(seed: bytes, key_id: str) -> bytes:
+    """Chain key 0 for a KME seed, bound to the seed's key ID"""
+    return _hkdf(seed, CHAIN_KEY_BYTES, b'QuMail ratchet chain|' + key_id.encode('utf-8'))
+
+def ratchet_step(chain_key: bytes) -> Tuple[bytes, bytes]:
+    """Return (next chain key, message key) for one chain step"""
+    material = _hkdf(chain_key, CHAIN_KEY_BYTES + MESSAGE_KEY_BYTES, b'QuMail ratchet step')
+    return material[:CHAIN_KEY_BYTES], material[CHAIN_KEY_BYTES:]
+
+def derive_message_key(seed: bytes, key_id: str, index: int) -> bytes:
+    """Message key `index` straight from the seed (re-reads once the chain has moved past it)"""
+    chain_key = initial_chain_key(seed, key_id)
+    for _ in range(index):
+        chain_key, _ = ratchet_step(chain_key)
+    return ratchet_step(chain_key)[1]
+
+@dataclass
+class SendingChain:
+    """Our side of a peer session: the current seed and next chain position"""
+    key_id: str
+    chain_key: bytes
+    index: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+@dataclass
+class ReceivingChain:
+    """A peer's chain for one seed, advanced as far as the newest message seen"""
+    chain_key: bytes
+    next_index: int = 0
+
+class SessionRatchet:
+    """Per-peer sending chains and per-seed receiving chains with a skipped-key cache"""
+    
+    def __init__(self, reseed_messages: int = 100, reseed_seconds: float = 600.0,
+                 max_skip: int = 1000, max_skipped_keys: int = 2000):
+        self.reseed_messages = reseed_messages
+        self.reseed_seconds = reseed_seconds
+        self.max_skip = max_skip  # furthest a single message may jump ahead in a chain
+        self.max_skipped_keys = max_skipped_keys
+        
+        self.sending: Dict[str, SendingChain] = {}
+        self.receiving: Dict[str, ReceivingChain] = {}
+        self.skipped: 'OrderedDict[Tuple[str, int], bytes]' = OrderedDict()
+        self.stats = {
+            'seeds': 0,
+            'message_keys_sent': 0,
+            'message_keys_received': 0,
+            'skipped_keys_used': 0,
+            'skipped_keys_evicted': 0,
+            'seed_rederivations': 0
+        }
+        
+    @classmethod
+    def from_config(cls, config: Dict) -> 'SessionRatchet':
+        return cls(
+            reseed_messages=config.get('ratchet_reseed_messages', 100),
+            reseed_seconds=config.get('ratchet_reseed_seconds', 600.0),
+            max_skipped_keys=config.get('ratchet_max_skipped_keys', 2000)
+        )
+        
+    def needs_seed(self, peer: str) -> bool:
+        """True when peer has no chain yet or its chain is due for a KME re-seed"""
+        chain = self.sending.get(peer)
+        if chain is None:
+            return True
+        return (chain.index >= self.reseed_messages or
+                time.monotonic() - chain.created_at >= self.reseed_seconds)
+                
+    def seed_sending_chain(self, peer: str, key_id: str, seed: bytes):
+        """Start a fresh chain for peer from a KME seed key"""
+        self.sending[peer] = SendingChain(key_id, initial_chain_key(seed, key_id))
+        self.stats['seeds'] += 1
+        logging.debug(f"Session ratchet for {peer} seeded with {key_id}")
+        
+    def next_sending_key(self, peer: str) -> Tuple[str, int, bytes]:
+        """Return (seed key_id, chain index, message key) and advance peer's chain"""
+        chain = self.sending[peer]
+        chain.chain_key, message_key = ratchet_step(chain.chain_key)
+        index = chain.index
+        chain.index += 1
+        self.stats['message_keys_sent'] += 1
+        return chain.key_id, index, message_key
+        
+    def has_receiving_chain(self, key_id: str) -> bool:
+        return key_id in self.receiving
+        
+    def receive_key(self, key_id: str, index: int, seed: Optional[bytes] = None) -> Optional[bytes]:
+        """Message key for (key_id, index), or None when the seed is needed
+        
+        Indices ahead of the chain advance it, caching the keys skipped on the
+        way; indices behind it come from the skipped-key cache. Without either,
+        the key is re-derived from `seed` when given (e.g. re-opening an email).
+        """
+        if index < 0:
+            raise ValueError(f"Invalid ratchet index {index}")
+            
+        message_key = self.skipped.pop((key_id, index), None)
+        if message_key is not None:
+            self.stats['skipped_keys_used'] += 1
+            self.stats['message_keys_received'] += 1
+            return message_key
+            
+        chain = self.receiving.get(key_id)
+        if chain is None:
+            if seed is None:
+                return None
+            chain = self.receiving[key_id] = ReceivingChain(initial_chain_key(seed, key_id))
+            
+        if index < chain.next_index:
+            # Already consumed or evicted: only the seed can reproduce it
+            if seed is None:
+                return None
+            if index > self.max_skip:
+                raise ValueError(f"Ratchet index {index} exceeds the re-derivation limit")
+            self.stats['seed_rederivations'] += 1
+            return derive_message_key(seed, key_id, index)
+            
+        if index - chain.next_index > self.max_skip:
+            raise ValueError(f"Ratchet index {index} is too far ahead of chain position {chain.next_index}")
+            
+        while chain.next_index < index:
+            chain.chain_key, skipped_key = ratchet_step(chain.chain_key)
+            self._store_skipped(key_id, chain.next_index, skipped_key)
+            chain.next_index += 1
+            
+        chain.chain_key, message_key = ratchet_step(chain.chain_key)
+        chain.next_index += 1
+        self.stats['message_keys_received'] += 1
+        return message_key
+        
+    def _store_skipped(self, key_id: str, index: int, message_key: bytes):
+        self.skipped[(key_id, index)] = message_key
+        while len(self.skipped) > self.max_skipped_keys:
+            self.skipped.popitem(last=False)
+            self.stats['skipped_keys_evicted'] += 1
+            
+    def clear(self):
+        """Drop all chains and cached keys (logout)"""
+        self.sending.clear()
+        self.receiving.clear()
+        self.skipped.clear()
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'sending_chains': len(self.sending),
+            'receiving_chains': len(self.receiving),
+            'skipped_keys': len(self.skipped),
+            'reseed_messages': self.reseed_messages,
+            'reseed_seconds': self.reseed_seconds
+        })
+        return stats
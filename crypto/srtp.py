@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+SRTP Engine - Batched AES_CM_128_HMAC_SHA1_80 protect/unprotect for call media
+
+Implements the RFC 3711 default profile: AES counter mode over the RTP
+payload, HMAC-SHA1 over header + ciphertext + ROC truncated to 80 bits, and a
+sliding replay window per SSRC. A 4-byte MKI names the master key (seed index
+and epoch from the call's key schedule, see srtp_keys) so both sides can rekey
+mid-call.
+
+Per-packet cipher objects dominate the cost of small audio packets in Python,
+so packets are handled in batches: one reused AES-ECB context encrypts the
+counter blocks of the whole batch into a preallocated buffer, the keystream
+is XORed in one big-integer operation, and HMAC contexts are copied from a
+pre-keyed template instead of re-keyed per packet.
+"""
+
+import hashlib
+import hmac
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+RTP_HEADER = struct.Struct('>BBHII')  # V/P/X/CC, M/PT, sequence, timestamp, SSRC
+MKI = struct.Struct('>I')
+AUTH_TAG_BYTES = 10
+MKI_BYTES = MKI.size
+REPLAY_WINDOW = 64
+
+def _aes_cm_prf(master_key: bytes, master_salt: bytes, label: int, length: int) -> bytes:
+    """RFC 3711 4.3.1 key derivation (key_derivation_rate 0)"""
+    x = int.from_bytes(master_salt, 'big') ^ (label << 48)
+    iv = (x << 16).to_bytes(16, 'big')
+    return Cipher(algorithms.AES(master_key), modes.CTR(iv)).encryptor().update(bytes(length))
+
+def derive_session_keys(master_key: bytes, master_salt: bytes) -> Tuple[bytes, bytes, bytes]:
+    """(cipher key, auth key, cipher salt) for AES_CM_128_HMAC_SHA1_80"""
+    return (_aes_cm_prf(master_key, master_salt, 0x00, 16),
+            _aes_cm_prf(master_key, master_salt, 0x01, 20),
+            _aes_cm_prf(master_key, master_salt, 0x02, 14))
+
+def rtp_header_length(packet: bytes) -> int:
+    """Length of the RTP header including CSRCs and any header extension"""
+    length = 12 + 4 * (packet[0] & 0x0F)
+    if packet[0] & 0x10:
+        length += 4 + 4 * int.from_bytes(packet[length + 2:length + 4], 'big')
+    if length > len(packet):
+        raise ValueError("Truncated RTP header")
+    return length
+
+class ReplayWindow:
+    """RFC 3711 3.3.2 sliding window over 48-bit packet indices"""
+    
+    __slots__ = ('size', 'highest', 'bitmap')
+    
+    def __init__(self, size: int = REPLAY_WINDOW):
+        self.size = size
+        self.highest = -1
+        self.bitmap = 0  # bit n set: index highest - n already seen
+        
+    def check(self, index: int) -> bool:
+        """True if index is new and not too old"""
+        if index > self.highest:
+            return True
+        delta = self.highest - index
+        return delta < self.size and not (self.bitmap >> delta) & 1
+        
+    def update(self, index: int):
+        if index > self.highest:
+            shift = index - self.highest
+            self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.size) - 1) if shift < self.size else 1
+            self.highest = index
+        else:
+            self.bitmap |= 1 << (self.highest - index)
+
+@dataclass
+class StreamState:
+    """Per-SSRC rollover counter, highest sequence seen and replay window"""
+    roc: int = 0
+    last_seq: Optional[int] = None
+    replay: ReplayWindow = field(default_factory=ReplayWindow)
+
+class SRTPContext:
+    """Session keys of one master key with their reusable cipher and HMAC contexts"""
+    
+    def __init__(self, key_index: int, master_key: bytes, master_salt: bytes):
+        cipher_key, auth_key, salt = derive_session_keys(master_key, master_salt)
+        self.key_index = key_index
+        self.mki = MKI.pack(key_index)
+        self.salt = int.from_bytes(salt, 'big') << 16
+        self.keystream = Cipher(algorithms.AES(cipher_key), modes.ECB()).encryptor()
+        # HMAC-SHA1 (RFC 2104) with the padded key already absorbed; tags copy these
+        block_key = auth_key.ljust(64, b'\x00')
+        self.inner = hashlib.sha1(bytes(byte ^ 0x36 for byte in block_key))
+        self.outer = hashlib.sha1(bytes(byte ^ 0x5C for byte in block_key))
+        
+    def tag(self, authenticated: bytes, roc: int) -> bytes:
+        inner = self.inner.copy()
+        inner.update(authenticated)
+        inner.update(roc.to_bytes(4, 'big'))
+        outer = self.outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()[:AUTH_TAG_BYTES]
+
+class SRTPSession:
+    """Protects outgoing and unprotects incoming RTP packets of one call in batches"""
+    
+    def __init__(self, max_epochs: int = 3, batch_size: int = 64):
+        self.max_epochs = max_epochs  # master keys kept for packets still in flight after a rekey
+        self.batch_size = batch_size
+        self.contexts: Dict[int, SRTPContext] = {}
+        self.send_context: Optional[SRTPContext] = None
+        self.send_streams: Dict[int, StreamState] = {}
+        self.recv_streams: Dict[int, StreamState] = {}
+        
+        self._counter_tails: Dict[int, Tuple[bytes, bytes]] = {}  # blocks per packet -> (high, low) counter bytes
+        self._buffer = bytearray(16 * 64 * 16)  # keystream buffer, grown to the largest batch seen
+        self.stats = {
+            'protected': 0,
+            'unprotected': 0,
+            'auth_failures': 0,
+            'replayed': 0,
+            'unknown_mki': 0,
+            'malformed': 0,
+            'rekeys': 0
+        }
+        
+    def install_key(self, mki: int, master_key: bytes, master_salt: bytes, send: bool = True):
+        """Add the master key named by mki; with send, outgoing packets switch to it"""
+        context = self.contexts.get(mki)
+        if context is None:
+            context = self.contexts[mki] = SRTPContext(mki, master_key, master_salt)
+            for stale in list(self.contexts)[:-self.max_epochs]:  # oldest installed first
+                del self.contexts[stale]
+        if send and self.send_context is not context:
+            if self.send_context is not None:
+                self.stats['rekeys'] += 1
+            self.send_context = context
+            
+    def _keystream(self, context: SRTPContext, ivs: List[int], lengths: List[int]) -> int:
+        """AES-CM keystream for a batch as one integer (little-endian, packets back to back in 16-byte blocks)"""
+        counters = []
+        high = []
+        low = []
+        for iv, length in zip(ivs, lengths):
+            blocks = (length + 15) // 16
+            counters.append(iv.to_bytes(16, 'big') * blocks)
+            tail = self._counter_tails.get(blocks)
+            if tail is None:
+                tail = self._counter_tails[blocks] = (bytes(i >> 8 for i in range(blocks)),
+                                                      bytes(i & 0xFF for i in range(blocks)))
+            high.append(tail[0])
+            low.append(tail[1])
+        # IVs end in 16 zero bits, so the per-packet block counter is written straight into them
+        counter_blocks = bytearray(b''.join(counters))
+        counter_blocks[14::16] = b''.join(high)
+        counter_blocks[15::16] = b''.join(low)
+        size = len(counter_blocks)
+        if len(self._buffer) < size + 15:
+            self._buffer = bytearray(size + 15)
+        written = context.keystream.update_into(counter_blocks, self._buffer)
+        return int.from_bytes(memoryview(self._buffer)[:written], 'little')
+        
+    def _apply_keystream(self, context: SRTPContext, ivs: List[int], payloads: List[bytes]) -> List[bytes]:
+        lengths = [len(payload) for payload in payloads]
+        keystream = self._keystream(context, ivs, lengths)
+        padded = b''.join(payload + bytes(-len(payload) % 16) for payload in payloads)
+        mixed = (int.from_bytes(padded, 'little') ^ keystream).to_bytes(len(padded), 'little')
+        output = []
+        offset = 0
+        for length in lengths:
+            output.append(mixed[offset:offset + length])
+            offset += (length + 15) // 16 * 16
+        return output
+        
+    def protect_batch(self, packets: List[bytes]) -> List[bytes]:
+        """Encrypt and authenticate RTP packets with the current send key"""
+        context = self.send_context
+        if context is None:
+            raise ValueError("No SRTP key installed")
+            
+        results: List[bytes] = []
+        for start in range(0, len(packets), self.batch_size):
+            batch = packets[start:start + self.batch_size]
+            headers, payloads, ivs, rocs = [], [], [], []
+            for packet in batch:
+                _, _, seq, _, ssrc = RTP_HEADER.unpack_from(packet)
+                header_length = rtp_header_length(packet)
+                stream = self.send_streams.get(ssrc)
+                if stream is None:
+                    stream = self.send_streams[ssrc] = StreamState()
+                elif seq < stream.last_seq and stream.last_seq - seq > 0x8000:
+                    stream.roc = (stream.roc + 1) & 0xFFFFFFFF  # sequence number wrapped
+                stream.last_seq = seq
+                index = (stream.roc << 16) | seq
+                headers.append(packet[:header_length])
+                payloads.append(packet[header_length:])
+                ivs.append(context.salt ^ (ssrc << 64) ^ (index << 16))
+                rocs.append(stream.roc)
+                
+            for header, encrypted, roc in zip(headers, self._apply_keystream(context, ivs, payloads), rocs):
+                authenticated = header + encrypted
+                results.append(authenticated + context.mki + context.tag(authenticated, roc))
+                
+        self.stats['protected'] += len(packets)
+        return results
+        
+    def _estimate_index(self, stream: StreamState, seq: int) -> Tuple[int, int]:
+        """RFC 3711 3.3.1: guess the ROC for a received sequence number"""
+        if stream.last_seq is None:
+            return stream.roc, seq
+        roc = stream.roc
+        if stream.last_seq < 0x8000:
+            if seq - stream.last_seq > 0x8000:
+                roc = (roc - 1) & 0xFFFFFFFF
+        elif stream.last_seq - 0x8000 > seq:
+            roc = (roc + 1) & 0xFFFFFFFF
+        return roc, (roc << 16) | seq
+        
+    def unprotect_batch(self, packets: List[bytes]) -> List[Optional[bytes]]:
+        """Verify and decrypt SRTP packets; None marks a rejected packet"""
+        results: List[Optional[bytes]] = [None] * len(packets)
+        for start in range(0, len(packets), self.batch_size):
+            # Authenticate first, grouping survivors by MKI for batched decryption
+            groups: Dict[int, List[Tuple[int, bytes, bytes, int, StreamState, int, int, int]]] = {}
+            for position in range(start, min(start + self.batch_size, len(packets))):
+                packet = packets[position]
+                try:
+                    _, _, seq, _, ssrc = RTP_HEADER.unpack_from(packet)
+                    header_length = rtp_header_length(packet)
+                    if len(packet) < header_length + MKI_BYTES + AUTH_TAG_BYTES:
+                        raise ValueError("Truncated SRTP packet")
+                except (struct.error, ValueError, IndexError):
+                    self.stats['malformed'] += 1
+                    continue
+                    
+                authenticated = packet[:-(MKI_BYTES + AUTH_TAG_BYTES)]
+                mki = MKI.unpack_from(packet, len(authenticated))[0]
+                context = self.contexts.get(mki)
+                if context is None:
+                    self.stats['unknown_mki'] += 1
+                    continue
+                    
+                stream = self.recv_streams.get(ssrc)
+                if stream is None:
+                    stream = self.recv_streams[ssrc] = StreamState()
+                roc, index = self._estimate_index(stream, seq)
+                if not stream.replay.check(index):
+                    self.stats['replayed'] += 1
+                    continue
+                if not hmac.compare_digest(context.tag(authenticated, roc), packet[-AUTH_TAG_BYTES:]):
+                    self.stats['auth_failures'] += 1
+                    continue
+                    
+                groups.setdefault(mki, []).append(
+                    (position, authenticated[:header_length], authenticated[header_length:],
+                     context.salt ^ (ssrc << 64) ^ (index << 16), stream, index, roc, seq)
+                )
+                
+            for mki, entries in groups.items():
+                plaintexts = self._apply_keystream(self.contexts[mki], [entry[3] for entry in entries],
+                                                   [entry[2] for entry in entries])
+                for (position, header, _, _, stream, index, roc, seq), payload in zip(entries, plaintexts):
+                    if not stream.replay.check(index):  # duplicate within the same batch
+                        self.stats['replayed'] += 1
+                        continue
+                    stream.replay.update(index)
+                    if stream.last_seq is None or index >= (stream.roc << 16 | stream.last_seq):
+                        stream.roc, stream.last_seq = roc, seq
+                    results[position] = header + payload
+                    self.stats['unprotected'] += 1
+                    
+        return results
+        
+    def protect(self, packet: bytes) -> bytes:
+        return self.protect_batch([packet])[0]
+        
+    def unprotect(self, packet: bytes) -> Optional[bytes]:
+        return self.unprotect_batch([packet])[0]
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'send_mki': self.send_context.key_index if self.send_context else None,
+            'mkis': list(self.contexts),
+            'streams': len(self.recv_streams)
+        })
+        return stats
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+SRTP Key Schedule - Per-call SRTP master keys derived from quantum seeds
+
+A call draws one seed key from the KME up front. SRTP master key and salt
+(AES_CM_128_HMAC_SHA1_80: 128-bit key, 112-bit salt) are HKDF-derived per
+epoch from that seed, so mid-call rekeys are local and never wait on the KME.
+After `epochs_per_seed` epochs the schedule moves to a fresh KME seed, which
+is requested in the background `prefetch_lead` seconds before it is needed;
+if it is late, epochs keep deriving from the previous seed rather than stall
+the media path.
+
+Peers agree on keys through (seed key_id, epoch): the receiver fetches the
+seed by key_id once and derives any epoch locally. Packets name their key by
+MKI = seed index << 24 | epoch, where the seed index is the seed's position in
+the call's seed order, so an epoch the sender derived from the previous seed
+because the next one was late still resolves to the right seed on receive.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+SRTP_MASTER_KEY_BYTES = 16
+SRTP_MASTER_SALT_BYTES = 14
+SRTP_PROFILE = 'AES_CM_128_HMAC_SHA1_80'
+MKI_EPOCH_BITS = 24  # low MKI bits carry the epoch, the high byte the seed index (mod 256)
+
+def derive_epoch_key(seed: bytes, call_id: str, epoch: int) -> Tuple[bytes, bytes]:
+    """(master_key, master_salt) for one epoch of a call"""
+    material = HKDF(
+        algorithm=hashes.SHA256(),
+        length=SRTP_MASTER_KEY_BYTES + SRTP_MASTER_SALT_BYTES,
+        salt=call_id.encode('utf-8'),
+        info=b'QuMail SRTP epoch %d' % epoch
+    ).derive(seed)
+    return material[:SRTP_MASTER_KEY_BYTES], material[SRTP_MASTER_KEY_BYTES:]
+
+@dataclass
+class SRTPMasterKey:
+    """SRTP master key material for one epoch"""
+    call_id: str
+    epoch: int
+    key_id: str  # KME seed the epoch derives from
+    master_key: bytes
+    master_salt: bytes
+    expires_at: float  # schedule clock time the epoch ends
+    seed_index: int = 0  # position of key_id in the call's seed order
+    
+    @property
+    def mki(self) -> int:
+        """SRTP MKI naming this key: seed index and epoch"""
+        return (self.seed_index & 0xFF) << MKI_EPOCH_BITS | self.epoch & ((1 << MKI_EPOCH_BITS) - 1)
+
+class CallKeySchedule:
+    """Epoch-based SRTP master keys for one call with prefetched KME re-seeding"""
+    
+    def __init__(self, call_id: str, seed_provider: Optional[Callable[[], Awaitable[Optional[Dict]]]] = None,
+                 epoch_seconds: float = 60.0, epochs_per_seed: int = 10, prefetch_lead: float = 15.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.call_id = call_id
+        self.seed_provider = seed_provider  # async () -> {'key_id', 'key_data'}; None on the receiving side
+        self.epoch_seconds = epoch_seconds
+        self.epochs_per_seed = epochs_per_seed
+        self.prefetch_lead = prefetch_lead
+        self.clock = clock
+        
+        self.started_at: Optional[float] = None
+        self.seeds: Dict[str, bytes] = {}  # key_id -> seed
+        self.seed_order: List[str] = []  # key_ids in use order
+        self._prefetch: Optional[asyncio.Task] = None
+        self._prefetch_retry_at = 0.0
+        self._late_seed: Optional[int] = None
+        self._epoch_cache: Dict[Tuple[str, int], SRTPMasterKey] = {}
+        self.stats = {
+            'seed_requests': 0,
+            'seed_failures': 0,
+            'late_seeds': 0,
+            'epoch_keys_derived': 0
+        }
+        
+    async def start(self) -> Optional[SRTPMasterKey]:
+        """Fetch the call's first seed (the only KME round trip on the call setup path)"""
+        seed = await self._request_seed()
+        if not seed:
+            return None
+        self.started_at = self.clock()
+        self.seed_order.append(seed['key_id'])
+        return self.current()
+        
+    async def _request_seed(self) -> Optional[Dict]:
+        self.stats['seed_requests'] += 1
+        try:
+            seed = await self.seed_provider()
+        except Exception as e:
+            logging.error(f"SRTP seed request for {self.call_id} failed: {e}")
+            seed = None
+        if not seed:
+            self.stats['seed_failures'] += 1
+            return None
+        self.seeds[seed['key_id']] = seed['key_data']
+        return seed
+        
+    def epoch_at(self, now: Optional[float] = None) -> int:
+        now = self.clock() if now is None else now
+        return max(0, int((now - self.started_at) // self.epoch_seconds))
+        
+    def current(self) -> SRTPMasterKey:
+        """Master key for the current epoch; never blocks (may schedule a seed prefetch)"""
+        now = self.clock()
+        epoch = self.epoch_at(now)
+        seed_index = epoch // self.epochs_per_seed
+        
+        # Switch to the next seed when its first epoch arrives, if it has been fetched
+        if seed_index >= len(self.seed_order):
+            if self._prefetch is not None and self._prefetch.done():
+                seed = self._prefetch.result()
+                self._prefetch = None
+                if seed:
+                    self.seed_order.append(seed['key_id'])
+                else:
+                    self._prefetch_retry_at = now + min(self.prefetch_lead, self.epoch_seconds)
+            if seed_index >= len(self.seed_order) and self._late_seed != len(self.seed_order):
+                self._late_seed = len(self.seed_order)
+                self.stats['late_seeds'] += 1
+                logging.warning(f"SRTP seed for call {self.call_id} not ready at epoch {epoch}; staying on current seed")
+                
+        # Prefetch the next seed ahead of the epoch that needs it
+        next_seed_start = self.started_at + len(self.seed_order) * self.epochs_per_seed * self.epoch_seconds
+        if (self.seed_provider and self._prefetch is None and now >= self._prefetch_retry_at and
+                next_seed_start - now <= self.prefetch_lead):
+            self._prefetch = asyncio.ensure_future(self._request_seed())
+            
+        key = self.key_for(self.seed_order[-1], epoch)
+        key.expires_at = self.started_at + (epoch + 1) * self.epoch_seconds
+        return key
+        
+    def install_seed(self, key_id: str, seed: bytes):
+        """Receiving side: register a seed fetched from the KME by key_id (in the sender's seed order)"""
+        self.seeds[key_id] = seed
+        if key_id not in self.seed_order:
+            self.seed_order.append(key_id)
+            
+    def key_for_mki(self, mki: int) -> Optional[SRTPMasterKey]:
+        """Receiving side: master key named by a packet's MKI, or None if its seed is not installed"""
+        seed_index = mki >> MKI_EPOCH_BITS
+        epoch = mki & ((1 << MKI_EPOCH_BITS) - 1)
+        # The MKI keeps the seed index mod 256: take the latest seed with that index
+        for index in range(len(self.seed_order) - 1, -1, -1):
+            if index & 0xFF == seed_index:
+                return self.key_for(self.seed_order[index], epoch)
+        return None
+        
+    def key_for(self, key_id: str, epoch: int) -> SRTPMasterKey:
+        """Master key for (seed key_id, epoch); the seed must already be known"""
+        cached = self._epoch_cache.get((key_id, epoch))
+        if cached is None:
+            master_key, master_salt = derive_epoch_key(self.seeds[key_id], self.call_id, epoch)
+            seed_index = self.seed_order.index(key_id) if key_id in self.seed_order else 0
+            cached = SRTPMasterKey(self.call_id, epoch, key_id, master_key, master_salt, 0.0, seed_index)
+            self._epoch_cache[(key_id, epoch)] = cached
+            self.stats['epoch_keys_derived'] += 1
+            # Epochs only move forward; old ones are kept briefly for late packets
+            for stale in [k for k in self._epoch_cache if k[1] < epoch - 1]:
+                del self._epoch_cache[stale]
+        return cached
+        
+    def close(self):
+        """End of call: cancel any prefetch and forget seed material"""
+        if self._prefetch is not None and not self._prefetch.done():
+            self._prefetch.cancel()
+        self._prefetch = None
+        self.seeds.clear()
+        self._epoch_cache.clear()
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'call_id': self.call_id,
+            'seeds_used': len(self.seed_order),
+            'current_epoch': self.epoch_at() if self.started_at is not None else None,
+            'prefetch_pending': self._prefetch is not None and not self._prefetch.done()
+        })
+        return stats
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+QuMail Headless Service
+
+Runs the QuMail core without the GUI: one asyncio loop serving the JSON-RPC
+API (see service/rpc_server.py) on a Unix socket for any number of
+concurrent user sessions. Start with `python -m qumail.daemon`.
+"""
+
+import sys
+import asyncio
+import signal
+import logging
+import argparse
+
+from .service import JSONRPCServer, SessionManager
+from .utils.config import load_config
+from .utils.logger import setup_logging
+from .utils.scheduler import IDLE, get_scheduler
+
+async def reap_idle_sessions(sessions: SessionManager):
+    """Close sessions idle past their timeout (IDLE when there are none to check)"""
+    if not sessions.sessions:
+        return IDLE
+    expired = await sessions.reap_idle()
+    if expired:
+        logging.info(f"Closed {expired} idle service sessions")
+    return expired
+
+async def reap_idle_connections(sessions: SessionManager):
+    """Close pooled SMTP/IMAP connections idle past their timeout"""
+    smtp_pool, imap_pool = sessions.smtp_pool, sessions.imap_pool
+    if not (smtp_pool.idle or imap_pool.idle):
+        return IDLE
+    return await smtp_pool.reap_idle() + await imap_pool.reap_idle()
+
+async def serve(config: dict, socket_path: str):
+    """Run the service until SIGINT/SIGTERM"""
+    sessions = SessionManager.from_config(config)
+    server = JSONRPCServer(sessions, socket_path)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+        
+    await sessions.start()
+    await server.start()
+    scheduler = get_scheduler()
+    reapers = [
+        scheduler.add('service.reap_sessions', lambda: reap_idle_sessions(sessions), 60, idle_backoff=5),
+        scheduler.add('service.reap_connections', lambda: reap_idle_connections(sessions), 60, idle_backoff=5)
+    ]
+    try:
+        await stop.wait()
+    finally:
+        logging.info("QuMail service shutting down")
+        for reaper in reapers:
+            reaper.cancel()
+        await server.close()
+        await sessions.close()
+
+def main(argv=None):
+    """Service entry point"""
+    parser = argparse.ArgumentParser(description='QuMail headless service (JSON-RPC on a Unix socket)')
+    parser.add_argument('--socket', type=str, help='Unix socket path (default: service_socket config)')
+    parser.add_argument('--kme-url', type=str, help='KME URL (default: kme_url config)')
+    args = parser.parse_args(argv)
+    
+    setup_logging()
+    config = load_config()
+    if args.kme_url:
+        config['kme_url'] = args.kme_url
+    socket_path = args.socket or config['service_socket']
+    
+    logging.info(f"Starting QuMail headless service on {socket_path}")
+    try:
+        asyncio.run(serve(config, socket_path))
+    except Exception as e:
+        logging.error(f"QuMail service error: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
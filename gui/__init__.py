@@ -3,11 +3,24 @@
 GUI Module for QuMail
 """
 
-from .main_window import QuMailMainWindow
-from .email_module import EmailModule
-from .chat_module import ChatModule
-from .call_module import CallModule
-from .security_dock import SecurityDockWidget
+import importlib
+
+# Tab modules are imported on first access (the main window builds hidden tabs on first show)
+_LAZY_EXPORTS = {
+    'QuMailMainWindow': '.main_window',
+    'EmailModule': '.email_module',
+    'ChatModule': '.chat_module',
+    'CallModule': '.call_module',
+    'SecurityDockWidget': '.security_dock'
+}
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'QuMailMainWindow',
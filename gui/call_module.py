@@ -16,6 +16,9 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread, pyqtSlot, QSize
 from PyQt6.QtGui import QFont, QPalette, QColor, QIcon, QPainter, QPen
 from datetime import datetime, timedelta
+from ..crypto.srtp import SRTPSession
+from ..crypto.srtp_keys import CallKeySchedule, SRTPMasterKey, SRTP_PROFILE
+from ..transport.media_transport import LoopbackCall
 
 class CallHistoryItem(QFrame):
     """Individual call history item"""
@@ -396,34 +399,45 @@ class VideoCallWidget(QWidget):
         self.close()
 
 class SRTPKeyManager:
-    """Manages SRTP key derivation from quantum material"""
+    """Manages SRTP key derivation from quantum material
     
-    def __init__(self, kme_client):
+    One KME seed per call feeds a CallKeySchedule: master key and salt are
+    HKDF-derived per epoch, and the next seed is prefetched before it is due.
+    """
+    
+    def __init__(self, kme_client, epoch_seconds: float = 60.0, epochs_per_seed: int = 10):
         self.kme_client = kme_client
+        self.epoch_seconds = epoch_seconds
+        self.epochs_per_seed = epochs_per_seed
+        self.schedules: Dict[str, CallKeySchedule] = {}
+        self.media: Dict[str, LoopbackCall] = {}
         
     async def derive_srtp_master_key(self, contact_id: str, call_id: str) -> Optional[Dict]:
         """Derive SRTP master key from quantum material"""
         try:
-            # Request quantum key material from KME
-            key_request = await self.kme_client.request_key(
-                sender_sae_id=f"qumail_caller",
-                receiver_sae_id=f"qumail_{contact_id}",
-                key_length=256,  # 256 bits for SRTP master key
-                key_type='seed'
-            )
-            
-            if not key_request:
-                return None
+            async def request_seed():
+                return await self.kme_client.request_key(
+                    sender_sae_id=f"qumail_caller",
+                    receiver_sae_id=f"qumail_{contact_id}",
+                    key_length=256,  # 256-bit seed; epoch keys are HKDF-derived from it
+                    key_type='seed'
+                )
                 
-            # In real implementation, use HKDF to derive SRTP keys
-            # HKDF(quantum_key, salt="SRTP-QuMail", info="master_key")
+            schedule = CallKeySchedule(call_id, request_seed, epoch_seconds=self.epoch_seconds,
+                                       epochs_per_seed=self.epochs_per_seed)
+            epoch_key = await schedule.start()
+            if not epoch_key:
+                return None
+            self.schedules[call_id] = schedule
             
             srtp_keys = {
-                'master_key': key_request['key_data'][:32],  # 256 bits
-                'master_salt': key_request['key_data'][32:46],  # 112 bits
-                'key_id': key_request['key_id'],
+                'master_key': epoch_key.master_key,  # 128 bits
+                'master_salt': epoch_key.master_salt,  # 112 bits
+                'key_id': epoch_key.key_id,
+                'epoch': epoch_key.epoch,
+                'mki': epoch_key.mki,  # names this key in SRTP packets (seed index, epoch)
                 'call_id': call_id,
-                'algorithm': 'AES_CM_128_HMAC_SHA1_80'  # SRTP crypto suite
+                'algorithm': SRTP_PROFILE  # SRTP crypto suite
             }
             
             logging.info(f"SRTP master key derived for call {call_id}")
@@ -432,6 +446,37 @@ class SRTPKeyManager:
         except Exception as e:
             logging.error(f"Failed to derive SRTP master key: {e}")
             return None
+            
+    def current_keys(self, call_id: str) -> Optional[SRTPMasterKey]:
+        """Current epoch's master key for an active call (local derivation, no KME wait)"""
+        schedule = self.schedules.get(call_id)
+        return schedule.current() if schedule else None
+        
+    async def start_media(self, call_id: str) -> Optional[LoopbackCall]:
+        """Start the call's SRTP media path (loopback UDP until a signaling peer exists)"""
+        schedule = self.schedules.get(call_id)
+        if not schedule:
+            return None
+        try:
+            media = LoopbackCall(call_id, SRTPSession, schedule.current)
+            await media.start()
+            self.media[call_id] = media
+            return media
+        except Exception as e:
+            logging.error(f"Failed to start media for call {call_id}: {e}")
+            return None
+            
+    def end_call(self, call_id: str):
+        """Drop a call's key schedule, seed material and media path"""
+        media = self.media.pop(call_id, None)
+        if media:
+            stats = media.get_stats()
+            logging.info(f"Call {call_id} media: mouth-to-ear {stats['mouth_to_ear']}, "
+                         f"loss {stats['caller']['jitter_buffer']['lost']}/{stats['caller']['jitter_buffer']['expected']}")
+            asyncio.ensure_future(media.stop())
+        schedule = self.schedules.pop(call_id, None)
+        if schedule:
+            schedule.close()
 
 class CallModule(QWidget):
     """Main call module implementing audio/video calling with quantum SRTP"""
@@ -443,6 +488,7 @@ class CallModule(QWidget):
         self.core = core
         self.call_history = []
         self.active_call = None
+        self.active_call_id = None
         self.srtp_manager = SRTPKeyManager(core.kme_client if core else None)
         
         self.setup_ui()
@@ -810,11 +856,13 @@ class CallModule(QWidget):
                     return
                     
                 logging.info(f"SRTP keys derived: Key ID {srtp_keys['key_id']}")
+                await self.srtp_manager.start_media(call_id)
                 
             # Create call window based on type
             if call_type == 'video':
                 # Existing logic to show VideoCallWidget
                 self.active_call = VideoCallWidget(contact_name)
+                self.active_call_id = call_id
                 self.active_call.call_ended.connect(self.on_call_ended)
                 self.active_call.show()
                 self.active_call.start_call()
@@ -921,6 +969,7 @@ class CallModule(QWidget):
         # Show dialog
         dialog.exec()
         call_timer.stop()
+        self.srtp_manager.end_call(call_id)
         
         # Update call history with actual duration
         for call in self.call_history:
@@ -942,6 +991,9 @@ class CallModule(QWidget):
     def on_call_ended(self):
         """Handle call end"""
         self.active_call = None
+        if self.active_call_id:
+            self.srtp_manager.end_call(self.active_call_id)
+            self.active_call_id = None
         self.status_message.emit("Call ended")
         self.load_call_history()  # Refresh history
         
@@ -958,4 +1010,6 @@ class CallModule(QWidget):
         """Cleanup resources"""
         if self.active_call:
             self.active_call.close()
+        for call_id in list(self.srtp_manager.schedules):
+            self.srtp_manager.end_call(call_id)
         logging.info("Call Module cleanup")
\ No newline at end of file
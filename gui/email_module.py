@@ -500,9 +500,17 @@ class ComposeDialog(QDialog):
             'total_attachment_size': total_size
         }
         
-        # Emit signal (in real implementation, this would be async)
+        # Emit signal; the receiver calls keep_draft() if the send could not be queued
+        self.draft_kept = False
         self.email_sent.emit(email_data)
+        if self.draft_kept:
+            self.progress_bar.setVisible(False)
+            return
         self.accept()
+        
+    def keep_draft(self):
+        """Keep the dialog open with its contents after a refused send"""
+        self.draft_kept = True
 
 class EmailModule(QWidget):
     """Main email module implementing Gmail-like interface"""
@@ -931,12 +939,72 @@ class EmailModule(QWidget):
                 'kyber_kem': True
             }
         
+        # REAL FUNCTIONALITY: Queue the send via the core outbox before reporting anything
+        handle = None
+        if self.core and hasattr(self.core, 'try_enqueue_send'):
+            try:
+                handle = self.core.try_enqueue_send(
+                    email_data['to'], 
+                    email_data['subject'], 
+                    email_data['body'],
+                    email_data.get('attachments'),
+                    email_data['security_level'],
+                    {'has_attachments': bool(email_data.get('attachments')),
+                     'total_size': email_data.get('total_attachment_size', 0)}
+                )
+                error = None if handle else "The outbox is full. Please retry once queued emails are sent."
+            except Exception as e:
+                logging.error(f"Failed to send via core: {e}")
+                error = f"The email could not be queued: {e}"
+                
+            if error:
+                # Keep the draft open so the user can retry; nothing goes to Sent
+                dialog = self.sender()
+                if isinstance(dialog, ComposeDialog):
+                    dialog.keep_draft()
+                QMessageBox.warning(self, "Email Not Sent", error)
+                self.status_message.emit("Email not sent - draft kept")
+                return
+                
+            new_mail['status'] = 'queued'
+            
         # Add the sent mail to the persistent store
         self.all_emails.append(new_mail)
 
         # Switch to Sent folder to immediately show the sent mail
         self.set_active_folder('Sent') 
         
+        if handle is None:
+            # No core: local-only mode, the mail is "sent" as soon as it is stored
+            self.show_send_result(new_mail, email_data, True)
+            return
+            
+        self.status_message.emit(f"Email to {email_data['to']} queued for sending")
+        
+        # The asyncio loop is pumped from the Qt event loop, so this runs on the GUI thread
+        handle.future.add_done_callback(
+            lambda future: self.on_send_finished(new_mail, email_data, future))
+        
+    def on_send_finished(self, new_mail: Dict, email_data: Dict, future):
+        """Report the outcome of a queued send"""
+        try:
+            success = not future.cancelled() and bool(future.result())
+        except Exception as e:
+            logging.error(f"Queued send to {email_data['to']} failed: {e}")
+            success = False
+            
+        new_mail['status'] = 'sent' if success else 'failed'
+        self.show_send_result(new_mail, email_data, success)
+        
+    def show_send_result(self, new_mail: Dict, email_data: Dict, success: bool):
+        """Show the sent dialog, or a warning when the send failed"""
+        if not success:
+            QMessageBox.warning(self, "Email Not Sent",
+                                f"Sending to {email_data['to']} failed. "
+                                "The email is kept in Sent marked as failed.")
+            self.status_message.emit("Email sending failed")
+            return
+            
         # Enhanced success message with PQC info
         if email_data.get('has_large_attachments') and email_data['security_level'] == 'L3':
             success_msg = (f"📧 Email sent to {email_data['to']} with Post-Quantum Crypto!\n\n"
@@ -949,23 +1017,6 @@ class EmailModule(QWidget):
         QMessageBox.information(self, "Email Sent", success_msg)
         self.status_message.emit("Email sent successfully with advanced quantum security")
         
-        # REAL FUNCTIONALITY: Actually send via core if available
-        if self.core and hasattr(self.core, 'send_secure_email'):
-            try:
-                import asyncio
-                loop = asyncio.get_event_loop()
-                loop.create_task(self.core.send_secure_email(
-                    email_data['to'], 
-                    email_data['subject'], 
-                    email_data['body'],
-                    email_data.get('attachments'),
-                    email_data['security_level'],
-                    {'has_attachments': bool(email_data.get('attachments')),
-                     'total_size': email_data.get('total_attachment_size', 0)}
-                ))
-            except Exception as e:
-                logging.error(f"Failed to send via core: {e}")
-        
     def refresh_emails(self):
         """Refresh email list"""
         logging.info("Refreshing email list")
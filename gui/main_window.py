@@ -16,10 +16,8 @@ from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize
 from PyQt6.QtGui import QIcon, QPixmap, QAction, QPalette, QColor
 
 from .email_module import EmailModule
-from .chat_module import ChatModule
-from .call_module import CallModule
-from .security_dock import SecurityDockWidget
 from ..utils.styles import get_main_window_stylesheet
+from ..utils.scheduler import IDLE, get_scheduler
 
 class QuMailMainWindow(QMainWindow):
     """Main application window with KME heartbeat integration"""
@@ -34,10 +32,9 @@ class QuMailMainWindow(QMainWindow):
         self.current_theme = "light"
         self.modules = {}
         
-        # KME ROBUSTNESS: Heartbeat monitoring timer
-        self.kme_status_timer = QTimer()
-        self.kme_status_timer.timeout.connect(self.update_kme_status)
-        self.kme_status_timer.start(5000)  # Update every 5 seconds
+        # KME ROBUSTNESS: Status re-render task on the background scheduler
+        self.kme_status_task = None
+        self._kme_status_signature = None
         
         # Initialize UI
         self.init_ui()
@@ -145,6 +142,12 @@ class QuMailMainWindow(QMainWindow):
         self.kme_status_indicator.clicked.connect(self.show_kme_details)
         toolbar.addWidget(self.kme_status_indicator)
         
+        # Security status dock toggle
+        self.security_dock_button = QPushButton("🛡")
+        self.security_dock_button.setToolTip("Security Status")
+        self.security_dock_button.setFixedSize(40, 40)
+        toolbar.addWidget(self.security_dock_button)
+        
         # Theme toggle
         self.theme_button = QPushButton("🌙")
         self.theme_button.setToolTip("Toggle Dark Mode")
@@ -212,21 +215,21 @@ class QuMailMainWindow(QMainWindow):
             }
         """)
         
-        # Initialize modules
+        # LAZY TABS: Only the visible email tab is built up front; chat and
+        # calls (and their imports) are built the first time they are shown
         self.email_module = EmailModule(self.core)
-        self.chat_module = ChatModule(self.core)
-        self.call_module = CallModule(self.core)
+        self.chat_module = None
+        self.call_module = None
         
         self.modules = {
-            'email': self.email_module,
-            'chat': self.chat_module,
-            'calls': self.call_module
+            'email': self.email_module
         }
+        self.tab_keys = ['email', 'chat', 'calls']
         
-        # Add tabs
+        # Add tabs (placeholders stand in for modules not built yet)
         self.main_tabs.addTab(self.email_module, "📧 Email")
-        self.main_tabs.addTab(self.chat_module, "💬 Chats")
-        self.main_tabs.addTab(self.call_module, "📞 Calls")
+        self.main_tabs.addTab(QWidget(), "💬 Chats")
+        self.main_tabs.addTab(QWidget(), "📞 Calls")
         
         # Add tabs to splitter
         parent_splitter.addWidget(self.main_tabs)
@@ -234,13 +237,58 @@ class QuMailMainWindow(QMainWindow):
         # Set splitter proportions (sidebar:main = 1:3)
         parent_splitter.setSizes([300, 900])
         
-    def setup_security_dock(self):
-        """Setup the security status dock"""
-        self.security_dock = SecurityDockWidget(self.core)
-        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.security_dock)
+    def build_module(self, key: str):
+        """Construct a tab module on first show"""
+        if key == 'chat':
+            from .chat_module import ChatModule
+            self.chat_module = ChatModule(self.core)
+            return self.chat_module
+        if key == 'calls':
+            from .call_module import CallModule
+            self.call_module = CallModule(self.core)
+            return self.call_module
+        raise ValueError(f"Unknown tab module: {key}")
+        
+    def ensure_tab(self, index: int):
+        """Return the module for tab index, building it (and swapping out its placeholder) if needed"""
+        if index < 0 or index >= len(self.tab_keys):
+            return None
+        key = self.tab_keys[index]
+        module = self.modules.get(key)
+        if module is not None:
+            return module
+            
+        module = self.build_module(key)
+        self.modules[key] = module
+        if hasattr(module, 'status_message'):
+            module.status_message.connect(self.show_status_message)
+        if hasattr(module, 'update_user_state'):
+            module.update_user_state(self.core.current_user if self.core else None)
+            
+        label = self.main_tabs.tabText(index)
+        placeholder = self.main_tabs.widget(index)
+        self.main_tabs.blockSignals(True)
+        self.main_tabs.removeTab(index)
+        self.main_tabs.insertTab(index, module, label)
+        self.main_tabs.setCurrentIndex(index)
+        self.main_tabs.blockSignals(False)
+        placeholder.deleteLater()
+        logging.info(f"Built {key} tab on first show")
+        return module
         
-        # Initially hide - can be toggled
-        self.security_dock.setVisible(False)
+    def setup_security_dock(self):
+        """Setup the security status dock (built on first toggle)"""
+        self.security_dock = None
+        
+    def toggle_security_dock(self):
+        """Show or hide the security status dock, building it the first time"""
+        if self.security_dock is None:
+            from .security_dock import SecurityDockWidget
+            self.security_dock = SecurityDockWidget(self.core)
+            self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.security_dock)
+            self.security_dock.setVisible(True)
+            return
+        self.security_dock.setVisible(self.security_dock.isHidden())
         
     def setup_enhanced_status_bar(self):
         """Setup the application status bar with KME heartbeat monitoring"""
@@ -289,8 +337,32 @@ class QuMailMainWindow(QMainWindow):
         # Update KME status immediately
         self.update_kme_status()
         
-        # Schedule periodic updates
-        self.kme_status_timer.start(3000)  # Update every 3 seconds
+        # Repaint as soon as the shared KME status poll refreshes
+        if self.core and hasattr(self.core, 'subscribe_status'):
+            self.core.subscribe_status(self.on_kme_status)
+        
+        # Periodic re-render of the cached status (no KME requests), backing off while unchanged
+        if self.kme_status_task is None:
+            self.kme_status_task = get_scheduler().add('ui.kme_status', self.refresh_kme_status, 3,
+                                                       idle_backoff=5)
+        
+    def on_kme_status(self, status: dict):
+        """Shared KME status poll refreshed"""
+        self.update_kme_status()
+        
+    def refresh_kme_status(self):
+        """Scheduled re-render; IDLE when nothing shown in the status bar changed"""
+        if not self.core or not hasattr(self.core, 'get_qkd_status'):
+            return IDLE
+        qkd_status = self.core.get_qkd_status()
+        pqc_stats = qkd_status.get('pqc_stats', {})
+        signature = (qkd_status['kme_connected'], round(qkd_status['success_rate'], 1),
+                     qkd_status.get('heartbeat_enabled'), qkd_status.get('uptime_seconds', 0) // 60,
+                     pqc_stats.get('files_encrypted', 0), pqc_stats.get('total_size_encrypted', 0))
+        if signature == self._kme_status_signature:
+            return IDLE
+        self._kme_status_signature = signature
+        self.update_kme_status()
         
     def update_kme_status(self):
         """KME ROBUSTNESS: Update KME status indicators"""
@@ -379,6 +451,9 @@ class QuMailMainWindow(QMainWindow):
         # Profile/Logout button
         self.profile_button.clicked.connect(self.show_profile_dialog)
         
+        # Security dock
+        self.security_dock_button.clicked.connect(self.toggle_security_dock)
+        
         # Module connections
         for module in self.modules.values():
             if hasattr(module, 'status_message'):
@@ -386,8 +461,8 @@ class QuMailMainWindow(QMainWindow):
                 
     def on_tab_changed(self, index):
         """Handle tab change events"""
-        # Update sidebar content based on active module
-        current_widget = self.main_tabs.widget(index)
+        # Update sidebar content based on active module (built on first show)
+        current_widget = self.ensure_tab(index)
         
         # Clear sidebar stack
         while self.sidebar_stack.count() > 0:
@@ -676,9 +751,12 @@ class QuMailMainWindow(QMainWindow):
         """Handle application close event with KME cleanup"""
         logging.info("QuMail main window closing - stopping KME monitoring")
         
-        # Stop KME status timer
-        if self.kme_status_timer:
-            self.kme_status_timer.stop()
+        # Stop the KME status task
+        if self.kme_status_task:
+            self.kme_status_task.cancel()
+            self.kme_status_task = None
+        if self.core and hasattr(self.core, 'unsubscribe_status'):
+            self.core.unsubscribe_status(self.on_kme_status)
         
         # Cleanup modules
         for module in self.modules.values():
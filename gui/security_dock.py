@@ -12,7 +12,7 @@ from PyQt6.QtWidgets import (
     QPushButton, QFrame, QScrollArea, QListWidget, QListWidgetItem,
     QComboBox, QSpinBox, QMessageBox, QDialog, QDialogButtonBox, QTextEdit
 )
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread, pyqtSlot
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject, pyqtSlot
 from PyQt6.QtGui import QFont, QPalette, QColor, QPixmap, QPainter
 from datetime import datetime, timedelta
 
@@ -361,8 +361,78 @@ class SecurityAlertWidget(QFrame):
             'timestamp': timestamp
         })
 
-class SecurityStatusWorker(QThread):
-    """Background worker for fetching security status"""
+class PerformanceMetricsWidget(QFrame):
+    """Widget showing per-stage send/receive latency from the core metrics registry"""
+    
+    OPERATIONS = [
+        ('email.send', "📧 Send"),
+        ('email.receive', "📥 Open"),
+        ('email.decrypt', "🔓 Decrypt"),
+        ('chat.send', "💬 Chat"),
+        ('group.send', "👥 Group")
+    ]
+    
+    def __init__(self):
+        super().__init__()
+        self.setup_ui()
+        
+    def setup_ui(self):
+        """Setup performance metrics UI"""
+        self.setFrameStyle(QFrame.Shape.StyledPanel)
+        self.setStyleSheet("""
+            PerformanceMetricsWidget {
+                background-color: #F5F9FF;
+                border: 1px solid #90CAF9;
+                border-radius: 6px;
+                padding: 8px;
+            }
+        """)
+        
+        layout = QVBoxLayout(self)
+        
+        # Title
+        title = QLabel("⏱️ Latency (p50 / p95)")
+        title.setFont(QFont("Arial", 11, QFont.Weight.Bold))
+        title.setStyleSheet("color: #1565C0; border: none;")
+        layout.addWidget(title)
+        
+        self.latency_list = QListWidget()
+        self.latency_list.setMaximumHeight(120)
+        self.latency_list.setStyleSheet("""
+            QListWidget {
+                border: 1px solid #90CAF9;
+                border-radius: 4px;
+                background-color: white;
+                font-size: 9px;
+            }
+        """)
+        layout.addWidget(self.latency_list)
+        
+    def update_metrics(self, metrics: Dict):
+        """Show each operation's total latency and its slowest stage"""
+        latency = metrics.get('latency', {})
+        self.latency_list.clear()
+        
+        for operation, label in self.OPERATIONS:
+            total = latency.get(f"{operation}.total")
+            if not total:
+                continue
+                
+            stages = {
+                name[len(operation) + 1:]: summary for name, summary in latency.items()
+                if name.startswith(f"{operation}.") and not name.endswith('.total')
+            }
+            text = f"{label}: {total['p50_ms']:.0f} / {total['p95_ms']:.0f} ms ({total['count']})"
+            if stages:
+                slowest, summary = max(stages.items(), key=lambda item: item[1]['p95_ms'])
+                text += f" - slowest: {slowest} {summary['p95_ms']:.0f} ms"
+            self.latency_list.addItem(QListWidgetItem(text))
+            
+        if not self.latency_list.count():
+            self.latency_list.addItem(QListWidgetItem("No operations recorded yet"))
+
+class SecurityStatusWorker(QObject):
+    """Relays security status from the shared KME status poll to the dock"""
     
     status_updated = pyqtSignal(dict)
     error_occurred = pyqtSignal(str)
@@ -370,41 +440,44 @@ class SecurityStatusWorker(QThread):
     def __init__(self, core):
         super().__init__()
         self.core = core
-        self.running = True
+        self.running = False
         
-    def run(self):
-        """Main worker loop"""
-        while self.running:
-            try:
-                # Get status from core
-                if self.core:
-                    status = self.core.get_qkd_status()
-                    self.status_updated.emit(status)
-                else:
-                    # Mock status for testing
-                    mock_status = {
-                        'kme_connected': True,
-                        'qkd_rate': 10000,
-                        'available_keys': 234,
-                        'used_keys': 12,
-                        'total_keys': 300,
-                        'active_sessions': {
-                            'email': 2,
-                            'chat': 1,
-                            'calls': 0
-                        }
+    def start(self):
+        """Subscribe to core status updates and emit the current snapshot"""
+        self.running = True
+        try:
+            if self.core:
+                self.core.subscribe_status(self.on_status)
+                self.status_updated.emit(self.core.get_qkd_status())
+            else:
+                # Mock status for testing
+                mock_status = {
+                    'kme_connected': True,
+                    'qkd_rate': 10000,
+                    'available_keys': 234,
+                    'used_keys': 12,
+                    'total_keys': 300,
+                    'active_sessions': {
+                        'email': 2,
+                        'chat': 1,
+                        'calls': 0
                     }
-                    self.status_updated.emit(mock_status)
-                    
-                self.msleep(5000)  # Update every 5 seconds
-                
-            except Exception as e:
-                self.error_occurred.emit(str(e))
-                self.msleep(10000)  # Wait longer on error
+                }
+                self.status_updated.emit(mock_status)
                 
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+            
+    def on_status(self, status: Dict):
+        """Called by the core whenever the shared poll refreshes"""
+        if self.running:
+            self.status_updated.emit(status)
+            
     def stop(self):
         """Stop the worker"""
         self.running = False
+        if self.core:
+            self.core.unsubscribe_status(self.on_status)
 
 class SecurityDockWidget(QDockWidget):
     """Main security dock widget with comprehensive monitoring"""
@@ -457,6 +530,10 @@ class SecurityDockWidget(QDockWidget):
         self.alerts_widget = SecurityAlertWidget()
         scroll_layout.addWidget(self.alerts_widget)
         
+        # Performance Metrics Widget
+        self.performance_widget = PerformanceMetricsWidget()
+        scroll_layout.addWidget(self.performance_widget)
+        
         # Advanced Options Button
         self.advanced_button = QPushButton("⚙️ Advanced Options")
         self.advanced_button.setStyleSheet("""
@@ -519,7 +596,6 @@ class SecurityDockWidget(QDockWidget):
         """Stop background monitoring"""
         if self.status_worker:
             self.status_worker.stop()
-            self.status_worker.wait()
             self.status_worker = None
             
             logging.info("Security monitoring stopped")
@@ -547,6 +623,9 @@ class SecurityDockWidget(QDockWidget):
                 call_count=sessions.get('calls', 0)
             )
             
+            if self.core:
+                self.performance_widget.update_metrics(self.core.get_performance_metrics())
+                
             # Check for alerts
             available_keys = status.get('available_keys', 0)
             total_keys = status.get('total_keys', 100)
@@ -9,6 +9,8 @@ with various options and environment setup.
 import sys
 import os
 import argparse
+import asyncio
+import threading
 from pathlib import Path
 
 # Add the qumail package to Python path
@@ -39,8 +41,11 @@ Examples:
   python launcher.py                    # Launch with default settings
   python launcher.py --debug            # Launch in debug mode
   python launcher.py --kme-url localhost:8081  # Use different KME
+  python launcher.py --simulate-kme --kme-workers 4  # Multi-process KME simulator
+  python launcher.py --simulate-kme --kme-topology mesh.json  # Multi-node KME network
   python launcher.py --security L1      # Default to OTP security
   python launcher.py --theme dark       # Use dark theme
+  python launcher.py --headless --socket /run/qumail.sock  # Headless JSON-RPC service
         """
     )
     
@@ -86,6 +91,31 @@ Examples:
         help='Start built-in KME simulator (for testing)'
     )
     
+    parser.add_argument(
+        '--kme-workers',
+        type=int,
+        default=1,
+        help='Worker processes for the built-in KME simulator (shared-memory key table when > 1)'
+    )
+    
+    parser.add_argument(
+        '--kme-topology',
+        type=str,
+        help='JSON topology for a multi-node KME simulator network with trusted-node relay'
+    )
+    
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='Run the headless multi-session service instead of the GUI (no PyQt6 needed)'
+    )
+    
+    parser.add_argument(
+        '--socket',
+        type=str,
+        help='Unix socket for the headless service API (default: /tmp/qumail.sock)'
+    )
+    
     parser.add_argument(
         '--version',
         action='version',
@@ -116,6 +146,9 @@ def apply_arguments(args):
     if args.log_level:
         os.environ['QUMAIL_LOG_LEVEL'] = args.log_level
     
+    if args.socket:
+        os.environ['QUMAIL_SERVICE_SOCKET'] = args.socket
+    
     if args.window_size:
         try:
             width, height = args.window_size.split('x')
@@ -125,14 +158,15 @@ def apply_arguments(args):
             print(f"Warning: Invalid window size format: {args.window_size}")
             print("Expected format: WIDTHxHEIGHT (e.g., 1440x900)")
 
-def check_dependencies():
+def check_dependencies(headless=False):
     """Check if required dependencies are installed"""
     missing_deps = []
     
-    try:
-        import PyQt6
-    except ImportError:
-        missing_deps.append('PyQt6')
+    if not headless:
+        try:
+            import PyQt6
+        except ImportError:
+            missing_deps.append('PyQt6')
     
     try:
         import cryptography
@@ -161,13 +195,36 @@ def check_dependencies():
     
     return True
 
-def start_kme_simulator():
+def start_kme_simulator(workers=1, topology=None):
     """Start the KME simulator in background"""
     print("Starting KME Simulator...")
     try:
+        if topology:
+            from qumail.crypto.kme_network import KMENetwork
+            
+            network = KMENetwork.load(topology)
+            
+            def run_network():
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                loop.run_until_complete(network.start())
+                
+            threading.Thread(target=run_network, daemon=True).start()
+            
+            for node_id, url in network.get_topology()['nodes'].items():
+                print(f"KME node {node_id} started on {url}")
+            return
+            
+        if workers > 1:
+            from qumail.crypto.kme_cluster import KMECluster
+            
+            cluster = KMECluster(workers=workers)
+            cluster.start()
+            
+            print(f"KME Simulator cluster started on http://127.0.0.1:8080 ({workers} workers)")
+            return
+            
         from qumail.crypto.kme_simulator import KMESimulator
-        import asyncio
-        import threading
         
         def run_kme():
             kme = KMESimulator()
@@ -194,7 +251,7 @@ def main():
     args = parse_arguments()
     
     # Check dependencies
-    if not check_dependencies():
+    if not check_dependencies(args.headless):
         sys.exit(1)
     
     # Setup environment
@@ -203,19 +260,26 @@ def main():
     
     # Start KME simulator if requested
     if args.simulate_kme:
-        start_kme_simulator()
+        start_kme_simulator(args.kme_workers, args.kme_topology)
         import time
         time.sleep(2)  # Give KME time to start
     
     # Print configuration
     print(f"KME URL: {os.environ.get('QUMAIL_KME_URL')}")
     print(f"Security Level: {os.environ.get('QUMAIL_DEFAULT_SECURITY')}")
-    print(f"Theme: {os.environ.get('QUMAIL_THEME')}")
+    if args.headless:
+        print(f"Service socket: {os.environ.get('QUMAIL_SERVICE_SOCKET', '/tmp/qumail.sock')}")
+    else:
+        print(f"Theme: {os.environ.get('QUMAIL_THEME')}")
     print(f"Debug: {os.environ.get('QUMAIL_DEBUG')}")
     print(f"Log Level: {os.environ.get('QUMAIL_LOG_LEVEL')}")
     print("-" * 50)
     
     try:
+        if args.headless:
+            from qumail.daemon import main as daemon_main
+            sys.exit(daemon_main([]))
+            
         # Import and run QuMail
         from qumail.main import main as qumail_main
         qumail_main()
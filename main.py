@@ -17,7 +17,6 @@ from PyQt6.QtGui import QIcon, QPalette, QColor
 # Imports corrected in the previous step
 from .gui.main_window import QuMailMainWindow
 from .core.app_core import QuMailCore
-from .crypto.kme_simulator import KMESimulator
 from .utils.config import load_config
 from .utils.logger import setup_logging
 
@@ -30,6 +29,7 @@ class QuMailApplication:
         self.core = None
         self.kme_simulator = None
         self.config = None
+        self.loop_timer = None
         
     def setup_application(self):
         """Initialize the PyQt6 application"""
@@ -76,20 +76,8 @@ class QuMailApplication:
             # Load configuration
             self.config = load_config()
             
-            # Start KME Simulator
-            self.kme_simulator = KMESimulator()
-            
-            # Only run KME if the launcher passed the --simulate-kme argument.
-            # However, since the launcher handles this, we rely on the main loop 
-            # to conditionally start/stop the simulator based on config/launcher.
-            # In this context, we assume the launcher has prepared the KME if needed.
-            
-            # NOTE: We keep the original logic for completeness, as the flask thread is managed externally.
-            # For this context, we only initialize KME if the external launcher didn't handle it.
-            # The launcher's logic ensures the KME is running before main() is called.
-            
-            # The simulator logic relies on the config having been loaded, which is correct here.
-            # We skip the synchronous start/stop logic here as the launcher handles the background thread.
+            # The KME simulator (Flask) is started by the launcher when requested
+            # (--simulate-kme); it is not imported on the client startup path
             
             # Initialize application core
             self.core = QuMailCore(self.config)
@@ -134,6 +122,17 @@ class QuMailApplication:
             
         return True
         
+    def start_asyncio_pump(self, loop, interval_ms: int = 20):
+        """Step the asyncio loop from the Qt event loop so background tasks keep progressing"""
+        def step():
+            if not loop.is_running():
+                loop.call_soon(loop.stop)
+                loop.run_forever()
+                
+        self.loop_timer = QTimer()
+        self.loop_timer.timeout.connect(step)
+        self.loop_timer.start(interval_ms)
+        
     def run(self):
         """Main application run method"""
         try:
@@ -153,6 +152,10 @@ class QuMailApplication:
             # Setup main window only after successful authentication
             if not self.setup_main_window():
                 return 1
+            logging.info(f"Startup timings: {self.core.get_startup_timings()}")
+            
+            # STARTUP: Keep background phases (KME connect, key pool watch) running under Qt
+            self.start_asyncio_pump(loop)
                 
             # Start the Qt event loop
             return self.app.exec()
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+Headless Service for QuMail
+
+Multi-session QuMail core behind a JSON-RPC API on a Unix socket (no PyQt)
+"""
+
+from .sessions import SessionManager, SessionError, UserSession
+from .rpc_server import JSONRPCServer, RPCClient, RPCError
+
+__all__ = ['SessionManager', 'SessionError', 'UserSession', 'JSONRPCServer', 'RPCClient', 'RPCError']
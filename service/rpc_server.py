@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+JSON-RPC Server - QuMail service API on a Unix socket
+
+JSON-RPC 2.0 with one JSON document per line. Requests on a connection are
+handled concurrently (up to `max_in_flight`), so responses can come back in
+a different order than the requests; match them by `id`. Batches (a JSON
+array of requests) are supported. Parameters are passed by name.
+
+Trust boundary: the socket is created with mode 0600, so only processes of
+the service's OS user can connect. Without a service token that is the only
+check, and any such process may open a session as any user. Set
+`service_token` (QUMAIL_SERVICE_TOKEN) to require the token in session.open.
+A user's session ID is returned only to the caller that opened it; opening a
+second session for the same user fails until the first is closed.
+
+Methods:
+    service.status
+    session.open      email, token?, display_name?  -> {session_id, email, sae_id}
+    session.close     session_id
+    email.send        session_id, to, subject, body, security_level?, min_security_level?
+    email.list        session_id, folder?, limit?   -> [email summaries]
+    email.receive     session_id, email_id          -> decrypted email
+    group.create      session_id, name, participants -> {group_id}
+    group.send        session_id, group_id, content, recipients, security_level?
+    group.list        session_id
+    group.history     session_id, group_id, limit?
+"""
+
+import asyncio
+import base64
+import inspect
+import itertools
+import json
+import logging
+import os
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..utils.scheduler import get_scheduler
+from .sessions import SessionError, SessionManager
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SESSION_ERROR = -32001
+OPERATION_FAILED = -32002
+
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+class RPCError(Exception):
+    """Error returned to the caller as a JSON-RPC error object"""
+    
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+def encode_line(document: Any) -> bytes:
+    return json.dumps(document, default=_json_default, separators=(',', ':')).encode('utf-8') + b'\n'
+
+def email_summary(email: Dict) -> Dict:
+    """List entry for an email: routing and security metadata, no payload"""
+    payload = email.get('encrypted_payload') or {}
+    return {
+        'email_id': email.get('email_id'),
+        'sender': email.get('sender'),
+        'receiver': email.get('receiver'),
+        'folder': email.get('folder'),
+        'sent_at': email.get('sent_at'),
+        'received_at': email.get('received_at'),
+        'security_level': payload.get('security_level', email.get('security_level'))
+    }
+
+class JSONRPCServer:
+    """Line-delimited JSON-RPC 2.0 over a Unix socket, backed by a SessionManager"""
+    
+    def __init__(self, sessions: SessionManager, path: str, max_in_flight: int = 64):
+        self.sessions = sessions
+        self.path = path
+        self.max_in_flight = max_in_flight  # concurrent requests per connection
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections = set()
+        self.methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            'service.status': self.service_status,
+            'session.open': self.session_open,
+            'session.close': self.session_close,
+            'email.send': self.email_send,
+            'email.list': self.email_list,
+            'email.receive': self.email_receive,
+            'group.create': self.group_create,
+            'group.send': self.group_send,
+            'group.list': self.group_list,
+            'group.history': self.group_history
+        }
+        self.stats = {
+            'connections': 0,
+            'requests': 0,
+            'errors': 0
+        }
+        
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket from a previous run
+        self.server = await asyncio.start_unix_server(self._handle_connection, path=self.path,
+                                                      limit=MAX_LINE_BYTES)
+        os.chmod(self.path, 0o600)  # only the service user may talk to it (the trust boundary)
+        logging.info(f"QuMail service listening on {self.path}")
+        
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in list(self.connections):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+            
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        self.connections.add(writer)
+        write_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        
+        async def respond(line: bytes):
+            try:
+                response = await self.handle_line(line)
+                if response is not None:
+                    async with write_lock:
+                        writer.write(encode_line(response))
+                        await writer.drain()
+            except (ConnectionError, RuntimeError) as e:
+                logging.debug(f"Service client went away: {e}")
+            finally:
+                in_flight.release()
+                
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Line over MAX_LINE_BYTES: the stream cannot be resynchronized
+                    async with write_lock:
+                        writer.write(encode_line(self._error(None, INVALID_REQUEST, "Request too large")))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await in_flight.acquire()
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+            
+    async def handle_line(self, line: bytes) -> Optional[Any]:
+        """Response document for one request line (None when nothing is to be sent back)"""
+        try:
+            document = json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            return self._error(None, PARSE_ERROR, "Parse error")
+            
+        if isinstance(document, list):
+            if not document:
+                return self._error(None, INVALID_REQUEST, "Empty batch")
+            responses = await asyncio.gather(*(self.dispatch(request) for request in document))
+            return [response for response in responses if response is not None] or None
+        return await self.dispatch(document)
+        
+    async def dispatch(self, request: Any) -> Optional[Dict]:
+        """Run one JSON-RPC request object; notifications (no id) get no response"""
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or not isinstance(request.get('method'), str):
+            return self._error(request.get('id') if isinstance(request, dict) else None,
+                               INVALID_REQUEST, "Invalid request")
+        request_id = request.get('id')
+        is_notification = 'id' not in request
+        self.stats['requests'] += 1
+        
+        method = self.methods.get(request['method'])
+        params = request.get('params', {})
+        try:
+            if method is None:
+                raise RPCError(METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, "Params must be an object")
+            try:
+                inspect.signature(method).bind(**params)
+            except TypeError as e:
+                raise RPCError(INVALID_PARAMS, str(e))
+            result = await method(**params)
+        except RPCError as e:
+            self.stats['errors'] += 1
+            return None if is_notification else self._error(request_id, e.code, e.message)
+        except SessionError as e:
+            self.stats['errors'] += 1
+            return None if is_notification else self._error(request_id, SESSION_ERROR, str(e))
+        except ValueError as e:
+            self.stats['errors'] += 1
+            return None if is_notification else self._error(request_id, OPERATION_FAILED, str(e))
+        except Exception as e:
+            self.stats['errors'] += 1
+            logging.error(f"Service method {request['method']} failed: {e}")
+            return None if is_notification else self._error(request_id, INTERNAL_ERROR, "Internal error")
+            
+        if is_notification:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        
+    def _error(self, request_id, code: int, message: str) -> Dict:
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+        
+    # API methods
+    
+    async def service_status(self) -> Dict:
+        stats = self.sessions.get_stats()
+        stats['rpc'] = dict(self.stats, open_connections=len(self.connections))
+        stats['scheduler'] = get_scheduler().get_stats()
+        return stats
+        
+    async def session_open(self, email: str, token: Optional[str] = None,
+                           display_name: Optional[str] = None) -> Dict:
+        session = await self.sessions.open_session(email, display_name, token=token)
+        return {'session_id': session.session_id, 'email': session.email,
+                'sae_id': session.core.current_user.sae_id}
+                
+    async def session_close(self, session_id: str) -> Dict:
+        return {'closed': await self.sessions.close_session(session_id)}
+        
+    async def email_send(self, session_id: str, to: str, subject: str, body: str,
+                         security_level: Optional[str] = None, min_security_level: Optional[str] = None) -> Dict:
+        core = self.sessions.get(session_id).core
+        sent = await core.send_secure_email(to, subject, body, security_level=security_level,
+                                            min_security_level=min_security_level)
+        return {'sent': bool(sent)}
+        
+    async def email_list(self, session_id: str, folder: str = 'Inbox', limit: int = 50) -> List[Dict]:
+        core = self.sessions.get(session_id).core
+        return [email_summary(email) for email in await core.get_email_list(folder, limit)]
+        
+    async def email_receive(self, session_id: str, email_id: str) -> Dict:
+        core = self.sessions.get(session_id).core
+        email = await core.receive_secure_email(email_id)
+        if email is None:
+            raise RPCError(OPERATION_FAILED, f"Email {email_id} could not be fetched or decrypted")
+        return email
+        
+    async def group_create(self, session_id: str, name: str, participants: List[str]) -> Dict:
+        core = self.sessions.get(session_id).core
+        group_id = await core.create_group_chat(name, participants)
+        if group_id is None:
+            raise RPCError(OPERATION_FAILED, "Group could not be created")
+        return {'group_id': group_id}
+        
+    async def group_send(self, session_id: str, group_id: str, content: str, recipients: List[str],
+                         security_level: str = 'L2') -> Dict:
+        core = self.sessions.get(session_id).core
+        sent = await core.send_secure_group_message(group_id, content, recipients, security_level)
+        return {'sent': bool(sent)}
+        
+    async def group_list(self, session_id: str) -> List[Dict]:
+        return await self.sessions.get(session_id).core.get_group_chat_list()
+        
+    async def group_history(self, session_id: str, group_id: str, limit: int = 100) -> List[Dict]:
+        return await self.sessions.get(session_id).core.get_group_chat_history(group_id, limit)
+
+class RPCClient:
+    """Minimal pipelining client for the service socket (scripts, tests, benchmarks)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._reader_task: Optional[asyncio.Task] = None
+        
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_BYTES)
+        self._reader_task = asyncio.ensure_future(self._read_responses())
+        return self
+        
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                for item in response if isinstance(response, list) else [response]:
+                    future = self.pending.pop(item.get('id'), None)
+                    if future is not None and not future.done():
+                        future.set_result(item)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Service connection closed"))
+            self.pending.clear()
+            
+    async def call(self, method: str, **params) -> Any:
+        """Call method and return its result; raises RPCError for error responses"""
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(encode_line({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}))
+        await self.writer.drain()
+        response = await future
+        if 'error' in response:
+            raise RPCError(response['error']['code'], response['error']['message'])
+        return response['result']
+        
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
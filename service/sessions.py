@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Session Manager - Concurrent user sessions for the headless QuMail service
+
+Each signed-in user gets their own QuMailCore (user profile, outbox, inbox
+prefetch cache, session ratchet), while the expensive shared resources are
+created once per process:
+
+- one KMEClient (one aiohttp connector, heartbeat and status poll)
+- one crypto worker pool
+- one SMTP and one IMAP connection pool
+- the loopback mailboxes used for @qumail.com delivery, so sessions in the
+  same service deliver to each other
+
+Sessions are addressed by an opaque session ID and closed explicitly or
+after `idle_timeout` seconds without a request. The session ID is the
+session's only credential: it is handed out once, to the caller that opened
+the session, and a second open for the same user is refused rather than
+resumed. With a `service_token` configured, opening a session also requires
+that token; without one, whoever can reach the service may sign in as any
+user (see the trust boundary in rpc_server.py).
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..core.app_core import QuMailCore, UserProfile
+from ..crypto.cipher_strategies import CipherManager
+from ..crypto.crypto_executor import CryptoExecutor
+from ..crypto.kme_client import KMEClient
+from ..transport.imap_pool import IMAPConnectionPool
+from ..transport.smtp_pool import SMTPConnectionPool
+
+class SessionError(Exception):
+    """A session request that cannot be served (unknown session, limit reached)"""
+
+def service_identity(email: str) -> str:
+    """User ID for an address, matching the SAE IDs senders derive for recipients"""
+    return email.lower().replace('@', '_').replace('.', '_')
+
+@dataclass
+class UserSession:
+    """One signed-in user of the service"""
+    session_id: str
+    email: str
+    core: QuMailCore
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    last_active: float = field(default_factory=time.monotonic)
+    requests: int = 0
+    
+    def touch(self):
+        self.last_active = time.monotonic()
+        self.requests += 1
+
+class SessionManager:
+    """Per-user QuMailCore sessions over shared KME, crypto and SMTP/IMAP pools"""
+    
+    def __init__(self, config: Dict, kme_client: Optional[KMEClient] = None,
+                 max_sessions: int = 1000, idle_timeout: float = 1800.0,
+                 service_token: Optional[str] = None):
+        self.config = config
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.service_token = service_token or None
+        
+        self.kme_client = kme_client or KMEClient(config.get('kme_url', 'http://127.0.0.1:8080'))
+        self.crypto_executor = CryptoExecutor.from_config(CipherManager(), config)
+        self.smtp_pool = SMTPConnectionPool.from_config(config)
+        self.imap_pool = IMAPConnectionPool.from_config(config)
+        self.mailboxes: Dict[str, Dict[str, List[Dict]]] = {}
+        
+        self.sessions: Dict[str, UserSession] = {}
+        self.by_email: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self.stats = {
+            'opened': 0,
+            'closed': 0,
+            'expired': 0,
+            'rejected': 0,
+            'unauthorized': 0
+        }
+        
+    @classmethod
+    def from_config(cls, config: Dict, kme_client: Optional[KMEClient] = None) -> 'SessionManager':
+        return cls(
+            config,
+            kme_client=kme_client,
+            max_sessions=config.get('service_max_sessions', 1000),
+            idle_timeout=config.get('service_session_idle', 1800.0),
+            service_token=config.get('service_token')
+        )
+        
+    async def start(self):
+        """Connect the shared KME client once for every session"""
+        await self.kme_client.initialize(enable_heartbeat=True)
+        if self.kme_client.is_connected:
+            self.kme_client.start_status_polling()
+            logging.info("Service KME connection established")
+        else:
+            logging.warning("Service KME connection failed - sessions will retry on demand")
+        if not self.service_token:
+            logging.warning("No service token set - socket permissions are the only check on session.open")
+            
+    async def open_session(self, email: str, display_name: Optional[str] = None,
+                           token: Optional[str] = None) -> UserSession:
+        """Sign a user in; refused with a bad service token or while the user has a session"""
+        if self.service_token and not secrets.compare_digest(str(token or '').encode('utf-8'),
+                                                                 self.service_token.encode('utf-8')):
+            self.stats['unauthorized'] += 1
+            raise SessionError("Invalid service token")
+            
+        email = email.strip().lower()
+        if '@' not in email:
+            raise SessionError(f"Invalid email address: {email}")
+            
+        async with self._lock:
+            if self.by_email.get(email) in self.sessions:
+                # Never hand the existing session ID to another caller
+                self.stats['rejected'] += 1
+                raise SessionError(f"{email} already has an open session")
+            if len(self.sessions) >= self.max_sessions:
+                self.stats['rejected'] += 1
+                raise SessionError(f"Session limit reached ({self.max_sessions})")
+                
+            user_id = service_identity(email)
+            now = datetime.utcnow()
+            profile = UserProfile(
+                user_id=user_id, email=email, display_name=display_name or email.split('@')[0],
+                password_hash='', sae_id=f"qumail_{user_id}", provider='qumail_service',
+                created_at=now, last_login=now
+            )
+            core = QuMailCore(self.config, kme_client=self.kme_client,
+                              crypto_executor=self.crypto_executor, smtp_pool=self.smtp_pool,
+                              imap_pool=self.imap_pool)
+            core.email_handler.qumail_mock_inboxes = self.mailboxes
+            core.qkd_status = "connected" if self.kme_client.is_connected else "degraded"
+            await core.start_headless_session(profile)
+            
+            session = UserSession(secrets.token_urlsafe(16), email, core)
+            self.sessions[session.session_id] = session
+            self.by_email[email] = session.session_id
+            self.stats['opened'] += 1
+            logging.info(f"Service session opened for {email} ({len(self.sessions)} active)")
+            return session
+            
+    def get(self, session_id: str) -> UserSession:
+        """Look up an active session and mark it used"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionError("Unknown or expired session")
+        session.touch()
+        return session
+        
+    async def close_session(self, session_id: str) -> bool:
+        async with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self.by_email.pop(session.email, None)
+        try:
+            await session.core.end_headless_session()
+        except Exception as e:
+            logging.warning(f"Error closing session for {session.email}: {e}")
+        self.stats['closed'] += 1
+        logging.info(f"Service session closed for {session.email}")
+        return True
+        
+    async def reap_idle(self) -> int:
+        """Close sessions idle longer than idle_timeout; returns how many were closed"""
+        now = time.monotonic()
+        idle = [sid for sid, session in self.sessions.items() if now - session.last_active > self.idle_timeout]
+        for session_id in idle:
+            if await self.close_session(session_id):
+                self.stats['expired'] += 1
+        return len(idle)
+        
+    async def close(self):
+        """Close every session, then the shared pools and KME client"""
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        await self.smtp_pool.close()
+        await self.imap_pool.close()
+        self.crypto_executor.shutdown()
+        await self.kme_client.close()
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'active_sessions': len(self.sessions),
+            'max_sessions': self.max_sessions,
+            'kme': {
+                'connected': self.kme_client.is_connected,
+                'breaker_state': self.kme_client.breaker_state,
+                'latency_ewma': self.kme_client.latency_ewma
+            },
+            'crypto_executor': self.crypto_executor.get_stats(),
+            'smtp_pool': self.smtp_pool.get_stats(),
+            'imap_pool': self.imap_pool.get_stats()
+        })
+        return stats
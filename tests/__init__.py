@@ -5,10 +5,57 @@ QuMail Tests
 Test suite for QuMail application
 """
 
+import io
+import json
+import os
+import email
+import secrets
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 import asyncio
 from ..crypto.cipher_strategies import CipherManager
-from ..crypto.kme_simulator import KMESimulator
+from ..crypto.kme_simulator import KMESimulator, EntropyReservoir
+from ..crypto.crypto_executor import CryptoExecutor
+from ..crypto.session_ratchet import SessionRatchet
+from ..crypto.srtp_keys import CallKeySchedule
+from ..crypto.srtp import SRTPSession, derive_session_keys
+from datetime import datetime
+from ..core.app_core import QuMailCore, UserProfile
+from ..core.outbox import Outbox
+from ..core.inbox_prefetch import SealedPlaintextCache
+from ..core.startup import StartupOrchestrator
+from ..utils.adaptive_compression import AdaptiveCompressor, decompress_payload
+from ..utils.perf_metrics import MetricsRegistry
+from ..utils.message_codec import MessageReader, MessageWriter, decode_message, encode_message
+from ..utils.config import load_config
+from ..transport.media_transport import JitterBuffer, LoopbackCall
+from ..transport.attachment_stream import AttachmentStreamPipeline, FileSink, SMTPDataSink, decrypt_segments
+from ..transport.smtp_pool import SMTPConnectionPool
+from ..transport.imap_pool import IMAPConnectionPool
+from ..transport.mail_engine import MailEngine, TokenCache
+from ..utils.scheduler import IDLE, BackgroundScheduler
+from ..crypto.kme_client import KMEClient
+from ..crypto.kme_network import KMENetwork
+from ..service import JSONRPCServer, RPCClient, RPCError, SessionError, SessionManager
+from ..service.rpc_server import INVALID_PARAMS, SESSION_ERROR
+
+def route_to_simulator(kme_client: KMEClient, kme: KMESimulator) -> KMEClient:
+    """Serve kme_client's requests from the simulator's Flask test client (no sockets)"""
+    kme_http = kme.app.test_client()
+    
+    async def make_request(method, endpoint, data=None, params=None, **kwargs):
+        if method == 'POST':
+            return kme_http.post(endpoint, json=data).get_json()
+        return kme_http.get(endpoint, query_string=params).get_json()
+        
+    kme_client._make_request = make_request
+    kme_client.is_connected = True
+    return kme_client
 
 class TestCipherStrategies(unittest.TestCase):
     """Test cipher strategies"""
@@ -42,6 +89,28 @@ class TestCipherStrategies(unittest.TestCase):
         
         self.assertEqual(test_data, decrypted)
         
+    def test_otp_stream(self):
+        """Test streaming OTP with mismatched data and key chunk sizes"""
+        otp = self.cipher_manager.strategies['L1']
+        test_data = os.urandom(100000)
+        test_key = os.urandom(len(test_data))
+        
+        async def chunked(data, size):
+            for offset in range(0, len(data), size):
+                yield data[offset:offset + size]
+                
+        async def run(data, data_chunk, key_chunk):
+            return b''.join([chunk async for chunk in otp.xor_stream(
+                chunked(data, data_chunk), chunked(test_key, key_chunk))])
+                
+        ciphertext = asyncio.run(run(test_data, 4096, 1000))
+        
+        self.assertEqual(ciphertext, bytes(a ^ b for a, b in zip(test_data, test_key)))
+        self.assertEqual(asyncio.run(run(ciphertext, 777, 65536)), test_data)
+        
+        with self.assertRaises(ValueError):
+            asyncio.run(run(test_data + b"x", 4096, 4096))
+            
 class TestKMESimulator(unittest.TestCase):
     """Test KME simulator"""
     
@@ -62,5 +131,1341 @@ class TestKMESimulator(unittest.TestCase):
         self.assertEqual(key.sender_sae_id, "alice")
         self.assertEqual(key.receiver_sae_id, "bob")
         
+    def test_key_stream(self):
+        """Test OTP keys stream to the sender freely and to the receiver once"""
+        key = self.kme._generate_quantum_key("alice", "bob", 10000 * 8, "otp")
+        self.kme._store_key(key)
+        client = self.kme.app.test_client()
+        
+        sender = client.get(f'/api/v1/keys/alice/{key.key_id}/stream?chunk_size=4096')
+        receiver = client.get(f'/api/v1/keys/bob/{key.key_id}/stream?chunk_size=4096')
+        replay = client.get(f'/api/v1/keys/bob/{key.key_id}/stream')
+        
+        self.assertEqual(sender.data, bytes(key.key_data))
+        self.assertEqual(receiver.data, bytes(key.key_data))
+        self.assertEqual(replay.status_code, 410)
+        
+class TestEntropyReservoir(unittest.TestCase):
+    """Test KME entropy reservoir"""
+    
+    def setUp(self):
+        self.reservoir = EntropyReservoir(block_size=1024, max_blocks=2, low_watermark=1)
+        
+    def tearDown(self):
+        self.reservoir.stop()
+        
+    def test_take_slices(self):
+        """Test reservoir hands out distinct slices across block boundaries"""
+        slices = [bytes(self.reservoir.take(100)) for _ in range(50)]
+        
+        self.assertTrue(all(len(chunk) == 100 for chunk in slices))
+        self.assertEqual(len(set(slices)), len(slices))
+        
+        stats = self.reservoir.get_stats()
+        self.assertEqual(stats['bytes_served'], 5000)
+        self.assertEqual(stats['hits'] + stats['stalls'], 50)
+        
+    def test_oversized_take(self):
+        """Test requests larger than a block bypass the pool"""
+        self.assertEqual(len(self.reservoir.take(4096)), 4096)
+        self.assertEqual(self.reservoir.get_stats()['direct_reads'], 1)
+        
+class TestCryptoExecutor(unittest.TestCase):
+    """Test crypto offload keeps the event loop responsive"""
+    
+    # Override with QUMAIL_TEST_ENCRYPT_MB where sandbox memory is tight
+    PAYLOAD_MB = int(os.getenv('QUMAIL_TEST_ENCRYPT_MB', '500'))
+    
+    def setUp(self):
+        self.executor = CryptoExecutor(CipherManager(), size_threshold=64 * 1024)
+        
+    def tearDown(self):
+        self.executor.shutdown()
+        
+    def test_small_payloads_stay_inline(self):
+        """Test payloads under the threshold skip the pool and still round-trip"""
+        key = os.urandom(32)
+        
+        async def run():
+            encrypted = await self.executor.encrypt_with_level(b"short message", key, 'L2')
+            return await self.executor.decrypt_with_level(encrypted, key)
+            
+        self.assertEqual(asyncio.run(run()), b"short message")
+        self.assertEqual(self.executor.stats['inline_operations'], 2)
+        self.assertEqual(self.executor.stats['offloaded_operations'], 0)
+        
+    def test_heartbeat_flat_during_large_encrypt(self):
+        """Test heartbeat latency stays flat while a large payload encrypts"""
+        data = os.urandom(self.PAYLOAD_MB * 1024 * 1024)
+        key = os.urandom(32)
+        interval = 0.01
+        
+        async def run():
+            lateness = []
+            done = asyncio.Event()
+            
+            async def heartbeat():
+                while not done.is_set():
+                    start = time.perf_counter()
+                    await asyncio.sleep(interval)
+                    lateness.append(time.perf_counter() - start - interval)
+                    
+            task = asyncio.create_task(heartbeat())
+            start = time.perf_counter()
+            encrypted = await self.executor.encrypt_with_level(data, key, 'L2')
+            elapsed = time.perf_counter() - start
+            done.set()
+            await task
+            return encrypted, elapsed, sorted(lateness)
+            
+        encrypted, elapsed, lateness = asyncio.run(run())
+        
+        self.assertEqual(encrypted['data_length'], len(data))
+        self.assertEqual(self.executor.stats['offloaded_operations'], 1)
+        self.assertIn('avg_ms', self.executor.get_stats()['queue_delay'])
+        
+        # Inline, the loop would stall for the whole encrypt
+        self.assertLess(lateness[int(len(lateness) * 0.95)], 0.05)
+        self.assertLess(lateness[-1], max(0.1, elapsed / 4))
+        
+class TestAttachmentStream(unittest.TestCase):
+    """Test the streaming attachment send pipeline"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.key = secrets.token_bytes(32)
+        self.attachments = []
+        for name, size in [('report.pdf', 300000), ('empty.txt', 0)]:
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            self.attachments.append({'name': name, 'path': path, 'size': size})
+            
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        
+    def test_stream_round_trip(self):
+        """Test streamed MIME parts decrypt back to the original files"""
+        spool_path = os.path.join(self.tmpdir.name, 'out.eml')
+        progress = []
+        pipeline = AttachmentStreamPipeline(self.key, chunk_size=64 * 1024, queue_depth=2,
+                                            progress_callback=lambda *args: progress.append(args))
+        preamble = b'MIME-Version: 1.0\r\nContent-Type: multipart/mixed; boundary="B"\r\n\r\n'
+        stats = asyncio.run(pipeline.send(self.attachments, FileSink(spool_path), 'B', preamble))
+        
+        with open(spool_path, 'rb') as f:
+            message = email.message_from_bytes(f.read())
+        for part, attachment in zip(message.get_payload(), self.attachments):
+            plaintext = b''.join(decrypt_segments(part.get_payload(decode=True), self.key))
+            with open(attachment['path'], 'rb') as f:
+                self.assertEqual(plaintext, f.read())
+                
+        self.assertEqual(stats['files'], 2)
+        self.assertEqual(stats['plaintext_bytes'], 300000)
+        self.assertEqual(progress[-1], ('report.pdf', 300000, 300000))
+        
+    def test_truncation_detected(self):
+        """Test a stream missing its final segment fails authentication"""
+        spool_path = os.path.join(self.tmpdir.name, 'out.eml')
+        pipeline = AttachmentStreamPipeline(self.key, chunk_size=64 * 1024)
+        asyncio.run(pipeline.send(self.attachments[:1], FileSink(spool_path), 'B',
+                                  b'Content-Type: multipart/mixed; boundary="B"\r\n\r\n'))
+        
+        with open(spool_path, 'rb') as f:
+            data = email.message_from_bytes(f.read()).get_payload()[0].get_payload(decode=True)
+        truncated = data[:11 + 4 + 64 * 1024 - 64 * 1024 % 57 + 16]
+        with self.assertRaises(Exception):
+            list(decrypt_segments(truncated, self.key))
+            
+    def test_smtp_sink_streams_with_flow_control(self):
+        """Test SMTP DATA streaming to a slow server waits on the socket and delivers intact"""
+        import aiosmtplib
+        
+        received = []
+        
+        async def handle(reader, writer):
+            writer.write(b"220 test ready\r\n")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.strip().upper()
+                if command.startswith(b"EHLO") or command.startswith(b"HELO"):
+                    writer.write(b"250 test\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 go ahead\r\n")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        line = await reader.readline()
+                        if line == b".\r\n":
+                            break
+                        lines.append(line[1:] if line.startswith(b'.') else line)
+                        if len(lines) % 100 == 0:
+                            await asyncio.sleep(0.001)  # a slow reader, so the client's buffer fills
+                    received.append(b''.join(lines))
+                    writer.write(b"250 queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+            writer.close()
+            
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            client = aiosmtplib.SMTP(hostname='127.0.0.1', port=port, start_tls=False)
+            await client.connect()
+            # Small socket and transport buffers so the stream has to wait on the reader
+            client.protocol.transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            client.protocol.transport.set_write_buffer_limits(high=16 * 1024)
+            sink = SMTPDataSink(client, 'alice@qumail.com', ['bob@qumail.com'])
+            pipeline = AttachmentStreamPipeline(self.key, chunk_size=64 * 1024)
+            await pipeline.send(self.attachments, sink, 'B',
+                                b'Content-Type: multipart/mixed; boundary="B"\r\n\r\n.leading dot\r\n')
+            await client.quit()
+            server.close()
+            await server.wait_closed()
+            return sink
+            
+        sink = asyncio.run(run())
+        self.assertGreater(sink.stalls, 0)
+        message = email.message_from_bytes(received[0])
+        self.assertIn(b'\r\n.leading dot\r\n', received[0])
+        part = message.get_payload()[0]
+        with open(self.attachments[0]['path'], 'rb') as f:
+            self.assertEqual(b''.join(decrypt_segments(part.get_payload(decode=True), self.key)), f.read())
+
+class TestOutbox(unittest.TestCase):
+    """Test the outbound send queue"""
+    
+    def test_parallel_sends_with_destination_limit(self):
+        """Test workers run sends in parallel but cap each destination"""
+        active = {}
+        peak = {}
+        
+        async def send(to_address, subject):
+            active[to_address] = active.get(to_address, 0) + 1
+            peak[to_address] = max(peak.get(to_address, 0), active[to_address])
+            await asyncio.sleep(0.01)
+            active[to_address] -= 1
+            return subject != 'fail'
+            
+        async def run():
+            outbox = Outbox(send, workers=4, max_queue=20, per_destination_limit=2)
+            handles = [await outbox.enqueue(to, to_address=to, subject=f"m{i}")
+                       for i, to in enumerate(['a@qumail.com'] * 6 + ['b@qumail.com'] * 2)]
+            handles.append(await outbox.enqueue('c@qumail.com', to_address='c@qumail.com', subject='fail'))
+            results = [await handle.wait() for handle in handles]
+            stats = outbox.get_stats()
+            await outbox.stop()
+            return results, stats
+            
+        results, stats = asyncio.run(run())
+        
+        self.assertEqual(results, [True] * 8 + [False])
+        self.assertEqual(peak['a@qumail.com'], 2)
+        self.assertEqual(stats['sent'], 8)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['depth'], 0)
+        self.assertGreater(stats['throughput_per_sec'], 0)
+        
+    def test_backpressure(self):
+        """Test a full outbox refuses non-blocking sends and blocks others"""
+        release = None
+        
+        async def send(to_address):
+            await release.wait()
+            return True
+            
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            outbox = Outbox(send, workers=1, max_queue=2)
+            first = outbox.try_enqueue('a', to_address='a')
+            await asyncio.sleep(0)  # worker picks up the first send
+            queued = [outbox.try_enqueue('a', to_address='a') for _ in range(3)]
+            
+            blocked = asyncio.ensure_future(outbox.enqueue('a', to_address='a'))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            
+            release.set()
+            await (await blocked).wait()
+            await outbox.stop()
+            return first, queued, outbox.get_stats()
+            
+        first, queued, stats = asyncio.run(run())
+        
+        self.assertIsNotNone(first)
+        self.assertIsNone(queued[2])
+        self.assertEqual(stats['rejected'], 1)
+        self.assertEqual(stats['sent'], 4)
+        
+    def test_logout_drains_queued_sends(self):
+        """Test sends still queued at logout are delivered before the user and KME go away"""
+        kme = KMESimulator()
+        core = QuMailCore(load_config())
+        core.current_user = UserProfile(
+            user_id='alice', email='alice@qumail.com', display_name='Alice', password_hash='',
+            sae_id='qumail_alice', provider='qumail', created_at=datetime.utcnow(), last_login=datetime.utcnow()
+        )
+        route_to_simulator(core.kme_client, kme)
+        
+        async def run():
+            await core.email_handler.initialize(core.current_user)
+            handle = await core.enqueue_send('bob@qumail.com', "Queued", "Sent during logout", security_level='L2')
+            await core.logout_user()
+            return handle
+            
+        handle = asyncio.run(run())
+        self.assertEqual(handle.status, 'sent')
+        self.assertIsNone(core.current_user)
+        inbox = core.email_handler.qumail_mock_inboxes['bob@qumail.com']['Inbox']
+        self.assertEqual(len(inbox), 1)
+        
+class TestBulkSend(unittest.TestCase):
+    """Test bulk sends encrypt content once and wrap the CEK per recipient"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        
+        self.core = QuMailCore(load_config())
+        self.core.current_user = UserProfile(
+            user_id='alice', email='alice@qumail.com', display_name='Alice', password_hash='',
+            sae_id='qumail_alice', provider='qumail', created_at=datetime.utcnow(), last_login=datetime.utcnow()
+        )
+        self.core.email_handler.oauth_manager = None
+        asyncio.run(self.core.email_handler.initialize(self.core.current_user))
+        route_to_simulator(self.core.kme_client, self.kme)
+        
+    def test_bulk_round_trip(self):
+        """Test every recipient decrypts the single shared ciphertext"""
+        recipients = [f"user{i}@qumail.com" for i in range(5)]
+        encrypted_before = self.core.crypto_executor.stats['inline_operations']
+        
+        results = asyncio.run(self.core.send_secure_email_bulk(recipients, "Hello", "Bulk body"))
+        self.assertEqual(results, {recipient: True for recipient in recipients})
+        
+        # Content encrypted exactly once
+        self.assertEqual(self.core.crypto_executor.stats['inline_operations'] - encrypted_before, 1)
+        
+        payloads = [self.core.email_handler.qumail_mock_inboxes[recipient]['Inbox'][-1]['encrypted_payload']
+                    for recipient in recipients]
+        self.assertEqual(len({id(p['encrypted_content_payload']) for p in payloads}), 1)
+        self.assertEqual(len({p['key_id'] for p in payloads}), len(recipients))
+        
+        async def decrypt_all():
+            opened = []
+            for payload in payloads:
+                key = self.kme.keys[payload['key_id']].key_data
+                opened.append(await self.core._decrypt_fetched_email(
+                    'id', {'encrypted_payload': payload, 'sender': 'alice@qumail.com', 'received_at': ''},
+                    bytes(key)
+                ))
+            return opened
+            
+        for message in asyncio.run(decrypt_all()):
+            self.assertEqual(message['body'], "Bulk body")
+            
+class TestInboxPrefetch(unittest.TestCase):
+    """Test listing the inbox decrypts the newest emails ahead into the sealed cache"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_prefetch_then_open_hits_cache(self):
+        """Test opening a prefetched email skips the KME and decryption"""
+        async def run():
+            for i in range(3):
+                await self.core.send_secure_email('alice@qumail.com', f"Subject {i}", f"Body {i}")
+                await asyncio.sleep(0.002)  # loopback email IDs are millisecond timestamps
+                
+            emails = await self.core.get_email_list('Inbox')
+            await self.core.inbox_prefetcher.task
+            
+            self.core.kme_client.get_key = None  # any further key lookup would fail the open
+            return [await self.core.receive_secure_email(email['email_id']) for email in emails]
+            
+        opened = asyncio.run(run())
+        self.assertEqual(sorted(message['body'] for message in opened), ["Body 0", "Body 1", "Body 2"])
+        
+        stats = self.core.inbox_prefetcher.get_stats()
+        self.assertEqual(stats['prefetched'], 3)
+        self.assertEqual(stats['cache']['hit_rate'], 1.0)
+        
+        # Entries are sealed, never stored as plaintext
+        for _, sealed in self.core.inbox_prefetcher.cache.entries.values():
+            self.assertNotIn(b"Body", sealed)
+            
+    def test_prefetch_skips_one_time_pads(self):
+        """Test prefetch leaves L1 emails alone so their OTP key is only consumed when opened"""
+        async def run():
+            await self.core.send_secure_email('alice@qumail.com', "OTP", "One-time pad body", security_level='L1')
+            await asyncio.sleep(0.002)
+            await self.core.send_secure_email('alice@qumail.com', "Seed", "Seeded body", security_level='L2')
+            emails = await self.core.get_email_list('Inbox')
+            await self.core.inbox_prefetcher.task
+            return emails
+            
+        emails = asyncio.run(run())
+        otp = next(email for email in emails if email['encrypted_payload']['security_level'] == 'L1')
+        self.assertFalse(self.kme.keys[otp['encrypted_payload']['key_id']].consumed)
+        self.assertEqual(self.core.inbox_prefetcher.get_stats()['prefetched'], 1)
+        
+        opened = asyncio.run(self.core.receive_secure_email(otp['email_id']))
+        self.assertEqual(opened['body'], "One-time pad body")
+        
+    def test_prefetch_keys_page_in_one_batch(self):
+        """Test a prefetched page is keyed from one dec_keys lookup instead of one get_key per email"""
+        lookups = []
+        get_keys = self.core.kme_client.get_keys
+        
+        async def counting_get_keys(sae_id, key_ids):
+            lookups.append(list(key_ids))
+            return await get_keys(sae_id, key_ids)
+            
+        async def run():
+            for i in range(4):
+                await self.core.send_secure_email('alice@qumail.com', f"Subject {i}", f"Body {i}")
+                await asyncio.sleep(0.002)
+                
+            self.core.kme_client.get_key = None  # the per-email path must not be used
+            self.core.kme_client.get_keys = counting_get_keys
+            emails = await self.core.get_email_list('Inbox')
+            opening = asyncio.ensure_future(self.core.receive_secure_email(emails[0]['email_id']))
+            await self.core.inbox_prefetcher.task
+            return await opening
+            
+        opened = asyncio.run(run())
+        self.assertIn(opened['body'], ["Body 0", "Body 1", "Body 2", "Body 3"])
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(len(lookups[0]), 4)
+        
+        stats = self.core.inbox_prefetcher.get_stats()
+        self.assertEqual(stats['prefetched'], 4)
+        
+    def test_sealed_cache_lru_bounds(self):
+        """Test the cache evicts least recently used entries past its byte budget"""
+        cache = SealedPlaintextCache(max_bytes=600, max_entries=10)
+        for i in range(5):
+            cache.put(f"k{i}", {'body': 'x' * 100})
+            
+        self.assertLessEqual(cache.size, 600)
+        self.assertIsNone(cache.get('k0'))
+        self.assertEqual(cache.get('k4'), {'body': 'x' * 100})
+        self.assertGreater(cache.stats['evictions'], 0)
+        
+class TestMessageCodec(unittest.TestCase):
+    """Test the framed binary message format"""
+    
+    def setUp(self):
+        self.message = {
+            'subject': 'Quantum report Ψ',
+            'body': 'Body text',
+            'total_attachment_size': 4096,
+            'has_large_files': False,
+            'priority': None,
+            'attachments': [
+                {'name': 'inline.bin', 'size': 4096, 'data': secrets.token_bytes(4096)},
+                {'name': 'mock.iso', 'size': 10 ** 9, 'is_mock': True}
+            ]
+        }
+        
+    def test_round_trip_keeps_attachment_bytes_raw(self):
+        """Test attachment bytes survive unencoded and legacy JSON still decodes"""
+        encoded = encode_message(self.message)
+        self.assertIn(self.message['attachments'][0]['data'], encoded)
+        self.assertLess(len(encoded), 4096 + 512)
+        self.assertEqual(decode_message(encoded), self.message)
+        
+        legacy = {'subject': 'Old', 'body': 'JSON payload', 'attachments': []}
+        self.assertEqual(decode_message(json.dumps(legacy).encode('utf-8')), legacy)
+        
+    def test_streaming_reader_writer(self):
+        """Test the streaming writer output reads back section by section"""
+        stream = io.BytesIO()
+        MessageWriter(stream).write(self.message)
+        self.assertEqual(stream.getvalue(), encode_message(self.message))
+        
+        stream.seek(0)
+        reader = MessageReader(stream, chunk_size=1000)
+        fields = reader.read_fields()
+        self.assertEqual(fields['subject'], self.message['subject'])
+        
+        sections = [(index, list(chunks)) for index, chunks in reader.sections()]
+        self.assertEqual([index for index, _ in sections], [0])
+        self.assertEqual(len(sections[0][1]), 5)
+        self.assertEqual(b''.join(sections[0][1]), self.message['attachments'][0]['data'])
+        
+class TestAdaptiveCompression(unittest.TestCase):
+    """Test pre-encryption compression choice, envelope record and OTP savings"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_incompressible_payload_skipped(self):
+        """Test random bytes are sent as-is and text round-trips through the record"""
+        compressor = AdaptiveCompressor()
+        payload, record = compressor.compress(secrets.token_bytes(64 * 1024))
+        self.assertEqual(record['codec'], 'none')
+        self.assertEqual(len(payload), 64 * 1024)
+        
+        text = ("Quantum keys rotate every epoch. " * 2000).encode('utf-8')
+        payload, record = compressor.compress(text)
+        self.assertNotEqual(record['codec'], 'none')
+        self.assertLess(len(payload), len(text) // 10)
+        self.assertEqual(decompress_payload(payload, record), text)
+        self.assertIn(f"{record['codec']}:{record['level']}", compressor.get_stats()['levels'])
+        
+    def test_compressed_otp_email_fits_key_budget(self):
+        """Test a 100KB text body now fits under the 50KB OTP limit and decrypts"""
+        body = "Status nominal on all quantum links. " * 2800
+        
+        async def run():
+            sent = await self.core.send_secure_email('alice@qumail.com', "Daily report", body, security_level='L1')
+            email_id = self.core.email_handler.local_email_store['Inbox'][-1]['email_id']
+            return sent, await self.core.receive_secure_email(email_id)
+            
+        sent, message = asyncio.run(run())
+        self.assertTrue(sent)
+        envelope = self.core.email_handler.local_email_store['Inbox'][-1]['encrypted_payload']
+        self.assertNotEqual(envelope['compression']['codec'], 'none')
+        self.assertLess(len(self.kme.keys[envelope['key_id']].key_data), 50 * 1024)
+        self.assertEqual(message['body'], body)
+        
+class TestPerformanceMetrics(unittest.TestCase):
+    """Test per-stage latency spans in the send/receive paths"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_send_and_receive_stages_recorded(self):
+        """Test each stage of a send and an open lands in the registry"""
+        async def run():
+            await self.core.send_secure_email('alice@qumail.com', "Metrics", "Body")
+            email_id = self.core.email_handler.local_email_store['Inbox'][-1]['email_id']
+            await self.core.receive_secure_email(email_id)
+            await self.core.receive_secure_email(email_id)
+            
+        asyncio.run(run())
+        metrics = self.core.get_performance_metrics()
+        for stage in ['serialize', 'compress', 'key_request', 'encrypt', 'transport', 'total']:
+            self.assertEqual(metrics['latency'][f"email.send.{stage}"]['count'], 1)
+        for stage in ['fetch', 'key_fetch', 'decrypt', 'deserialize']:
+            self.assertEqual(metrics['latency'][f"email.decrypt.{stage}"]['count'], 1)
+        self.assertEqual(metrics['latency']['email.receive.total']['count'], 2)
+        self.assertEqual(metrics['counters']['email.receive.cache_hit'], 1)
+        self.assertEqual(metrics['counters']['email.send.ok'], 1)
+        
+    def test_histogram_percentiles_and_overhead(self):
+        """Test bucketed percentiles are close and a span costs microseconds"""
+        registry = MetricsRegistry()
+        for ms in range(1, 101):
+            registry.record('op.stage', ms / 1000)
+        summary = registry.snapshot()['latency']['op.stage']
+        self.assertLessEqual(summary['p50_ms'], 2 * 50)
+        self.assertGreaterEqual(summary['p95_ms'], 95)
+        self.assertEqual(summary['max_ms'], 100)
+        
+        start = time.perf_counter()
+        for _ in range(10000):
+            trace = registry.trace('hot')
+            trace.mark('a')
+            trace.end()
+        self.assertLess((time.perf_counter() - start) / 10000, 50e-6)
+        
+class TestSecurityPolicy(unittest.TestCase):
+    """Test security level selection from KME key material, latency and breaker state"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def limit_key_material(self, bits: int):
+        """Pin a cached aggregated status whose links hold only `bits` of key material"""
+        self.core.kme_client.status_snapshot = {'global': {}, 'links': [{'link_id': 'a-b', 'available_bits': bits}]}
+        self.core.kme_client.status_fetched_at = time.monotonic() + 3600  # never refreshed
+        
+    def test_downgrade_within_floor_when_otp_material_short(self):
+        """Test an L1 send with an L2 floor goes out as L2 when link bits run short"""
+        self.limit_key_material(2000)
+        body = secrets.token_hex(1000)  # ~8K bits of OTP even after compression
+        sent = asyncio.run(self.core.send_secure_email('alice@qumail.com', "Policy", body, security_level='L1',
+                                                       min_security_level='L2'))
+        self.assertTrue(sent)
+        decision = self.core.get_security_decisions()[-1]
+        self.assertEqual((decision['requested_level'], decision['level']), ('L1', 'L2'))
+        self.assertEqual(self.core.email_handler.local_email_store['Inbox'][-1]['encrypted_payload']['security_level'], 'L2')
+        
+    def test_defer_until_key_material_or_timeout(self):
+        """Test an L1-floor send defers, then times out or proceeds once material returns"""
+        policy = self.core.security_policy
+        policy.poll_interval = 0.01
+        self.limit_key_material(2000)
+        
+        decision = asyncio.run(policy.decide_or_wait('L1', 1024, timeout=0.05))
+        self.assertEqual((decision.action, decision.blocker), ('defer', 'key_material'))
+        self.assertEqual(policy.stats['deferral_timeouts'], 1)
+        
+        # Cache expiry lets the next poll see the simulator's real link capacity
+        self.core.kme_client.status_fetched_at = time.monotonic() - 3600
+        decision = asyncio.run(policy.decide_or_wait('L1', 1024, timeout=5))
+        self.assertEqual((decision.action, decision.level), ('send', 'L1'))
+        self.assertEqual(policy.stats['deferred'], 2)
+        
+    def test_latency_and_breaker_signals(self):
+        """Test a slow KME picks a faster level and an open breaker rejects quantum-only floors"""
+        policy = self.core.security_policy
+        self.core.kme_client.latency_ewma = 5.0
+        self.assertEqual(policy.decide('L2', 1024, floor='L4').level, 'L4')
+        self.assertEqual(policy.decide('L2', 1024).level, 'L2')  # floor L2: slow but still allowed
+        
+        self.core.kme_client.latency_ewma = 0.01
+        self.core.kme_client.is_connected = False
+        self.assertEqual(policy.decide('L2', 1024).blocker, 'breaker_open')
+        self.assertEqual(policy.decide('L1', 60 * 1024).blocker, 'size')
+        self.assertEqual(self.core.get_qkd_status()['security_policy']['signals']['breaker'], 'open')
+        
+    def test_key_material_follows_relay_path(self):
+        """Test only the links on the path to the receiver limit key material"""
+        network = KMENetwork.from_config({
+            'nodes': ['A', 'B', 'C'],
+            'links': [
+                {'a': 'A', 'b': 'B', 'key_rate': 100000},
+                {'a': 'A', 'b': 'C', 'key_rate': 10, 'buffer_seconds': 1}  # nearly no link key
+            ],
+            'saes': {'qumail_alice': 'A', 'bob': 'B', 'carol': 'C'}
+        })
+        route_to_simulator(self.core.kme_client, network.nodes['A'])
+        policy = self.core.security_policy
+        
+        async def run():
+            await self.core.kme_client.get_aggregated_status(max_age=0)
+            return (await policy.decide_or_wait('L1', 1024, receiver_sae_id='bob', timeout=0.05),
+                    await policy.decide_or_wait('L1', 1024, receiver_sae_id='carol', timeout=0.05))
+                    
+        to_bob, to_carol = asyncio.run(run())
+        self.assertEqual((to_bob.action, to_bob.level), ('send', 'L1'))
+        self.assertEqual(to_bob.signals['route'], ['A', 'B'])
+        self.assertEqual((to_carol.action, to_carol.blocker), ('defer', 'key_material'))
+        
+class TestSessionRatchet(unittest.TestCase):
+    """Test KME-seeded ratchet chains for chat and email session keys"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_out_of_order_keys_and_skipped_cache_bound(self):
+        """Test receivers derive skipped keys once, within the cache bound"""
+        sender, receiver = SessionRatchet(), SessionRatchet(max_skipped_keys=2)
+        seed = secrets.token_bytes(32)
+        sender.seed_sending_chain('bob', 'QK_seed', seed)
+        sent = [sender.next_sending_key('bob') for _ in range(5)]
+        self.assertEqual(len({key for _, _, key in sent}), 5)
+        
+        self.assertIsNone(receiver.receive_key('QK_seed', 4))  # seed needed first
+        self.assertEqual(receiver.receive_key('QK_seed', 4, seed=seed), sent[4][2])
+        self.assertEqual(receiver.receive_key('QK_seed', 3), sent[3][2])  # from the skipped cache
+        self.assertIsNone(receiver.receive_key('QK_seed', 0))  # evicted (bound of 2)
+        self.assertIsNone(receiver.receive_key('QK_seed', 3))  # each key is released once
+        self.assertEqual(receiver.receive_key('QK_seed', 0, seed=seed), sent[0][2])
+        self.assertEqual(receiver.stats['skipped_keys_evicted'], 2)  # 0 and 1 of four skipped
+        
+    def test_chat_session_reseeds_and_decrypts(self):
+        """Test session chat uses one KME seed per reseed window and decrypts out of order"""
+        self.core.chat_handler.is_connected = True
+        self.core.session_ratchet.reseed_messages = 2
+        keys_before = len(self.kme.keys)
+        
+        async def run():
+            for i in range(3):
+                self.assertTrue(await self.core.send_secure_chat_message('bob', f"hi {i}", 'L2', session=True))
+            payloads = [message.encrypted_payload for message in self.core.chat_handler.active_chats['bob']]
+            return [await self.core.decrypt_secure_chat_message(payload) for payload in reversed(payloads)]
+            
+        self.assertEqual(asyncio.run(run()), ["hi 2", "hi 1", "hi 0"])
+        self.assertEqual(len(self.kme.keys) - keys_before, 2)
+        self.assertEqual(self.core.session_ratchet.stats['seeds'], 2)
+        
+    def test_email_session_round_trip_and_reread(self):
+        """Test ratcheted emails carry seed key_id and index and reopen after the cache is dropped"""
+        async def run():
+            for i in range(2):
+                self.assertTrue(await self.core.send_secure_email('alice@qumail.com', f"Session {i}", "Body",
+                                                                  security_level='L2', session=True))
+                await asyncio.sleep(0.002)
+            inbox = self.core.email_handler.local_email_store['Inbox'][-2:]
+            self.assertEqual([e['encrypted_payload']['ratchet_index'] for e in inbox], [0, 1])
+            self.assertEqual(inbox[0]['encrypted_payload']['key_id'], inbox[1]['encrypted_payload']['key_id'])
+            
+            second = await self.core.receive_secure_email(inbox[1]['email_id'])
+            first = await self.core.receive_secure_email(inbox[0]['email_id'])
+            self.core.inbox_prefetcher.cache.clear()
+            reread = await self.core.receive_secure_email(inbox[1]['email_id'])
+            return first, second, reread
+            
+        first, second, reread = asyncio.run(run())
+        self.assertEqual((first['subject'], second['subject'], reread['subject']), ("Session 0", "Session 1", "Session 1"))
+        self.assertEqual(self.core.session_ratchet.stats['seed_rederivations'], 1)
+        
+class TestSRTPKeySchedule(unittest.TestCase):
+    """Test per-call SRTP epoch keys derived from prefetched quantum seeds"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_local_epoch_rekeys_and_prefetched_reseed(self):
+        """Test epochs rekey without the KME and the next seed is fetched before it is due"""
+        now = [0.0]
+        
+        async def request_seed():
+            return await self.core.kme_client.request_key('qumail_alice', 'qumail_bob', 256, 'seed')
+            
+        async def run():
+            schedule = CallKeySchedule('call_1', request_seed, epoch_seconds=10, epochs_per_seed=3,
+                                       prefetch_lead=5, clock=lambda: now[0])
+            first = await schedule.start()
+            now[0] = 15
+            second = schedule.current()
+            self.assertEqual(schedule.stats['seed_requests'], 1)  # epoch 1 derived locally
+            
+            now[0] = 26
+            schedule.current()  # 4s before the seed's epochs run out
+            await schedule._prefetch
+            now[0] = 31
+            third = schedule.current()
+            return schedule, first, second, third
+            
+        schedule, first, second, third = asyncio.run(run())
+        self.assertEqual([k.epoch for k in (first, second, third)], [0, 1, 3])
+        self.assertEqual(first.key_id, second.key_id)
+        self.assertNotEqual(third.key_id, first.key_id)
+        self.assertEqual((len(first.master_key), len(first.master_salt)), (16, 14))
+        self.assertNotEqual(first.master_key, second.master_key)
+        self.assertEqual((schedule.stats['seed_requests'], schedule.stats['late_seeds']), (2, 0))
+        
+        # The callee derives the same epoch key from the seed's key_id
+        receiver = CallKeySchedule('call_1')
+        receiver.install_seed(third.key_id, self.kme.keys[third.key_id].key_data)
+        self.assertEqual(receiver.key_for(third.key_id, 3).master_key, third.master_key)
+        
+    def test_late_seed_epoch_resolves_from_mki(self):
+        """Test an epoch derived from the old seed while the next seed was late decrypts on receive"""
+        now = [0.0]
+        release = asyncio.Event()
+        seeds = []
+        
+        async def request_seed():
+            if seeds:
+                await release.wait()  # the second seed arrives late
+            seeds.append(await self.core.kme_client.request_key('qumail_alice', 'qumail_bob', 256, 'seed'))
+            return seeds[-1]
+            
+        async def run():
+            schedule = CallKeySchedule('call_late', request_seed, epoch_seconds=10, epochs_per_seed=2,
+                                       prefetch_lead=5, clock=lambda: now[0])
+            await schedule.start()
+            now[0] = 16
+            schedule.current()  # starts the prefetch, which stalls
+            now[0] = 21
+            late = schedule.current()  # epoch 2 is due but its seed is not
+            release.set()
+            await schedule._prefetch
+            switched = schedule.current()  # same epoch, now on the new seed
+            return schedule, late, switched
+            
+        schedule, late, switched = asyncio.run(run())
+        self.assertEqual((late.epoch, switched.epoch), (2, 2))
+        self.assertNotEqual(late.key_id, switched.key_id)
+        self.assertNotEqual(late.mki, switched.mki)
+        self.assertEqual(schedule.stats['late_seeds'], 1)
+        
+        receiver = CallKeySchedule('call_late')
+        for seed in seeds:
+            receiver.install_seed(seed['key_id'], self.kme.keys[seed['key_id']].key_data)
+            
+        sender_srtp, receiver_srtp = SRTPSession(), SRTPSession()
+        packet = struct.pack('>BBHII', 0x80, 0, 1, 160, 0x1234) + b"late seed audio"
+        for key in (late, switched):
+            sender_srtp.install_key(key.mki, key.master_key, key.master_salt)
+            protected = sender_srtp.protect(packet)
+            mki = struct.unpack_from('>I', protected, len(protected) - 14)[0]
+            resolved = receiver.key_for_mki(mki)
+            self.assertEqual(resolved.master_key, key.master_key)
+            receiver_srtp.install_key(mki, resolved.master_key, resolved.master_salt, send=False)
+            self.assertEqual(receiver_srtp.unprotect(protected), packet)
+            packet = packet[:2] + struct.pack('>H', 2) + packet[4:]
+
+class TestSRTPEngine(unittest.TestCase):
+    """Test batched SRTP protect/unprotect, replay window and rekeying"""
+    
+    def setUp(self):
+        self.master_key, self.master_salt = secrets.token_bytes(16), secrets.token_bytes(14)
+        self.sender, self.receiver = SRTPSession(batch_size=16), SRTPSession(batch_size=16)
+        self.sender.install_key(0, self.master_key, self.master_salt)
+        self.receiver.install_key(0, self.master_key, self.master_salt, send=False)
+        
+    def rtp(self, seq: int, payload_size: int = 160) -> bytes:
+        return struct.pack('>BBHII', 0x80, 0, seq & 0xFFFF, seq * 160, 0xCAFE) + secrets.token_bytes(payload_size)
+        
+    def test_rfc3711_key_derivation(self):
+        """Test session keys match the RFC 3711 B.3 vectors"""
+        keys = derive_session_keys(bytes.fromhex('E1F97A0D3E018BE0D64FA32C06DE4139'),
+                                   bytes.fromhex('0EC675AD498AFEEBB6960B3AABE6'))
+        self.assertEqual([key.hex() for key in keys], [
+            'c61e7a93744f39ee10734afe3ff7a087',
+            'cebe321f6ff7716b6fd4ab49af256a156d38baa4',
+            '30cbbc08863d8c85d49db34a9ae1'
+        ])
+        
+    def test_batches_across_rollover_replay_and_tamper(self):
+        """Test out-of-order batches decrypt across a sequence wrap; replays and forgeries drop"""
+        packets = [self.rtp(seq, size) for seq, size in zip(range(65500, 65600), [160, 1200, 3, 0] * 25)]
+        protected = self.sender.protect_batch(packets)
+        self.assertEqual(self.sender.send_streams[0xCAFE].roc, 1)
+        
+        order = list(range(100))
+        for i in range(0, 100, 8):
+            order[i:i + 8] = reversed(order[i:i + 8])  # reordered within the replay window
+        unprotected = self.receiver.unprotect_batch([protected[i] for i in order])
+        self.assertEqual(unprotected, [packets[i] for i in order])
+        
+        forged = bytearray(self.sender.protect(self.rtp(65600)))
+        forged[20] ^= 1
+        self.assertEqual(self.receiver.unprotect_batch([protected[99], bytes(forged)]), [None, None])
+        self.assertEqual((self.receiver.stats['replayed'], self.receiver.stats['auth_failures']), (1, 1))
+        
+    def test_rekey_keeps_previous_epoch_for_late_packets(self):
+        """Test packets sent before a rekey still decrypt after it"""
+        late = self.sender.protect(self.rtp(1))
+        new_key, new_salt = secrets.token_bytes(16), secrets.token_bytes(14)
+        self.sender.install_key(1, new_key, new_salt)
+        self.receiver.install_key(1, new_key, new_salt, send=False)
+        fresh = self.sender.protect(self.rtp(2))
+        
+        self.assertIsNotNone(self.receiver.unprotect(fresh))
+        self.assertIsNotNone(self.receiver.unprotect(late))
+        self.assertEqual(self.sender.get_stats()['rekeys'], 1)
+        
+class TestMediaTransport(unittest.TestCase):
+    """Test the jitter buffer and SRTP calls over loopback UDP"""
+    
+    setUp = TestBulkSend.setUp
+    
+    def test_jitter_buffer_reorders_and_conceals(self):
+        """Test reordered frames play in order and a missing one is concealed"""
+        buffer = JitterBuffer(clock_rate=8000, frame_seconds=0.02, min_delay=0.01)
+        arrivals = [(0, 0.000), (2, 0.041), (1, 0.045), (4, 0.080)]  # 3 never arrives
+        for seq, arrival in arrivals:
+            buffer.push(seq, seq * 160, bytes([seq]), arrival)
+        played = buffer.pop_due(now=1.0)
+        self.assertEqual(played, [b'\x00', b'\x01', b'\x02', None, b'\x04'])
+        stats = buffer.get_stats()
+        self.assertEqual((stats['played'], stats['concealed'], stats['lost']), (4, 1, 1))
+        self.assertGreater(stats['jitter_ms'], 0)
+        
+    def test_loopback_call_rekeys_without_loss(self):
+        """Test a quantum-keyed loopback call plays every frame across epoch rekeys"""
+        async def request_seed():
+            return await self.core.kme_client.request_key('qumail_alice', 'qumail_bob', 256, 'seed')
+            
+        async def run():
+            schedule = CallKeySchedule('call_media', request_seed, epoch_seconds=0.15)
+            await schedule.start()
+            call = LoopbackCall('call_media', SRTPSession, schedule.current)
+            await call.start()
+            await asyncio.sleep(0.5)
+            await call.stop()
+            return call.get_stats()
+            
+        stats = asyncio.run(run())
+        self.assertGreaterEqual(stats['epoch'], 2)
+        for side in ('caller', 'callee'):
+            self.assertEqual(stats[side]['rejected'], 0)
+            self.assertEqual(stats[side]['jitter_buffer']['lost'], 0)
+            self.assertGreater(stats[side]['jitter_buffer']['played'], 15)
+        self.assertLess(stats['mouth_to_ear']['p50_ms'], 100)
+        
+class TestStartupOrchestrator(unittest.TestCase):
+    """Test startup phases run concurrently in dependency order"""
+    
+    def test_independent_phases_overlap(self):
+        """Test independent phases run together and dependents wait for theirs"""
+        order = []
+        
+        def phase(name, delay):
+            async def run():
+                order.append(f"{name}:start")
+                await asyncio.sleep(delay)
+                order.append(f"{name}:end")
+            return run
+            
+        async def run():
+            startup = StartupOrchestrator(MetricsRegistry())
+            startup.add('storage', phase('storage', 0.1))
+            startup.add('kme', phase('kme', 0.1))
+            startup.add('profile', phase('profile', 0.0), depends_on=['storage'])
+            started = time.perf_counter()
+            ok = await startup.run()
+            return ok, time.perf_counter() - started, startup
+            
+        ok, elapsed, startup = asyncio.run(run())
+        self.assertTrue(ok)
+        self.assertLess(elapsed, 0.18)  # storage and kme overlapped
+        self.assertLess(order.index('kme:start'), order.index('storage:end'))
+        self.assertGreater(order.index('profile:start'), order.index('storage:end'))
+        timings = startup.get_timings()
+        self.assertEqual({p['status'] for p in timings['phases'].values()}, {'ok'})
+        self.assertEqual(startup.metrics.get('startup.kme').count, 1)
+        
+    def test_failed_dependency_skips_dependents(self):
+        """Test a failing phase skips its dependents and unknown dependencies are rejected"""
+        async def fail():
+            raise RuntimeError("storage locked")
+            
+        async def noop():
+            pass
+            
+        async def run():
+            startup = StartupOrchestrator()
+            startup.add('storage', fail)
+            startup.add('profile', noop, depends_on=['storage'])
+            startup.add('kme', noop)
+            return await startup.run(), startup.get_timings()['phases']
+            
+        ok, phases = asyncio.run(run())
+        self.assertFalse(ok)
+        self.assertEqual(phases['storage']['status'], 'failed')
+        self.assertEqual(phases['profile']['status'], 'skipped')
+        self.assertEqual(phases['kme']['status'], 'ok')
+        
+        startup = StartupOrchestrator()
+        startup.add('profile', noop, depends_on=['storage'])
+        with self.assertRaises(ValueError):
+            asyncio.run(startup.run())
+            
+    def test_core_ready_before_slow_kme(self):
+        """Test core initialization returns with the profile loaded while the KME is still connecting"""
+        core = QuMailCore(load_config())
+        
+        async def noop():
+            pass
+            
+        async def load_profile():
+            core.current_user = UserProfile(
+                user_id='alice', email='alice@qumail.com', display_name='Alice', password_hash='',
+                sae_id='qumail_alice', provider='qumail', created_at=datetime.utcnow(), last_login=datetime.utcnow()
+            )
+            
+        async def slow_kme(enable_heartbeat=True):
+            await asyncio.sleep(0.3)
+            
+        core.secure_storage.initialize = noop
+        core.load_user_profile = load_profile
+        core.kme_client.initialize = slow_kme
+        
+        async def run():
+            started = time.perf_counter()
+            await core.initialize()
+            ready = time.perf_counter() - started
+            kme_pending = not core.startup.is_done('kme')
+            await core.initialize_kme_with_robustness()  # joins the in-flight connect
+            await core.startup.wait()
+            return ready, kme_pending, core.get_startup_timings()
+            
+        ready, kme_pending, timings = asyncio.run(run())
+        self.assertLess(ready, 0.2)
+        self.assertTrue(kme_pending)
+        self.assertEqual(core.current_user.email, 'alice@qumail.com')
+        self.assertEqual(core.email_handler.user_email, 'alice@qumail.com')
+        self.assertGreaterEqual(timings['phases']['kme']['duration'], 0.3)
+        self.assertLess(timings['ready_after'], timings['total'])
+        
+class TestLazyImports(unittest.TestCase):
+    """Test heavy optional modules stay unloaded until used"""
+    
+    def test_core_import_skips_simulator_and_mail_libraries(self):
+        """Test importing the package, core and service does not load Qt, Flask or the mail/HTTP clients"""
+        package = __name__.split('.')[0]
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        deferred = ['PyQt6', 'flask', 'flask_cors', 'aiosmtplib', 'aioimaplib', 'httpx']
+        code = (f"import sys, {package}, {package}.crypto\n"
+                f"from {package}.core.app_core import QuMailCore\n"
+                f"from {package}.service import SessionManager, JSONRPCServer\n"
+                f"print([m for m in {deferred!r} if m in sys.modules])\n"
+                f"from {package}.crypto import KMESimulator\n"
+                f"print('flask' in sys.modules)")
+        env = dict(os.environ, PYTHONPATH=root)
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        loaded, simulator_loaded = result.stdout.strip().splitlines()[-2:]
+        self.assertEqual(loaded, '[]')
+        self.assertEqual(simulator_loaded, 'True')
+        
+class TestHeadlessService(unittest.TestCase):
+    """Test the headless multi-session service and its shared pools"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        kme_client = route_to_simulator(KMEClient('http://127.0.0.1:8080'), self.kme)
+        self.sessions = SessionManager(load_config(), kme_client=kme_client)
+        
+    def test_smtp_pool_reuses_and_caps_connections(self):
+        """Test connections are reused per account, discarded on error and capped per account"""
+        opened = []
+        
+        class FakeSMTP:
+            is_connected = True
+            
+            async def quit(self):
+                self.is_connected = False
+                
+        async def connect(server, port, user, auth_string, timeout):
+            opened.append(user)
+            return FakeSMTP()
+            
+        async def scenario():
+            pool = SMTPConnectionPool(max_per_key=1, connect=connect)
+            async with pool.connection('smtp.test', 465, 'a@test', 'auth') as first:
+                pass
+            async with pool.connection('smtp.test', 465, 'a@test', 'auth') as second:
+                self.assertIs(second, first)
+            with self.assertRaises(RuntimeError):
+                async with pool.connection('smtp.test', 465, 'a@test', 'auth'):
+                    raise RuntimeError("send failed")
+            self.assertFalse(first.is_connected)
+            
+            # Second user of the same account waits for the single allowed connection
+            order = []
+            
+            async def use(tag):
+                async with pool.connection('smtp.test', 465, 'a@test', 'auth'):
+                    order.append(tag)
+                    await asyncio.sleep(0.01)
+                    
+            await asyncio.gather(use(1), use(2))
+            async with pool.connection('smtp.test', 465, 'b@test', 'auth'):
+                pass
+            await pool.close()
+            return order, pool.get_stats()
+            
+        order, stats = asyncio.run(scenario())
+        self.assertEqual(order, [1, 2])
+        self.assertEqual(opened, ['a@test', 'a@test', 'b@test'])
+        self.assertEqual(stats['discarded'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['idle'], 0)
+        
+    def test_sessions_share_pools_and_deliver(self):
+        """Test sessions share the KME client and pools and deliver to each other"""
+        async def scenario():
+            alice = await self.sessions.open_session('Alice@QuMail.com')
+            bob = await self.sessions.open_session('bob@qumail.com')
+            with self.assertRaises(SessionError):
+                await self.sessions.open_session('alice@qumail.com')  # never handed to a second opener
+            self.assertIs(alice.core.kme_client, bob.core.kme_client)
+            self.assertIs(alice.core.crypto_executor, bob.core.crypto_executor)
+            self.assertIs(alice.core.email_handler.smtp_pool, bob.core.email_handler.smtp_pool)
+            
+            self.assertTrue(await alice.core.send_secure_email('bob@qumail.com', 'Hi', 'From Alice',
+                                                               security_level='L2'))
+            inbox = await bob.core.get_email_list('Inbox', 10)
+            message = await bob.core.receive_secure_email(inbox[0]['email_id'])
+            
+            self.assertTrue(await self.sessions.close_session(alice.session_id))
+            await self.sessions.close()
+            return message
+            
+        message = asyncio.run(scenario())
+        self.assertEqual(message['body'], 'From Alice')
+        self.assertEqual(message['sender'], 'alice@qumail.com')
+        self.assertEqual(self.sessions.stats['rejected'], 1)
+        
+    def test_session_open_requires_service_token(self):
+        """Test a configured service token gates session.open over the socket"""
+        self.sessions.service_token = 'correct horse'
+        
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                server = JSONRPCServer(self.sessions, os.path.join(tmp, 'qumail.sock'))
+                await server.start()
+                client = await RPCClient(server.path).connect()
+                errors = []
+                try:
+                    for token in (None, 'wrong'):
+                        try:
+                            await client.call('session.open', email='alice@qumail.com', token=token)
+                        except RPCError as e:
+                            errors.append(e.code)
+                    opened = await client.call('session.open', email='alice@qumail.com', token='correct horse')
+                    try:
+                        await client.call('session.open', email='alice@qumail.com', token='correct horse')
+                    except RPCError as e:
+                        errors.append(e.code)
+                finally:
+                    await client.close()
+                    await server.close()
+                    await self.sessions.close()
+            return opened, errors
+            
+        opened, errors = asyncio.run(scenario())
+        self.assertEqual(opened['email'], 'alice@qumail.com')
+        self.assertEqual(errors, [SESSION_ERROR] * 3)
+        self.assertEqual(self.sessions.stats['unauthorized'], 2)
+        self.assertEqual(self.sessions.stats['opened'], 1)
+        
+    def test_close_session_delivers_queued_sends(self):
+        """Test closing a session sends its queued outbox mail before the user is dropped"""
+        async def scenario():
+            alice = await self.sessions.open_session('alice@qumail.com')
+            handle = await alice.core.enqueue_send('bob@qumail.com', 'Queued', 'Sent on close', security_level='L2')
+            await self.sessions.close_session(alice.session_id)
+            await self.sessions.close()
+            return handle
+            
+        handle = asyncio.run(scenario())
+        self.assertEqual(handle.status, 'sent')
+        self.assertEqual(len(self.sessions.mailboxes['bob@qumail.com']['Inbox']), 1)
+        
+    def test_rpc_round_trip_over_unix_socket(self):
+        """Test send/list/receive and error codes through the JSON-RPC socket"""
+        async def scenario():
+            with tempfile.TemporaryDirectory() as tmp:
+                server = JSONRPCServer(self.sessions, os.path.join(tmp, 'qumail.sock'))
+                await server.start()
+                client = await RPCClient(server.path).connect()
+                try:
+                    alice = await client.call('session.open', email='alice@qumail.com')
+                    bob = await client.call('session.open', email='bob@qumail.com', display_name='Bob')
+                    sent = await asyncio.gather(*(
+                        client.call('email.send', session_id=alice['session_id'], to='bob@qumail.com',
+                                    subject=f"Note {n}", body=f"Body {n}", security_level='L2')
+                        for n in range(3)))
+                    listed = await client.call('email.list', session_id=bob['session_id'])
+                    received = await client.call('email.receive', session_id=bob['session_id'],
+                                                 email_id=listed[0]['email_id'])
+                    
+                    errors = []
+                    for method, params in [('email.list', {'session_id': 'missing'}),
+                                           ('email.list', {'session_id': bob['session_id'], 'bogus': 1})]:
+                        try:
+                            await client.call(method, **params)
+                        except RPCError as e:
+                            errors.append(e.code)
+                    status = await client.call('service.status')
+                finally:
+                    await client.close()
+                    await server.close()
+                    await self.sessions.close()
+            return sent, listed, received, errors, status
+            
+        sent, listed, received, errors, status = asyncio.run(scenario())
+        self.assertEqual(sent, [{'sent': True}] * 3)
+        self.assertEqual(len(listed), 3)
+        self.assertEqual(listed[0]['security_level'], 'L2')
+        self.assertTrue(received['body'].startswith('Body '))
+        self.assertEqual(errors, [SESSION_ERROR, INVALID_PARAMS])
+        self.assertEqual(status['active_sessions'], 2)
+        
+class TestMailEngine(unittest.TestCase):
+    """Test multi-account scheduling, shared token refresh and provider-wide pool caps"""
+    
+    def test_round_robin_across_accounts(self):
+        """Test a backlog on one account does not delay another account's send"""
+        async def scenario():
+            engine = MailEngine(load_config(), workers=1)
+            await engine.add_account('busy@qumail.com', 'qumail')
+            await engine.add_account('quiet@qumail.com', 'qumail')
+            finished = []
+            
+            async def send(account, n):
+                self.assertTrue(await engine.send(account, 'peer@qumail.com', {'security_level': 'L2', 'n': n}))
+                finished.append(account)
+                
+            await asyncio.gather(*[send('busy@qumail.com', n) for n in range(6)], send('quiet@qumail.com', 0))
+            stats = engine.get_stats()
+            await engine.close()
+            return finished, stats
+            
+        finished, stats = asyncio.run(scenario())
+        self.assertEqual(finished.index('quiet@qumail.com'), 1)
+        self.assertEqual(stats['completed'], 7)
+        self.assertEqual(stats['accounts']['busy@qumail.com']['send'], 6)
+        
+    def test_per_account_concurrency_cap(self):
+        """Test no account runs more jobs at once than its cap while others use spare workers"""
+        async def scenario():
+            engine = MailEngine(load_config(), workers=8, account_concurrency=2)
+            running, peak = {}, {}
+            for name in ('a@qumail.com', 'b@qumail.com'):
+                account = await engine.add_account(name, 'qumail')
+                
+                async def slow_list(folder, limit, name=name):
+                    running[name] = running.get(name, 0) + 1
+                    peak[name] = max(peak.get(name, 0), running[name])
+                    await asyncio.sleep(0.01)
+                    running[name] -= 1
+                    return []
+                    
+                account.handler.get_email_list = slow_list
+            await asyncio.gather(*(engine.sync(name, 'Inbox') for name in ('a@qumail.com', 'b@qumail.com')
+                                   for _ in range(6)))
+            await engine.close()
+            return peak
+            
+        self.assertEqual(asyncio.run(scenario()), {'a@qumail.com': 2, 'b@qumail.com': 2})
+        
+    def test_token_refresh_is_shared(self):
+        """Test concurrent callers trigger one refresh per account and expired tokens are renewed"""
+        refreshed = []
+        
+        async def refresh(provider, refresh_token):
+            refreshed.append(refresh_token)
+            await asyncio.sleep(0.01)
+            return {'access_token': f"new-{refresh_token}", 'expires_in': 3600}
+            
+        async def scenario():
+            cache = TokenCache(refresh)
+            cache.put('gmail', 'one@gmail.com', 'old', 'r1', expires_in=0)
+            cache.put('gmail', 'two@gmail.com', 'fresh', 'r2', expires_in=3600)
+            tokens = await asyncio.gather(*(cache.ensure_valid_token('gmail', 'one@gmail.com') for _ in range(5)),
+                                          cache.get('gmail', 'two@gmail.com'))
+            return tokens, await cache.get('gmail', 'one@gmail.com'), cache.get_stats()
+            
+        tokens, later, stats = asyncio.run(scenario())
+        self.assertEqual(tokens, ['new-r1'] * 5 + ['fresh'])
+        self.assertEqual(later, 'new-r1')
+        self.assertEqual(refreshed, ['r1'])
+        self.assertEqual(stats['coalesced'], 4)
+        
+    def test_pool_per_server_cap_spans_accounts(self):
+        """Test the provider-wide cap makes a second account wait, then evicts the idle connection for it"""
+        class FakeIMAP:
+            async def logout(self):
+                pass
+                
+        async def connect(server, port, user, auth_string, timeout):
+            return FakeIMAP()
+            
+        async def scenario():
+            pool = IMAPConnectionPool(max_per_server=1, connect=connect)
+            order = []
+            
+            async def use(user):
+                async with pool.connection('imap.test', 993, user, 'auth'):
+                    order.append(user)
+                    await asyncio.sleep(0.01)
+                    order.append(user)
+                    
+            await asyncio.gather(use('a@test'), use('b@test'))
+            await pool.close()
+            return order, pool.get_stats()
+            
+        order, stats = asyncio.run(scenario())
+        self.assertEqual(order, ['a@test', 'a@test', 'b@test', 'b@test'])
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['evicted'], 1)
+        
+class TestBackgroundScheduler(unittest.TestCase):
+    """Test timer wheel scheduling, idle backoff, resource coalescing and the KME client tasks"""
+    
+    def test_idle_backoff_and_wake(self):
+        """Test an idle task's interval doubles up to its cap and a wake resets it"""
+        async def scenario():
+            scheduler = BackgroundScheduler(tick=0.01)
+            runs = []
+            task = scheduler.add('idle', lambda: runs.append(scheduler.loop.time()) or IDLE, 0.02,
+                                 jitter=0.0, idle_backoff=8, delay=0)
+            await asyncio.sleep(0.6)
+            backed_off = task.current_interval
+            count = len(runs)
+            scheduler.wake(task)
+            await asyncio.sleep(0.03)
+            woken = len(runs) - count
+            await scheduler.stop()
+            return runs[:count], backed_off, woken
+            
+        runs, backed_off, woken = asyncio.run(scenario())
+        gaps = [later - earlier for earlier, later in zip(runs, runs[1:])]
+        self.assertAlmostEqual(backed_off, 0.16)
+        self.assertLess(len(runs), 10)  # 30 runs without backoff
+        self.assertGreater(gaps[-1], gaps[0] * 2)
+        self.assertEqual(woken, 1)
+        
+    def test_same_resource_probes_coalesce(self):
+        """Test a probe is skipped right after another probe of its resource succeeded"""
+        async def scenario():
+            scheduler = BackgroundScheduler(tick=0.01)
+            calls = []
+            
+            async def probe(name):
+                calls.append(name)
+                return True
+                
+            first = scheduler.add('probe.a', lambda: probe('a'), 1.0, resource='kme:test', delay=0)
+            second = scheduler.add('probe.b', lambda: probe('b'), 1.0, resource='kme:test', delay=0.1)
+            feed = scheduler.add('feed', lambda: probe('feed'), 1.0, resource='kme:test', coalesce=False, delay=0.15)
+            await asyncio.sleep(0.3)
+            stats = scheduler.get_stats()
+            await scheduler.stop()
+            return calls, first, second, feed, stats
+            
+        calls, first, second, feed, stats = asyncio.run(scenario())
+        self.assertEqual(calls, ['a', 'feed'])
+        self.assertEqual((second.runs, second.coalesced), (0, 1))
+        self.assertEqual(feed.coalesced, 0)
+        self.assertEqual(stats['tasks']['probe.b']['coalesced'], 1)
+        
+    def test_jitter_bounds_and_no_overlap(self):
+        """Test jittered intervals stay in bounds and a slow task never overlaps itself"""
+        async def scenario():
+            scheduler = BackgroundScheduler(tick=0.01)
+            active, peak = [0], [0]
+            
+            async def slow():
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                await asyncio.sleep(0.05)
+                active[0] -= 1
+                
+            task = scheduler.add('slow', slow, 0.01, jitter=0.5, delay=0)
+            delays = [scheduler._jittered(task) for _ in range(500)]
+            await asyncio.sleep(0.3)
+            stats = scheduler.get_stats()
+            await scheduler.stop()
+            return delays, peak[0], task, stats
+            
+        delays, peak, task, stats = asyncio.run(scenario())
+        self.assertTrue(all(0.005 <= delay <= 0.015 for delay in delays))
+        self.assertGreater(max(delays) - min(delays), 0.005)
+        self.assertEqual(peak, 1)
+        self.assertGreater(task.overruns, 0)
+        self.assertGreaterEqual(stats['tasks']['slow']['duration_p50_ms'], 50)
+        self.assertLess(stats['wakeups'], 100)
+        
+    def test_kme_status_poll_stands_in_for_heartbeat(self):
+        """Test the KME heartbeat is coalesced while the shared status poll keeps succeeding"""
+        async def scenario():
+            client = route_to_simulator(KMEClient("http://kme.test"), KMESimulator())
+            client.heartbeat_interval = 1.2
+            client.status_max_age = 0.25  # one scheduler tick (two once jitter rounds up)
+            heartbeats = []
+            
+            async def heartbeat():
+                heartbeats.append(1)
+                return True
+                
+            client._perform_heartbeat = heartbeat
+            client.subscribe_status(lambda snapshot: None)
+            client.start_status_polling()
+            await client._start_heartbeat()
+            await asyncio.sleep(1.7)
+            stats = client.scheduler.get_stats()
+            await client.stop_heartbeat()
+            await client.stop_status_polling()
+            return heartbeats, stats
+            
+        heartbeats, stats = asyncio.run(scenario())
+        self.assertEqual(heartbeats, [])
+        self.assertGreater(stats['tasks']['kme.heartbeat']['coalesced'], 0)
+        self.assertGreater(stats['tasks']['kme.status']['runs'], 3)
+        
 if __name__ == '__main__':
     unittest.main()
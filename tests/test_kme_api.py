@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+KME API Tests
+
+Tests for batched dec_keys/consume requests, paginated key listings and
+the aggregated status endpoint
+"""
+
+import asyncio
+import threading
+import unittest
+from datetime import datetime, timedelta
+from werkzeug.serving import make_server
+from ..crypto.kme_simulator import KMESimulator
+from ..crypto.kme_network import KMENetwork
+from ..crypto.kme_client import KMEClient
+
+class TestKMEBatchDecKeys(unittest.TestCase):
+    """Test batched key retrieval against the KME simulator"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        self.client = self.kme.app.test_client()
+        
+    def _generate(self, key_type='seed'):
+        key = self.kme._generate_quantum_key(
+            sender_sae_id="alice",
+            receiver_sae_id="bob",
+            length_bits=256,
+            key_type=key_type
+        )
+        self.kme.keys[key.key_id] = key
+        return key
+        
+    def test_batch_dec_keys(self):
+        """Test several keys are resolved in one request"""
+        keys = [self._generate() for _ in range(3)]
+        key_ids = [key.key_id for key in keys]
+        
+        response = self.client.post('/api/v1/keys/bob/dec_keys', json={
+            'key_IDs': [{'key_ID': key_id} for key_id in key_ids + key_ids[:1]]
+        })
+        data = response.get_json()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['key_id'] for entry in data['keys']], key_ids)
+        self.assertEqual(data['errors'], [])
+        
+    def test_batch_dec_keys_partial_failure(self):
+        """Test unknown, foreign and consumed keys are reported per key"""
+        otp_key = self._generate(key_type='otp')
+        otp_key.consumed = True
+        valid_key = self._generate()
+        
+        response = self.client.post('/api/v1/keys/mallory/dec_keys', json={
+            'key_IDs': [valid_key.key_id]
+        })
+        self.assertEqual(response.get_json()['errors'][0]['status'], 403)
+        
+        response = self.client.post('/api/v1/keys/bob/dec_keys', json={
+            'key_IDs': [valid_key.key_id, otp_key.key_id, 'missing']
+        })
+        data = response.get_json()
+        
+        self.assertEqual(len(data['keys']), 1)
+        self.assertEqual({e['key_id']: e['status'] for e in data['errors']},
+                         {otp_key.key_id: 410, 'missing': 404})
+                         
+    def test_batch_limit(self):
+        """Test oversized batches are rejected"""
+        response = self.client.post('/api/v1/keys/bob/dec_keys', json={
+            'key_IDs': [f"key_{i}" for i in range(self.kme.max_keys_per_request + 1)]
+        })
+        self.assertEqual(response.status_code, 400)
+        
+    def test_batch_consume(self):
+        """Test several keys are consumed in one request"""
+        keys = [self._generate(key_type='otp') for _ in range(2)]
+        
+        response = self.client.post('/api/v1/keys/bob/consume', json={
+            'key_IDs': [key.key_id for key in keys]
+        })
+        
+        self.assertEqual(len(response.get_json()['consumed']), 2)
+        self.assertTrue(all(key.consumed for key in keys))
+
+class TestKMEAvailableListing(unittest.TestCase):
+    """Test cursor-paginated available-keys listing"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        self.client = self.kme.app.test_client()
+        
+        self.keys = []
+        for _ in range(25):
+            key = self.kme._generate_quantum_key("alice", "bob", 256, "otp")
+            self.kme._store_key(key)
+            self.keys.append(key)
+            
+        # Consumed keys are skipped by listings and counts
+        for key in self.keys[::5]:
+            key.consumed = True
+            
+    def test_pagination(self):
+        """Test pages follow the cursor until the listing is exhausted"""
+        key_ids = []
+        params = {'limit': 7}
+        pages = 0
+        
+        while True:
+            data = self.client.get('/api/v1/keys/bob/available', query_string=params).get_json()
+            self.assertLessEqual(data['count'], 7)
+            key_ids.extend(entry['key_id'] for entry in data['available_keys'])
+            pages += 1
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+            
+        listed = sorted(self.keys, key=lambda key: (key.created_at, key.key_id))
+        self.assertEqual(key_ids, [key.key_id for key in listed if not key.consumed])
+        self.assertEqual(pages, 3)
+        
+    def test_pagination_survives_cleanup(self):
+        """Test keys expiring between pages do not make the cursor skip later keys"""
+        listed = [key for key in sorted(self.keys, key=lambda key: (key.created_at, key.key_id))
+                  if not key.consumed]
+                  
+        first = self.client.get('/api/v1/keys/bob/available', query_string={'limit': 7}).get_json()
+        self.assertEqual([entry['key_id'] for entry in first['available_keys']],
+                         [key.key_id for key in listed[:7]])
+                         
+        # Expire and clean up keys already listed on the first page
+        for key in listed[:4]:
+            key.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        self.assertEqual(self.kme.cleanup_expired_keys(), 4)
+        
+        key_ids = []
+        params = {'limit': 7, 'cursor': first['next_cursor']}
+        while params['cursor']:
+            data = self.client.get('/api/v1/keys/bob/available', query_string=params).get_json()
+            key_ids.extend(entry['key_id'] for entry in data['available_keys'])
+            params['cursor'] = data['next_cursor']
+            
+        self.assertEqual(key_ids, [key.key_id for key in listed[7:]])
+        
+    def test_invalid_cursor(self):
+        """Test malformed cursors and limits are rejected"""
+        response = self.client.get('/api/v1/keys/bob/available?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.get('/api/v1/keys/bob/available?limit=0')
+        self.assertEqual(response.status_code, 400)
+        
+    def test_count_only(self):
+        """Test count-only responses carry no key descriptors"""
+        data = self.client.get('/api/v1/keys/alice/available?count_only=true').get_json()
+        
+        self.assertEqual(data['count'], 20)
+        self.assertEqual(data['total_keys'], 25)
+        self.assertEqual(data['consumed_keys'], 5)
+        self.assertNotIn('available_keys', data)
+        
+class TestKMEAggregatedStatus(unittest.TestCase):
+    """Test the aggregated status endpoint and the shared client cache"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        self.client = self.kme.app.test_client()
+        for _ in range(3):
+            self.kme._store_key(self.kme._generate_quantum_key("alice", "bob", 256, "otp"))
+            
+    def test_aggregate_payload(self):
+        """Test global, per-SAE and link status arrive in one response"""
+        data = self.client.get('/api/v1/status/aggregate?sae_id=bob&sae_id=carol').get_json()
+        
+        self.assertEqual(data['global']['active_keys'], 3)
+        self.assertEqual(data['saes']['bob']['available_keys'], 3)
+        self.assertEqual(data['saes']['carol']['total_keys'], 0)
+        self.assertEqual(data['links'][0]['status'], 'connected')
+        
+    def test_client_cache_and_subscribers(self):
+        """Test concurrent readers share one poll and subscribers see it"""
+        kme_client = KMEClient()
+        kme_client.watch_key_pool('bob')
+        requests = []
+        
+        async def make_request(method, endpoint, params=None, **kwargs):
+            requests.append(endpoint)
+            await asyncio.sleep(0)
+            return self.client.get(endpoint, query_string=params).get_json()
+            
+        kme_client._make_request = make_request
+        snapshots = []
+        kme_client.subscribe_status(snapshots.append)
+        
+        async def run():
+            results = await asyncio.gather(*[kme_client.get_aggregated_status() for _ in range(5)])
+            stats = await kme_client.get_key_statistics('bob')
+            return results, stats
+            
+        results, stats = asyncio.run(run())
+        
+        self.assertEqual(requests, ['/api/v1/status/aggregate'])
+        self.assertEqual(len(snapshots), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(stats['available_keys'], 3)
+        self.assertEqual(kme_client.key_pool_counts['available_keys'], 3)
+        
+class TestKMEKeyStream(unittest.TestCase):
+    """Test KMEClient.stream_key against the simulator over HTTP"""
+    
+    def setUp(self):
+        self.kme = KMESimulator()
+        self.server = make_server('127.0.0.1', 0, self.kme.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        
+        self.key = self.kme._generate_quantum_key("alice", "bob", 1000 * 8, "otp")
+        self.kme._store_key(self.key)
+        
+    def _stream(self, *requests):
+        """Run (sae_id, key_id) streams in order, returning the chunks and the client"""
+        async def run():
+            kme_client = KMEClient(f"http://127.0.0.1:{self.server.server_port}")
+            await kme_client.initialize(enable_heartbeat=False)
+            try:
+                results = []
+                for sae_id, key_id in requests:
+                    results.append([chunk async for chunk in kme_client.stream_key(sae_id, key_id, chunk_size=64)])
+                return results, kme_client
+            finally:
+                await kme_client.close()
+                
+        return asyncio.run(run())
+        
+    def test_fixed_size_chunks(self):
+        """Test every chunk is chunk_size bytes except the last, and both SAEs see the same key"""
+        (sender, receiver), kme_client = self._stream(('alice', self.key.key_id), ('bob', self.key.key_id))
+        
+        self.assertEqual([len(chunk) for chunk in receiver], [64] * 15 + [40])
+        self.assertEqual(b''.join(receiver), self.key.key_data)
+        self.assertEqual(sender, receiver)
+        self.assertTrue(self.key.consumed)
+        self.assertEqual(kme_client.stats['failed_requests'], 0)
+        
+    def test_rejected_stream_ends_early(self):
+        """Test unknown keys and a second receiver stream yield nothing and count as failures"""
+        (missing, first, second), kme_client = self._stream(
+            ('bob', 'missing'), ('bob', self.key.key_id), ('bob', self.key.key_id))
+            
+        self.assertEqual(missing, [])
+        self.assertEqual(b''.join(first), self.key.key_data)
+        self.assertEqual(second, [])
+        self.assertEqual(kme_client.stats['failed_requests'], 2)
+        self.assertEqual(kme_client.stats['successful_requests'], 1)
+        
+class TestKMENetwork(unittest.TestCase):
+    """Test multi-hop trusted-node key relay"""
+    
+    def setUp(self):
+        self.network = KMENetwork.from_config({
+            'nodes': ['A', 'B', 'C'],
+            'links': [
+                {'a': 'A', 'b': 'B', 'key_rate': 1000, 'latency_ms': 1, 'buffer_seconds': 1},
+                {'a': 'B', 'b': 'C', 'key_rate': 1000, 'latency_ms': 1, 'buffer_seconds': 1},
+                {'a': 'A', 'b': 'C', 'key_rate': 100000, 'latency_ms': 20}
+            ],
+            'saes': {'alice': 'A', 'bob': 'C'}
+        })
+        self.node_a = self.network.nodes['A'].app.test_client()
+        self.node_c = self.network.nodes['C'].app.test_client()
+        
+    def _request_key(self):
+        return self.node_a.post('/api/v1/keys/bob/enc_keys', json={
+            'sender_sae_id': 'alice', 'key_length': 512
+        }).get_json()['keys'][0]
+        
+    def test_relay_to_remote_node(self):
+        """Test keys relayed over the cheapest path match at both ends"""
+        key_info = self._request_key()
+        
+        self.assertEqual(key_info['relay']['path'], ['A', 'B', 'C'])
+        
+        sender = self.node_a.get(f"/api/v1/keys/alice/{key_info['key_id']}/dec_keys").get_json()
+        receiver = self.node_c.get(f"/api/v1/keys/bob/{key_info['key_id']}/dec_keys").get_json()
+        self.assertEqual(sender['key_data'], receiver['key_data'])
+        
+    def test_reroute_around_depleted_links(self):
+        """Test routing avoids links whose key pool is drained"""
+        self._request_key()
+        second = self._request_key()
+        
+        self.assertEqual(second['relay']['path'], ['A', 'C'])
+        
+        stats = self.node_a.get('/api/v1/network/stats').get_json()
+        consumed = {tuple(link['nodes']): link['bits_consumed'] for link in stats['links']}
+        self.assertEqual(consumed, {('A', 'B'): 512, ('B', 'C'): 512, ('A', 'C'): 512})
+        self.assertEqual(stats['relays'], 2)
+        self.assertIn('p95_ms', stats['relay_latency'])
+        
+    def test_insufficient_link_key(self):
+        """Test relays fail when no path has enough link key"""
+        response = self.node_a.post('/api/v1/keys/bob/enc_keys', json={
+            'sender_sae_id': 'alice', 'key_length': 100000 * 60 + 8
+        })
+        self.assertEqual(response.status_code, 503)
+        
+    def test_multi_key_relay_is_all_or_nothing(self):
+        """Test a request whose keys do not all fit spends no link key and stores nothing"""
+        network = KMENetwork.from_config({
+            'nodes': ['A', 'B'],
+            'links': [{'a': 'A', 'b': 'B', 'key_rate': 1000, 'buffer_seconds': 1}],
+            'saes': {'alice': 'A', 'bob': 'B'}
+        })
+        response = network.nodes['A'].app.test_client().post('/api/v1/keys/bob/enc_keys', json={
+            'sender_sae_id': 'alice', 'key_length': 256, 'key_count': 5
+        })
+        
+        self.assertEqual(response.status_code, 503)
+        link = network.links[('A', 'B')]
+        self.assertEqual(int(link.available_bits), 1000)
+        self.assertEqual(link.bits_consumed, 0)
+        self.assertEqual(len(network.nodes['B'].keys), 0)
+        
+        response = network.nodes['A'].app.test_client().post('/api/v1/keys/bob/enc_keys', json={
+            'sender_sae_id': 'alice', 'key_length': 256, 'key_count': 3
+        })
+        self.assertEqual([entry['relay']['path'] for entry in response.get_json()['keys']], [['A', 'B']] * 3)
+        self.assertEqual(link.bits_consumed, 768)
+        self.assertEqual(len(network.nodes['B'].keys), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+KME Cluster Tests
+
+Tests for the shared-memory key table and multi-worker KME simulator
+"""
+
+import base64
+import json
+import secrets
+import socket
+import sys
+import threading
+import unittest
+import urllib.request
+from datetime import datetime, timedelta
+from ..crypto.kme_cluster import SharedKeyTable, ClusterKMESimulator, KMECluster
+from ..crypto.kme_simulator import QuantumKey
+
+class TestSharedKeyTable(unittest.TestCase):
+    """Test shared-memory key table through the simulator routes"""
+    
+    def setUp(self):
+        self.table = SharedKeyTable(slots=64, slot_bytes=64, partitions=2)
+        self.kme = ClusterKMESimulator(self.table)
+        self.client = self.kme.app.test_client()
+        
+    def _request_keys(self, key_length=256, key_count=1, key_type='seed'):
+        response = self.client.post('/api/v1/keys/bob/enc_keys', json={
+            'sender_sae_id': 'alice',
+            'key_length': key_length,
+            'key_count': key_count,
+            'key_type': key_type
+        })
+        return [key['key_id'] for key in response.get_json()['keys']]
+        
+    def test_store_and_retrieve(self):
+        """Test keys spanning several slots round-trip through shared memory"""
+        key_id = self._request_keys(key_length=200 * 8)[0]
+        
+        response = self.client.get(f'/api/v1/keys/bob/{key_id}/dec_keys')
+        data = response.get_json()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['length'], 1600)
+        self.assertEqual(base64.b64decode(data['key_data']), self.table.get(key_id).key_data)
+        self.assertEqual(self.table.get_stats()['slots_used'], 4)
+        
+    def test_otp_consumed_once(self):
+        """Test OTP keys are released once across the table"""
+        key_id = self._request_keys(key_type='otp')[0]
+        
+        first = self.client.get(f'/api/v1/keys/bob/{key_id}/dec_keys')
+        second = self.client.get(f'/api/v1/keys/bob/{key_id}/dec_keys')
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 410)
+        
+    def test_partition_full_and_cleanup(self):
+        """Test a full partition rejects keys until expired slots are freed"""
+        self.assertEqual(len(self._request_keys(key_count=32)), 32)
+        
+        response = self.client.post('/api/v1/keys/bob/enc_keys', json={'sender_sae_id': 'alice'})
+        self.assertEqual(response.status_code, 500)
+        
+        key_id = next(self.table.iter_keys()).key_id
+        self.assertTrue(self.table.delete(key_id))
+        self.assertEqual(len(self._request_keys()), 1)
+        
+    def test_available_lists_both_saes(self):
+        """Test SAE listings are built from the shared table"""
+        self._request_keys(key_count=3)
+        
+        alice = self.client.get('/api/v1/keys/alice/available').get_json()
+        bob = self.client.get('/api/v1/keys/bob/available').get_json()
+        
+        self.assertEqual(alice['count'], 3)
+        self.assertEqual(bob['count'], 3)
+        
+    def test_threaded_puts_never_share_a_slot(self):
+        """Test request threads of one worker allocating at once each get their own slot"""
+        table = SharedKeyTable(slots=16384, slot_bytes=64)
+        stored = [[] for _ in range(8)]
+        
+        def store(results):
+            for _ in range(2000):
+                key = QuantumKey(key_id=f"QK_{0:08x}{secrets.token_hex(12)}", key_data=secrets.token_bytes(32),
+                                 length=256, created_at=datetime.utcnow(),
+                                 expires_at=datetime.utcnow() + timedelta(hours=1),
+                                 sender_sae_id='alice', receiver_sae_id='bob')
+                results.append((table.put(key), key.key_data))
+                
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=store, args=(results,)) for results in stored]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+            
+        keys = [entry for results in stored for entry in results]
+        self.assertEqual(len({key_id for key_id, _ in keys}), 16000)
+        self.assertTrue(all(table.get(key_id).key_data == key_data for key_id, key_data in keys))
+
+class TestKMECluster(unittest.TestCase):
+    """Test forked KME workers behind one front port"""
+    
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+            
+        self.base_url = f'http://127.0.0.1:{port}'
+        self.cluster = KMECluster(port=port, workers=2, slots=256)
+        self.cluster.start()
+        self.assertTrue(self.cluster.wait_until_ready())
+        
+    def tearDown(self):
+        self.cluster.stop()
+        
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+            
+    def test_keys_visible_from_every_worker(self):
+        """Test keys minted by one worker are retrievable through any worker"""
+        response = self._post('/api/v1/keys/bob/enc_keys', {
+            'sender_sae_id': 'alice', 'key_count': 20, 'key_type': 'otp'
+        })
+        key_ids = [key['key_id'] for key in response['keys']]
+        
+        result = self._post('/api/v1/keys/bob/dec_keys', {'key_IDs': key_ids})
+        
+        self.assertEqual(len(result['keys']), 20)
+        self.assertEqual(result['errors'], [])
+
+if __name__ == '__main__':
+    unittest.main()
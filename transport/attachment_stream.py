@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Streaming Attachment Pipeline for QuMail
+
+Attachments are sent through four stages joined by bounded queues:
+
+    aiofiles chunked read -> segment encryption -> incremental MIME/base64 -> transport
+
+Each queue holds at most queue_depth chunks, so a slow transport stalls the
+readers instead of buffering the file, and memory stays constant regardless
+of attachment size.
+
+Segments use the STREAM construction over AES-256-GCM: the nonce is a random
+per-file prefix, a segment counter and a final-segment flag, so reordered,
+dropped or truncated segments fail authentication.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import secrets
+import struct
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import aiofiles
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+STREAM_MAGIC = b'QMS1'
+NONCE_PREFIX_SIZE = 7
+SEGMENT_HEADER = struct.Struct('>I')  # ciphertext length incl. GCM tag
+BASE64_LINE_BYTES = 57  # 57 raw bytes -> one 76 character base64 line
+
+_END = object()
+
+def _segment_nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+    return prefix + struct.pack('>I?', counter, final)
+
+def decrypt_segments(data: bytes, key: bytes) -> Iterator[bytes]:
+    """Decrypt one attachment stream produced by the pipeline, segment by segment"""
+    if data[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+        raise ValueError("Not a QuMail attachment stream")
+        
+    aead = AESGCM(key)
+    offset = len(STREAM_MAGIC)
+    prefix = data[offset:offset + NONCE_PREFIX_SIZE]
+    offset += NONCE_PREFIX_SIZE
+    counter = 0
+    
+    while offset < len(data):
+        (length,) = SEGMENT_HEADER.unpack_from(data, offset)
+        offset += SEGMENT_HEADER.size
+        segment = data[offset:offset + length]
+        offset += length
+        final = offset >= len(data)
+        yield aead.decrypt(_segment_nonce(prefix, counter, final), segment, None)
+        counter += 1
+        
+    if counter == 0:
+        raise ValueError("Attachment stream has no segments")
+
+class FileSink:
+    """Transport sink that spools the MIME stream to a file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        
+    async def open(self):
+        self.file = await aiofiles.open(self.path, 'wb')
+        
+    async def write(self, data: bytes):
+        await self.file.write(data)
+        
+    async def close(self):
+        if self.file:
+            await self.file.close()
+            self.file = None
+            
+    async def abort(self):
+        await self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class SMTPDataSink:
+    """Transport sink that streams into an SMTP DATA command
+    
+    Writes straight to the aiosmtplib protocol, dot-stuffing line starts and
+    waiting for the socket to drain, instead of handing send_message() the
+    whole message as one bytes object. aiosmtplib has no public drain, so flow
+    control goes through the asyncio transport's public write buffer API.
+    """
+    
+    DEFAULT_HIGH_WATER = 64 * 1024  # for transports that do not report buffer limits
+    
+    def __init__(self, smtp_client, sender: str, recipients: List[str]):
+        self.smtp_client = smtp_client
+        self.sender = sender
+        self.recipients = recipients
+        self.at_line_start = True
+        self.stalls = 0  # writes that waited for the socket to drain
+        
+    async def open(self):
+        await self.smtp_client.mail(self.sender)
+        for recipient in self.recipients:
+            await self.smtp_client.rcpt(recipient)
+            
+        protocol = self.smtp_client.protocol
+        protocol.write(b"DATA\r\n")
+        response = await protocol.read_response(timeout=self.smtp_client.timeout)
+        if response.code != 354:
+            raise ConnectionError(f"SMTP DATA refused: {response.code} {response.message}")
+            
+    async def write(self, data: bytes):
+        # Pipeline output is CRLF-terminated lines; quote any that start with '.'
+        if self.at_line_start and data.startswith(b'.'):
+            data = b'.' + data
+        data = data.replace(b'\r\n.', b'\r\n..')
+        self.at_line_start = data.endswith(b'\r\n')
+        
+        protocol = self.smtp_client.protocol
+        protocol.write(data)
+        await self._drain(protocol.transport)
+        
+    async def _drain(self, transport: asyncio.WriteTransport):
+        """Wait until the transport's write buffer is back under its high-water mark"""
+        try:
+            _, high_water = transport.get_write_buffer_limits()
+        except (AttributeError, NotImplementedError):
+            high_water = self.DEFAULT_HIGH_WATER
+            
+        if transport.get_write_buffer_size() > high_water:
+            self.stalls += 1
+        delay = 0.0005
+        while transport.get_write_buffer_size() > high_water:
+            if transport.is_closing():
+                raise ConnectionError("SMTP connection lost during DATA")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+            
+    async def close(self):
+        protocol = self.smtp_client.protocol
+        protocol.write(b".\r\n" if self.at_line_start else b"\r\n.\r\n")
+        response = await protocol.read_response(timeout=self.smtp_client.timeout)
+        if response.code != 250:
+            raise ConnectionError(f"SMTP message rejected: {response.code} {response.message}")
+            
+    async def abort(self):
+        # Dropping the connection mid-DATA discards the partial message server-side
+        self.smtp_client.close()
+
+class AttachmentStreamPipeline:
+    """Read, encrypt, MIME-encode and transmit attachments with constant memory"""
+    
+    def __init__(self, key: bytes, chunk_size: int = 256 * 1024, queue_depth: int = 4,
+                 progress_callback: Optional[Callable[[str, int, int], None]] = None):
+        self.key = key
+        self.chunk_size = chunk_size - chunk_size % BASE64_LINE_BYTES  # whole base64 lines
+        self.queue_depth = queue_depth
+        self.progress_callback = progress_callback
+        
+        self.stats = {
+            'files': 0,
+            'plaintext_bytes': 0,
+            'ciphertext_bytes': 0,
+            'wire_bytes': 0,
+            'segments': 0,
+            'reader_stalls': 0,  # reads that waited on a full queue (backpressure)
+            'duration_seconds': 0.0
+        }
+        
+    async def send(self, attachments: List[Dict], sink, boundary: str, preamble: bytes = b''):
+        """Stream attachments into sink as MIME parts of a multipart message
+        
+        preamble (headers and leading parts) is written first; the closing
+        boundary is written last. Each attachment dict needs 'path' and 'name'.
+        """
+        start = time.perf_counter()
+        read_queue = asyncio.Queue(maxsize=self.queue_depth)
+        encrypt_queue = asyncio.Queue(maxsize=self.queue_depth)
+        wire_queue = asyncio.Queue(maxsize=self.queue_depth)
+        
+        await sink.open()
+        stages = []
+        try:
+            if preamble:
+                await sink.write(preamble)
+                
+            stages = [
+                asyncio.create_task(self._read_stage(attachments, read_queue)),
+                asyncio.create_task(self._encrypt_stage(read_queue, encrypt_queue)),
+                asyncio.create_task(self._mime_stage(encrypt_queue, wire_queue, boundary)),
+                asyncio.create_task(self._transport_stage(wire_queue, sink, attachments))
+            ]
+            await asyncio.gather(*stages)
+            await sink.close()
+            
+        except BaseException:
+            # Never terminate a partial message: abort the transport instead
+            for stage in stages:
+                stage.cancel()
+            await sink.abort()
+            raise
+            
+        finally:
+            self.stats['duration_seconds'] = time.perf_counter() - start
+            
+        logging.info(f"Streamed {self.stats['files']} attachments "
+                     f"({self.stats['plaintext_bytes'] / (1024 * 1024):.1f} MB) "
+                     f"in {self.stats['duration_seconds']:.2f}s")
+        return dict(self.stats)
+        
+    async def _put(self, queue: asyncio.Queue, item):
+        if queue.full():
+            self.stats['reader_stalls'] += 1
+        await queue.put(item)
+        
+    async def _read_stage(self, attachments: List[Dict], out: asyncio.Queue):
+        """Stage 1: chunked aiofiles reads"""
+        for index, attachment in enumerate(attachments):
+            await out.put(('begin', index, attachment))
+            async with aiofiles.open(attachment['path'], 'rb') as f:
+                while True:
+                    chunk = await f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    await self._put(out, ('data', index, chunk))
+            await out.put(('end', index, attachment))
+        await out.put(_END)
+        
+    async def _encrypt_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        """Stage 2: STREAM segment encryption (one chunk held back to flag the last)"""
+        aead = AESGCM(self.key)
+        prefix = None
+        counter = 0
+        pending = None
+        
+        def seal(chunk: bytes, final: bool) -> bytes:
+            ciphertext = aead.encrypt(_segment_nonce(prefix, counter, final), chunk, None)
+            self.stats['segments'] += 1
+            self.stats['ciphertext_bytes'] += len(ciphertext)
+            return SEGMENT_HEADER.pack(len(ciphertext)) + ciphertext
+            
+        while True:
+            item = await inp.get()
+            if item is _END:
+                await out.put(_END)
+                return
+                
+            kind, index, payload = item
+            if kind == 'begin':
+                prefix = secrets.token_bytes(NONCE_PREFIX_SIZE)
+                counter = 0
+                pending = None
+                await out.put(item)
+                await out.put(('data', index, STREAM_MAGIC + prefix, 0))
+            elif kind == 'data':
+                if pending is not None:
+                    await out.put(('data', index, seal(pending, False), len(pending)))
+                    counter += 1
+                pending = payload
+            else:
+                # Empty files still carry one (empty) final segment
+                final_chunk = pending if pending is not None else b''
+                await out.put(('data', index, seal(final_chunk, True), len(final_chunk)))
+                pending = None
+                await out.put(item)
+                
+    async def _mime_stage(self, inp: asyncio.Queue, out: asyncio.Queue, boundary: str):
+        """Stage 3: incremental base64 in 76 character lines inside MIME parts"""
+        carry = b''
+        
+        while True:
+            item = await inp.get()
+            if item is _END:
+                await out.put((None, f"--{boundary}--\r\n".encode(), 0))
+                await out.put(_END)
+                return
+                
+            kind, index, payload = item[:3]
+            if kind == 'begin':
+                name = os.path.basename(payload['name']).replace('"', '')
+                headers = (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: application/octet-stream; name=\"{name}.qenc\"\r\n"
+                    f"Content-Transfer-Encoding: base64\r\n"
+                    f"Content-Disposition: attachment; filename=\"{name}.qenc\"\r\n"
+                    f"X-QuMail-Attachment-Index: {index}\r\n\r\n"
+                )
+                self.stats['files'] += 1
+                await out.put((index, headers.encode(), 0))
+            elif kind == 'data':
+                data = carry + payload
+                whole = len(data) - len(data) % BASE64_LINE_BYTES
+                carry = data[whole:]
+                await out.put((index, self._encode_lines(data[:whole]), item[3]))
+            else:
+                await out.put((index, self._encode_lines(carry), 0))
+                carry = b''
+                
+    @staticmethod
+    def _encode_lines(data: bytes) -> bytes:
+        if not data:
+            return b''
+        return base64.encodebytes(data).replace(b'\n', b'\r\n')
+        
+    async def _transport_stage(self, inp: asyncio.Queue, sink, attachments: List[Dict]):
+        """Stage 4: hand wire bytes to the transport and report progress"""
+        totals = [attachment.get('size', 0) for attachment in attachments]
+        sent = [0] * len(attachments)
+        
+        while True:
+            item = await inp.get()
+            if item is _END:
+                return
+                
+            index, wire_bytes, plaintext_bytes = item
+            if wire_bytes:
+                await sink.write(wire_bytes)
+                self.stats['wire_bytes'] += len(wire_bytes)
+                
+            if plaintext_bytes:
+                sent[index] += plaintext_bytes
+                self.stats['plaintext_bytes'] += plaintext_bytes
+                if self.progress_callback:
+                    try:
+                        self.progress_callback(attachments[index]['name'], sent[index], totals[index])
+                    except Exception as e:
+                        logging.error(f"Attachment progress callback failed: {e}")
@@ -13,6 +13,8 @@ from typing import Dict, List, Optional, Callable, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 
+from ..utils.scheduler import IDLE, get_scheduler
+
 @dataclass
 class ChatMessage:
     """Chat message data structure"""
@@ -62,7 +64,7 @@ class ChatHandler:
         
         # PRODUCTION: Background task references for proper cleanup
         self.listener_task = None
-        self.heartbeat_task = None
+        self.heartbeat_task = None  # SCHEDULER: ScheduledTask handles
         self.queue_processor_task = None
         
         logging.info("Chat Handler initialized")
@@ -101,8 +103,12 @@ class ChatHandler:
             
             # PRODUCTION: Start background tasks and store references for cleanup
             self.listener_task = asyncio.create_task(self._message_listener())
-            self.heartbeat_task = asyncio.create_task(self._heartbeat_task())
-            self.queue_processor_task = asyncio.create_task(self._process_message_queue())
+            # SCHEDULER: Heartbeat and queue drain run from the shared background scheduler
+            scheduler = get_scheduler()
+            self.heartbeat_task = scheduler.add('chat.heartbeat', self._heartbeat_task, 30,
+                                                resource=f"chat:{self.chat_server_url}")
+            self.queue_processor_task = scheduler.add('chat.queue', self._process_message_queue, 1,
+                                                      idle_backoff=16)
             
             logging.info("Chat connection established successfully")
             return True
@@ -489,38 +495,36 @@ class ChatHandler:
                 await asyncio.sleep(5)
                 
     async def _heartbeat_task(self):
-        """Background task to maintain connection with heartbeat"""
-        while self.is_connected:
-            try:
-                # In real implementation, send WebSocket ping/pong
-                # await websocket.ping()
-                
-                logging.debug("Chat: Heartbeat sent")
-                await asyncio.sleep(30)  # Send heartbeat every 30 seconds
-                
-            except Exception as e:
-                logging.error(f"Heartbeat error: {e}")
-                # Try to reconnect
-                await self._attempt_reconnect()
-                
+        """Keep the connection alive (scheduled every 30 seconds)"""
+        if not self.is_connected:
+            return IDLE
+        try:
+            # In real implementation, send WebSocket ping/pong
+            # await websocket.ping()
+            
+            logging.debug("Chat: Heartbeat sent")
+            return True
+            
+        except Exception as e:
+            logging.error(f"Heartbeat error: {e}")
+            # Try to reconnect
+            await self._attempt_reconnect()
+            return False
+            
     async def _process_message_queue(self):
-        """Process queued messages when connection is restored"""
-        while True:
-            try:
-                if self.is_connected and not self.message_queue.empty():
-                    queued_message = await self.message_queue.get()
-                    
-                    if queued_message['action'] == 'send_message':
-                        await self.send_message(
-                            queued_message['contact_id'],
-                            queued_message['encrypted_data']
-                        )
-                        
-                await asyncio.sleep(1)  # Check queue every second
-                
-            except Exception as e:
-                logging.error(f"Message queue processing error: {e}")
-                await asyncio.sleep(5)
+        """Send queued messages once the connection is up (IDLE while there is nothing to send)"""
+        if not self.is_connected or self.message_queue.empty():
+            return IDLE
+            
+        while self.is_connected and not self.message_queue.empty():
+            queued_message = self.message_queue.get_nowait()
+            
+            if queued_message['action'] == 'send_message':
+                await self.send_message(
+                    queued_message['contact_id'],
+                    queued_message['encrypted_data']
+                )
+        return True
                 
     async def _attempt_reconnect(self):
         """Attempt to reconnect to chat server"""
@@ -541,6 +545,10 @@ class ChatHandler:
             self.reconnect_attempts = 0
             logging.info("Reconnection successful")
             
+            # Flush messages queued while offline without waiting out the idle backoff
+            if self.queue_processor_task:
+                self.queue_processor_task.scheduler.wake(self.queue_processor_task)
+            
         except Exception as e:
             logging.error(f"Reconnection failed: {e}")
             
@@ -555,19 +563,11 @@ class ChatHandler:
                 except asyncio.CancelledError:
                     logging.info("PRODUCTION: Message listener task cancelled successfully")
                     
-            if self.heartbeat_task and not self.heartbeat_task.done():
+            if self.heartbeat_task:
                 self.heartbeat_task.cancel()
-                try:
-                    await self.heartbeat_task
-                except asyncio.CancelledError:
-                    logging.info("PRODUCTION: Heartbeat task cancelled successfully")
-                    
-            if self.queue_processor_task and not self.queue_processor_task.done():
+                
+            if self.queue_processor_task:
                 self.queue_processor_task.cancel()
-                try:
-                    await self.queue_processor_task
-                except asyncio.CancelledError:
-                    logging.info("PRODUCTION: Queue processor task cancelled successfully")
             
             await self.disconnect()
             
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+IMAP Connection Pool - Authenticated IMAP connections shared across accounts
+
+Same pooling rules as the SMTP pool (transport/smtp_pool.py): connections are
+reused per account, and the per-account, per-server and total caps are shared
+by every mailbox the process serves. A checked-out connection may be left in
+any selected folder; callers SELECT the folder they need.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .smtp_pool import ConnectionPool
+
+async def connect_imap_xoauth2(server: str, port: int, user: str, auth_string: str, timeout: float):
+    """Open an aioimaplib connection and authenticate with a base64 XOAUTH2 string"""
+    import aioimaplib  # imported on first real connection
+    
+    client = aioimaplib.IMAP4_SSL(host=server, port=port, timeout=timeout)
+    await asyncio.wait_for(client.wait_hello_from_server(), timeout=timeout)
+    result = await asyncio.wait_for(client.authenticate('XOAUTH2', auth_string), timeout=15.0)
+    if result.result != 'OK':
+        try:
+            await asyncio.wait_for(client.logout(), timeout=10.0)
+        except Exception:
+            pass
+        raise ConnectionError(f"IMAP XOAUTH2 authentication failed for {user}")
+    return client
+
+class IMAPConnectionPool(ConnectionPool):
+    """Per-account reusable IMAP connections authenticated with XOAUTH2"""
+    protocol = 'IMAP'
+    
+    def __init__(self, max_per_key: int = 2, max_total: int = 32, idle_timeout: float = 60.0,
+                 connect: Optional[Callable[..., Awaitable[Any]]] = None, max_per_server: int = 0):
+        super().__init__(connect or connect_imap_xoauth2, max_per_key, max_total, idle_timeout, max_per_server)
+        
+    @classmethod
+    def from_config(cls, config: Dict) -> 'IMAPConnectionPool':
+        return cls(
+            max_per_key=config.get('imap_pool_per_account', 2),
+            max_total=config.get('imap_pool_size', 32),
+            idle_timeout=config.get('imap_pool_idle_timeout', 60.0),
+            max_per_server=config.get('imap_pool_per_server', 0)
+        )
+        
+    async def close_client(self, client):
+        await client.logout()
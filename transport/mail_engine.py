@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Mail Engine - Many email accounts served concurrently by one process
+
+Each account keeps its own EmailHandler (mailbox store, OAuth2 token state),
+but every handler shares:
+
+- the SMTP and IMAP connection pools (reuse per account, caps per provider
+  server and per process)
+- one TokenCache, which refreshes each account's token once no matter how
+  many sends and syncs need it, and limits concurrent refreshes per provider
+- one connection health check per provider instead of one per account,
+  run every `health_interval` seconds from the background scheduler
+
+Sends and syncs are queued per account and run by a fixed set of workers
+that take jobs round-robin across accounts, so an account with a deep
+backlog cannot starve the others. `max_concurrency` caps how many jobs of
+one account run at once (providers throttle per-account connections).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .email_handler import EmailHandler
+from .imap_pool import IMAPConnectionPool
+from .smtp_pool import SMTPConnectionPool
+from ..utils.scheduler import IDLE, get_scheduler
+
+@dataclass
+class CachedToken:
+    """OAuth2 tokens for one account"""
+    provider: str
+    account: str
+    access_token: Optional[str]
+    refresh_token: Optional[str]
+    expires_at: datetime
+    refreshes: int = 0
+
+class TokenCache:
+    """OAuth2 access tokens for many accounts with single-flight refresh
+    
+    Implements `ensure_valid_token(provider, user_id)` like OAuth2Manager, so
+    it can be handed to EmailHandler.set_credentials as the token manager.
+    """
+    
+    def __init__(self, refresh: Optional[Callable[[str, str], Awaitable[Optional[Dict]]]] = None,
+                 expiry_buffer: float = 300.0, max_refresh_per_provider: int = 4):
+        self.refresh = refresh  # (provider, refresh_token) -> {'access_token', 'expires_in', ...}
+        self.expiry_buffer = expiry_buffer
+        self.max_refresh_per_provider = max_refresh_per_provider
+        self.tokens: Dict[tuple, CachedToken] = {}
+        self._refreshing: Dict[tuple, asyncio.Future] = {}
+        self._provider_limits: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {
+            'hits': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'coalesced': 0  # callers that waited on a refresh already in progress
+        }
+        
+    def put(self, provider: str, account: str, access_token: Optional[str],
+            refresh_token: Optional[str] = None, expires_in: float = 3600):
+        key = (provider.lower(), account.lower())
+        self.tokens[key] = CachedToken(key[0], key[1], access_token, refresh_token,
+                                       datetime.utcnow() + timedelta(seconds=expires_in))
+    
+    def remove(self, provider: str, account: str):
+        self.tokens.pop((provider.lower(), account.lower()), None)
+        
+    async def get(self, provider: str, account: str) -> Optional[str]:
+        """A valid access token for the account, refreshing it first if it is about to expire"""
+        key = (provider.lower(), account.lower())
+        token = self.tokens.get(key)
+        if token is None:
+            return None
+        if token.expires_at > datetime.utcnow() + timedelta(seconds=self.expiry_buffer):
+            self.stats['hits'] += 1
+            return token.access_token
+            
+        refreshing = self._refreshing.get(key)
+        if refreshing is not None:
+            self.stats['coalesced'] += 1
+        else:
+            refreshing = asyncio.ensure_future(self._refresh(token))
+            self._refreshing[key] = refreshing
+            refreshing.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return await asyncio.shield(refreshing)
+        
+    async def ensure_valid_token(self, provider: str, user_id: str) -> Optional[str]:
+        """OAuth2Manager-compatible alias of get()"""
+        return await self.get(provider, user_id)
+        
+    async def _refresh(self, token: CachedToken) -> Optional[str]:
+        if not token.refresh_token:
+            return None
+        limit = self._provider_limits.setdefault(token.provider, asyncio.Semaphore(self.max_refresh_per_provider))
+        async with limit:
+            try:
+                refresh = self.refresh
+                if refresh is None:
+                    from ..auth.oauth2_manager import OAuth2Manager
+                    refresh = self.refresh = OAuth2Manager().refresh_token
+                result = await refresh(token.provider, token.refresh_token)
+            except Exception as e:
+                logging.error(f"Token refresh failed for {token.account} ({token.provider}): {e}")
+                result = None
+                
+        if not result or not result.get('access_token'):
+            self.stats['refresh_failures'] += 1
+            return None
+        token.access_token = result['access_token']
+        token.refresh_token = result.get('refresh_token') or token.refresh_token
+        token.expires_at = datetime.utcnow() + timedelta(seconds=result.get('expires_in', 3600))
+        token.refreshes += 1
+        self.stats['refreshes'] += 1
+        logging.info(f"OAuth2 token refreshed for {token.account} ({token.provider})")
+        return token.access_token
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({'accounts': len(self.tokens), 'refreshing': len(self._refreshing)})
+        return stats
+
+@dataclass
+class MailJob:
+    """A queued send or sync for one account"""
+    kind: str  # send | sync
+    run: Callable[[EmailHandler], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+@dataclass
+class MailAccount:
+    """One mailbox served by the engine"""
+    email: str
+    provider: str
+    handler: EmailHandler
+    max_concurrency: int = 2
+    queue: Deque[MailJob] = field(default_factory=deque)
+    in_flight: int = 0
+    stats: Dict[str, int] = field(default_factory=lambda: {'send': 0, 'sync': 0, 'failed': 0})
+
+class MailEngine:
+    """Round-robin send/sync scheduling across accounts over shared pools and tokens"""
+    
+    def __init__(self, config: Dict, workers: int = 16, account_concurrency: int = 2,
+                 smtp_pool: Optional[SMTPConnectionPool] = None, imap_pool: Optional[IMAPConnectionPool] = None,
+                 token_cache: Optional[TokenCache] = None):
+        self.config = config
+        self.worker_count = workers
+        self.account_concurrency = account_concurrency
+        
+        self.smtp_pool = smtp_pool or SMTPConnectionPool.from_config(config)
+        self.imap_pool = imap_pool or IMAPConnectionPool.from_config(config)
+        self.owns_smtp_pool = smtp_pool is None
+        self.owns_imap_pool = imap_pool is None
+        self.token_cache = token_cache or TokenCache()
+        self.mailboxes: Dict[str, Dict[str, List[Dict]]] = {}  # loopback stores shared by the accounts
+        
+        self.accounts: Dict[str, MailAccount] = {}
+        self._order: Deque[str] = deque()  # round-robin position over accounts
+        self._work: Optional[asyncio.Condition] = None  # signalled when a job is queued or finishes
+        self.workers: List[asyncio.Task] = []
+        self.health_interval = 300.0
+        self.health_task = None
+        
+        self.wait_times = deque(maxlen=1000)
+        self.stats = {
+            'queued': 0,
+            'completed': 0,
+            'failed': 0,
+            'health_checks': 0
+        }
+        
+    @classmethod
+    def from_config(cls, config: Dict, **kwargs) -> 'MailEngine':
+        return cls(
+            config,
+            workers=config.get('mail_engine_workers', 16),
+            account_concurrency=config.get('mail_account_concurrency', 2),
+            **kwargs
+        )
+        
+    def start(self):
+        """Start the worker pool (idempotent)"""
+        if self.workers:
+            return
+        self._work = asyncio.Condition()
+        self.workers = [asyncio.ensure_future(self._worker(index)) for index in range(self.worker_count)]
+        self.health_task = get_scheduler().add('mail.health', self._scheduled_health_check, self.health_interval)
+        logging.info(f"Mail engine started: {self.worker_count} workers, "
+                     f"{self.account_concurrency} jobs per account")
+    
+    async def add_account(self, email: str, provider: str, access_token: Optional[str] = None,
+                          refresh_token: Optional[str] = None, expires_in: float = 3600,
+                          max_concurrency: Optional[int] = None) -> MailAccount:
+        """Register a mailbox; its handler uses the engine's pools and token cache"""
+        email = email.strip().lower()
+        if email in self.accounts:
+            return self.accounts[email]
+            
+        handler = EmailHandler(smtp_pool=self.smtp_pool, imap_pool=self.imap_pool, health_checks=False)
+        handler.qumail_mock_inboxes = self.mailboxes
+        handler.user_id = email  # token cache key used by ensure_valid_token
+        await handler.initialize(SimpleNamespace(email=email))
+        if access_token:
+            self.token_cache.put(provider, email, access_token, refresh_token, expires_in)
+            await handler.set_credentials(access_token, refresh_token, provider, oauth_manager=self.token_cache)
+            
+        account = MailAccount(email, provider.lower(), handler, max_concurrency or self.account_concurrency)
+        self.accounts[email] = account
+        self._order.append(email)
+        logging.info(f"Mail engine serving {email} ({provider}); {len(self.accounts)} accounts")
+        return account
+        
+    async def remove_account(self, email: str) -> bool:
+        """Stop serving a mailbox; its queued jobs are cancelled"""
+        account = self.accounts.pop(email.strip().lower(), None)
+        if account is None:
+            return False
+        self._order.remove(account.email)
+        while account.queue:
+            job = account.queue.popleft()
+            if not job.future.done():
+                job.future.cancel()
+        self.token_cache.remove(account.provider, account.email)
+        await account.handler.cleanup()  # shared pools stay open
+        return True
+        
+    async def send(self, email: str, to_address: str, encrypted_data: Dict[str, Any], **kwargs) -> bool:
+        """Send encrypted_data from the account (EmailHandler.send_encrypted_email)"""
+        return await self._submit(email, 'send', lambda handler: handler.send_encrypted_email(
+            to_address, encrypted_data, **kwargs))
+            
+    async def sync(self, email: str, folder: str = "INBOX", limit: int = 50) -> List[Dict]:
+        """List a folder of the account (EmailHandler.get_email_list)"""
+        return await self._submit(email, 'sync', lambda handler: handler.get_email_list(folder, limit))
+        
+    async def sync_all(self, folder: str = "INBOX", limit: int = 50) -> Dict[str, List[Dict]]:
+        """Sync every account; accounts whose sync failed are left out"""
+        emails = list(self.accounts)
+        results = await asyncio.gather(*(self.sync(email, folder, limit) for email in emails),
+                                       return_exceptions=True)
+        return {email: result for email, result in zip(emails, results) if not isinstance(result, BaseException)}
+        
+    async def _submit(self, email: str, kind: str, run: Callable[[EmailHandler], Awaitable[Any]]):
+        account = self.accounts.get(email.strip().lower())
+        if account is None:
+            raise ValueError(f"Mail engine does not serve {email}")
+        self.start()
+        job = MailJob(kind, run, asyncio.get_running_loop().create_future())
+        async with self._work:
+            account.queue.append(job)
+            self.stats['queued'] += 1
+            self._work.notify()
+        return await job.future
+        
+    async def _next_job(self):
+        """Next runnable job, taking accounts in turn (skipping ones at their cap)"""
+        async with self._work:
+            while True:
+                for _ in range(len(self._order)):
+                    account = self.accounts[self._order[0]]
+                    self._order.rotate(-1)
+                    while account.queue and account.queue[0].future.done():
+                        account.queue.popleft()  # caller gave up before the job started
+                    if account.queue and account.in_flight < account.max_concurrency:
+                        account.in_flight += 1
+                        return account, account.queue.popleft()
+                await self._work.wait()
+                
+    async def _worker(self, index: int):
+        while True:
+            account, job = await self._next_job()
+            self.wait_times.append(time.monotonic() - job.enqueued_at)
+            try:
+                result = await job.run(account.handler)
+                account.stats[job.kind] += 1
+                self.stats['completed'] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                account.stats['failed'] += 1
+                self.stats['failed'] += 1
+                logging.error(f"Mail engine {job.kind} for {account.email} failed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                account.in_flight -= 1
+                async with self._work:
+                    self._work.notify_all()
+                    
+    async def _scheduled_health_check(self):
+        if not self.accounts:
+            return IDLE
+        await self.check_health(force=True)
+        
+    async def check_health(self, force: bool = False) -> Dict[str, Dict]:
+        """One connection health check per provider, shared with all of its accounts"""
+        by_provider: Dict[str, List[MailAccount]] = {}
+        for account in self.accounts.values():
+            by_provider.setdefault(account.provider, []).append(account)
+            
+        async def check(accounts: List[MailAccount]) -> Dict:
+            lead = accounts[0].handler
+            status = await lead.check_connection_health(force=force)
+            for account in accounts[1:]:
+                # Their own check_connection_health() now answers from this result
+                account.handler.connection_healthy = lead.connection_healthy
+                account.handler.last_health_check = lead.last_health_check
+            return status
+            
+        providers = list(by_provider)
+        results = await asyncio.gather(*(check(by_provider[provider]) for provider in providers))
+        self.stats['health_checks'] += len(providers)
+        return dict(zip(providers, results))
+        
+    async def reap_idle(self) -> int:
+        """Close pooled connections idle past their timeout"""
+        return await self.smtp_pool.reap_idle() + await self.imap_pool.reap_idle()
+        
+    async def close(self):
+        """Stop the workers, cancel queued jobs and release every account"""
+        if self.health_task:
+            self.health_task.cancel()
+            self.health_task = None
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        for email in list(self.accounts):
+            await self.remove_account(email)
+        if self.owns_smtp_pool:
+            await self.smtp_pool.close()
+        if self.owns_imap_pool:
+            await self.imap_pool.close()
+            
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-account queues and counters, scheduling wait, pool and token cache stats"""
+        waits = sorted(self.wait_times)
+        stats = dict(self.stats)
+        stats.update({
+            'workers': len(self.workers),
+            'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+            'wait_p95_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+            'accounts': {
+                email: dict(account.stats, queued=len(account.queue), in_flight=account.in_flight,
+                            provider=account.provider)
+                for email, account in self.accounts.items()
+            },
+            'smtp_pool': self.smtp_pool.get_stats(),
+            'imap_pool': self.imap_pool.get_stats(),
+            'tokens': self.token_cache.get_stats()
+        })
+        return stats
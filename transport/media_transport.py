@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Media Transport - SRTP over UDP with an adaptive jitter buffer
+
+Each call endpoint is an asyncio datagram endpoint that sends one RTP frame
+per packet interval, protected by the call's SRTP session, and plays received
+frames out of an adaptive jitter buffer. Datagrams that arrive in the same
+event loop tick are unprotected as one batch.
+
+Frames carry their capture time, so in loopback (both endpoints in one
+process) playout time minus capture time is the mouth-to-ear latency:
+packetization, SRTP, UDP, batching and jitter buffer delay together.
+
+The SRTP session (protect_batch/unprotect_batch/install_key) and the key
+source (current() -> epoch key) are passed in, keeping this module free of
+crypto dependencies.
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RTP_HEADER = struct.Struct('>BBHII')
+CAPTURE_STAMP = struct.Struct('>d')  # perf_counter() at capture, first payload bytes
+RTP_VERSION = 0x80
+PAYLOAD_TYPE_PCMU = 0
+
+def _summarize(samples) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        'avg_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+class JitterBuffer:
+    """Adaptive playout buffer keyed by extended RTP sequence number
+    
+    The playout delay tracks the RFC 3550 interarrival jitter estimate
+    (target = jitter_multiplier * jitter, clamped to [min_delay, max_delay]),
+    moving at most `max_step` seconds per frame so playout never jumps.
+    """
+    
+    def __init__(self, clock_rate: int = 8000, frame_seconds: float = 0.02, min_delay: float = 0.01,
+                 max_delay: float = 0.2, jitter_multiplier: float = 3.0, max_step: float = 0.002):
+        self.clock_rate = clock_rate
+        self.frame_seconds = frame_seconds
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter_multiplier = jitter_multiplier
+        self.max_step = max_step
+        
+        self.frames: Dict[int, Tuple[float, bytes]] = {}
+        self.jitter = 0.0
+        self.delay = min_delay
+        self.min_transit: Optional[float] = None
+        self._last_transit: Optional[float] = None
+        self._highest_seq: Optional[int] = None
+        self.first_seq: Optional[int] = None
+        self.first_media_time = 0.0
+        self.next_seq: Optional[int] = None
+        self.stats = {
+            'received': 0,
+            'played': 0,
+            'late': 0,
+            'concealed': 0,
+            'duplicates': 0
+        }
+        
+    def _extend(self, seq: int) -> int:
+        """Extended sequence number (handles the 16-bit wrap)"""
+        if self._highest_seq is None:
+            return seq
+        candidate = (self._highest_seq & ~0xFFFF) | seq
+        if candidate - self._highest_seq > 0x8000:
+            candidate -= 0x10000
+        elif self._highest_seq - candidate > 0x8000:
+            candidate += 0x10000
+        return candidate
+        
+    def push(self, seq: int, rtp_timestamp: int, payload: bytes, arrival: float):
+        media_time = rtp_timestamp / self.clock_rate
+        transit = arrival - media_time
+        if self._last_transit is not None:
+            # RFC 3550 A.8 interarrival jitter
+            self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+        self._last_transit = transit
+        self.min_transit = transit if self.min_transit is None else min(self.min_transit, transit)
+        
+        extended = self._extend(seq)
+        if self._highest_seq is None or extended > self._highest_seq:
+            self._highest_seq = extended
+        if self.first_seq is None:
+            self.first_seq = self.next_seq = extended
+            self.first_media_time = media_time
+        if extended < self.next_seq:
+            self.stats['late'] += 1
+            return
+        if extended in self.frames:
+            self.stats['duplicates'] += 1
+            return
+        self.frames[extended] = (media_time, payload)
+        self.stats['received'] += 1
+        
+    def pop_due(self, now: float) -> List[Optional[bytes]]:
+        """Frames whose playout time has come, in order; None marks a concealed (missing) frame"""
+        if self.next_seq is None or self._highest_seq is None:
+            return []
+        target = min(self.max_delay, max(self.min_delay, self.jitter_multiplier * self.jitter))
+        output: List[Optional[bytes]] = []
+        while self.next_seq <= self._highest_seq:
+            self.delay += max(-self.max_step, min(self.max_step, target - self.delay))
+            entry = self.frames.get(self.next_seq)
+            if entry is not None:
+                media_time = entry[0]
+            else:
+                # Missing frame: its slot follows from the frame interval
+                media_time = self.first_media_time + (self.next_seq - self.first_seq) * self.frame_seconds
+            playout_at = media_time + self.min_transit + self.delay
+            if playout_at > now:
+                break
+            if entry is None:
+                self.stats['concealed'] += 1
+            else:
+                del self.frames[self.next_seq]
+                self.stats['played'] += 1
+            output.append(entry[1] if entry else None)
+            self.next_seq += 1
+        return output
+        
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        expected = (self._highest_seq - self.first_seq + 1) if self.first_seq is not None else 0
+        stats.update({
+            'expected': expected,
+            'lost': max(0, expected - self.stats['received'] - self.stats['late']),
+            'jitter_ms': round(self.jitter * 1000, 3),
+            'playout_delay_ms': round(self.delay * 1000, 3),
+            'buffered': len(self.frames)
+        })
+        return stats
+
+class MediaEndpoint(asyncio.DatagramProtocol):
+    """One side of a call: sends SRTP frames to its peer and plays out what it receives"""
+    
+    def __init__(self, name: str, srtp, ssrc: int, payload_size: int = 160, clock_rate: int = 8000,
+                 frame_seconds: float = 0.02, jitter_buffer: Optional[JitterBuffer] = None):
+        self.name = name
+        self.srtp = srtp
+        self.ssrc = ssrc
+        self.payload_size = max(payload_size, CAPTURE_STAMP.size)
+        self.clock_rate = clock_rate
+        self.frame_seconds = frame_seconds
+        self.jitter_buffer = jitter_buffer or JitterBuffer(clock_rate, frame_seconds)
+        
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.peer: Optional[Tuple[str, int]] = None
+        self.seq = 0
+        self.timestamp = 0
+        self._pending: List[Tuple[bytes, float]] = []
+        self._flush_scheduled = False
+        self.mouth_to_ear = deque(maxlen=5000)  # seconds, capture -> playout
+        self.stats = {
+            'sent': 0,
+            'send_errors': 0,
+            'datagrams': 0,
+            'rejected': 0,
+            'batches': 0
+        }
+        
+    def connection_made(self, transport):
+        self.transport = transport
+        
+    def datagram_received(self, data: bytes, addr):
+        self._pending.append((data, time.perf_counter()))
+        self.stats['datagrams'] += 1
+        if not self._flush_scheduled:
+            # Everything that arrives before the loop gets back to us is unprotected together
+            self._flush_scheduled = True
+            asyncio.get_event_loop().call_soon(self._flush)
+            
+    def error_received(self, exc):
+        logging.debug(f"Media endpoint {self.name} socket error: {exc}")
+        
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.stats['batches'] += 1
+        for packet, (_, arrival) in zip(self.srtp.unprotect_batch([data for data, _ in pending]), pending):
+            if packet is None:
+                self.stats['rejected'] += 1
+                continue
+            _, _, seq, rtp_timestamp, _ = RTP_HEADER.unpack_from(packet)
+            self.jitter_buffer.push(seq, rtp_timestamp, packet[RTP_HEADER.size:], arrival)
+            
+    def send_frame(self):
+        """Capture, packetize, protect and send one frame"""
+        payload = CAPTURE_STAMP.pack(time.perf_counter()).ljust(self.payload_size, b'\x00')
+        packet = RTP_HEADER.pack(RTP_VERSION, PAYLOAD_TYPE_PCMU, self.seq, self.timestamp, self.ssrc) + payload
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + int(self.clock_rate * self.frame_seconds)) & 0xFFFFFFFF
+        try:
+            self.transport.sendto(self.srtp.protect_batch([packet])[0], self.peer)
+            self.stats['sent'] += 1
+        except Exception as e:
+            self.stats['send_errors'] += 1
+            logging.debug(f"Media endpoint {self.name} send failed: {e}")
+            
+    def play_due(self):
+        """Play out due frames, recording mouth-to-ear latency for each"""
+        now = time.perf_counter()
+        for payload in self.jitter_buffer.pop_due(now):
+            if payload is not None:
+                self.mouth_to_ear.append(now - CAPTURE_STAMP.unpack_from(payload)[0])
+                
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['jitter_buffer'] = self.jitter_buffer.get_stats()
+        stats['mouth_to_ear'] = _summarize(self.mouth_to_ear)
+        return stats
+
+class LoopbackCall:
+    """A full-duplex call between two local endpoints over 127.0.0.1 UDP"""
+    
+    def __init__(self, call_id: str, srtp_factory: Callable[[], Any], key_source: Optional[Callable[[], Any]] = None,
+                 payload_size: int = 160, frame_seconds: float = 0.02, host: str = '127.0.0.1'):
+        self.call_id = call_id
+        self.key_source = key_source  # () -> epoch key (epoch, mki, master_key, master_salt)
+        self.frame_seconds = frame_seconds
+        self.host = host
+        self.caller = MediaEndpoint(f"{call_id}/caller", srtp_factory(), 0x51A70001, payload_size,
+                                    frame_seconds=frame_seconds)
+        self.callee = MediaEndpoint(f"{call_id}/callee", srtp_factory(), 0x51A70002, payload_size,
+                                    frame_seconds=frame_seconds)
+        self.epoch: Optional[int] = None
+        self.mki: Optional[int] = None
+        self._clock_task: Optional[asyncio.Task] = None
+        self.started_at: Optional[float] = None
+        self.tick_overruns = 0
+        
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        for endpoint in (self.caller, self.callee):
+            await loop.create_datagram_endpoint(lambda endpoint=endpoint: endpoint, local_addr=(self.host, 0))
+        self.caller.peer = self.callee.transport.get_extra_info('sockname')
+        self.callee.peer = self.caller.transport.get_extra_info('sockname')
+        self._rekey()
+        self.started_at = time.perf_counter()
+        self._clock_task = asyncio.ensure_future(self._media_clock())
+        logging.info(f"Loopback media started for call {self.call_id}")
+        
+    def _rekey(self):
+        """Install the key schedule's current epoch on both endpoints when it changes"""
+        if self.key_source is None:
+            return
+        key = self.key_source()
+        if key.mki != self.mki:  # a new epoch, or a late seed arriving mid-epoch
+            for endpoint in (self.caller, self.callee):
+                endpoint.srtp.install_key(key.mki, key.master_key, key.master_salt)
+            self.epoch, self.mki = key.epoch, key.mki
+            
+    async def _media_clock(self):
+        """Send a frame each way and run playout every frame interval (drift-free)"""
+        next_tick = time.perf_counter()
+        while True:
+            self._rekey()
+            self.caller.send_frame()
+            self.callee.send_frame()
+            self.caller.play_due()
+            self.callee.play_due()
+            next_tick += self.frame_seconds
+            delay = next_tick - time.perf_counter()
+            if delay < 0:
+                self.tick_overruns += 1
+                next_tick = time.perf_counter()
+                delay = 0
+            await asyncio.sleep(delay)
+            
+    async def stop(self):
+        if self._clock_task:
+            self._clock_task.cancel()
+            try:
+                await self._clock_task
+            except asyncio.CancelledError:
+                pass
+            self._clock_task = None
+        await asyncio.sleep(self.frame_seconds)  # let in-flight frames land
+        for endpoint in (self.caller, self.callee):
+            endpoint.play_due()
+            if endpoint.transport:
+                endpoint.transport.close()
+                
+    def get_stats(self) -> Dict[str, Any]:
+        samples = list(self.caller.mouth_to_ear) + list(self.callee.mouth_to_ear)
+        return {
+            'call_id': self.call_id,
+            'epoch': self.epoch,
+            'duration': round(time.perf_counter() - self.started_at, 3) if self.started_at else 0.0,
+            'tick_overruns': self.tick_overruns,
+            'mouth_to_ear': _summarize(samples),
+            'caller': self.caller.get_stats(),
+            'callee': self.callee.get_stats()
+        }
+
+async def run_loopback_calls(count: int, duration: float, srtp_factory: Callable[[], Any],
+                             key_source_factory: Optional[Callable[[str], Callable[[], Any]]] = None,
+                             payload_size: int = 160) -> Dict[str, Any]:
+    """Run `count` concurrent loopback calls for `duration` seconds; latency, loss and CPU per call"""
+    if count < 1:
+        raise ValueError(f"Loopback call count must be at least 1, got {count}")
+        
+    calls = []
+    for i in range(count):
+        call_id = f"loopback_{i}"
+        key_source = key_source_factory(call_id) if key_source_factory else None
+        calls.append(LoopbackCall(call_id, srtp_factory, key_source, payload_size))
+    for call in calls:
+        await call.start()
+        
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    for call in calls:
+        await call.stop()
+        
+    samples = [sample for call in calls for endpoint in (call.caller, call.callee) for sample in endpoint.mouth_to_ear]
+    buffers = [endpoint.jitter_buffer.get_stats() for call in calls for endpoint in (call.caller, call.callee)]
+    expected = sum(stats['expected'] for stats in buffers)
+    return {
+        'calls': count,
+        'mouth_to_ear': _summarize(samples),
+        'loss_rate': round(sum(stats['lost'] for stats in buffers) / expected, 4) if expected else 0.0,
+        'late_rate': round(sum(stats['late'] for stats in buffers) / expected, 4) if expected else 0.0,
+        'cpu_ms_per_call_second': round(cpu / wall / count * 1000, 3),
+        'tick_overruns': sum(call.tick_overruns for call in calls),
+        'per_call': [call.get_stats() for call in calls]
+    }
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+SMTP Connection Pool - Authenticated SMTP connections shared across sessions
+
+Connections are keyed by (server, port, user): an XOAUTH2-authenticated
+connection can only send as the account it logged in with, so reuse is per
+account while the per-key, per-server and total caps are shared by every
+session using the pool. Idle connections are reused for up to `idle_timeout`
+seconds; a connection that raised while checked out is closed instead of
+returned. When a shared cap is held by another account's idle connection,
+that connection is closed to make room; otherwise callers wait for a
+connection to be released.
+
+`ConnectionPool` holds the pooling logic; `SMTPConnectionPool` and
+`IMAPConnectionPool` (transport/imap_pool.py) supply how to open and close
+their protocol's connections.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+PoolKey = Tuple[str, int, str]
+
+async def connect_xoauth2(server: str, port: int, user: str, auth_string: str, timeout: float):
+    """Open an aiosmtplib connection and authenticate with a base64 XOAUTH2 string"""
+    import aiosmtplib  # imported on first real connection
+
+    client = aiosmtplib.SMTP(hostname=server, port=port, use_tls=True, timeout=timeout)
+    await asyncio.wait_for(client.connect(), timeout=timeout)
+    await asyncio.wait_for(client.execute_command("AUTH", "XOAUTH2", auth_string), timeout=15.0)
+    return client
+
+class ConnectionPool:
+    """Per-account reusable connections with per-key, per-server and total caps"""
+    protocol = 'mail'
+
+    def __init__(self, connect: Callable[..., Awaitable[Any]], max_per_key: int = 2, max_total: int = 32,
+                 idle_timeout: float = 60.0, max_per_server: int = 0):
+        self.connect = connect
+        self.max_per_key = max_per_key
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.max_per_server = max_per_server  # provider-wide cap across accounts (0 = none)
+
+        self.idle: Dict[PoolKey, Deque[Tuple[Any, float]]] = {}
+        self.in_use = Counter()
+        self._opening = Counter()
+        self._released = asyncio.Condition()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'expired': 0,
+            'evicted': 0,
+            'waits': 0,
+            'connect_failures': 0
+        }
+
+    def _total(self) -> int:
+        return (sum(self.in_use.values()) + sum(self._opening.values()) +
+                sum(len(connections) for connections in self.idle.values()))
+
+    def _count(self, key: PoolKey) -> int:
+        return self.in_use[key] + self._opening[key] + len(self.idle.get(key, ()))
+
+    def _server_count(self, server: str, port: int) -> int:
+        keys = set(self.in_use) | set(self._opening) | set(self.idle)
+        return sum(self._count(key) for key in keys if key[:2] == (server, port))
+        
+    def _has_capacity(self, key: PoolKey) -> bool:
+        if self._count(key) >= self.max_per_key or self._total() >= self.max_total:
+            return False
+        return not self.max_per_server or self._server_count(key[0], key[1]) < self.max_per_server
+        
+    @asynccontextmanager
+    async def connection(self, server: str, port: int, user: str, auth_string: str, timeout: float = 30.0):
+        """Check out a connection for (server, port, user); it returns to the pool on clean exit"""
+        key = (server, port, user)
+        client = await self._acquire(key, auth_string, timeout)
+        try:
+            yield client
+        except BaseException:
+            await self._discard(key, client)
+            raise
+        else:
+            await self._release(key, client)
+
+    async def _acquire(self, key: PoolKey, auth_string: str, timeout: float):
+        waited = False
+        while True:
+            async with self._released:
+                client = self._take_idle(key)
+                if client is not None:
+                    self.in_use[key] += 1
+                    self.stats['reused'] += 1
+                    return client
+                if self._has_capacity(key):
+                    self._opening[key] += 1
+                    break
+                if self._count(key) < self.max_per_key and self._evict_idle_for(key):
+                    continue  # a shared cap was held by another account's idle connection
+                if not waited:
+                    waited = True
+                    self.stats['waits'] += 1
+                await self._released.wait()
+
+        try:
+            client = await self.connect(key[0], key[1], key[2], auth_string, timeout)
+        except BaseException:
+            self.stats['connect_failures'] += 1
+            async with self._released:
+                self._opening[key] -= 1
+                self._released.notify_all()
+            raise
+
+        async with self._released:
+            self._opening[key] -= 1
+            self.in_use[key] += 1
+        self.stats['created'] += 1
+        logging.debug(f"{self.protocol} pool opened connection for {key[2]} at {key[0]}:{key[1]}")
+        return client
+
+    def _take_idle(self, key: PoolKey):
+        connections = self.idle.get(key)
+        now = time.monotonic()
+        while connections:
+            client, released_at = connections.pop()  # most recently used first
+            if now - released_at <= self.idle_timeout and getattr(client, 'is_connected', True):
+                return client
+            self.stats['expired'] += 1
+            asyncio.ensure_future(self._close(client))
+        return None
+
+    def _evict_idle_for(self, key: PoolKey) -> bool:
+        """Close the oldest idle connection of another account that is blocking key at a shared cap"""
+        same_server = self.max_per_server and self._server_count(key[0], key[1]) >= self.max_per_server
+        candidates = [(connections[0][1], other) for other, connections in self.idle.items()
+                      if connections and other != key and (not same_server or other[:2] == key[:2])]
+        if not candidates:
+            return False
+        _, other = min(candidates)
+        client, _ = self.idle[other].popleft()  # oldest release first
+        self.stats['evicted'] += 1
+        asyncio.ensure_future(self._close(client))
+        return True
+        
+    async def _release(self, key: PoolKey, client):
+        async with self._released:
+            self.in_use[key] -= 1
+            self.idle.setdefault(key, deque()).append((client, time.monotonic()))
+            self._released.notify_all()
+
+    async def _discard(self, key: PoolKey, client):
+        async with self._released:
+            self.in_use[key] -= 1
+            self.stats['discarded'] += 1
+            self._released.notify_all()
+        await self._close(client)
+
+    async def _close(self, client):
+        try:
+            await asyncio.wait_for(self.close_client(client), timeout=10.0)
+        except Exception as e:
+            logging.debug(f"{self.protocol} pool connection close failed: {e}")
+            
+    async def close_client(self, client):
+        """Protocol-level goodbye for one connection"""
+        raise NotImplementedError
+
+    async def reap_idle(self) -> int:
+        """Close idle connections older than idle_timeout; returns how many were closed"""
+        now = time.monotonic()
+        expired = []
+        async with self._released:
+            for key, connections in self.idle.items():
+                keep = deque((client, released_at) for client, released_at in connections
+                             if now - released_at <= self.idle_timeout)
+                expired.extend(client for client, released_at in connections
+                               if now - released_at > self.idle_timeout)
+                self.idle[key] = keep
+            self.stats['expired'] += len(expired)
+            self._released.notify_all()
+        await asyncio.gather(*(self._close(client) for client in expired))
+        return len(expired)
+
+    async def close(self):
+        """Close every idle connection (checked-out ones close when discarded by their users)"""
+        async with self._released:
+            clients = [client for connections in self.idle.values() for client, _ in connections]
+            self.idle.clear()
+        await asyncio.gather(*(self._close(client) for client in clients))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update({
+            'in_use': sum(self.in_use.values()),
+            'idle': sum(len(connections) for connections in self.idle.values()),
+            'accounts': len([key for key in set(self.in_use) | set(self.idle) if self._count(key)]),
+            'max_per_key': self.max_per_key,
+            'max_per_server': self.max_per_server,
+            'max_total': self.max_total
+        })
+        return stats
+
+class SMTPConnectionPool(ConnectionPool):
+    """Per-account reusable SMTP connections authenticated with XOAUTH2"""
+    protocol = 'SMTP'
+    
+    def __init__(self, max_per_key: int = 2, max_total: int = 32, idle_timeout: float = 60.0,
+                 connect: Optional[Callable[..., Awaitable[Any]]] = None, max_per_server: int = 0):
+        super().__init__(connect or connect_xoauth2, max_per_key, max_total, idle_timeout, max_per_server)
+        
+    @classmethod
+    def from_config(cls, config: Dict) -> 'SMTPConnectionPool':
+        return cls(
+            max_per_key=config.get('smtp_pool_per_account', 2),
+            max_total=config.get('smtp_pool_size', 32),
+            idle_timeout=config.get('smtp_pool_idle_timeout', 60.0),
+            max_per_server=config.get('smtp_pool_per_server', 0)
+        )
+        
+    async def close_client(self, client):
+        await client.quit()
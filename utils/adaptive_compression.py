@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Adaptive Compression - Pre-encryption compression for QuMail payloads
+
+Compressing before encryption shrinks the wire size and, for L1, the one-time
+pad key material drawn from the KME (OTP consumes key bytes 1:1 with
+plaintext). The codec is chosen per payload: a sample is compressed with each
+candidate from fastest to strongest, and the strongest candidate whose
+projected time fits the CPU budget wins. Incompressible payloads (already
+compressed files, random data) are sent as-is.
+
+The choice is recorded in the envelope as a small dict:
+
+    {'codec': 'zlib' | 'lzma' | 'none', 'level': 6, 'original_length': n, 'compressed_length': m}
+"""
+
+import logging
+import lzma
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fastest first: sampling stops at the first candidate over the time budget
+CANDIDATES: List[Tuple[str, int]] = [('zlib', 1), ('zlib', 6), ('zlib', 9), ('lzma', 6)]
+
+def _compress(codec: str, level: int, data: bytes) -> bytes:
+    if codec == 'zlib':
+        return zlib.compress(data, level)
+    return lzma.compress(data, preset=level)
+
+def decompress_payload(data: bytes, compression: Optional[Dict[str, Any]]) -> bytes:
+    """Undo compress() using the envelope's compression record"""
+    if not compression or compression.get('codec', 'none') == 'none':
+        return data
+        
+    codec = compression['codec']
+    original_length = compression['original_length']
+    # Never inflate past the recorded size (decompression bombs)
+    if codec == 'zlib':
+        decompressor = zlib.decompressobj()
+        plaintext = decompressor.decompress(data, original_length)
+        finished = decompressor.eof
+    elif codec == 'lzma':
+        decompressor = lzma.LZMADecompressor()
+        plaintext = decompressor.decompress(data, original_length)
+        finished = decompressor.eof
+    else:
+        raise ValueError(f"Unsupported payload compression: {codec}")
+        
+    if not finished or len(plaintext) != original_length:
+        raise ValueError("Compressed payload does not match its recorded length")
+    return plaintext
+
+class AdaptiveCompressor:
+    """Chooses zlib/lzma level or no compression per payload from a sampled ratio and CPU budget"""
+    
+    def __init__(self, enabled: bool = True, min_size: int = 256, sample_size: int = 16 * 1024,
+                 budget_ms_per_mb: float = 50.0, min_saving: float = 0.1):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.sample_size = sample_size
+        self.budget_ms_per_mb = budget_ms_per_mb
+        self.min_saving = min_saving  # skip unless at least this fraction is saved
+        
+        self.level_stats: Dict[str, Dict[str, float]] = {}
+        self.fixed_costs: Dict[Tuple[str, int], float] = {}  # fastest run seen per candidate (setup cost)
+        self.stats = {
+            'payloads': 0,
+            'compressed': 0,
+            'skipped': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'sampling_seconds': 0.0
+        }
+        
+    @classmethod
+    def from_config(cls, config: Dict) -> 'AdaptiveCompressor':
+        return cls(
+            enabled=config.get('compression_enabled', True),
+            budget_ms_per_mb=config.get('compression_budget_ms_per_mb', 50.0)
+        )
+        
+    def _sample(self, data: bytes) -> bytes:
+        """Head and middle of the payload, so a uniform header does not skew the ratio"""
+        if len(data) <= self.sample_size:
+            return data
+        half = self.sample_size // 2
+        middle = len(data) // 2
+        return data[:half] + data[middle:middle + half]
+        
+    def choose(self, data: bytes, budget_scale: float = 1.0) -> Tuple[str, int, Optional[bytes], float]:
+        """Return (codec, level, compressed, seconds) for data; codec 'none' means skip
+        
+        When the whole payload fit in the sample, compressed (and the seconds it
+        took) is the final result, so it need not be compressed twice.
+        """
+        sample = self._sample(data)
+        scale = len(data) / len(sample)
+        # lzma alone costs milliseconds to set up, so small payloads get a small floor, not a free pass
+        budget = max(len(data) / (1024 * 1024) * self.budget_ms_per_mb, 2.0) / 1000 * budget_scale
+        
+        best = ('none', 0, None, 0.0)
+        best_ratio = 1.0 - self.min_saving
+        started = time.perf_counter()
+        for codec, level in CANDIDATES:
+            # Candidates whose setup alone exceeds the budget are not even sampled
+            if self.fixed_costs.get((codec, level), 0.0) > budget:
+                break
+            t0 = time.perf_counter()
+            compressed = _compress(codec, level, sample)
+            elapsed = time.perf_counter() - t0
+            self.fixed_costs[(codec, level)] = min(elapsed, self.fixed_costs.get((codec, level), elapsed))
+            if elapsed * scale > budget:
+                break
+                
+            ratio = len(compressed) / len(sample)
+            # A stronger codec has to earn its extra CPU with a clearly better ratio
+            if ratio < best_ratio - 0.02 or (best[0] == 'none' and ratio <= best_ratio):
+                best, best_ratio = (codec, level, compressed, elapsed), ratio
+            elif codec == 'zlib' and level == 1 and ratio > 0.95:
+                break  # effectively incompressible
+                
+        self.stats['sampling_seconds'] += time.perf_counter() - started
+        if best[2] is not None and len(sample) != len(data):
+            best = (best[0], best[1], None, 0.0)
+        return best
+        
+    def compress(self, data: bytes, budget_scale: float = 1.0) -> Tuple[bytes, Dict[str, Any]]:
+        """Compress data adaptively; returns (payload, compression record for the envelope)
+        
+        budget_scale widens the CPU budget where bytes are expensive (e.g. OTP).
+        """
+        data = bytes(data)
+        self.stats['payloads'] += 1
+        self.stats['bytes_in'] += len(data)
+        codec, level, compressed, elapsed = 'none', 0, None, 0.0
+        
+        if self.enabled and len(data) >= self.min_size:
+            codec, level, compressed, elapsed = self.choose(data, budget_scale)
+            
+        if codec != 'none':
+            if compressed is None:
+                start = time.perf_counter()
+                compressed = _compress(codec, level, data)
+                elapsed = time.perf_counter() - start
+                
+            if len(compressed) < len(data):
+                self._record(codec, level, len(data), len(compressed), elapsed)
+                self.stats['compressed'] += 1
+                self.stats['bytes_out'] += len(compressed)
+                logging.debug(f"Payload compressed with {codec}:{level}: {len(data)} -> {len(compressed)} bytes")
+                return compressed, {
+                    'codec': codec,
+                    'level': level,
+                    'original_length': len(data),
+                    'compressed_length': len(compressed)
+                }
+                
+        self.stats['skipped'] += 1
+        self.stats['bytes_out'] += len(data)
+        return data, {'codec': 'none', 'level': 0, 'original_length': len(data), 'compressed_length': len(data)}
+        
+    def _record(self, codec: str, level: int, bytes_in: int, bytes_out: int, seconds: float):
+        entry = self.level_stats.setdefault(f"{codec}:{level}", {
+            'count': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0
+        })
+        entry['count'] += 1
+        entry['bytes_in'] += bytes_in
+        entry['bytes_out'] += bytes_out
+        entry['seconds'] += seconds
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """Overall savings plus ratio and time per codec level"""
+        stats = dict(self.stats)
+        stats['ratio'] = round(self.stats['bytes_out'] / self.stats['bytes_in'], 3) if self.stats['bytes_in'] else 1.0
+        stats['levels'] = {
+            name: {
+                'count': entry['count'],
+                'ratio': round(entry['bytes_out'] / entry['bytes_in'], 3),
+                'avg_ms': round(entry['seconds'] / entry['count'] * 1000, 3),
+                'mb_per_sec': round(entry['bytes_in'] / (1024 * 1024) / entry['seconds'], 1) if entry['seconds'] else 0.0
+            }
+            for name, entry in self.level_stats.items()
+        }
+        return stats
@@ -23,6 +23,22 @@ def load_config() -> Dict[str, Any]:
         'default_security_level': os.getenv('QUMAIL_DEFAULT_SECURITY', 'L2'),
         'otp_size_limit': int(os.getenv('QUMAIL_OTP_LIMIT', '51200')),  # 50KB
         'max_key_lifetime_hours': int(os.getenv('QUMAIL_KEY_LIFETIME', '24')),
+        'policy_latency_budget': float(os.getenv('QUMAIL_POLICY_LATENCY_BUDGET', '2.0')),  # seconds per key fetch
+        'policy_otp_reserve_bits': int(os.getenv('QUMAIL_POLICY_OTP_RESERVE_BITS', '0')),
+        'policy_defer_timeout': float(os.getenv('QUMAIL_POLICY_DEFER_TIMEOUT', '30')),
+        
+        # Crypto Executor Settings (payloads above the threshold leave the event loop)
+        'crypto_executor': os.getenv('QUMAIL_CRYPTO_EXECUTOR', 'thread'),  # thread | process
+        'crypto_workers': int(os.getenv('QUMAIL_CRYPTO_WORKERS', '0')),  # 0 = auto
+        'crypto_offload_threshold': int(os.getenv('QUMAIL_CRYPTO_OFFLOAD_THRESHOLD', str(256 * 1024))),
+        'compression_enabled': os.getenv('QUMAIL_COMPRESSION', 'true').lower() == 'true',
+        'compression_budget_ms_per_mb': float(os.getenv('QUMAIL_COMPRESSION_BUDGET_MS_PER_MB', '50')),
+        
+        # Session Ratchet Settings (one KME seed per peer, re-seeded every N messages or T seconds)
+        'session_ratchet_enabled': os.getenv('QUMAIL_SESSION_RATCHET', 'false').lower() == 'true',
+        'ratchet_reseed_messages': int(os.getenv('QUMAIL_RATCHET_RESEED_MESSAGES', '100')),
+        'ratchet_reseed_seconds': float(os.getenv('QUMAIL_RATCHET_RESEED_SECONDS', '600')),
+        'ratchet_max_skipped_keys': int(os.getenv('QUMAIL_RATCHET_MAX_SKIPPED', '2000')),
         
         # UI Settings
         'window_width': int(os.getenv('QUMAIL_WINDOW_WIDTH', '1440')),
@@ -36,6 +52,31 @@ def load_config() -> Dict[str, Any]:
         # Email Settings
         'email_batch_size': int(os.getenv('QUMAIL_EMAIL_BATCH', '50')),
         'chat_history_limit': int(os.getenv('QUMAIL_CHAT_HISTORY', '100')),
+        'outbox_workers': int(os.getenv('QUMAIL_OUTBOX_WORKERS', '4')),
+        'outbox_max_queue': int(os.getenv('QUMAIL_OUTBOX_MAX_QUEUE', '100')),
+        'outbox_per_destination': int(os.getenv('QUMAIL_OUTBOX_PER_DESTINATION', '2')),
+        'prefetch_depth': int(os.getenv('QUMAIL_PREFETCH_DEPTH', '10')),
+        'prefetch_concurrency': int(os.getenv('QUMAIL_PREFETCH_CONCURRENCY', '3')),
+        'prefetch_cache_bytes': int(os.getenv('QUMAIL_PREFETCH_CACHE_BYTES', str(16 * 1024 * 1024))),
+        'prefetch_cache_entries': int(os.getenv('QUMAIL_PREFETCH_CACHE_ENTRIES', '200')),
+        'smtp_pool_size': int(os.getenv('QUMAIL_SMTP_POOL_SIZE', '32')),
+        'smtp_pool_per_account': int(os.getenv('QUMAIL_SMTP_POOL_PER_ACCOUNT', '2')),
+        'smtp_pool_idle_timeout': float(os.getenv('QUMAIL_SMTP_POOL_IDLE_TIMEOUT', '60')),
+        'smtp_pool_per_server': int(os.getenv('QUMAIL_SMTP_POOL_PER_SERVER', '0')),  # 0 = no provider cap
+        'imap_pool_size': int(os.getenv('QUMAIL_IMAP_POOL_SIZE', '32')),
+        'imap_pool_per_account': int(os.getenv('QUMAIL_IMAP_POOL_PER_ACCOUNT', '1')),
+        'imap_pool_idle_timeout': float(os.getenv('QUMAIL_IMAP_POOL_IDLE_TIMEOUT', '60')),
+        'imap_pool_per_server': int(os.getenv('QUMAIL_IMAP_POOL_PER_SERVER', '0')),
+        
+        # Multi-account Mail Engine Settings
+        'mail_engine_workers': int(os.getenv('QUMAIL_MAIL_ENGINE_WORKERS', '16')),
+        'mail_account_concurrency': int(os.getenv('QUMAIL_MAIL_ACCOUNT_CONCURRENCY', '2')),
+        
+        # Headless Service Settings (python -m qumail.daemon)
+        'service_socket': os.getenv('QUMAIL_SERVICE_SOCKET', '/tmp/qumail.sock'),
+        'service_max_sessions': int(os.getenv('QUMAIL_SERVICE_MAX_SESSIONS', '1000')),
+        'service_session_idle': float(os.getenv('QUMAIL_SERVICE_SESSION_IDLE', '1800')),  # seconds
+        'service_token': os.getenv('QUMAIL_SERVICE_TOKEN', ''),  # required by session.open when set
         
         # OAuth2 Settings - HARDCODED CREDENTIALS FIX
         'oauth2_timeout': int(os.getenv('QUMAIL_OAUTH_TIMEOUT', '60')),
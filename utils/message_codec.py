@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Message Codec - Framed binary format for plaintext message payloads
+
+Replaces the JSON serialization QuMailCore used before encryption. A message
+is a typed header (one frame per top-level field) followed by raw attachment
+sections, so attachment bytes go into the cipher as-is instead of being
+base64'd into JSON first and base64'd again by the cipher envelope:
+
+    MAGIC | field count (u16) | section count (u16)
+    field:   type tag (1 byte) | name length (u16) | value length (u32) | name | value
+    section: attachment index (u32) | data length (u64) | raw bytes
+
+Strings, bytes, ints, floats, bools and None get native frames; nested
+lists/dicts are stored as compact JSON frames. The `data` bytes of entries in
+the `attachments` list are lifted out into sections. Payloads that do not
+start with MESSAGE_MAGIC are decoded as legacy JSON.
+"""
+
+import json
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple, Union
+
+MESSAGE_MAGIC = b'QMM\x01'
+MESSAGE_HEADER = struct.Struct('>HH')  # field count, section count
+FIELD_HEADER = struct.Struct('>cHI')  # type tag, name length, value length
+SECTION_HEADER = struct.Struct('>IQ')  # attachment index, data length
+INT_VALUE = struct.Struct('>q')
+FLOAT_VALUE = struct.Struct('>d')
+
+ATTACHMENTS_FIELD = 'attachments'
+ATTACHMENT_DATA_KEY = 'data'
+
+TAG_NONE = b'n'
+TAG_STR = b's'
+TAG_BYTES = b'b'
+TAG_INT = b'i'
+TAG_FLOAT = b'f'
+TAG_TRUE = b'T'
+TAG_FALSE = b'F'
+TAG_JSON = b'j'
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+def _encode_value(value: Any) -> Tuple[bytes, Buffer]:
+    if value is None:
+        return TAG_NONE, b''
+    if value is True:
+        return TAG_TRUE, b''
+    if value is False:
+        return TAG_FALSE, b''
+    if isinstance(value, str):
+        return TAG_STR, value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return TAG_BYTES, value
+    if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return TAG_INT, INT_VALUE.pack(value)
+    if isinstance(value, float):
+        return TAG_FLOAT, FLOAT_VALUE.pack(value)
+    return TAG_JSON, json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _decode_value(tag: bytes, value: memoryview) -> Any:
+    if tag == TAG_STR:
+        return str(value, 'utf-8')
+    if tag == TAG_BYTES:
+        return bytes(value)
+    if tag == TAG_INT:
+        return INT_VALUE.unpack(value)[0]
+    if tag == TAG_FLOAT:
+        return FLOAT_VALUE.unpack(value)[0]
+    if tag == TAG_TRUE:
+        return True
+    if tag == TAG_FALSE:
+        return False
+    if tag == TAG_NONE:
+        return None
+    if tag == TAG_JSON:
+        return json.loads(str(value, 'utf-8'))
+    raise ValueError(f"Unknown message field type: {tag!r}")
+
+def _split_sections(message: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[int, Buffer]]]:
+    """Lift attachment bytes out of the message into (index, data) sections"""
+    attachments = message.get(ATTACHMENTS_FIELD)
+    if not isinstance(attachments, list):
+        return message, []
+        
+    sections = []
+    stripped = []
+    for index, attachment in enumerate(attachments):
+        data = attachment.get(ATTACHMENT_DATA_KEY) if isinstance(attachment, dict) else None
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            attachment = {k: v for k, v in attachment.items() if k != ATTACHMENT_DATA_KEY}
+            sections.append((index, data))
+        stripped.append(attachment)
+        
+    if not sections:
+        return message, []
+    header = dict(message)
+    header[ATTACHMENTS_FIELD] = stripped
+    return header, sections
+
+def iter_encode(message: Dict[str, Any]) -> Iterator[Buffer]:
+    """Yield the encoded message frame by frame; attachment data is yielded uncopied"""
+    header, sections = _split_sections(message)
+    yield MESSAGE_MAGIC + MESSAGE_HEADER.pack(len(header), len(sections))
+    
+    for name, value in header.items():
+        name_bytes = str(name).encode('utf-8')
+        tag, encoded = _encode_value(value)
+        yield FIELD_HEADER.pack(tag, len(name_bytes), len(encoded)) + name_bytes
+        if encoded:
+            yield encoded
+            
+    for index, data in sections:
+        yield SECTION_HEADER.pack(index, len(data))
+        yield data
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Encode a message dict into the framed binary format"""
+    return b''.join(iter_encode(message))
+
+def decode_message(data: Buffer) -> Dict[str, Any]:
+    """Decode a framed binary message (or a legacy JSON payload) back into a dict"""
+    view = memoryview(data)
+    if view[:len(MESSAGE_MAGIC)] != MESSAGE_MAGIC:
+        return json.loads(str(view, 'utf-8'))
+        
+    offset = len(MESSAGE_MAGIC)
+    field_count, section_count = MESSAGE_HEADER.unpack_from(view, offset)
+    offset += MESSAGE_HEADER.size
+    
+    message = {}
+    for _ in range(field_count):
+        tag, name_length, value_length = FIELD_HEADER.unpack_from(view, offset)
+        offset += FIELD_HEADER.size
+        name = str(view[offset:offset + name_length], 'utf-8')
+        offset += name_length
+        message[name] = _decode_value(tag, view[offset:offset + value_length])
+        offset += value_length
+        
+    for _ in range(section_count):
+        index, length = SECTION_HEADER.unpack_from(view, offset)
+        offset += SECTION_HEADER.size
+        if offset + length > len(view):
+            raise ValueError("Truncated attachment section")
+        message[ATTACHMENTS_FIELD][index][ATTACHMENT_DATA_KEY] = bytes(view[offset:offset + length])
+        offset += length
+        
+    if offset != len(view):
+        raise ValueError(f"Trailing bytes after message ({len(view) - offset})")
+    return message
+
+class MessageWriter:
+    """Stream an encoded message into a binary file-like object"""
+    
+    def __init__(self, sink: BinaryIO):
+        self.sink = sink
+        self.bytes_written = 0
+        
+    def write(self, message: Dict[str, Any]) -> int:
+        for frame in iter_encode(message):
+            self.sink.write(frame)
+            self.bytes_written += len(frame)
+        return self.bytes_written
+
+class MessageReader:
+    """Read an encoded message from a binary file-like object, section by section
+    
+    read_fields() returns the header fields; sections() then yields
+    (attachment index, chunk iterator) so large attachments can be consumed
+    without holding them in memory.
+    """
+    
+    def __init__(self, source: BinaryIO, chunk_size: int = 256 * 1024):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.section_count = 0
+        
+    def _read_exact(self, size: int) -> bytes:
+        data = self.source.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated message stream")
+        return data
+        
+    def read_fields(self) -> Dict[str, Any]:
+        if self._read_exact(len(MESSAGE_MAGIC)) != MESSAGE_MAGIC:
+            raise ValueError("Not a QuMail binary message")
+        field_count, self.section_count = MESSAGE_HEADER.unpack(self._read_exact(MESSAGE_HEADER.size))
+        
+        fields = {}
+        for _ in range(field_count):
+            tag, name_length, value_length = FIELD_HEADER.unpack(self._read_exact(FIELD_HEADER.size))
+            name = self._read_exact(name_length).decode('utf-8')
+            fields[name] = _decode_value(tag, memoryview(self._read_exact(value_length)))
+        return fields
+        
+    def sections(self) -> Iterator[Tuple[int, Iterator[bytes]]]:
+        """Yield (attachment index, chunks); each chunk iterator must be drained in order"""
+        for _ in range(self.section_count):
+            index, length = SECTION_HEADER.unpack(self._read_exact(SECTION_HEADER.size))
+            yield index, self._chunks(length)
+            
+    def _chunks(self, remaining: int) -> Iterator[bytes]:
+        while remaining:
+            chunk = self._read_exact(min(self.chunk_size, remaining))
+            remaining -= len(chunk)
+            yield chunk
+            
+    def read(self) -> Dict[str, Any]:
+        """Read the whole message into a dict, like decode_message"""
+        message = self.read_fields()
+        for index, chunks in self.sections():
+            message[ATTACHMENTS_FIELD][index][ATTACHMENT_DATA_KEY] = b''.join(chunks)
+        return message
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Performance Metrics - Per-stage latency spans and histograms for QuMail
+
+Send/receive paths mark the end of each stage on a StageTrace; the time since
+the previous mark lands in a fixed-bucket histogram in the MetricsRegistry
+under "<operation>.<stage>", and end() records "<operation>.total". Recording
+is a perf_counter() call, a bisect and a few integer adds, so it stays on in
+production.
+"""
+
+import bisect
+import time
+from typing import Any, Dict, List, Optional
+
+# Bucket upper bounds in seconds: 50us doubling up to ~110s, plus overflow
+BUCKET_BOUNDS: List[float] = [0.00005 * 2 ** i for i in range(22)]
+
+class LatencyHistogram:
+    """Fixed log-spaced latency buckets with count/sum/min/max"""
+    
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+            
+    def percentile(self, fraction: float) -> float:
+        """Approximate percentile in seconds (bucket upper bound, capped at the max seen)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+        
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'min_ms': round((self.min or 0.0) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3)
+        }
+
+class StageTrace:
+    """Times consecutive stages of one operation"""
+    
+    __slots__ = ('registry', 'operation', 'started', 'last', 'stages')
+    
+    def __init__(self, registry: 'MetricsRegistry', operation: str):
+        self.registry = registry
+        self.operation = operation
+        self.started = self.last = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        
+    def mark(self, stage: str) -> float:
+        """Close the current stage: record the time since the previous mark"""
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+        self.registry.record(f"{self.operation}.{stage}", elapsed)
+        return elapsed
+        
+    def skip(self):
+        """Drop time since the last mark (e.g. policy checks not worth a stage)"""
+        self.last = time.perf_counter()
+        
+    def end(self, outcome: str = 'ok') -> float:
+        """Record the operation total, and count it under its outcome"""
+        if self.started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.started
+        self.started = None
+        self.registry.record(f"{self.operation}.total", elapsed)
+        self.registry.count(f"{self.operation}.{outcome}")
+        return elapsed
+
+class MetricsRegistry:
+    """In-process registry of named latency histograms and counters"""
+    
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        
+    def trace(self, operation: str) -> StageTrace:
+        return StageTrace(self, operation)
+        
+    def record(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+        
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+        
+    def get(self, name: str) -> Optional[LatencyHistogram]:
+        return self.histograms.get(name)
+        
+    def snapshot(self, prefix: str = '') -> Dict[str, Any]:
+        """Histogram summaries (ms) and counters, optionally filtered by name prefix"""
+        return {
+            'latency': {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())
+                        if name.startswith(prefix)},
+            'counters': {name: value for name, value in sorted(self.counters.items())
+                         if name.startswith(prefix)}
+        }
+        
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Background Scheduler - One timer wheel for QuMail's periodic work
+
+Heartbeats, status polls, queue drains, health checks and cleanups register
+here instead of each running its own sleep loop:
+
+- Timer wheel: due times are rounded up to `tick` seconds and kept in a
+  hashed wheel of `wheel_size` slots, so everything due in the same tick runs
+  from a single wakeup and the loop sleeps until the next occupied tick.
+- Jitter: each run is rescheduled `interval * (1 +/- jitter)` out so clients
+  and sessions started together do not probe in lockstep.
+- Idle backoff: a task that returns IDLE found nothing to do; its interval
+  doubles (up to `interval * idle_backoff`) and snaps back on the next run
+  that does work, or when the task is woken.
+- Coalescing: tasks probing the same `resource` skip a run when another probe
+  of it succeeded within half their interval.
+- A task never overlaps itself; a run longer than its interval counts as an
+  overrun. Lag (how late a run started) and duration land in the
+  MetricsRegistry under "scheduler.<name>.lag" / ".duration".
+
+There is one scheduler per event loop (get_scheduler()).
+"""
+
+import asyncio
+import inspect
+import logging
+import math
+import random
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .perf_metrics import MetricsRegistry
+
+IDLE = object()  # returned by a task that found nothing to do
+COALESCE_WINDOW = 0.5  # fraction of the interval a same-resource success stands in for a probe
+
+@dataclass(eq=False)
+class ScheduledTask:
+    """Handle for one periodic task (cancel() to unregister)"""
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    jitter: float = 0.1
+    resource: Optional[str] = None
+    coalesce: bool = True  # False: successes count for the resource but the task is never skipped
+    idle_backoff: float = 1.0  # max interval multiplier while the task keeps returning IDLE
+    current_interval: float = 0.0
+    due: float = 0.0  # loop time
+    due_tick: int = 0
+    runs: int = 0
+    coalesced: int = 0
+    failures: int = 0
+    overruns: int = 0
+    cancelled: bool = False
+    rerun: bool = False
+    running: Optional[asyncio.Task] = None
+    scheduler: Optional['BackgroundScheduler'] = field(default=None, repr=False)
+    
+    def cancel(self):
+        """Unregister the task and cancel a run in progress"""
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+
+class BackgroundScheduler:
+    """Hashed timer wheel running periodic tasks on one event loop"""
+    
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, tick: float = 0.25,
+                 wheel_size: int = 512, metrics: Optional[MetricsRegistry] = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.metrics = metrics or MetricsRegistry()
+        
+        self.slots: List[Set[ScheduledTask]] = [set() for _ in range(wheel_size)]
+        self.tasks: Set[ScheduledTask] = set()
+        self.cursor = self._now_tick()  # next tick to process
+        self.resource_ok: Dict[str, float] = {}  # resource -> loop time of last successful probe
+        self._sleep_until: Optional[int] = None  # tick the loop is sleeping towards
+        self._wake = asyncio.Event()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {
+            'wakeups': 0,
+            'runs': 0,
+            'coalesced': 0,
+            'failures': 0,
+            'overruns': 0
+        }
+        
+    def _tick_of(self, when: float) -> int:
+        """First tick at or after when"""
+        return math.ceil(when / self.tick)
+        
+    def _now_tick(self) -> int:
+        """Last tick boundary already reached (timers may fire a hair early)"""
+        return int(self.loop.time() / self.tick + 1e-6)
+        
+    def add(self, name: str, func: Callable[[], Any], interval: float, jitter: float = 0.1,
+            resource: Optional[str] = None, coalesce: bool = True, idle_backoff: float = 1.0,
+            delay: Optional[float] = None) -> ScheduledTask:
+        """Run func (sync or async) every interval seconds; first run after delay (default: one jittered interval)"""
+        task = ScheduledTask(name, func, interval, jitter=jitter, resource=resource, coalesce=coalesce,
+                             idle_backoff=max(1.0, idle_backoff), current_interval=interval, scheduler=self)
+        self.tasks.add(task)
+        self._schedule(task, self._jittered(task) if delay is None else delay)
+        if self._runner is None or self._runner.done():
+            self._runner = self.loop.create_task(self._run())
+        logging.debug(f"Scheduled {name} every {interval}s" + (f" on {resource}" if resource else ""))
+        return task
+        
+    def remove(self, task: ScheduledTask):
+        task.cancelled = True
+        self.tasks.discard(task)
+        self.slots[task.due_tick % self.wheel_size].discard(task)
+        if task.running is not None and not task.running.done():
+            task.running.cancel()
+            
+    def wake(self, task: ScheduledTask):
+        """Run task now and reset its idle backoff (after a run in progress, if any)"""
+        if task.cancelled:
+            return
+        task.current_interval = task.interval
+        if task.running is not None:
+            task.rerun = True
+            return
+        self.slots[task.due_tick % self.wheel_size].discard(task)
+        self._schedule(task, 0.0)
+        
+    def _jittered(self, task: ScheduledTask) -> float:
+        return task.current_interval * (1.0 + random.uniform(-task.jitter, task.jitter))
+        
+    def _schedule(self, task: ScheduledTask, delay: float):
+        task.due = self.loop.time() + max(0.0, delay)
+        task.due_tick = max(self._tick_of(task.due), self.cursor)
+        self.slots[task.due_tick % self.wheel_size].add(task)
+        if self._sleep_until is not None and task.due_tick < self._sleep_until:
+            self._wake.set()  # due before the tick the loop is sleeping towards
+            
+    def _next_tick(self) -> Optional[int]:
+        """Earliest occupied tick within one revolution of the cursor (None: nothing scheduled)"""
+        if not self.tasks:
+            return None
+        for index in range(self.cursor, self.cursor + self.wheel_size):
+            if any(task.due_tick == index for task in self.slots[index % self.wheel_size]):
+                return index
+        return self.cursor + self.wheel_size  # only tasks further out: check again after a revolution
+        
+    async def _run(self):
+        while self.tasks:
+            now_tick = self._now_tick()
+            # Slots from the cursor up to now (one revolution at most covers every slot)
+            for index in range(max(self.cursor, now_tick - self.wheel_size + 1), now_tick + 1):
+                slot = self.slots[index % self.wheel_size]
+                for task in [task for task in slot if task.due_tick <= now_tick]:
+                    slot.discard(task)
+                    self._fire(task)
+            self.cursor = max(self.cursor, now_tick + 1)
+            
+            self._sleep_until = self._next_tick()
+            if self._sleep_until is None:
+                break
+            self._wake.clear()
+            self._timer = self.loop.call_at(self._sleep_until * self.tick, self._wake.set)
+            try:
+                await self._wake.wait()
+            finally:
+                self._timer.cancel()
+                self._sleep_until = None
+            self.stats['wakeups'] += 1
+        self._runner = None
+        
+    def _fire(self, task: ScheduledTask):
+        now = self.loop.time()
+        if task.resource and task.coalesce:
+            last_ok = self.resource_ok.get(task.resource)
+            if last_ok is not None and now - last_ok < task.interval * COALESCE_WINDOW:
+                task.coalesced += 1
+                self.stats['coalesced'] += 1
+                self.metrics.count(f"scheduler.{task.name}.coalesced")
+                self._schedule(task, self._jittered(task))
+                return
+        task.running = self.loop.create_task(self._execute(task))
+        
+    async def _execute(self, task: ScheduledTask):
+        started = self.loop.time()
+        self.metrics.record(f"scheduler.{task.name}.lag", max(0.0, started - task.due))
+        failed = False
+        try:
+            result = task.func()
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            task.running = None
+            raise
+        except Exception as e:
+            failed = True
+            result = None
+            task.failures += 1
+            self.stats['failures'] += 1
+            logging.error(f"Scheduled task {task.name} failed: {e}")
+            
+        finished = self.loop.time()
+        duration = finished - started
+        self.metrics.record(f"scheduler.{task.name}.duration", duration)
+        task.runs += 1
+        self.stats['runs'] += 1
+        if duration > task.interval:
+            task.overruns += 1
+            self.stats['overruns'] += 1
+            
+        if result is IDLE:
+            task.current_interval = min(task.current_interval * 2, task.interval * task.idle_backoff)
+        else:
+            task.current_interval = task.interval
+            if not failed and result is not False and task.resource:
+                self.resource_ok[task.resource] = finished
+                
+        task.running = None
+        if task.cancelled:
+            return
+        if task.rerun:
+            task.rerun = False
+            task.current_interval = task.interval
+            self._schedule(task, 0.0)
+        else:
+            self._schedule(task, self._jittered(task))
+            
+    def get_stats(self) -> Dict[str, Any]:
+        """Wakeups and per-task-name runs, skips and lag/duration percentiles"""
+        tasks: Dict[str, Dict[str, Any]] = {}
+        for task in self.tasks:
+            entry = tasks.setdefault(task.name, {
+                'instances': 0, 'interval': task.interval, 'current_interval': 0.0,
+                'runs': 0, 'coalesced': 0, 'failures': 0, 'overruns': 0
+            })
+            entry['instances'] += 1
+            entry['current_interval'] = max(entry['current_interval'], round(task.current_interval, 3))
+            for key in ('runs', 'coalesced', 'failures', 'overruns'):
+                entry[key] += getattr(task, key)
+        for name, entry in tasks.items():
+            lag = self.metrics.get(f"scheduler.{name}.lag")
+            duration = self.metrics.get(f"scheduler.{name}.duration")
+            entry['lag_p50_ms'] = round(lag.percentile(0.50) * 1000, 3) if lag else 0.0
+            entry['lag_p95_ms'] = round(lag.percentile(0.95) * 1000, 3) if lag else 0.0
+            entry['duration_p50_ms'] = round(duration.percentile(0.50) * 1000, 3) if duration else 0.0
+            entry['duration_p95_ms'] = round(duration.percentile(0.95) * 1000, 3) if duration else 0.0
+        stats = dict(self.stats)
+        stats.update({'tick': self.tick, 'scheduled': len(self.tasks), 'tasks': tasks})
+        return stats
+        
+    async def stop(self):
+        """Cancel every task and wait for runs in progress to finish cancelling"""
+        running = [task.running for task in self.tasks if task.running is not None]
+        for task in list(self.tasks):
+            self.remove(task)
+        if self._runner is not None:
+            self._runner.cancel()
+            running.append(self._runner)
+        await asyncio.gather(*running, return_exceptions=True)
+        self._runner = None
+
+_schedulers: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BackgroundScheduler]' = weakref.WeakKeyDictionary()
+
+def get_scheduler(loop: Optional[asyncio.AbstractEventLoop] = None) -> BackgroundScheduler:
+    """The scheduler of loop (default: the running loop, else the current thread's loop)"""
+    if loop is None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = asyncio.get_event_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = BackgroundScheduler(loop)
+    return scheduler